@@ -0,0 +1,237 @@
+"""ASGI entry point serving the webhook routes outside Azure Functions
+
+The routes match the function app: GET and POST /api/webhook, and POST /api/webhook/batch.
+Requests go through the same webhook services, so validation, filtering and queueing behave as
+they do in Functions. Single webhooks run on the event loop when WEBHOOK_ASYNC is true; the
+sync service and batches run in a worker thread.
+
+Bodies are read against MAX_BODY_BYTES (MAX_BATCH_BODY_BYTES for batches) as they stream in,
+so a chunked body over the limit is rejected without being buffered in full. With
+QUEUE_BACKEND=sqlite or memory, the app runs with no Azure services at all.
+
+Usage:
+    uvicorn alma_item_checks_webhook_service.asgi:app --workers 4
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, MutableMapping
+from typing import Any
+from urllib.parse import parse_qsl
+
+from alma_item_checks_webhook_service.config import Settings, get_settings
+from alma_item_checks_webhook_service.services.async_webhook_service import (
+    AsyncWebhookService,
+)
+from alma_item_checks_webhook_service.services.batch_webhook_service import (
+    BatchWebhookService,
+)
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    async_queue_client_registry,
+    queue_client_registry,
+)
+from alma_item_checks_webhook_service.services.webhook_service import (
+    WebhookService,
+    warm_up,
+)
+from alma_item_checks_webhook_service.utils.http import (
+    BufferedRequest,
+    WebhookResponse,
+)
+from alma_item_checks_webhook_service.utils.log_limiter import log_limited
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+WEBHOOK_PATH: str = "/api/webhook"
+BATCH_PATH: str = "/api/webhook/batch"
+
+# The methods allowed on each route
+ROUTES: dict[str, tuple[str, ...]] = {
+    WEBHOOK_PATH: ("GET", "POST"),
+    BATCH_PATH: ("POST",),
+}
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client disconnects before its request body has been read"""
+
+
+async def read_body(receive: Receive, max_bytes: int) -> bytes | None:
+    """Read a request body, stopping as soon as it goes over the size limit
+
+    Args:
+        receive (Receive): The ASGI receive callable
+        max_bytes (int): The largest body accepted
+
+    Returns:
+        bytes | None: The body, or None if it is over the limit
+
+    Raises:
+        ClientDisconnected: If the client disconnects first
+    """
+    chunks: list[bytes] = []
+    size: int = 0
+    while True:
+        message: Message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ClientDisconnected()
+        chunk: bytes = message.get("body", b"")
+        size += len(chunk)
+        if size > max_bytes:
+            log_limited(
+                logging.ERROR,
+                "asgi.read_body: Body is over the %d byte limit after %d bytes",
+                max_bytes,
+                size,
+            )
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+def build_request(scope: Scope, body: bytes) -> BufferedRequest:
+    """Build the request passed to the webhook services
+
+    Args:
+        scope (Scope): The ASGI HTTP connection scope
+        body (bytes): The request body
+
+    Returns:
+        BufferedRequest: The request
+    """
+    return BufferedRequest(
+        method=scope["method"],
+        url=scope["path"],
+        body=body,
+        headers=[
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in scope.get("headers", [])
+        ],
+        params=dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"))),
+    )
+
+
+async def handle(req: BufferedRequest) -> WebhookResponse:
+    """Run a request through the webhook service for its route
+
+    Args:
+        req (BufferedRequest): The request
+
+    Returns:
+        WebhookResponse: The service's response
+    """
+    if req.url == BATCH_PATH:
+        return await asyncio.to_thread(BatchWebhookService(req).parse_batch)
+    if get_settings().webhook_async:
+        return await AsyncWebhookService(req).parse_webhook()
+    return await asyncio.to_thread(WebhookService(req).parse_webhook)
+
+
+async def send_response(send: Send, response: WebhookResponse) -> None:
+    """Send a response
+
+    Args:
+        send (Send): The ASGI send callable
+        response (WebhookResponse): The response
+    """
+    body: bytes = response.get_body()
+    headers: list[tuple[bytes, bytes]] = [
+        (
+            b"content-type",
+            f"{response.mimetype}; charset={response.charset}".encode("latin-1"),
+        ),
+        (b"content-length", str(len(body)).encode("latin-1")),
+    ]
+    headers.extend(
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in response.headers.items()
+    )
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": headers,
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def lifespan(receive: Receive, send: Send) -> None:
+    """Validate settings and warm up the router and sync queue clients at startup, and close the pooled queue clients at shutdown
+
+    Args:
+        receive (Receive): The ASGI receive callable
+        send (Send): The ASGI send callable
+    """
+    while True:
+        message: Message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                warm_up()
+            except ValueError as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await async_queue_client_registry.clear()
+            queue_client_registry.clear()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    """Serve the webhook routes
+
+    Args:
+        scope (Scope): The ASGI connection scope
+        receive (Receive): The ASGI receive callable
+        send (Send): The ASGI send callable
+    """
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    path: str = scope["path"].rstrip("/")
+    methods: tuple[str, ...] | None = ROUTES.get(path)
+    if methods is None:
+        await send_response(send, WebhookResponse("Not Found", status_code=404))
+        return
+    if scope["method"] not in methods:
+        await send_response(
+            send,
+            WebhookResponse(
+                "Method Not Allowed",
+                status_code=405,
+                headers={"Allow": ", ".join(methods)},
+            ),
+        )
+        return
+
+    settings: Settings = get_settings()
+    max_bytes: int = (
+        settings.max_batch_body_bytes if path == BATCH_PATH else settings.max_body_bytes
+    )
+    try:
+        body: bytes | None = await read_body(receive, max_bytes)
+    except ClientDisconnected:
+        return
+    if body is None:
+        await send_response(
+            send, WebhookResponse("Request body too large", status_code=413)
+        )
+        return
+
+    try:
+        response: WebhookResponse = await handle(
+            build_request({**scope, "path": path}, body)
+        )
+    except Exception:
+        logging.exception("asgi.app: Unhandled error processing %s", path)
+        response = WebhookResponse("Internal Server Error", status_code=500)
+    await send_response(send, response)
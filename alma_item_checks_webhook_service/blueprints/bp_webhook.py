@@ -1,14 +1,43 @@
 """Process webhook from Alma on item update."""
 
 import azure.functions as func
+from azure.functions.warmup import WarmUpContext
 
-from alma_item_checks_webhook_service.services.webhook_service import WebhookService
+from alma_item_checks_webhook_service.config import webhook_async_enabled
+from alma_item_checks_webhook_service.services.async_webhook_service import (
+    AsyncWebhookService,
+)
+from alma_item_checks_webhook_service.services.batch_webhook_service import (
+    BatchWebhookService,
+)
+from alma_item_checks_webhook_service.services.webhook_service import (
+    WebhookService,
+    warm_up,
+)
+from alma_item_checks_webhook_service.utils.http import WebhookResponse
+from alma_item_checks_webhook_service.utils.profiling import profiled
 
 bp = func.Blueprint()
 
 
-@bp.function_name("item_webhook")
-@bp.route("webhook", methods=["GET", "POST"], auth_level="anonymous")
+def to_http_response(response: WebhookResponse) -> func.HttpResponse:
+    """Convert a webhook service response to a Functions HTTP response.
+
+    Args:
+        response (WebhookResponse): The response returned by a webhook service.
+
+    Returns:
+        func.HttpResponse: The same status, body and headers.
+    """
+    return func.HttpResponse(
+        response.get_body(),
+        status_code=response.status_code,
+        headers=response.headers,
+        mimetype=response.mimetype,
+        charset=response.charset,
+    )
+
+
 def item_webhook(req: func.HttpRequest) -> func.HttpResponse:
     """Process webhook from Alma on item update.
 
@@ -18,7 +47,61 @@ def item_webhook(req: func.HttpRequest) -> func.HttpResponse:
     Returns:
         func.HttpResponse: The HTTP response.
     """
-    webhook_service: WebhookService = WebhookService(req)  # initialize WebhookService
-    response: func.HttpResponse = webhook_service.parse_webhook()  # parse webhook
+    with profiled():  # sampled by PROFILE_SAMPLE_RATE, a no-op by default
+        webhook_service: WebhookService = WebhookService(
+            req
+        )  # initialize WebhookService
+        response: WebhookResponse = webhook_service.parse_webhook()  # parse webhook
+
+    return to_http_response(response)
+
+
+async def item_webhook_async(req: func.HttpRequest) -> func.HttpResponse:
+    """Process webhook from Alma on item update without blocking a worker thread.
+
+    Args:
+        req (func.HttpRequest): The incoming HTTP request.
+
+    Returns:
+        func.HttpResponse: The HTTP response.
+    """
+    with profiled():
+        webhook_service: AsyncWebhookService = AsyncWebhookService(req)
+        response: WebhookResponse = await webhook_service.parse_webhook()
 
-    return response
+    return to_http_response(response)
+
+
+# Register the sync handler unless the async one is selected with WEBHOOK_ASYNC=true
+bp.function_name("item_webhook")(
+    bp.route("webhook", methods=["GET", "POST"], auth_level="anonymous")(
+        item_webhook_async if webhook_async_enabled() else item_webhook
+    )
+)
+
+
+@bp.function_name("item_webhook_batch")
+@bp.route("webhook/batch", methods=["POST"], auth_level="anonymous")
+def item_webhook_batch(req: func.HttpRequest) -> func.HttpResponse:
+    """Queue a signed batch of item events or barcodes from an internal job.
+
+    Args:
+        req (func.HttpRequest): The incoming HTTP request.
+
+    Returns:
+        func.HttpResponse: A JSON summary of the outcome of each record.
+    """
+    batch_service: BatchWebhookService = BatchWebhookService(req)
+
+    return to_http_response(batch_service.parse_batch())
+
+
+@bp.function_name("warmup")
+@bp.warm_up_trigger("warmup")
+def warmup(warmup: WarmUpContext) -> None:
+    """Build the router and pooled queue clients before a new instance takes traffic.
+
+    Args:
+        warmup (WarmUpContext): The warm-up trigger context.
+    """
+    warm_up()
@@ -1,6 +1,18 @@
-"""Configurations for Alma Item Checks Webhook Service"""
+"""Configurations for Alma Item Checks Webhook Service
 
+Settings are read from the environment and validated the first time they are needed, then
+cached for the life of the worker. Module attributes such as config.FETCH_ITEM_QUEUE are
+still available and resolve through the cached settings.
+"""
+
+import json
+import logging
 import os
+from dataclasses import dataclass, fields
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from alma_item_checks_webhook_service.services.event_filter import EventFilter
 
 
 def _get_required_env(var_name: str) -> str:
@@ -11,9 +23,260 @@ def _get_required_env(var_name: str) -> str:
     return value
 
 
+def _get_bool_env(var_name: str, default: str) -> bool:
+    """Gets a true/false environment variable."""
+    return os.getenv(var_name, default).lower() == "true"
+
+
+def webhook_async_enabled() -> bool:
+    """Whether WEBHOOK_ASYNC selects the asyncio handler, read without loading the other settings
+
+    The function app chooses its handler at import, when the rest of the settings should not yet
+    be read or validated.
+
+    Returns:
+        bool: The WEBHOOK_ASYNC setting
+    """
+    return _get_bool_env("WEBHOOK_ASYNC", "false")
+
+
+def _get_list_env(var_name: str) -> list[str]:
+    """Gets a comma-separated environment variable as a list of non-empty values."""
+    return [
+        value.strip() for value in os.getenv(var_name, "").split(",") if value.strip()
+    ]
+
+
+def _get_mapping_env(var_name: str) -> dict[str, str]:
+    """Gets a comma-separated list of key=value pairs as a dict, raising a ValueError if malformed."""
+    mapping: dict[str, str] = {}
+    for entry in _get_list_env(var_name):
+        key, separator, value = entry.partition("=")
+        if not separator or not key.strip() or not value.strip():
+            raise ValueError(
+                f"Malformed entry in environment variable '{var_name}': '{entry}'"
+            )
+        mapping[key.strip()] = value.strip()
+    return mapping
+
+
+def _get_json_env(var_name: str) -> Any:
+    """Gets a JSON environment variable, or None if it is not set, raising a ValueError if malformed."""
+    value = os.getenv(var_name)
+    if value is None or not value.strip():
+        return None
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError as e:
+        raise ValueError(
+            f"Malformed JSON in environment variable '{var_name}': {e}"
+        ) from None
+
+
+def _get_event_filter_env(var_name: str) -> "EventFilter | None":
+    """Gets and compiles an event filter environment variable, or None if it is not set, raising a ValueError if invalid."""
+    document: Any = _get_json_env(var_name)
+    if document is None:
+        return None
+    from alma_item_checks_webhook_service.services.event_filter import EventFilter
+
+    try:
+        event_filter: EventFilter = EventFilter(document)
+    except ValueError as e:
+        raise ValueError(
+            f"Invalid event filter in environment variable '{var_name}': {e}"
+        ) from None
+    logging.info(
+        "Settings.from_env: Compiled event filter for %s with %d rules",
+        ", ".join(sorted(event_filter.event_types)),
+        len(event_filter.stats()) - 1,
+    )
+    return event_filter
+
+
 STORAGE_CONNECTION_SETTING_NAME = "AzureWebJobsStorage"
-STORAGE_CONNECTION_STRING: str = _get_required_env(STORAGE_CONNECTION_SETTING_NAME)
 
-WEBHOOK_SECRET: str = _get_required_env("WEBHOOK_SECRET")
 
-FETCH_ITEM_QUEUE: str = os.getenv("FETCH_ITEM_QUEUE", "fetch-item-queue")
+@dataclass(frozen=True)
+class Settings:
+    """Application settings; attribute names are the lower-cased environment variable names"""
+
+    storage_connection_string: str
+    webhook_secret: str
+    # Secrets still accepted while Alma is switched over to a new WEBHOOK_SECRET
+    webhook_previous_secrets: list[str]
+    fetch_item_queue: str
+    # Hash partitions of the fetch item queue and per-institution queue overrides
+    fetch_item_partitions: int
+    fetch_item_routes: dict[str, str]
+    webhook_async: bool
+    # Largest request bodies accepted by the single-event and batch routes
+    max_body_bytes: int
+    max_batch_body_bytes: int
+    # Micro-batching of fetch item queue messages; a batch size of 1 sends one message per webhook
+    fetch_item_batch_size: int
+    fetch_item_batch_window_ms: int
+    # Queue message encoding: json (plain objects) or compact (versioned, short field names)
+    message_format: str
+    message_compress_threshold: int
+    # Debounce of repeat ITEM_UPDATED events per (institution, barcode); a TTL of 0 disables it
+    debounce_ttl_seconds: float
+    debounce_max_entries: int
+    debounce_table_name: str | None
+    # Bounds on a single queue send, and the circuit breaker that fails sends fast while storage is unhealthy
+    queue_send_timeout_seconds: float
+    queue_send_retries: int
+    queue_breaker_failures: int
+    queue_breaker_reset_seconds: float
+    # Where messages are sent: azure, memory or sqlite
+    queue_backend: str
+    queue_sqlite_path: str
+    # Event filter compiled from its JSON document when the settings are loaded
+    event_filter: "EventFilter | None"
+    # Per-institution token-bucket smoothing: events per second, burst size and maximum delay
+    shaping_rates: dict[str, float]
+    shaping_default_rate: float
+    shaping_burst: float
+    shaping_max_delay_seconds: float
+    # Ack-first mode: answer once the message is in a bounded outbox drained in the background
+    outbox_enabled: bool
+    outbox_max_size: int
+    outbox_spill_path: str | None
+    outbox_max_attempts: int
+    outbox_workers: int
+    # Skip of item updates whose relevant fields are unchanged; no paths disables it
+    change_detection_paths: list[str]
+    change_detection_ttl_seconds: float
+    change_detection_max_entries: int
+    change_detection_table_name: str | None
+    # Claim-check mode: item snapshots written to a blob container (or a local stand-in directory)
+    claim_check_container: str | None
+    claim_check_local_path: str | None
+    # Idempotency of byte-identical webhook retries, keyed on the validated signature
+    idempotency_enabled: bool
+    idempotency_ttl_seconds: float
+    idempotency_max_entries: int
+    # Exporter for per-stage webhook spans: none, memory, console or otlp
+    telemetry_exporter: str
+    # Failure-path log lines per message in each interval; a limit of 0 logs every line
+    log_rate_limit: int
+    log_rate_interval_seconds: float
+    # Sampling profiler of item_webhook: 1 in N invocations, 0 disables it
+    profile_sample_rate: int
+    profile_flush_samples: int
+    profile_output: str | None
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Read and validate settings from the environment
+
+        Returns:
+            Settings: The settings
+
+        Raises:
+            ValueError: If a required variable is missing, a value is malformed or debouncing is
+                combined with claim-check mode
+        """
+        settings = cls(
+            storage_connection_string=_get_required_env(
+                STORAGE_CONNECTION_SETTING_NAME
+            ),
+            webhook_secret=_get_required_env("WEBHOOK_SECRET"),
+            webhook_previous_secrets=_get_list_env("WEBHOOK_PREVIOUS_SECRETS"),
+            fetch_item_queue=os.getenv("FETCH_ITEM_QUEUE", "fetch-item-queue"),
+            fetch_item_partitions=int(os.getenv("FETCH_ITEM_PARTITIONS", "1")),
+            fetch_item_routes=_get_mapping_env("FETCH_ITEM_ROUTES"),
+            webhook_async=webhook_async_enabled(),
+            max_body_bytes=int(os.getenv("MAX_BODY_BYTES", "1048576")),
+            max_batch_body_bytes=int(os.getenv("MAX_BATCH_BODY_BYTES", "33554432")),
+            fetch_item_batch_size=int(os.getenv("FETCH_ITEM_BATCH_SIZE", "1")),
+            fetch_item_batch_window_ms=int(
+                os.getenv("FETCH_ITEM_BATCH_WINDOW_MS", "50")
+            ),
+            message_format=os.getenv("MESSAGE_FORMAT", "json").lower(),
+            message_compress_threshold=int(
+                os.getenv("MESSAGE_COMPRESS_THRESHOLD", "1024")
+            ),
+            debounce_ttl_seconds=float(os.getenv("DEBOUNCE_TTL_SECONDS", "0")),
+            debounce_max_entries=int(os.getenv("DEBOUNCE_MAX_ENTRIES", "10000")),
+            debounce_table_name=os.getenv("DEBOUNCE_TABLE_NAME"),
+            queue_send_timeout_seconds=float(
+                os.getenv("QUEUE_SEND_TIMEOUT_SECONDS", "5")
+            ),
+            queue_send_retries=int(os.getenv("QUEUE_SEND_RETRIES", "1")),
+            queue_breaker_failures=int(os.getenv("QUEUE_BREAKER_FAILURES", "5")),
+            queue_breaker_reset_seconds=float(
+                os.getenv("QUEUE_BREAKER_RESET_SECONDS", "30")
+            ),
+            queue_backend=os.getenv("QUEUE_BACKEND", "azure").lower(),
+            queue_sqlite_path=os.getenv("QUEUE_SQLITE_PATH", "queues.sqlite3"),
+            event_filter=_get_event_filter_env("EVENT_FILTER"),
+            shaping_rates={
+                institution: float(rate)
+                for institution, rate in _get_mapping_env("SHAPING_RATES").items()
+            },
+            shaping_default_rate=float(os.getenv("SHAPING_DEFAULT_RATE", "0")),
+            shaping_burst=float(os.getenv("SHAPING_BURST", "50")),
+            shaping_max_delay_seconds=float(
+                os.getenv("SHAPING_MAX_DELAY_SECONDS", "3600")
+            ),
+            outbox_enabled=_get_bool_env("OUTBOX_ENABLED", "false"),
+            outbox_max_size=int(os.getenv("OUTBOX_MAX_SIZE", "1000")),
+            outbox_spill_path=os.getenv("OUTBOX_SPILL_PATH"),
+            outbox_max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10")),
+            outbox_workers=int(os.getenv("OUTBOX_WORKERS", "4")),
+            change_detection_paths=_get_list_env("CHANGE_DETECTION_PATHS"),
+            change_detection_ttl_seconds=float(
+                os.getenv("CHANGE_DETECTION_TTL_SECONDS", "86400")
+            ),
+            change_detection_max_entries=int(
+                os.getenv("CHANGE_DETECTION_MAX_ENTRIES", "100000")
+            ),
+            change_detection_table_name=os.getenv("CHANGE_DETECTION_TABLE_NAME"),
+            claim_check_container=os.getenv("CLAIM_CHECK_CONTAINER"),
+            claim_check_local_path=os.getenv("CLAIM_CHECK_LOCAL_PATH"),
+            idempotency_enabled=_get_bool_env("IDEMPOTENCY_ENABLED", "true"),
+            idempotency_ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600")),
+            idempotency_max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000")),
+            telemetry_exporter=os.getenv("TELEMETRY_EXPORTER", "none").lower(),
+            log_rate_limit=int(os.getenv("LOG_RATE_LIMIT", "10")),
+            log_rate_interval_seconds=float(
+                os.getenv("LOG_RATE_INTERVAL_SECONDS", "60")
+            ),
+            profile_sample_rate=int(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+            profile_flush_samples=int(os.getenv("PROFILE_FLUSH_SAMPLES", "100")),
+            profile_output=os.getenv("PROFILE_OUTPUT"),
+        )
+        # Each claim-check message references its own snapshot, which debouncing would drop
+        if settings.debounce_ttl_seconds > 0 and (
+            settings.claim_check_container or settings.claim_check_local_path
+        ):
+            raise ValueError(
+                "DEBOUNCE_TTL_SECONDS cannot be used with CLAIM_CHECK_CONTAINER or CLAIM_CHECK_LOCAL_PATH"
+            )
+        return settings
+
+
+_settings: Settings | None = None
+
+
+def get_settings() -> Settings:
+    """Get the cached settings, reading and validating them on first use
+
+    Returns:
+        Settings: The settings
+    """
+    global _settings
+    if _settings is None:
+        _settings = Settings.from_env()
+    return _settings
+
+
+_SETTING_NAMES: frozenset[str] = frozenset(field.name for field in fields(Settings))
+
+
+def __getattr__(name: str) -> Any:
+    """Resolve upper-case setting names, e.g. config.FETCH_ITEM_QUEUE, through the cached settings"""
+    if name.isupper() and name.lower() in _SETTING_NAMES:
+        return getattr(get_settings(), name.lower())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
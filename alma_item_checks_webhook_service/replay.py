@@ -0,0 +1,550 @@
+"""Replay captured Alma webhooks into the fetch item queue
+
+After an outage, captured webhooks can be re-run in bulk instead of one HTTP request at a time.
+Each record goes through the same validation, extraction and filtering as a live webhook and
+is enqueued by a bounded thread pool. Records for an (institution, barcode) already queued in
+the run are skipped. That in-run dedupe replaces the delivery idempotency, debounce and change
+detection stages, which are bypassed: they remember live deliveries, and would drop records
+whose live processing is exactly what the replay is making up for.
+
+The source is an NDJSON file with one webhook per line, or a directory of files holding one
+webhook each, read in name order. In the raw format a record is the webhook body exactly as
+Alma sent it. In the envelope format it is {"body": "<raw body>", "signature": "<X-Exl-Signature>"},
+which is needed to verify signatures.
+
+Files are streamed, so memory use does not grow with the file size, only with the number of
+distinct items queued. With --checkpoint, the position of the last record whose processing
+finished, along with every record before it, is saved periodically with the items queued up to
+there, and a later run with the same checkpoint resumes from there without queueing those
+items again.
+
+Usage:
+    alma-webhook-replay captured.ndjson --checkpoint replay.checkpoint --failed failed.ndjson
+"""
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any
+
+from alma_item_checks_webhook_service.services.webhook_service import WebhookService
+from alma_item_checks_webhook_service.utils import fast_json
+from alma_item_checks_webhook_service.utils.http import (
+    BufferedRequest,
+    WebhookRequest,
+    WebhookResponse,
+)
+from alma_item_checks_webhook_service.utils.telemetry import NoOpSpan
+
+QUEUED_OUTCOMES: frozenset[str] = frozenset({"queued", "outboxed"})
+INVALID_OUTCOMES: frozenset[str] = frozenset(
+    {"invalid_signature", "invalid_payload", "too_large", "unsupported_media_type"}
+)
+FAILED_OUTCOMES: frozenset[str] = frozenset(
+    {"enqueue_failed", "outbox_full", "circuit_open", "rate_limited"}
+)
+COUNTERS: tuple[str, ...] = (
+    "read",
+    "queued",
+    "duplicate",
+    "skipped",
+    "invalid",
+    "failed",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class ReplayRecord:
+    """A captured webhook as read from the source"""
+
+    raw: bytes
+    # Where reading resumes after this record: a byte offset, or a count of files
+    position: int
+
+
+def read_ndjson(path: Path, start: int = 0) -> Iterator[ReplayRecord]:
+    """Stream the records of an NDJSON file
+
+    Args:
+        path (Path): The file
+        start (int): Byte offset to start reading at
+
+    Yields:
+        ReplayRecord: Each non-blank line
+    """
+    with path.open("rb") as file:
+        file.seek(start)
+        position: int = start
+        for line in file:
+            position += len(line)
+            if line.strip():
+                yield ReplayRecord(line.strip(), position)
+
+
+def read_directory(path: Path, start: int = 0) -> Iterator[ReplayRecord]:
+    """Read the records of a directory holding one webhook per file, in name order
+
+    Args:
+        path (Path): The directory
+        start (int): Number of files to skip
+
+    Yields:
+        ReplayRecord: The content of each file
+    """
+    files: list[Path] = sorted(entry for entry in path.iterdir() if entry.is_file())
+    for position, file in enumerate(files[start:], start + 1):
+        yield ReplayRecord(file.read_bytes().strip(), position)
+
+
+class Checkpoint:
+    """The replay position, counters and queued items of a source, saved to a JSON file"""
+
+    def __init__(self, path: Path, source: Path) -> None:
+        """Initialize the Checkpoint class
+
+        Args:
+            path (Path): The checkpoint file
+            source (Path): The replayed source
+        """
+        self.path: Path = path
+        self.source: str = str(source.resolve())
+
+    def load(self) -> tuple[int, dict[str, int], set[tuple[str, str]]]:
+        """Load the saved position, counters and queued items
+
+        Returns:
+            tuple[int, dict[str, int], set[tuple[str, str]]]: The position, counters and
+                (institution, barcode) of the items queued, or 0 and nothing if nothing is saved
+
+        Raises:
+            ValueError: If the checkpoint belongs to another source
+        """
+        if not self.path.exists():
+            return 0, {}, set()
+        saved: dict[str, Any] = json.loads(self.path.read_text())
+        if saved.get("source") != self.source:
+            raise ValueError(
+                f"Checkpoint {self.path} belongs to {saved.get('source')}, not {self.source}"
+            )
+        return (
+            int(saved["position"]),
+            dict(saved.get("counts", {})),
+            {(institution, barcode) for institution, barcode in saved.get("seen", [])},
+        )
+
+    def save(
+        self,
+        position: int,
+        counts: dict[str, int],
+        seen: Iterable[tuple[str, str]] = (),
+    ) -> None:
+        """Save the position, counters and queued items, replacing the file atomically
+
+        Args:
+            position (int): Where reading resumes
+            counts (dict[str, int]): The replay counters
+            seen (Iterable[tuple[str, str]]): (institution, barcode) of the items queued before position
+        """
+        temporary: Path = self.path.with_name(self.path.name + ".tmp")
+        temporary.write_text(
+            json.dumps(
+                {
+                    "source": self.source,
+                    "position": position,
+                    "counts": counts,
+                    "seen": sorted(seen),
+                }
+            )
+        )
+        temporary.replace(self.path)
+
+
+class OutcomeSpan(NoOpSpan):
+    """Span that only keeps the outcome attribute, so replay can classify each record"""
+
+    __slots__ = ("outcome",)
+
+    def __init__(self) -> None:
+        """Initialize the OutcomeSpan class"""
+        self.outcome: str | None = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if key == "outcome":
+            self.outcome = value
+
+
+class ReplayWebhookService(WebhookService):
+    """WebhookService for a replayed record, with optional signature validation
+
+    Replayed records are not claimed as deliveries, debounced or checked for changes.
+    """
+
+    def __init__(self, req: WebhookRequest, verify_signatures: bool) -> None:
+        """Initialize the ReplayWebhookService class
+
+        Args:
+            req (WebhookRequest): The request rebuilt from the record
+            verify_signatures (bool): Whether to validate the record's signature
+        """
+        super().__init__(req)
+        self.verify_signatures: bool = verify_signatures
+        self.outcome_span: OutcomeSpan = OutcomeSpan()
+        self.span = self.outcome_span
+
+    def signature_skipped(self) -> bool:  # type: ignore[override]
+        """Whether signature validation is skipped for this replay"""
+        return not self.verify_signatures
+
+    def claim_delivery(self) -> str | None:
+        """Process every record, whatever the idempotency store remembers of its live delivery"""
+        return None
+
+    def barcode_debouncer(self) -> None:
+        """Queue every record the replay has not already queued, without debouncing"""
+        return None
+
+    def change_detector(self) -> None:
+        """Queue every record without comparing it with the fingerprints of live updates"""
+        return None
+
+
+class Replayer:
+    """Replays records through WebhookService with a bounded pool of enqueue threads"""
+
+    def __init__(
+        self,
+        workers: int = 8,
+        envelope: bool = False,
+        verify_signatures: bool = False,
+        retries: int = 3,
+        checkpoint: Checkpoint | None = None,
+        failed_output: IO[bytes] | None = None,
+        progress_output: IO[str] | None = None,
+        progress_seconds: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """Initialize the Replayer class
+
+        Args:
+            workers (int): Enqueue threads
+            envelope (bool): Whether records are envelopes rather than raw bodies
+            verify_signatures (bool): Whether to validate envelope signatures
+            retries (int): Retries of a failed enqueue, waiting for Retry-After when given
+            checkpoint (Checkpoint | None): Where progress is saved, if anywhere
+            failed_output (IO[bytes] | None): Where records that could not be enqueued are written, one per line
+            progress_output (IO[str] | None): Where progress lines are written, if anywhere
+            progress_seconds (float): Seconds between progress lines and checkpoint saves
+            clock (Callable[[], float]): Monotonic clock, replaceable in tests
+            sleep (Callable[[float], None]): Sleep between retries, replaceable in tests
+        """
+        self.workers: int = workers
+        self.envelope: bool = envelope
+        self.verify_signatures: bool = verify_signatures
+        self.retries: int = retries
+        self.checkpoint: Checkpoint | None = checkpoint
+        self.failed_output: IO[bytes] | None = failed_output
+        self.progress_output: IO[str] | None = progress_output
+        self.progress_seconds: float = progress_seconds
+        self.position: int = 0
+        self.counts: dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self._clock: Callable[[], float] = clock
+        self._sleep: Callable[[float], None] = sleep
+        self._lock: threading.Lock = threading.Lock()
+        # (institution, barcode) of every item queued or being queued in this run
+        self.seen: set[tuple[str, str]] = set()
+        # Items of seen whose records are past the position, left out of the checkpoint
+        self._unconfirmed: set[tuple[str, str]] = set()
+        # (enqueue future or None if there was nothing to enqueue, position after the record,
+        # item of the enqueue)
+        self._pending: deque[
+            tuple[Future[None] | None, int, tuple[str, str] | None]
+        ] = deque()
+
+    def run(self, records: Iterable[ReplayRecord]) -> dict[str, int]:
+        """Replay records, blocking until every enqueue has finished
+
+        Args:
+            records (Iterable[ReplayRecord]): The records, in source order
+
+        Returns:
+            dict[str, int]: The replay counters
+        """
+        started: float = self._clock()
+        read_at_start: int = self.counts["read"]
+        last_report: float = started
+        in_flight: threading.BoundedSemaphore = threading.BoundedSemaphore(
+            self.workers * 2
+        )
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="replay") as pool:
+            for record in records:
+                self.count("read")
+                future: Future[None] | None = None
+                item: tuple[str, str] | None = None
+                prepared = self.prepare(record)
+                if prepared is not None:
+                    item = (prepared[1]["institution"], prepared[1]["barcode"])
+                    in_flight.acquire()
+                    future = pool.submit(self.enqueue, record, *prepared)
+                    future.add_done_callback(lambda _: in_flight.release())
+                self.track(future, record.position, item)
+                if self._clock() - last_report >= self.progress_seconds:
+                    self.report(started, read_at_start)
+                    last_report = self._clock()
+        self.report(started, read_at_start)
+        return self.stats()
+
+    def prepare(
+        self, record: ReplayRecord
+    ) -> tuple[ReplayWebhookService, dict[str, Any]] | None:
+        """Validate a record and build its queue message, counting records with nothing to enqueue
+
+        Args:
+            record (ReplayRecord): The record
+
+        Returns:
+            tuple[ReplayWebhookService, dict[str, Any]] | None: The service and message, or None if there is nothing to enqueue
+        """
+        try:
+            req: BufferedRequest = self.build_request(record)
+        except ValueError:
+            logging.error("Replayer.prepare: Malformed envelope at %d", record.position)
+            self.count("invalid")
+            return None
+        service: ReplayWebhookService = ReplayWebhookService(
+            req, self.verify_signatures
+        )
+        message: WebhookResponse | dict[str, Any] = service.prepare_queue_message()
+        if isinstance(message, WebhookResponse):
+            service.finish_delivery(message)
+            outcome: str | None = service.outcome_span.outcome
+            self.count("invalid" if outcome in INVALID_OUTCOMES else "skipped")
+            return None
+        item: tuple[str, str] = (message["institution"], message["barcode"])
+        with self._lock:
+            duplicate: bool = item in self.seen
+            if not duplicate:
+                self.seen.add(item)
+                self._unconfirmed.add(item)
+        if duplicate:
+            self.count("duplicate")
+            return None
+        return service, message
+
+    def build_request(self, record: ReplayRecord) -> BufferedRequest:
+        """Rebuild the webhook request of a record
+
+        Args:
+            record (ReplayRecord): The record
+
+        Returns:
+            BufferedRequest: A POST with the webhook body and, for envelopes, its signature
+
+        Raises:
+            ValueError: If the record should be an envelope but is not one
+        """
+        body: bytes = record.raw
+        headers: dict[str, str] = {}
+        if self.envelope:
+            envelope: Any = fast_json.loads(record.raw)
+            if not isinstance(envelope, dict) or not isinstance(
+                envelope.get("body"), str
+            ):
+                raise ValueError("Record is not a webhook envelope")
+            body = envelope["body"].encode()
+            if isinstance(envelope.get("signature"), str):
+                headers["X-Exl-Signature"] = envelope["signature"]
+        return BufferedRequest(
+            method="POST", url="/api/webhook", headers=headers, body=body
+        )
+
+    def enqueue(
+        self,
+        record: ReplayRecord,
+        service: ReplayWebhookService,
+        message: dict[str, Any],
+    ) -> None:
+        """Enqueue a message, retrying failures, and count the result (runs in a pool thread)
+
+        Args:
+            record (ReplayRecord): The record the message was built from
+            service (ReplayWebhookService): The record's service
+            message (dict[str, Any]): The fetch item queue message
+        """
+        try:
+            for attempt in range(self.retries + 1):
+                response: WebhookResponse = service.enqueue(message)
+                if service.outcome_span.outcome not in FAILED_OUTCOMES:
+                    break
+                if attempt < self.retries:
+                    self._sleep(float(response.headers.get("Retry-After", 2**attempt)))
+            service.finish_delivery(response)
+            queued: bool = service.outcome_span.outcome in QUEUED_OUTCOMES
+        except Exception as e:  # a lost record must still be counted and written out
+            logging.error("Replayer.enqueue: Unexpected error: %s", e)
+            queued = False
+        if queued:
+            self.count("queued")
+            return
+        self.count("failed")
+        with self._lock:
+            # Let a later record for the same item try again
+            self.seen.discard((message["institution"], message["barcode"]))
+            if self.failed_output is not None:
+                self.failed_output.write(record.raw + b"\n")
+
+    def track(
+        self,
+        future: Future[None] | None,
+        position: int,
+        item: tuple[str, str] | None = None,
+    ) -> None:
+        """Record a record's enqueue and move the position past every finished record
+
+        Args:
+            future (Future[None] | None): The enqueue, or None if there was nothing to enqueue
+            position (int): The position after the record
+            item (tuple[str, str] | None): The (institution, barcode) being enqueued
+        """
+        # Consecutive records with nothing to enqueue share one entry, bounding the deque
+        if future is None and self._pending and self._pending[-1][0] is None:
+            self._pending[-1] = (None, position, None)
+        else:
+            self._pending.append((future, position, item))
+        self.advance()
+
+    def advance(self) -> None:
+        """Move the position past every record that has finished, along with all records before it"""
+        while self._pending and (
+            self._pending[0][0] is None or self._pending[0][0].done()
+        ):
+            _, self.position, item = self._pending.popleft()
+            if item is not None:
+                with self._lock:
+                    self._unconfirmed.discard(item)
+
+    def count(self, counter: str) -> None:
+        """Increment a counter
+
+        Args:
+            counter (str): One of COUNTERS
+        """
+        with self._lock:
+            self.counts[counter] += 1
+
+    def stats(self) -> dict[str, int]:
+        """Get the replay counters
+
+        Returns:
+            dict[str, int]: Records read, queued, skipped as duplicate items, skipped by the service, invalid and failed
+        """
+        with self._lock:
+            return dict(self.counts)
+
+    def report(self, started: float, read_at_start: int) -> None:
+        """Save the checkpoint and write a progress line
+
+        Args:
+            started (float): Clock time the run started
+            read_at_start (int): Records counted as read before the run, when resuming
+        """
+        self.advance()
+        counts: dict[str, int] = self.stats()
+        if self.checkpoint is not None:
+            with self._lock:
+                seen: set[tuple[str, str]] = self.seen - self._unconfirmed
+            self.checkpoint.save(self.position, counts, seen)
+        if self.failed_output is not None:
+            self.failed_output.flush()
+        if self.progress_output is not None:
+            elapsed: float = max(self._clock() - started, 1e-9)
+            rate: float = (counts["read"] - read_at_start) / elapsed
+            details: str = ", ".join(f"{name} {counts[name]}" for name in COUNTERS)
+            print(
+                f"replay: {details} ({rate:.0f} records/s)", file=self.progress_output
+            )
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Replay captured webhooks from the command line
+
+    Args:
+        argv (list[str] | None): Arguments, defaulting to sys.argv
+
+    Returns:
+        int: 0 if every record with something to enqueue was queued, otherwise 1
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "source", type=Path, help="NDJSON file or directory of JSON files"
+    )
+    parser.add_argument(
+        "--format", choices=["raw", "envelope"], default="raw", help="record format"
+    )
+    parser.add_argument(
+        "--verify-signatures", action="store_true", help="validate envelope signatures"
+    )
+    parser.add_argument("--workers", type=int, default=8, help="enqueue threads")
+    parser.add_argument(
+        "--retries", type=int, default=3, help="retries of a failed enqueue"
+    )
+    parser.add_argument(
+        "--checkpoint", type=Path, help="file to save progress to and resume from"
+    )
+    parser.add_argument(
+        "--failed", type=Path, help="file receiving records that could not be enqueued"
+    )
+    parser.add_argument(
+        "--progress-seconds",
+        type=float,
+        default=10.0,
+        help="seconds between progress lines",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="log each skipped record"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    checkpoint: Checkpoint | None = (
+        Checkpoint(args.checkpoint, args.source) if args.checkpoint else None
+    )
+    try:
+        start, counts, seen = checkpoint.load() if checkpoint else (0, {}, set())
+    except ValueError as e:
+        parser.error(str(e))
+    read: Callable[[Path, int], Iterator[ReplayRecord]] = (
+        read_directory if args.source.is_dir() else read_ndjson
+    )
+    failed_output: IO[bytes] | None = args.failed.open("ab") if args.failed else None
+    try:
+        replayer = Replayer(
+            workers=args.workers,
+            envelope=args.format == "envelope",
+            verify_signatures=args.verify_signatures,
+            retries=args.retries,
+            checkpoint=checkpoint,
+            failed_output=failed_output,
+            progress_output=sys.stderr,
+            progress_seconds=args.progress_seconds,
+        )
+        replayer.position = start
+        replayer.counts.update(counts)
+        replayer.seen.update(seen)
+        final: dict[str, int] = replayer.run(read(args.source, start))
+    finally:
+        if failed_output is not None:
+            failed_output.close()
+    return 1 if final["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""Asyncio service class for handling Webhook events"""
+
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Any, TypeVar
+
+from alma_item_checks_webhook_service.config import Settings, get_settings
+from alma_item_checks_webhook_service.services.outbox import Outbox
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    async_queue_client_registry,
+    queue_send_errors,
+)
+from alma_item_checks_webhook_service.services.rate_shaper import (
+    ShapingLimitExceeded,
+)
+from alma_item_checks_webhook_service.services.webhook_service import (
+    WebhookService,
+    batch_result_timeout,
+    get_outbox,
+    queue_breaker_guard,
+    queue_send_options,
+    uses_remote_stores,
+)
+from alma_item_checks_webhook_service.utils.circuit_breaker import (
+    CircuitOpenError,
+)
+from alma_item_checks_webhook_service.utils.http import WebhookResponse
+from alma_item_checks_webhook_service.utils.telemetry import get_tracer
+
+T = TypeVar("T")
+
+
+class AsyncWebhookService(WebhookService):
+    """Service class for handling Webhook events without blocking a worker thread on the queue send
+
+    Validation and parsing are shared with WebhookService; only the enqueue awaits, so one worker
+    can overlap many in-flight queue sends. The debounce, change detection and claim-check stores
+    use synchronous clients, so when any of them is in Azure Storage, the stages calling it run in
+    a worker thread instead of on the event loop.
+    """
+
+    async def parse_webhook(self) -> WebhookResponse:  # type: ignore[override]
+        """Parse the webhook and queue request data for re-retrieval to verify active status
+
+        Returns:
+            WebhookResponse: The response to return to Alma
+        """
+        try:
+            with get_tracer().span("webhook") as self.span:
+                message: WebhookResponse | dict[str, Any] = await self.off_loop(
+                    self.prepare_queue_message
+                )
+                if isinstance(message, WebhookResponse):
+                    return self.finish_delivery(message)
+
+                with get_tracer().span("webhook.enqueue") as enqueue_span:
+                    response: WebhookResponse = await self.enqueue_async(message)
+                    self.record_circuit_state(enqueue_span)
+                return self.finish_delivery(response)
+        finally:
+            self.release_delivery()
+
+    async def enqueue_async(self, message: dict[str, Any]) -> WebhookResponse:
+        """Send the message to the fetch item queue with the aio queue client
+
+        Args:
+            message (dict[str, Any]): The fetch item queue message
+
+        Returns:
+            WebhookResponse: The response to return to Alma
+        """
+        queue_name: str = self.route_message(message)
+        try:
+            delay: int = self.delivery_delay(message)
+        except ShapingLimitExceeded as e:
+            return await self.off_loop(self.rate_limited, message, e)
+        outbox: Outbox | None = get_outbox()
+        if outbox is not None and not delay:
+            return await self.off_loop(self.put_in_outbox, outbox, message, queue_name)
+        try:
+            batched: Future[None] | None = (
+                None if delay else self.submit_to_batcher(message, queue_name)
+            )
+            if batched is not None:
+                await asyncio.wait_for(
+                    asyncio.wrap_future(batched), timeout=batch_result_timeout()
+                )
+            else:
+                await self.send_async(
+                    self.serialize_message(message), queue_name, delay
+                )
+        except CircuitOpenError as e:
+            return await self.off_loop(self.circuit_open, message, e)
+        except queue_send_errors() as e:
+            return await self.off_loop(self.enqueue_failed, message, e)
+
+        self.span.set_attribute("outcome", "queued")
+        return WebhookResponse("Webhook received", status_code=200)
+
+    @staticmethod
+    async def off_loop(function: Callable[..., T], *args: Any) -> T:
+        """Call a stage that may use the remote stores, in a worker thread if they are configured
+
+        Args:
+            function (Callable[..., T]): The stage to call
+            *args: The stage arguments
+
+        Returns:
+            T: The stage result
+        """
+        if uses_remote_stores():
+            return await asyncio.to_thread(function, *args)
+        return function(*args)
+
+    @staticmethod
+    async def send_async(
+        content: str, queue_name: str, visibility_timeout: int = 0
+    ) -> None:
+        """Send message content with the aio queue client, through the circuit breaker and bounded by the send timeout
+
+        Args:
+            content (str): The queue message content
+            queue_name (str): The fetch item queue chosen by the router
+            visibility_timeout (int): Seconds the message stays hidden from consumers
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open and the send was not attempted
+        """
+        settings: Settings = get_settings()
+        with queue_breaker_guard():
+            await asyncio.wait_for(
+                async_queue_client_registry.send_message(
+                    settings.storage_connection_string,
+                    queue_name,
+                    content,
+                    **queue_send_options(visibility_timeout),
+                ),
+                timeout=settings.queue_send_timeout_seconds,
+            )
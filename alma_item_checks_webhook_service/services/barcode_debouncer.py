@@ -0,0 +1,230 @@
+"""Time-windowed debounce of ITEM_UPDATED enqueues per (institution, barcode)
+
+The first event for a barcode is queued at once and opens a window. The first repeat inside
+the window is queued hidden for the length of the window, so it is processed after every
+repeat it coalesces, and the later repeats are dropped. A barcode therefore gets at most two
+messages per window, and only the one standing in for the repeats is delayed.
+"""
+
+import math
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from alma_item_checks_webhook_service.config import Settings, get_settings
+from alma_item_checks_webhook_service.services.table_storage import (
+    item_keys,
+    open_table,
+    store_errors_logged,
+)
+from alma_item_checks_webhook_service.utils.ttl_cache import TTLCache
+
+# Appended to the barcode of the key claimed by a window's delayed trailing message
+TRAILING_KEY_SUFFIX: str = ":trailing"
+
+
+class DebounceStore(Protocol):
+    """Storage for recently enqueued (institution, barcode) keys"""
+
+    def claim(self, institution: str, barcode: str, ttl: float) -> bool:
+        """Mark a key as enqueued, returning False if it was already claimed within ttl"""
+        ...
+
+    def release(self, institution: str, barcode: str) -> None:
+        """Forget a claimed key so the next event for it is enqueued"""
+        ...
+
+
+class MemoryDebounceStore:
+    """Per-process debounce store backed by a bounded LRU cache"""
+
+    def __init__(
+        self, max_entries: int, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """Initialize the MemoryDebounceStore class
+
+        Args:
+            max_entries (int): Maximum number of keys remembered
+            clock (Callable[[], float]): Monotonic clock, replaceable in tests
+        """
+        self._cache: TTLCache = TTLCache(max_entries, ttl=0, clock=clock)
+
+    def claim(self, institution: str, barcode: str, ttl: float) -> bool:
+        """Mark a key as enqueued, returning False if it was already claimed within ttl"""
+        return self._cache.add((institution, barcode), ttl=ttl)
+
+    def release(self, institution: str, barcode: str) -> None:
+        """Forget a claimed key so the next event for it is enqueued"""
+        self._cache.discard((institution, barcode))
+
+
+class TableDebounceStore:
+    """Debounce store shared by all function instances through an Azure Storage table
+
+    Entities are keyed by PartitionKey=institution and RowKey=barcode and hold the time the
+    claim expires. Claims are best effort: two instances racing on the same expired key may
+    both enqueue.
+    """
+
+    def __init__(
+        self, table_client: Any, clock: Callable[[], float] = time.time
+    ) -> None:
+        """Initialize the TableDebounceStore class
+
+        Args:
+            table_client (Any): An azure.data.tables TableClient (or a stand-in with the same methods)
+            clock (Callable[[], float]): Wall clock, replaceable in tests
+        """
+        self._table_client: Any = table_client
+        self._clock: Callable[[], float] = clock
+
+    @classmethod
+    def from_connection_string(
+        cls, connection_string: str, table_name: str
+    ) -> "TableDebounceStore":
+        """Build a store for a table, creating the table if it does not exist
+
+        Args:
+            connection_string (str): The storage account connection string
+            table_name (str): The name of the debounce table
+
+        Returns:
+            TableDebounceStore: The store
+        """
+        return cls(open_table(connection_string, table_name))
+
+    def claim(self, institution: str, barcode: str, ttl: float) -> bool:
+        """Mark a key as enqueued, returning False if it was already claimed within ttl"""
+        from azure.core.exceptions import ResourceExistsError
+
+        now = self._clock()
+        entity = {**item_keys(institution, barcode), "expires_at": now + ttl}
+        try:
+            self._table_client.create_entity(entity=entity)
+            return True
+        except ResourceExistsError:
+            pass
+
+        existing = self._table_client.get_entity(
+            partition_key=entity["PartitionKey"], row_key=entity["RowKey"]
+        )
+        if existing.get("expires_at", 0) > now:
+            return False
+        self._table_client.upsert_entity(entity=entity)
+        return True
+
+    def release(self, institution: str, barcode: str) -> None:
+        """Forget a claimed key so the next event for it is enqueued"""
+        keys: dict[str, str] = item_keys(institution, barcode)
+        self._table_client.delete_entity(
+            partition_key=keys["PartitionKey"], row_key=keys["RowKey"]
+        )
+
+
+class BarcodeDebouncer:
+    """Coalesces repeat enqueues of the same (institution, barcode) within a time window"""
+
+    def __init__(self, store: DebounceStore, ttl: float) -> None:
+        """Initialize the BarcodeDebouncer class
+
+        Args:
+            store (DebounceStore): Where claimed keys are remembered
+            ttl (float): Seconds during which repeat events for a key are coalesced
+        """
+        self.store: DebounceStore = store
+        self.ttl: float = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def hold(self, institution: str, barcode: str) -> int | None:
+        """Claim an event's place in its window
+
+        Args:
+            institution (str): The institution code
+            barcode (str): The item barcode
+
+        Returns:
+            int | None: Seconds to hide the event's message for: 0 for the first event of a
+                window, the window length for the first repeat, or None if an earlier repeat's
+                message already covers this one
+        """
+        # Stays 0, enqueueing the event, if the store is unavailable
+        delay: int | None = 0
+        with store_errors_logged(
+            "BarcodeDebouncer.hold: Debounce store unavailable, enqueueing: %s"
+        ):
+            if self.store.claim(institution, barcode, self.ttl):
+                delay = 0
+            elif self.store.claim(institution, barcode + TRAILING_KEY_SUFFIX, self.ttl):
+                delay = math.ceil(self.ttl)
+            else:
+                delay = None
+            with self._lock:
+                if delay is None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return delay
+
+    def release(self, institution: str, barcode: str, delay: int = 0) -> None:
+        """Forget a key after a failed enqueue so Alma's retry is not suppressed
+
+        Args:
+            institution (str): The institution code
+            barcode (str): The item barcode
+            delay (int): The delay hold() gave the message, telling which key it claimed
+        """
+        with store_errors_logged(
+            "BarcodeDebouncer.release: Failed to release debounce key: %s"
+        ):
+            self.store.release(
+                institution, barcode + TRAILING_KEY_SUFFIX if delay else barcode
+            )
+
+    def stats(self) -> dict[str, int]:
+        """Get the hit and miss counters
+
+        Returns:
+            dict[str, int]: Dropped (hits) and enqueued (misses) event counts
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_barcode_debouncer: BarcodeDebouncer | None = None
+_barcode_debouncer_lock: threading.Lock = threading.Lock()
+
+
+def get_barcode_debouncer() -> BarcodeDebouncer | None:
+    """Get the process-wide debouncer, or None if debouncing is disabled
+
+    Debouncing is off in claim-check mode: each event's message references its own snapshot, so
+    suppressing a later event would leave downstream with the stale snapshot of an earlier one.
+    Settings.from_env rejects DEBOUNCE_TTL_SECONDS in that mode.
+
+    Returns:
+        BarcodeDebouncer | None: The debouncer, using the shared table store when DEBOUNCE_TABLE_NAME is set
+    """
+    global _barcode_debouncer
+    settings: Settings = get_settings()
+    if settings.debounce_ttl_seconds <= 0 or (
+        settings.claim_check_container or settings.claim_check_local_path
+    ):
+        return None
+    if _barcode_debouncer is None:
+        with _barcode_debouncer_lock:
+            if _barcode_debouncer is None:
+                store: DebounceStore
+                if settings.debounce_table_name:
+                    store = TableDebounceStore.from_connection_string(
+                        settings.storage_connection_string,
+                        settings.debounce_table_name,
+                    )
+                else:
+                    store = MemoryDebounceStore(settings.debounce_max_entries)
+                _barcode_debouncer = BarcodeDebouncer(
+                    store, settings.debounce_ttl_seconds
+                )
+    return _barcode_debouncer
@@ -0,0 +1,328 @@
+"""Signed batches of item events or bare barcodes for internal re-check jobs
+
+A batch body is an NDJSON document with one record per line (Content-Type
+application/x-ndjson), or a JSON array of records (application/json). A
+record is an Alma item webhook body, an {"institution": ..., "barcode": ...} object, or an
+[institution, barcode] pair. The signature is validated once for the whole body. Records are
+decoded one at a time and go through the same filtering as single webhooks. With
+FETCH_ITEM_BATCH_SIZE above 1, their messages are packed into batch queue messages of up to
+that many records per queue by the route itself, since the whole body is at hand and nothing
+is gained by waiting on the per-webhook batchers. Otherwise each record is sent as its own
+message, in the format consumers read without batching.
+"""
+
+import json
+import logging
+from collections.abc import Iterator
+from typing import Any
+
+from alma_item_checks_webhook_service.services.event_filter import (
+    EVENT_TYPE_RULE,
+    EventFilter,
+    get_event_filter,
+)
+from alma_item_checks_webhook_service.services.outbox import Outbox, OutboxFull
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    queue_send_errors,
+)
+from alma_item_checks_webhook_service.config import get_settings
+from alma_item_checks_webhook_service.services.rate_shaper import (
+    ShapingLimitExceeded,
+)
+from alma_item_checks_webhook_service.services.webhook_service import (
+    JSON_CONTENT_TYPES,
+    WebhookService,
+    get_outbox,
+    pack_fetch_item_batch,
+    send_fetch_item_message,
+)
+from alma_item_checks_webhook_service.utils import fast_json
+from alma_item_checks_webhook_service.utils.circuit_breaker import CircuitOpenError
+from alma_item_checks_webhook_service.utils.http import WebhookResponse
+from alma_item_checks_webhook_service.utils.log_limiter import log_limited
+from alma_item_checks_webhook_service.utils.payload import (
+    ITEM_EVENT_TYPES,
+    ItemEvent,
+    item_event_from_payload,
+)
+from alma_item_checks_webhook_service.utils.telemetry import get_tracer
+
+# ItemEvent.event of a record holding only an institution and barcode
+BARCODE_RECORD: str = "BARCODE"
+
+FAILED_OUTCOMES: frozenset[str] = frozenset(
+    {"enqueue_failed", "outbox_full", "circuit_open", "rate_limited"}
+)
+
+
+NDJSON_CONTENT_TYPE: str = "application/x-ndjson"
+
+
+def iter_batch_records(
+    body: bytes, array: bool | None = None
+) -> Iterator[tuple[Any, str | None]]:
+    """Decode the records of a batch body one at a time
+
+    Args:
+        body (bytes): An NDJSON document or a JSON array
+        array (bool | None): Whether the body is a JSON array, or None to assume so if it starts with "["
+
+    Yields:
+        tuple[Any, str | None]: Each decoded record and None, or None and the decoding error.
+        A malformed NDJSON line only affects its own record; a malformed array ends the batch.
+    """
+    start: int = len(body) - len(body.lstrip())
+    if array is None:
+        array = body[start : start + 1] == b"["
+    if array:
+        if body[start : start + 1] != b"[":
+            yield None, "Invalid JSON array: body does not start with '['"
+            return
+        yield from _iter_array(body.decode("utf-8", errors="replace"), start + 1)
+        return
+    while start < len(body):
+        end: int = body.find(b"\n", start)
+        if end == -1:
+            end = len(body)
+        line: bytes = body[start:end].strip()
+        start = end + 1
+        if not line:
+            continue
+        try:
+            yield fast_json.loads(line), None
+        except ValueError as e:
+            yield None, f"Invalid JSON: {e}"
+
+
+def _iter_array(text: str, index: int) -> Iterator[tuple[Any, str | None]]:
+    """Decode the elements of a JSON array one at a time, starting after the opening bracket"""
+    decoder: json.JSONDecoder = json.JSONDecoder()
+    index = _skip_whitespace(text, index)
+    if text.startswith("]", index):
+        return
+    while True:
+        try:
+            record, index = decoder.raw_decode(text, index)
+        except ValueError as e:
+            yield None, f"Invalid JSON array: {e}"
+            return
+        yield record, None
+        index = _skip_whitespace(text, index)
+        if text.startswith("]", index):
+            return
+        if not text.startswith(",", index):
+            yield None, f"Invalid JSON array: expected ',' or ']' at char {index}"
+            return
+        index = _skip_whitespace(text, index + 1)
+
+
+def _skip_whitespace(text: str, index: int) -> int:
+    """The index of the first non-whitespace character at or after index"""
+    while index < len(text) and text[index] in " \t\r\n":
+        index += 1
+    return index
+
+
+def record_item_event(record: Any, event_types: frozenset[str]) -> ItemEvent | None:
+    """Interpret a batch record as an item event
+
+    Args:
+        record (Any): The decoded record
+        event_types (frozenset[str]): The webhook event types to queue
+
+    Returns:
+        ItemEvent | None: The event, or None if the record is a webhook of another event type
+
+    Raises:
+        ValueError: If the record is not a webhook body, institution and barcode object or pair
+    """
+    if isinstance(record, dict) and "event" in record:
+        return item_event_from_payload(record, event_types)
+    if isinstance(record, dict):
+        institution, barcode = record.get("institution"), record.get("barcode")
+    elif isinstance(record, list) and len(record) == 2:
+        institution, barcode = record
+    else:
+        raise ValueError("Record is not an item event or institution and barcode")
+    if not isinstance(institution, str) or not isinstance(barcode, str):
+        raise ValueError("Institution and barcode must be strings")
+    return ItemEvent(BARCODE_RECORD, institution or None, barcode or None)
+
+
+class BatchWebhookService(WebhookService):
+    """Queues every record of a signed batch and summarizes the outcome of each"""
+
+    def parse_batch(self) -> WebhookResponse:
+        """Validate the batch signature once and queue its records
+
+        Returns:
+            WebhookResponse: A JSON summary with counts and the outcome of each record,
+            with status 500 if any record could not be enqueued
+        """
+        try:
+            with get_tracer().span("webhook.batch") as self.span:
+                rejected: WebhookResponse | None = self.check_request(
+                    get_settings().max_batch_body_bytes,
+                    JSON_CONTENT_TYPES | {NDJSON_CONTENT_TYPE},
+                )
+                if rejected is not None:
+                    return rejected
+                if not self.validate_signature():
+                    self.span.set_attribute("outcome", "invalid_signature")
+                    return WebhookResponse(
+                        "Internal Server Error: Invalid webhook signature",
+                        status_code=500,
+                    )
+                earlier: str | None = self.claim_delivery()
+                if earlier is not None:
+                    return self.repeated_delivery(earlier, "Batch received")
+
+                records: list[dict[str, Any]] = self.process_records()
+                counts: dict[str, int] = {}
+                for record in records:
+                    counts[record["outcome"]] = counts.get(record["outcome"], 0) + 1
+                failed: bool = any(outcome in FAILED_OUTCOMES for outcome in counts)
+                self.span.set_attribute("records", len(records))
+                self.span.set_attribute(
+                    "outcome", "enqueue_failed" if failed else "queued"
+                )
+                response: WebhookResponse = WebhookResponse(
+                    json.dumps(
+                        {"received": len(records), "counts": counts, "records": records}
+                    ),
+                    mimetype="application/json",
+                    status_code=500 if failed else 200,
+                )
+                return self.finish_delivery(response)
+        finally:
+            self.release_delivery()
+
+    def process_records(self) -> list[dict[str, Any]]:
+        """Build and enqueue the message of each record
+
+        Returns:
+            list[dict[str, Any]]: The outcome of each record, in body order, with an error for invalid records
+        """
+        event_filter: EventFilter | None = get_event_filter()
+        event_types: frozenset[str] = (
+            event_filter.event_types if event_filter else ITEM_EVENT_TYPES
+        )
+        summary: list[dict[str, Any]] = []
+        # Records per queue message; 1 unless the versioned batch format is enabled
+        pack_size: int = max(get_settings().fetch_item_batch_size, 1)
+        # Messages waiting to be packed, by queue: (summary entry, message)
+        packs: dict[str, list[tuple[dict[str, Any], dict[str, Any]]]] = {}
+        content_type: str = self.req.headers.get("Content-Type", "")
+        media_type: str = content_type.partition(";")[0].strip().lower()
+        array: bool | None = {NDJSON_CONTENT_TYPE: False, "application/json": True}.get(
+            media_type
+        )
+        for record, error in iter_batch_records(self.req.get_body(), array):
+            entry: dict[str, Any] = {"outcome": "invalid_payload"}
+            summary.append(entry)
+            if error is not None:
+                entry["error"] = error
+                continue
+            try:
+                item_event: ItemEvent | None = record_item_event(record, event_types)
+            except ValueError as e:
+                entry["error"] = str(e)
+                continue
+            if item_event is None:
+                entry["outcome"] = "ignored"
+                if event_filter:
+                    event_filter.record_drop(EVENT_TYPE_RULE)
+                continue
+            if not item_event.institution:
+                entry["error"] = "Institution is missing"
+                continue
+            message: dict[str, Any] | str = self.build_queue_message(item_event)
+            if isinstance(message, str):
+                entry["outcome"] = message
+                if message == "invalid_payload":
+                    entry["error"] = "Barcode is missing"
+                continue
+            queue_name: str = self.route_message(message)
+            try:
+                delay: int = self.delivery_delay(message)
+            except ShapingLimitExceeded as e:
+                log_limited(
+                    logging.WARNING, "BatchWebhookService.process_records: %s", e
+                )
+                entry["outcome"] = "rate_limited"
+                self.release_claims(message)
+                continue
+            if delay or get_outbox() is not None:
+                entry["outcome"] = self.enqueue_record(message, queue_name, delay)
+                continue
+            pack: list[tuple[dict[str, Any], dict[str, Any]]] = packs.setdefault(
+                queue_name, []
+            )
+            pack.append((entry, message))
+            if len(pack) == pack_size:
+                self.send_pack(pack, queue_name)
+                del packs[queue_name]
+
+        for queue_name, pack in packs.items():
+            self.send_pack(pack, queue_name)
+        return summary
+
+    def send_pack(
+        self, pack: list[tuple[dict[str, Any], dict[str, Any]]], queue_name: str
+    ) -> None:
+        """Send record messages as one queue message and set the outcome of each record
+
+        Args:
+            pack (list[tuple[dict[str, Any], dict[str, Any]]]): The summary entry and message of each record
+            queue_name (str): The fetch item queue chosen by the router
+        """
+        messages: list[dict[str, Any]] = [message for _, message in pack]
+        outcome: str = "queued"
+        try:
+            send_fetch_item_message(
+                self.serialize_message(messages[0])
+                if len(messages) == 1
+                else pack_fetch_item_batch(messages),
+                queue_name,
+            )
+        except CircuitOpenError:
+            outcome = "circuit_open"
+        except queue_send_errors() as e:
+            log_limited(logging.ERROR, "Failed to send message to queue: %s", e)
+            outcome = "enqueue_failed"
+        for entry, message in pack:
+            entry["outcome"] = outcome
+            if outcome != "queued":
+                self.release_claims(message)
+
+    def enqueue_record(
+        self, message: dict[str, Any], queue_name: str, delay: int
+    ) -> str:
+        """Send a delayed record's message on its own, or hand it to the outbox
+
+        Args:
+            message (dict[str, Any]): The fetch item queue message
+            queue_name (str): The fetch item queue chosen by the router
+            delay (int): The rate shaping delay in seconds
+
+        Returns:
+            str: The outcome of the send
+        """
+        outbox: Outbox | None = get_outbox()
+        try:
+            if outbox is not None and not delay:
+                outbox.put(self.serialize_message(message), queue_name)
+                return "outboxed"
+            send_fetch_item_message(self.serialize_message(message), queue_name, delay)
+        except OutboxFull as e:
+            log_limited(logging.WARNING, "BatchWebhookService.enqueue_record: %s", e)
+            self.release_claims(message)
+            return "outbox_full"
+        except CircuitOpenError:
+            self.release_claims(message)
+            return "circuit_open"
+        except queue_send_errors() as e:
+            log_limited(logging.ERROR, "Failed to send message to queue: %s", e)
+            self.release_claims(message)
+            return "enqueue_failed"
+        return "queued"
@@ -0,0 +1,263 @@
+"""Content-based detection of ITEM_UPDATED events that changed fields the downstream checks use"""
+
+import hashlib
+import json
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from alma_item_checks_webhook_service.config import Settings, get_settings
+from alma_item_checks_webhook_service.services.table_storage import (
+    item_keys,
+    open_table,
+    store_errors_logged,
+)
+from alma_item_checks_webhook_service.utils.ttl_cache import TTLCache
+
+_MISSING: object = object()
+
+
+def item_fingerprint(item: dict[str, Any], paths: list[str]) -> str:
+    """Compute a compact fingerprint of the selected fields of an Alma item
+
+    Args:
+        item (dict[str, Any]): The webhook "item" object
+        paths (list[str]): Dotted paths relative to item, e.g. item_data.location
+
+    Returns:
+        str: A 32-character hex digest; equal for items whose selected fields are equal
+    """
+    values: list[Any] = []
+    for path in paths:
+        value: Any = item
+        for key in path.split("."):
+            value = value.get(key, _MISSING) if isinstance(value, dict) else _MISSING
+            if value is _MISSING:
+                break
+        values.append(None if value is _MISSING else value)
+    canonical: bytes = json.dumps(
+        values, sort_keys=True, separators=(",", ":"), default=str
+    ).encode()
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
+class FingerprintStore(Protocol):
+    """Storage for the last enqueued fingerprint of each (institution, barcode)"""
+
+    def get(self, institution: str, barcode: str) -> str | None:
+        """Get the stored fingerprint, or None if there is none"""
+        ...
+
+    def set(self, institution: str, barcode: str, fingerprint: str) -> None:
+        """Store a fingerprint"""
+        ...
+
+    def discard(self, institution: str, barcode: str) -> None:
+        """Forget the stored fingerprint"""
+        ...
+
+
+class MemoryFingerprintStore:
+    """Per-process fingerprint store backed by a bounded LRU cache"""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the MemoryFingerprintStore class
+
+        Args:
+            max_entries (int): Maximum number of items remembered
+            ttl (float): Seconds a fingerprint is remembered
+            clock (Callable[[], float]): Monotonic clock, replaceable in tests
+        """
+        self._cache: TTLCache = TTLCache(max_entries, ttl=ttl, clock=clock)
+
+    def get(self, institution: str, barcode: str) -> str | None:
+        """Get the stored fingerprint, or None if there is none"""
+        return self._cache.get((institution, barcode))
+
+    def set(self, institution: str, barcode: str, fingerprint: str) -> None:
+        """Store a fingerprint"""
+        self._cache.set((institution, barcode), fingerprint)
+
+    def discard(self, institution: str, barcode: str) -> None:
+        """Forget the stored fingerprint"""
+        self._cache.discard((institution, barcode))
+
+
+class TableFingerprintStore:
+    """Fingerprint store shared by all function instances through an Azure Storage table
+
+    Entities are keyed by PartitionKey=institution and RowKey=barcode and hold the
+    fingerprint and the time it expires.
+    """
+
+    def __init__(
+        self, table_client: Any, ttl: float, clock: Callable[[], float] = time.time
+    ) -> None:
+        """Initialize the TableFingerprintStore class
+
+        Args:
+            table_client (Any): An azure.data.tables TableClient (or a stand-in with the same methods)
+            ttl (float): Seconds a fingerprint is trusted
+            clock (Callable[[], float]): Wall clock, replaceable in tests
+        """
+        self._table_client: Any = table_client
+        self.ttl: float = ttl
+        self._clock: Callable[[], float] = clock
+
+    @classmethod
+    def from_connection_string(
+        cls, connection_string: str, table_name: str, ttl: float
+    ) -> "TableFingerprintStore":
+        """Build a store for a table, creating the table if it does not exist
+
+        Args:
+            connection_string (str): The storage account connection string
+            table_name (str): The name of the fingerprint table
+            ttl (float): Seconds a fingerprint is trusted
+
+        Returns:
+            TableFingerprintStore: The store
+        """
+        return cls(open_table(connection_string, table_name), ttl)
+
+    def get(self, institution: str, barcode: str) -> str | None:
+        """Get the stored fingerprint, or None if there is none or it has expired"""
+        from azure.core.exceptions import ResourceNotFoundError
+
+        keys: dict[str, str] = item_keys(institution, barcode)
+        try:
+            entity = self._table_client.get_entity(
+                partition_key=keys["PartitionKey"], row_key=keys["RowKey"]
+            )
+        except ResourceNotFoundError:
+            return None
+        if entity.get("expires_at", 0) <= self._clock():
+            return None
+        return entity.get("fingerprint")
+
+    def set(self, institution: str, barcode: str, fingerprint: str) -> None:
+        """Store a fingerprint"""
+        self._table_client.upsert_entity(
+            entity={
+                **item_keys(institution, barcode),
+                "fingerprint": fingerprint,
+                "expires_at": self._clock() + self.ttl,
+            }
+        )
+
+    def discard(self, institution: str, barcode: str) -> None:
+        """Forget the stored fingerprint"""
+        keys: dict[str, str] = item_keys(institution, barcode)
+        self._table_client.delete_entity(
+            partition_key=keys["PartitionKey"], row_key=keys["RowKey"]
+        )
+
+
+class ChangeDetector:
+    """Skips enqueues of items whose relevant fields are unchanged since their last enqueue"""
+
+    def __init__(self, store: FingerprintStore, paths: list[str]) -> None:
+        """Initialize the ChangeDetector class
+
+        Args:
+            store (FingerprintStore): Where the last enqueued fingerprints are kept
+            paths (list[str]): Dotted item paths whose values make up the fingerprint
+        """
+        self.store: FingerprintStore = store
+        self.paths: list[str] = paths
+        self.unchanged: int = 0
+        self.changed: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def has_changed(
+        self, institution: str, barcode: str, item: dict[str, Any] | None
+    ) -> bool:
+        """Compare an item with its last enqueued fingerprint, recording the new fingerprint if it changed
+
+        Args:
+            institution (str): The institution code
+            barcode (str): The item barcode
+            item (dict[str, Any] | None): The webhook "item" object
+
+        Returns:
+            bool: True if the event should be enqueued
+        """
+        if item is None:
+            return True
+        fingerprint: str = item_fingerprint(item, self.paths)
+        # Stays True, enqueueing the event, if the store is unavailable
+        changed: bool = True
+        with store_errors_logged(
+            "ChangeDetector.has_changed: Fingerprint store unavailable, enqueueing: %s"
+        ):
+            changed = self.store.get(institution, barcode) != fingerprint
+            if changed:
+                self.store.set(institution, barcode, fingerprint)
+            with self._lock:
+                if changed:
+                    self.changed += 1
+                else:
+                    self.unchanged += 1
+        return changed
+
+    def forget(self, institution: str, barcode: str) -> None:
+        """Forget a fingerprint after a failed enqueue so Alma's retry is not skipped
+
+        Args:
+            institution (str): The institution code
+            barcode (str): The item barcode
+        """
+        with store_errors_logged(
+            "ChangeDetector.forget: Failed to forget fingerprint: %s"
+        ):
+            self.store.discard(institution, barcode)
+
+    def stats(self) -> dict[str, int]:
+        """Get the unchanged and changed counters
+
+        Returns:
+            dict[str, int]: Skipped (unchanged) and enqueued (changed) event counts
+        """
+        with self._lock:
+            return {"unchanged": self.unchanged, "changed": self.changed}
+
+
+_change_detector: ChangeDetector | None = None
+_change_detector_lock: threading.Lock = threading.Lock()
+
+
+def get_change_detector() -> ChangeDetector | None:
+    """Get the process-wide change detector, or None if no relevant paths are configured
+
+    Returns:
+        ChangeDetector | None: The detector, using the shared table store when CHANGE_DETECTION_TABLE_NAME is set
+    """
+    global _change_detector
+    settings: Settings = get_settings()
+    if not settings.change_detection_paths:
+        return None
+    if _change_detector is None:
+        with _change_detector_lock:
+            if _change_detector is None:
+                store: FingerprintStore
+                if settings.change_detection_table_name:
+                    store = TableFingerprintStore.from_connection_string(
+                        settings.storage_connection_string,
+                        settings.change_detection_table_name,
+                        settings.change_detection_ttl_seconds,
+                    )
+                else:
+                    store = MemoryFingerprintStore(
+                        settings.change_detection_max_entries,
+                        settings.change_detection_ttl_seconds,
+                    )
+                _change_detector = ChangeDetector(
+                    store, settings.change_detection_paths
+                )
+    return _change_detector
@@ -0,0 +1,249 @@
+"""Claim-check forwarding of item snapshots from the webhook body
+
+The webhook body already holds the full item record. In claim-check mode a compacted, gzipped
+snapshot of it is written to blob storage and the queue message carries only a reference, so
+downstream can use the snapshot instead of re-fetching the item from Alma when it is fresh
+enough.
+"""
+
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Protocol
+from urllib.parse import quote
+
+from alma_item_checks_webhook_service.config import Settings, get_settings
+from alma_item_checks_webhook_service.utils.log_limiter import log_limited
+
+SNAPSHOT_SCHEMA_VERSION: int = 1
+
+
+class SnapshotStore(Protocol):
+    """Storage for gzipped item snapshots"""
+
+    def put(self, name: str, data: bytes) -> dict[str, str]:
+        """Store a snapshot, returning the reference downstream uses to read it"""
+        ...
+
+
+class BlobSnapshotStore:
+    """Snapshot store writing block blobs to an Azure Storage container"""
+
+    def __init__(self, container_client: Any) -> None:
+        """Initialize the BlobSnapshotStore class
+
+        Args:
+            container_client (Any): An azure.storage.blob ContainerClient (or a stand-in with the same methods)
+        """
+        self._container_client: Any = container_client
+
+    @classmethod
+    def from_connection_string(
+        cls, connection_string: str, container_name: str
+    ) -> "BlobSnapshotStore":
+        """Build a store for a container
+
+        Args:
+            connection_string (str): The storage account connection string
+            container_name (str): The name of the snapshot container, which must exist
+
+        Returns:
+            BlobSnapshotStore: The store
+        """
+        from azure.storage.blob import ContainerClient
+
+        return cls(
+            ContainerClient.from_connection_string(connection_string, container_name)
+        )
+
+    def put(self, name: str, data: bytes) -> dict[str, str]:
+        """Upload a snapshot blob, replacing any blob of the same name
+
+        Args:
+            name (str): The blob name
+            data (bytes): The gzipped snapshot
+
+        Returns:
+            dict[str, str]: The container and blob name
+        """
+        from azure.storage.blob import ContentSettings
+
+        self._container_client.upload_blob(
+            name,
+            data,
+            overwrite=True,
+            content_settings=ContentSettings(
+                content_type="application/json", content_encoding="gzip"
+            ),
+        )
+        return {"container": self._container_client.container_name, "name": name}
+
+
+class LocalSnapshotStore:
+    """Snapshot store writing files under a local directory, standing in for blob storage offline"""
+
+    def __init__(self, root: str | Path) -> None:
+        """Initialize the LocalSnapshotStore class
+
+        Args:
+            root (str | Path): The directory standing in for the container, created if needed
+        """
+        self.root: Path = Path(root)
+
+    def put(self, name: str, data: bytes) -> dict[str, str]:
+        """Write a snapshot file, replacing any file of the same name
+
+        Args:
+            name (str): The blob name, used as a path relative to root
+            data (bytes): The gzipped snapshot
+
+        Returns:
+            dict[str, str]: The root directory and file name
+        """
+        path: Path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A temporary file of its own, so concurrent writes of the same snapshot cannot interleave
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=path.name, suffix=".tmp", delete=False
+        ) as temporary:
+            temporary.write(data)
+        try:
+            os.replace(temporary.name, path)
+        except OSError:
+            os.unlink(temporary.name)
+            raise
+        return {"container": str(self.root), "name": name}
+
+
+def compact(value: Any) -> Any:
+    """Drop empty strings, None values and empty containers from a JSON value, recursively
+
+    Args:
+        value (Any): The decoded JSON value
+
+    Returns:
+        Any: The compacted value
+    """
+    if isinstance(value, dict):
+        compacted = {key: compact(item) for key, item in value.items()}
+        return {key: item for key, item in compacted.items() if not _is_empty(item)}
+    if isinstance(value, list):
+        return [item for item in map(compact, value) if not _is_empty(item)]
+    return value
+
+
+def _is_empty(value: Any) -> bool:
+    """Whether a compacted value carries no information"""
+    return value is None or value == "" or value == {} or value == []
+
+
+def snapshot_name(institution: str, barcode: str, event_time: str) -> str:
+    """Build the blob name of a snapshot
+
+    Args:
+        institution (str): The institution code
+        barcode (str): The item barcode
+        event_time (str): The webhook event time
+
+    Returns:
+        str: <institution>/<barcode>/<event time>.json.gz, each part percent-encoded
+    """
+    parts = (_name_part(part) for part in (institution, barcode, event_time))
+    return "/".join(parts) + ".json.gz"
+
+
+def _name_part(part: str) -> str:
+    """Percent-encode one part of a snapshot name, including the dots of a "." or ".." part"""
+    encoded: str = quote(part, safe="")
+    if encoded and not encoded.strip("."):
+        return encoded.replace(".", "%2E")
+    return encoded
+
+
+class ClaimCheck:
+    """Stores item snapshots and builds the reference added to the queue message"""
+
+    def __init__(self, store: SnapshotStore) -> None:
+        """Initialize the ClaimCheck class
+
+        Args:
+            store (SnapshotStore): Where snapshots are written
+        """
+        self.store: SnapshotStore = store
+
+    def store_snapshot(
+        self,
+        institution: str,
+        barcode: str,
+        item: dict[str, Any],
+        event_time: str | None,
+    ) -> dict[str, Any] | None:
+        """Store a compacted item snapshot
+
+        Args:
+            institution (str): The institution code
+            barcode (str): The item barcode
+            item (dict[str, Any]): The webhook "item" object
+            event_time (str | None): The webhook event time, defaulting to now
+
+        Returns:
+            dict[str, Any] | None: The snapshot reference, or None if the snapshot could not be stored
+        """
+        event_time = event_time or datetime.now(timezone.utc).isoformat()
+        document: bytes = json.dumps(
+            {
+                "version": SNAPSHOT_SCHEMA_VERSION,
+                "institution": institution,
+                "barcode": barcode,
+                "event_time": event_time,
+                "item": compact(item),
+            },
+            separators=(",", ":"),
+        ).encode()
+        try:
+            reference: dict[str, Any] = self.store.put(
+                snapshot_name(institution, barcode, event_time),
+                gzip.compress(document, mtime=0),
+            )
+        except Exception as e:  # the message without a snapshot is still valid
+            log_limited(
+                logging.WARNING,
+                "ClaimCheck.store_snapshot: Failed to store item snapshot: %s",
+                e,
+            )
+            return None
+        return {**reference, "event_time": event_time}
+
+
+_claim_check: ClaimCheck | None = None
+_claim_check_lock: threading.Lock = threading.Lock()
+
+
+def get_claim_check() -> ClaimCheck | None:
+    """Get the process-wide claim check, or None unless claim-check mode is enabled
+
+    Returns:
+        ClaimCheck | None: The claim check, writing to CLAIM_CHECK_LOCAL_PATH if set, else to CLAIM_CHECK_CONTAINER
+    """
+    global _claim_check
+    settings: Settings = get_settings()
+    if not (settings.claim_check_container or settings.claim_check_local_path):
+        return None
+    if _claim_check is None:
+        with _claim_check_lock:
+            if _claim_check is None:
+                store: SnapshotStore
+                if settings.claim_check_local_path:
+                    store = LocalSnapshotStore(settings.claim_check_local_path)
+                else:
+                    store = BlobSnapshotStore.from_connection_string(
+                        settings.storage_connection_string,
+                        str(settings.claim_check_container),
+                    )
+                _claim_check = ClaimCheck(store)
+    return _claim_check
@@ -0,0 +1,105 @@
+"""Idempotency of webhook deliveries keyed on the validated HMAC signature
+
+Alma retries deliveries that respond slowly. A retry carries the exact same body, so it also
+carries the same X-Exl-Signature: the base64 SHA-256 HMAC digest that signature validation has
+already checked. Once validated, the decoded digest is an exact and free idempotency key. The
+digest bytes are used rather than the header text, because base64 decoding accepts several
+spellings of the same digest.
+
+A delivery is in progress from its claim until its response is ready, and only then completed.
+A retry arriving meanwhile is told to come back later rather than acknowledged, so it is not
+lost if the first attempt fails.
+"""
+
+import threading
+import time
+from collections.abc import Callable
+from typing import Protocol
+
+from alma_item_checks_webhook_service.config import Settings, get_settings
+from alma_item_checks_webhook_service.utils.ttl_cache import TTLCache
+
+IN_PROGRESS: str = "in_progress"
+COMPLETED: str = "completed"
+
+
+class IdempotencyStore(Protocol):
+    """Storage for recently processed delivery keys"""
+
+    def claim(self, key: bytes) -> str | None:
+        """Mark a delivery as in progress, returning the state of an earlier claim instead if there is one"""
+        ...
+
+    def complete(self, key: bytes) -> None:
+        """Mark a claimed delivery as processed"""
+        ...
+
+    def release(self, key: bytes) -> None:
+        """Forget a delivery so a retry of it is processed again"""
+        ...
+
+
+class MemoryIdempotencyStore:
+    """Per-process idempotency store backed by a bounded LRU cache"""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the MemoryIdempotencyStore class
+
+        Args:
+            max_entries (int): Maximum number of delivery keys remembered
+            ttl (float): Seconds a delivery key is remembered
+            clock (Callable[[], float]): Monotonic clock, replaceable in tests
+        """
+        self._cache: TTLCache = TTLCache(max_entries, ttl=ttl, clock=clock)
+        self._lock: threading.Lock = threading.Lock()
+
+    def claim(self, key: bytes) -> str | None:
+        """Mark a delivery as in progress
+
+        Args:
+            key (bytes): The decoded signature digest
+
+        Returns:
+            str | None: None if the delivery was claimed, otherwise IN_PROGRESS or COMPLETED
+        """
+        with self._lock:
+            state: str | None = self._cache.get(key)
+            if state is None:
+                self._cache.set(key, IN_PROGRESS)
+            return state
+
+    def complete(self, key: bytes) -> None:
+        """Mark a claimed delivery as processed, remembering it for the ttl from now"""
+        self._cache.set(key, COMPLETED)
+
+    def release(self, key: bytes) -> None:
+        """Forget a delivery so a retry of it is processed again"""
+        self._cache.discard(key)
+
+
+_idempotency_store: IdempotencyStore | None = None
+_idempotency_store_lock: threading.Lock = threading.Lock()
+
+
+def get_idempotency_store() -> IdempotencyStore | None:
+    """Get the process-wide idempotency store, or None if idempotency is disabled
+
+    Returns:
+        IdempotencyStore | None: The store
+    """
+    global _idempotency_store
+    settings: Settings = get_settings()
+    if not settings.idempotency_enabled:
+        return None
+    if _idempotency_store is None:
+        with _idempotency_store_lock:
+            if _idempotency_store is None:
+                _idempotency_store = MemoryIdempotencyStore(
+                    settings.idempotency_max_entries, settings.idempotency_ttl_seconds
+                )
+    return _idempotency_store
@@ -0,0 +1,132 @@
+"""Micro-batching stage that packs several queue messages into one queue send"""
+
+import json
+import logging
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Any
+
+from alma_item_checks_webhook_service.utils.log_limiter import log_limited
+from alma_item_checks_webhook_service.utils.message_codec import BATCH_SCHEMA_VERSION
+
+
+def pack_batch(messages: list[dict[str, Any]]) -> str:
+    """Pack messages into a single versioned batch payload
+
+    Args:
+        messages (list[dict[str, Any]]): The messages to pack
+
+    Returns:
+        str: The batch queue message content
+    """
+    return json.dumps({"version": BATCH_SCHEMA_VERSION, "messages": messages})
+
+
+class EnqueueBatcher:
+    """Collects messages for a short window and sends them as one batch message
+
+    A batch is flushed when it reaches max_size messages or when window seconds have passed
+    since its first message, whichever comes first. Each caller gets a Future that resolves
+    when its batch is sent, or raises the error the send raised.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Any],
+        max_size: int = 32,
+        window: float = 0.05,
+        pack: Callable[[list[dict[str, Any]]], str] = pack_batch,
+    ) -> None:
+        """Initialize the EnqueueBatcher class
+
+        Args:
+            send (Callable[[str], Any]): Sends one queue message content, raising on failure
+            max_size (int): Maximum number of messages packed into one batch
+            window (float): Maximum seconds a message waits for its batch to fill
+            pack (Callable[[list[dict[str, Any]]], str]): Encodes the messages of a batch as one queue message
+        """
+        self.max_size: int = max_size
+        self.window: float = window
+        self._send: Callable[[str], Any] = send
+        self._pack: Callable[[list[dict[str, Any]]], str] = pack
+        self._pending: list[tuple[dict[str, Any], Future[None]]] = []
+        self._deadline: float = 0.0
+        self._closed: bool = False
+        self._condition: threading.Condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def submit(self, message: dict[str, Any]) -> Future[None]:
+        """Add a message to the current batch
+
+        Args:
+            message (dict[str, Any]): The queue message
+
+        Returns:
+            Future[None]: Resolves once the batch containing the message has been sent
+        """
+        future: Future[None] = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("EnqueueBatcher is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="enqueue-batcher", daemon=True
+                )
+                self._thread.start()
+            if not self._pending:
+                self._deadline = time.monotonic() + self.window
+            self._pending.append((message, future))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_size:
+                self._condition.notify()
+        return future
+
+    def close(self, timeout: float | None = None) -> None:
+        """Stop accepting messages and flush everything still pending
+
+        Args:
+            timeout (float | None): Maximum seconds to wait for the final flush
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        """Flush batches until closed and drained"""
+        while True:
+            with self._condition:
+                while not self._closed and len(self._pending) < self.max_size:
+                    remaining = (
+                        self._deadline - time.monotonic() if self._pending else None
+                    )
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if not self._pending:
+                    return
+                batch = self._pending[: self.max_size]
+                del self._pending[: self.max_size]
+                if self._pending:
+                    self._deadline = time.monotonic() + self.window
+            self._flush(batch)
+
+    def _flush(self, batch: list[tuple[dict[str, Any], Future[None]]]) -> None:
+        """Send one batch and resolve its callers' futures"""
+        try:
+            self._send(self._pack([message for message, _ in batch]))
+        except Exception as e:
+            log_limited(
+                logging.ERROR,
+                "EnqueueBatcher._flush: Failed to send batch of %d messages: %s",
+                len(batch),
+                e,
+            )
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for _, future in batch:
+            future.set_result(None)
@@ -0,0 +1,220 @@
+"""Declarative filtering of item events, compiled once into predicate closures
+
+EVENT_FILTER holds a JSON document such as:
+
+    {
+        "events": ["ITEM_UPDATED"],
+        "rules": [
+            {"name": "electronic", "exclude": {"item_data.physical_material_type": ["ELEC", "OTHER"]}},
+            {
+                "name": "gwa-libraries",
+                "institutions": ["01WRLC_GWA"],
+                "include": {"item_data.library": ["GELMAN", "EASTMAN"]}
+            }
+        ]
+    }
+
+Paths are dotted paths within the webhook "item" object, and Alma {"value": ..., "desc": ...}
+fields are compared by their value. A rule applies to events from its institutions, or from
+every institution if none are listed. It drops an event when the value at an include path is
+not one of the listed values, or the value at an exclude path is. A missing field has the
+value null. Rules are checked in order and the first rule that drops an event is counted.
+
+The document is compiled when the settings are loaded, so a malformed EVENT_FILTER fails the
+settings, and with them the ASGI lifespan startup, rather than the first webhook.
+"""
+
+import threading
+from collections.abc import Callable
+from typing import Any
+
+from alma_item_checks_webhook_service.config import get_settings
+from alma_item_checks_webhook_service.utils.payload import ITEM_EVENT_TYPES
+
+# Counter name for events dropped because their event type is not in "events"
+EVENT_TYPE_RULE: str = "event_type"
+
+# Takes the webhook "item" object and returns True if the event should be dropped
+Predicate = Callable[[dict[str, Any] | None], bool]
+
+_RULE_KEYS: frozenset[str] = frozenset({"name", "institutions", "include", "exclude"})
+
+
+def _compile_condition(path: str, values: Any, include: bool) -> Predicate:
+    """Compile one include or exclude condition into a predicate
+
+    Args:
+        path (str): Dotted path within the item
+        values (Any): The listed values, which must be a list of scalars
+        include (bool): True for an include condition, False for an exclude condition
+
+    Returns:
+        Predicate: Returns True if the condition drops the event
+
+    Raises:
+        ValueError: If the path is empty or values is not a list of scalars
+    """
+    if not path or not isinstance(values, list):
+        raise ValueError(f"Invalid event filter condition for path '{path}'")
+    try:
+        allowed: frozenset[Any] = frozenset(values)
+    except TypeError:
+        raise ValueError(
+            f"Invalid event filter condition for path '{path}': values must be scalars"
+        ) from None
+    keys: tuple[str, ...] = tuple(path.split("."))
+
+    def drops(item: dict[str, Any] | None) -> bool:
+        # Runs for every condition of every event, so the path walk is inline
+        value: Any = item
+        for key in keys:
+            if value.__class__ is not dict:
+                value = None
+                break
+            value = value.get(key)
+        if value.__class__ is dict:
+            value = value.get("value")
+        try:
+            listed: bool = value in allowed
+        except TypeError:  # an object or array is never one of the listed values
+            listed = False
+        return listed is not include
+
+    return drops
+
+
+def compile_rule(spec: Any, index: int) -> tuple[str, frozenset[str] | None, Predicate]:
+    """Compile a rule into its name, institutions and a single predicate
+
+    Args:
+        spec (Any): The decoded rule object
+        index (int): Position of the rule, used to name unnamed rules
+
+    Returns:
+        tuple[str, frozenset[str] | None, Predicate]: The name, the institutions (None for all) and the predicate
+
+    Raises:
+        ValueError: If the rule is malformed
+    """
+    if not isinstance(spec, dict) or not _RULE_KEYS.issuperset(spec):
+        raise ValueError(f"Invalid event filter rule at position {index}")
+    name: str = str(spec.get("name") or f"rule-{index}")
+    institutions: Any = spec.get("institutions")
+    if institutions is not None and not isinstance(institutions, list):
+        raise ValueError(f"Invalid institutions in event filter rule '{name}'")
+
+    conditions: list[Predicate] = []
+    for key, include in (("include", True), ("exclude", False)):
+        paths: Any = spec.get(key, {})
+        if not isinstance(paths, dict):
+            raise ValueError(f"Invalid {key} in event filter rule '{name}'")
+        conditions.extend(
+            _compile_condition(path, values, include) for path, values in paths.items()
+        )
+    if not conditions:
+        raise ValueError(f"Event filter rule '{name}' has no conditions")
+
+    predicate: Predicate
+    if len(conditions) == 1:
+        predicate = conditions[0]
+    else:
+        compiled: tuple[Predicate, ...] = tuple(conditions)
+
+        def predicate(item: dict[str, Any] | None) -> bool:
+            for condition in compiled:
+                if condition(item):
+                    return True
+            return False
+
+    return name, None if institutions is None else frozenset(institutions), predicate
+
+
+class EventFilter:
+    """Drops item events that downstream does not check, counting the drops of each rule"""
+
+    def __init__(self, config: Any) -> None:
+        """Initialize the EventFilter class, compiling the rules
+
+        Args:
+            config (Any): The decoded EVENT_FILTER document
+
+        Raises:
+            ValueError: If the document is malformed
+        """
+        if not isinstance(config, dict) or not {"events", "rules"}.issuperset(config):
+            raise ValueError("Event filter must be an object with 'events' and 'rules'")
+        events: Any = config.get("events", sorted(ITEM_EVENT_TYPES))
+        rules: Any = config.get("rules", [])
+        if not isinstance(events, list) or not all(isinstance(e, str) for e in events):
+            raise ValueError("Event filter 'events' must be a list of event types")
+        if not isinstance(rules, list):
+            raise ValueError("Event filter 'rules' must be a list")
+
+        self.event_types: frozenset[str] = frozenset(events)
+        compiled = [compile_rule(spec, index) for index, spec in enumerate(rules)]
+        names: list[str] = [name for name, _, _ in compiled]
+        if len(set(names)) != len(names) or EVENT_TYPE_RULE in names:
+            raise ValueError("Event filter rule names must be unique")
+
+        # The rules that apply to each listed institution, and to any other institution
+        self._default_rules: tuple[tuple[str, Predicate], ...] = tuple(
+            (name, predicate)
+            for name, institutions, predicate in compiled
+            if institutions is None
+        )
+        self._rules_by_institution: dict[str, tuple[tuple[str, Predicate], ...]] = {
+            institution: tuple(
+                (name, predicate)
+                for name, institutions, predicate in compiled
+                if institutions is None or institution in institutions
+            )
+            for _, institutions, _ in compiled
+            for institution in institutions or ()
+        }
+        self._dropped: dict[str, int] = dict.fromkeys([EVENT_TYPE_RULE, *names], 0)
+        self._lock: threading.Lock = threading.Lock()
+
+    def match(self, institution: str, item: dict[str, Any] | None) -> str | None:
+        """Check an item event against the rules, counting a drop
+
+        Args:
+            institution (str): The institution code
+            item (dict[str, Any] | None): The webhook "item" object
+
+        Returns:
+            str | None: The name of the rule that drops the event, or None to keep it
+        """
+        for name, predicate in self._rules_by_institution.get(
+            institution, self._default_rules
+        ):
+            if predicate(item):
+                self.record_drop(name)
+                return name
+        return None
+
+    def record_drop(self, name: str) -> None:
+        """Count an event dropped by a rule
+
+        Args:
+            name (str): The rule name, or EVENT_TYPE_RULE
+        """
+        with self._lock:
+            self._dropped[name] += 1
+
+    def stats(self) -> dict[str, int]:
+        """Get the drop counters
+
+        Returns:
+            dict[str, int]: Events dropped by each rule and by event type
+        """
+        with self._lock:
+            return dict(self._dropped)
+
+
+def get_event_filter() -> EventFilter | None:
+    """Get the process-wide event filter, compiled when the settings are loaded
+
+    Returns:
+        EventFilter | None: The compiled filter, or None if EVENT_FILTER is not set
+    """
+    return get_settings().event_filter
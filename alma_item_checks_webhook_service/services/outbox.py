@@ -0,0 +1,465 @@
+"""Bounded in-process outbox drained to the queue by a background thread
+
+In ack-first mode a webhook is answered as soon as its message is in the outbox. Drainer
+threads send each queue's messages in order, retrying failed sends with jittered exponential
+backoff. A message that still fails after max_attempts sends is dead-lettered so it cannot
+hold up the messages behind it. Rejections by an open circuit breaker are not counted as attempts, so an
+outage does not dead-letter every message.
+
+An optional SQLite spill file keeps every undelivered message on disk. Rows are owned by the
+process that added them, so the worker processes of an instance can share one file. A process
+opening the file takes over the rows of processes that are no longer running, so a crashed
+worker's messages are sent by the next one to start. Dead letters are kept in the
+outbox_dead_letters table of the same file.
+"""
+
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from itertools import islice
+from typing import Any
+
+from alma_item_checks_webhook_service.utils.circuit_breaker import CircuitOpenError
+from alma_item_checks_webhook_service.utils.log_limiter import log_limited
+
+# Seconds Alma is asked to wait before retrying a webhook rejected because the outbox is full
+RETRY_AFTER_SECONDS: int = 5
+
+
+class OutboxFull(Exception):
+    """Raised when the outbox is at capacity and cannot accept another message"""
+
+
+def process_alive(pid: int) -> bool:
+    """Whether a process with this id is running on this machine
+
+    Args:
+        pid (int): The process id
+
+    Returns:
+        bool: True if the process exists
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SQLiteSpill:
+    """Durable copy of the outbox in a local SQLite file, which several processes may share"""
+
+    def __init__(
+        self,
+        path: str,
+        owner: int | None = None,
+        is_alive: Callable[[int], bool] = process_alive,
+    ) -> None:
+        """Initialize the SQLiteSpill class
+
+        Args:
+            path (str): The SQLite database file, created if it does not exist
+            owner (int | None): Id stored with this process's rows, defaulting to the process id
+            is_alive (Callable[[int], bool]): Whether the owner of other rows is still running
+        """
+        self.path: str = path
+        self.owner: int = os.getpid() if owner is None else owner
+        self._is_alive: Callable[[int], bool] = is_alive
+        self._lock: threading.Lock = threading.Lock()
+        self._connection: sqlite3.Connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, queue_name TEXT NOT NULL, content TEXT NOT NULL, "
+            "owner INTEGER)"
+        )
+        columns: set[str] = {
+            row[1] for row in self._connection.execute("PRAGMA table_info(outbox)")
+        }
+        if "owner" not in columns:
+            # Files written before rows had owners; their rows are taken over like orphans
+            self._connection.execute("ALTER TABLE outbox ADD COLUMN owner INTEGER")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS outbox_dead_letters ("
+            "id INTEGER PRIMARY KEY, queue_name TEXT NOT NULL, content TEXT NOT NULL, "
+            "error TEXT NOT NULL, failed_at REAL NOT NULL)"
+        )
+
+    def add(self, content: str, queue_name: str) -> int:
+        """Store a message
+
+        Args:
+            content (str): The queue message content
+            queue_name (str): The destination queue
+
+        Returns:
+            int: The id of the stored message
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO outbox (queue_name, content, owner) VALUES (?, ?, ?)",
+                (queue_name, content, self.owner),
+            )
+        return int(cursor.lastrowid or 0)
+
+    def remove(self, entry_id: int) -> None:
+        """Delete a delivered message
+
+        Args:
+            entry_id (int): The id returned by add
+        """
+        with self._lock:
+            self._connection.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+
+    def dead_letter(self, entry_id: int, error: str) -> None:
+        """Move a message that could not be delivered to the dead-letter table
+
+        Args:
+            entry_id (int): The id returned by add
+            error (str): The last send error
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.execute(
+                    "INSERT INTO outbox_dead_letters (id, queue_name, content, error, failed_at) "
+                    "SELECT id, queue_name, content, ?, ? FROM outbox WHERE id = ?",
+                    (error, time.time(), entry_id),
+                )
+                self._connection.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+            except sqlite3.Error:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def pending(self) -> list[tuple[int, str, str]]:
+        """Take over the messages of processes that are no longer running, and get this process's messages
+
+        Returns:
+            list[tuple[int, str, str]]: (id, content, queue name) of each message, in the order added
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                owners: list[int | None] = [
+                    row[0]
+                    for row in self._connection.execute(
+                        "SELECT DISTINCT owner FROM outbox"
+                    )
+                ]
+                for owner in owners:
+                    if owner is None or (
+                        owner != self.owner and not self._is_alive(owner)
+                    ):
+                        self._connection.execute(
+                            "UPDATE outbox SET owner = ? WHERE owner IS ?",
+                            (self.owner, owner),
+                        )
+                rows: list[tuple[int, str, str]] = list(
+                    self._connection.execute(
+                        "SELECT id, content, queue_name FROM outbox WHERE owner = ? ORDER BY id",
+                        (self.owner,),
+                    )
+                )
+            except sqlite3.Error:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+        return rows
+
+    def dead_letters(self) -> list[tuple[int, str, str, str]]:
+        """Get the dead-lettered messages of every process
+
+        Returns:
+            list[tuple[int, str, str, str]]: (id, content, queue name, error) of each message
+        """
+        with self._lock:
+            return list(
+                self._connection.execute(
+                    "SELECT id, content, queue_name, error FROM outbox_dead_letters ORDER BY id"
+                )
+            )
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._connection.close()
+
+
+class Outbox:
+    """Holds queue messages in memory until background drainers have sent them
+
+    The outbox holds at most max_size messages, not counting messages recovered from the
+    spill file at startup. Each queue's messages are sent in the order they were added, and up
+    to workers drainer threads send to different queues at once. With a pack function, up to
+    batch_size messages waiting for the same queue are sent as one queue message. A failed send
+    is retried after a random delay of up to base_delay * 2 ** (attempt - 1) seconds, capped at
+    max_delay, and later messages for that queue wait behind it. After max_attempts failed sends
+    the messages are dead-lettered and the next ones are sent.
+
+    A queue never has more than one send in flight, so a process delivers at most batch_size
+    messages per queue per send round trip, across at most workers queues at a time. Bursts
+    above that rate fill the outbox until puts raise OutboxFull.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, str], Any],
+        max_size: int = 1000,
+        spill: SQLiteSpill | None = None,
+        base_delay: float = 0.1,
+        max_delay: float = 30.0,
+        jitter: Callable[[], float] = random.random,
+        max_attempts: int = 10,
+        workers: int = 1,
+        batch_size: int = 1,
+        pack: Callable[[list[str]], str] | None = None,
+    ) -> None:
+        """Initialize the Outbox class
+
+        Args:
+            send (Callable[[str, str], Any]): Sends message content to a queue name, raising on failure
+            max_size (int): Maximum number of messages held
+            spill (SQLiteSpill | None): Durable copy of the outbox, or None to hold messages only in memory
+            base_delay (float): Seconds before the first retry, before jitter
+            max_delay (float): Maximum seconds between retries
+            jitter (Callable[[], float]): Source of random factors in [0, 1), replaceable in tests
+            max_attempts (int): Failed sends of a message before it is dead-lettered; 0 retries forever
+            workers (int): Drainer threads, each sending to one queue at a time
+            batch_size (int): Most waiting messages of a queue packed into one send
+            pack (Callable[[list[str]], str] | None): Packs message contents into one queue
+                message, or None to send each message on its own
+        """
+        self.max_size: int = max_size
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.max_attempts: int = max_attempts
+        self.workers: int = max(workers, 1)
+        self.batch_size: int = max(batch_size, 1) if pack is not None else 1
+        self.dead_lettered: int = 0
+        self._send: Callable[[str, str], Any] = send
+        self._pack: Callable[[list[str]], str] | None = pack
+        self._spill: SQLiteSpill | None = spill
+        self._jitter: Callable[[], float] = jitter
+        # Waiting messages by queue, in the order they were added: (spill row id, content)
+        self._lanes: dict[str, deque[tuple[int | None, str]]] = {}
+        # Queues a drainer is sending to
+        self._busy: set[str] = set()
+        self._size: int = 0
+        self._closed: bool = False
+        self._stop: threading.Event = threading.Event()
+        self._condition: threading.Condition = threading.Condition()
+        self._threads: list[threading.Thread] = []
+
+        if spill is not None:
+            for entry_id, content, queue_name in spill.pending():
+                self._lanes.setdefault(queue_name, deque()).append((entry_id, content))
+                self._size += 1
+            if self._size:
+                logging.warning(
+                    "Outbox: Recovered %d undelivered messages from %s",
+                    self._size,
+                    spill.path,
+                )
+                self._start()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def put(self, content: str, queue_name: str) -> None:
+        """Add a message to be sent by a drainer
+
+        Args:
+            content (str): The queue message content
+            queue_name (str): The destination queue
+
+        Raises:
+            OutboxFull: If the outbox already holds max_size messages
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Outbox is closed")
+            if self._size >= self.max_size:
+                raise OutboxFull(f"Outbox is full ({self.max_size} messages)")
+            entry_id: int | None = (
+                self._spill.add(content, queue_name) if self._spill else None
+            )
+            self._lanes.setdefault(queue_name, deque()).append((entry_id, content))
+            self._size += 1
+            self._start()
+            self._condition.notify()
+
+    def close(self, timeout: float | None = None) -> None:
+        """Stop accepting messages and make a final attempt to send everything still held
+
+        Messages that cannot be sent stay in the spill file, if there is one.
+
+        Args:
+            timeout (float | None): Maximum seconds to wait for the final flush
+        """
+        with self._condition:
+            self._closed = True
+            self._stop.set()
+            self._condition.notify_all()
+            threads = list(self._threads)
+        deadline: float | None = (
+            time.monotonic() + timeout if timeout is not None else None
+        )
+        for thread in threads:
+            thread.join(
+                max(deadline - time.monotonic(), 0.0) if deadline is not None else None
+            )
+        if self._size:
+            logging.error(
+                "Outbox.close: %d messages were not delivered%s",
+                self._size,
+                f" and remain in {self._spill.path}" if self._spill else "",
+            )
+
+    def _start(self) -> None:
+        """Start the drainer threads if they are not running (condition held or during init)"""
+        if not self._threads:
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"outbox-drainer-{index}", daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+
+    def _backoff(self, attempt: int) -> float:
+        """Seconds to wait before retry number attempt"""
+        return self._jitter() * min(
+            self.max_delay, self.base_delay * 2 ** (attempt - 1)
+        )
+
+    def _claim(self) -> str | None:
+        """Claim the longest-waiting queue no other drainer is sending to (condition held)"""
+        for queue_name in self._lanes:
+            if queue_name not in self._busy:
+                self._busy.add(queue_name)
+                # Move the queue to the back so busy queues take turns with the others
+                self._lanes[queue_name] = self._lanes.pop(queue_name)
+                return queue_name
+        return None
+
+    def _run(self) -> None:
+        """Send the claimed queues' messages until closed and drained"""
+        while True:
+            with self._condition:
+                queue_name: str | None = self._claim()
+                while queue_name is None and not self._closed:
+                    self._condition.wait()
+                    queue_name = self._claim()
+                if queue_name is None:
+                    return
+            try:
+                sent: bool = self._send_head(queue_name)
+            finally:
+                with self._condition:
+                    self._busy.discard(queue_name)
+                    self._condition.notify()
+            if not sent:
+                return
+
+    def _send_head(self, queue_name: str) -> bool:
+        """Send the oldest messages of a queue, retrying until they are sent or dead-lettered
+
+        Args:
+            queue_name (str): The claimed queue
+
+        Returns:
+            bool: False if the outbox was closed after a failed send, True otherwise
+        """
+        attempt: int = 0
+        while True:
+            with self._condition:
+                batch: list[tuple[int | None, str]] = list(
+                    islice(self._lanes[queue_name], self.batch_size)
+                )
+            try:
+                if len(batch) == 1 or self._pack is None:
+                    self._send(batch[0][1], queue_name)
+                else:
+                    self._send(
+                        self._pack([content for _, content in batch]), queue_name
+                    )
+            except CircuitOpenError as e:
+                # The queue is known to be down; wait for the breaker without using up attempts
+                if self._closed:
+                    return False
+                self._stop.wait(max(e.retry_after, self.base_delay))
+                continue
+            except Exception as e:
+                if self._closed:
+                    return False
+                attempt += 1
+                if self.max_attempts > 0 and attempt >= self.max_attempts:
+                    self._dead_letter(queue_name, batch, e)
+                    return True
+                delay: float = self._backoff(attempt)
+                log_limited(
+                    logging.WARNING,
+                    "Outbox._run: Send to %s failed (attempt %d), retrying in %.2fs: %s",
+                    queue_name,
+                    attempt,
+                    delay,
+                    e,
+                )
+                self._stop.wait(delay)
+                continue
+            self._remove(queue_name, len(batch))
+            if self._spill is not None:
+                for entry_id, _ in batch:
+                    if entry_id is not None:
+                        self._spill.remove(entry_id)
+            return True
+
+    def _remove(self, queue_name: str, count: int) -> None:
+        """Drop the oldest messages of a queue once they are sent or dead-lettered"""
+        with self._condition:
+            lane = self._lanes[queue_name]
+            for _ in range(count):
+                lane.popleft()
+            if not lane:
+                del self._lanes[queue_name]
+            self._size -= count
+
+    def _dead_letter(
+        self,
+        queue_name: str,
+        batch: list[tuple[int | None, str]],
+        error: Exception,
+    ) -> None:
+        """Drop messages after their last failed attempt, keeping them in the spill file if there is one"""
+        self._remove(queue_name, len(batch))
+        with self._condition:
+            self.dead_lettered += len(batch)
+        for entry_id, content in batch:
+            if self._spill is not None and entry_id is not None:
+                self._spill.dead_letter(entry_id, str(error))
+                logging.error(
+                    "Outbox._dead_letter: Gave up on message %d to %s after %d attempts, kept in %s: %s",
+                    entry_id,
+                    queue_name,
+                    self.max_attempts,
+                    self._spill.path,
+                    error,
+                )
+                continue
+            logging.error(
+                "Outbox._dead_letter: Gave up on message to %s after %d attempts, dropping %s: %s",
+                queue_name,
+                self.max_attempts,
+                content,
+                error,
+            )
@@ -0,0 +1,388 @@
+"""Queue backends the pooled queue client registries build their clients from
+
+QUEUE_BACKEND selects where fetch item messages go:
+
+- azure: Azure Storage queues in the AzureWebJobsStorage account (the default)
+- memory: per-process in-memory queues, for tests and single-process load runs
+- sqlite: a table in the local SQLite file QUEUE_SQLITE_PATH, shared by every worker process
+  using the same file, so the whole pipeline can run and be load-tested offline
+
+Local clients accept the same send_message keyword arguments as the Azure clients. Only
+visibility_timeout has an effect; the per-call timeouts and retry options are ignored.
+"""
+
+import asyncio
+import itertools
+import sqlite3
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from alma_item_checks_webhook_service.config import Settings, get_settings
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    build_async_queue_client,
+    build_queue_client,
+)
+
+
+class QueueBackend(Protocol):
+    """Builds the sync and asyncio clients of a queue"""
+
+    def build_client(self, connection_string: str, queue_name: str) -> Any:
+        """Build a client with send_message(content, **kwargs) and close()"""
+        ...
+
+    def build_async_client(self, connection_string: str, queue_name: str) -> Any:
+        """Build a client whose send_message and close are coroutines"""
+        ...
+
+
+class LocalQueueStore(Protocol):
+    """Storage for the messages of local queues"""
+
+    # Whether put may block on I/O, so asyncio clients run it in a worker thread
+    blocking: bool
+
+    def put(self, queue_name: str, content: str, visibility_timeout: float) -> int:
+        """Store a message, returning its id"""
+        ...
+
+    def receive(self, queue_name: str, max_messages: int) -> list[str]:
+        """Remove and return the oldest visible messages"""
+        ...
+
+    def count(self, queue_name: str) -> int:
+        """Count the stored messages, visible or not"""
+        ...
+
+
+class AzureQueueBackend:
+    """Azure Storage queues, with base64 message encoding"""
+
+    def build_client(self, connection_string: str, queue_name: str) -> Any:
+        """Build a queue client for a queue
+
+        Args:
+            connection_string (str): The storage account connection string
+            queue_name (str): The name of the queue
+
+        Returns:
+            Any: An azure.storage.queue QueueClient
+        """
+        return build_queue_client(connection_string, queue_name)
+
+    def build_async_client(self, connection_string: str, queue_name: str) -> Any:
+        """Build an asyncio queue client for a queue
+
+        Args:
+            connection_string (str): The storage account connection string
+            queue_name (str): The name of the queue
+
+        Returns:
+            Any: An azure.storage.queue.aio QueueClient
+        """
+        return build_async_queue_client(connection_string, queue_name)
+
+
+class MemoryQueueStore:
+    """In-memory queues of one process"""
+
+    blocking: bool = False
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        """Initialize the MemoryQueueStore class
+
+        Args:
+            clock (Callable[[], float]): Clock for visibility timeouts, replaceable in tests
+        """
+        self._clock: Callable[[], float] = clock
+        # queue name -> (message id, time the message becomes visible, content), oldest first
+        self._queues: dict[str, deque[tuple[int, float, str]]] = {}
+        self._ids: itertools.count[int] = itertools.count(1)
+        self._lock: threading.Lock = threading.Lock()
+
+    def put(self, queue_name: str, content: str, visibility_timeout: float = 0) -> int:
+        """Store a message
+
+        Args:
+            queue_name (str): The name of the queue
+            content (str): The message content
+            visibility_timeout (float): Seconds the message stays hidden from receive
+
+        Returns:
+            int: The id of the stored message
+        """
+        with self._lock:
+            message_id: int = next(self._ids)
+            self._queues.setdefault(queue_name, deque()).append(
+                (message_id, self._clock() + visibility_timeout, content)
+            )
+        return message_id
+
+    def receive(self, queue_name: str, max_messages: int = 32) -> list[str]:
+        """Remove and return the oldest visible messages of a queue
+
+        Args:
+            queue_name (str): The name of the queue
+            max_messages (int): The most messages to return
+
+        Returns:
+            list[str]: The message contents, oldest first
+        """
+        with self._lock:
+            queue: deque[tuple[int, float, str]] = self._queues.get(queue_name, deque())
+            now: float = self._clock()
+            received: list[str] = []
+            hidden: list[tuple[int, float, str]] = []
+            while queue and len(received) < max_messages:
+                message: tuple[int, float, str] = queue.popleft()
+                if message[1] <= now:
+                    received.append(message[2])
+                else:
+                    hidden.append(message)
+            queue.extendleft(reversed(hidden))
+        return received
+
+    def count(self, queue_name: str) -> int:
+        """Count the stored messages of a queue, visible or not
+
+        Args:
+            queue_name (str): The name of the queue
+
+        Returns:
+            int: The number of messages
+        """
+        with self._lock:
+            return len(self._queues.get(queue_name, ()))
+
+
+class SQLiteQueueStore:
+    """Queues in a local SQLite file, which several processes may share"""
+
+    blocking: bool = True
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time) -> None:
+        """Initialize the SQLiteQueueStore class
+
+        Args:
+            path (str): The SQLite database file, created if it does not exist
+            clock (Callable[[], float]): Wall clock for visibility timeouts, shared between processes
+        """
+        self.path: str = path
+        self._clock: Callable[[], float] = clock
+        self._lock: threading.Lock = threading.Lock()
+        self._connection: sqlite3.Connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS queue_messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, queue_name TEXT NOT NULL, "
+            "content TEXT NOT NULL, visible_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS queue_messages_visible "
+            "ON queue_messages (queue_name, visible_at)"
+        )
+
+    def put(self, queue_name: str, content: str, visibility_timeout: float = 0) -> int:
+        """Store a message
+
+        Args:
+            queue_name (str): The name of the queue
+            content (str): The message content
+            visibility_timeout (float): Seconds the message stays hidden from receive
+
+        Returns:
+            int: The id of the stored message
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO queue_messages (queue_name, content, visible_at) VALUES (?, ?, ?)",
+                (queue_name, content, self._clock() + visibility_timeout),
+            )
+        return int(cursor.lastrowid or 0)
+
+    def receive(self, queue_name: str, max_messages: int = 32) -> list[str]:
+        """Remove and return the oldest visible messages of a queue
+
+        Args:
+            queue_name (str): The name of the queue
+            max_messages (int): The most messages to return
+
+        Returns:
+            list[str]: The message contents, oldest first
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows: list[tuple[int, str]] = list(
+                    self._connection.execute(
+                        "SELECT id, content FROM queue_messages "
+                        "WHERE queue_name = ? AND visible_at <= ? ORDER BY id LIMIT ?",
+                        (queue_name, self._clock(), max_messages),
+                    )
+                )
+                self._connection.executemany(
+                    "DELETE FROM queue_messages WHERE id = ?",
+                    [(message_id,) for message_id, _ in rows],
+                )
+            except sqlite3.Error:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+        return [content for _, content in rows]
+
+    def count(self, queue_name: str) -> int:
+        """Count the stored messages of a queue, visible or not
+
+        Args:
+            queue_name (str): The name of the queue
+
+        Returns:
+            int: The number of messages
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT COUNT(*) FROM queue_messages WHERE queue_name = ?",
+                (queue_name,),
+            ).fetchone()
+        return int(row[0])
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._connection.close()
+
+
+class LocalQueueClient:
+    """Queue client for a local queue, with the send_message signature of the Azure client"""
+
+    def __init__(self, store: LocalQueueStore, queue_name: str) -> None:
+        """Initialize the LocalQueueClient class
+
+        Args:
+            store (LocalQueueStore): Where messages are stored
+            queue_name (str): The name of the queue
+        """
+        self.store: LocalQueueStore = store
+        self.queue_name: str = queue_name
+
+    def send_message(self, content: str, **kwargs: Any) -> dict[str, Any]:
+        """Store a message
+
+        Args:
+            content (str): The message content
+            **kwargs: Azure send options; only visibility_timeout is used
+
+        Returns:
+            dict[str, Any]: The message id and content
+        """
+        message_id: int = self.store.put(
+            self.queue_name, content, kwargs.get("visibility_timeout") or 0
+        )
+        return {"id": message_id, "content": content}
+
+    def close(self) -> None:
+        """Release the client; the store stays open for other clients"""
+
+
+class AsyncLocalQueueClient(LocalQueueClient):
+    """asyncio queue client for a local queue, storing messages off the event loop when blocking"""
+
+    async def send_message(self, content: str, **kwargs: Any) -> dict[str, Any]:  # type: ignore[override]
+        """Store a message
+
+        Args:
+            content (str): The message content
+            **kwargs: Azure send options; only visibility_timeout is used
+
+        Returns:
+            dict[str, Any]: The message id and content
+        """
+        if self.store.blocking:
+            return await asyncio.to_thread(
+                LocalQueueClient.send_message, self, content, **kwargs
+            )
+        return LocalQueueClient.send_message(self, content, **kwargs)
+
+    async def close(self) -> None:  # type: ignore[override]
+        """Release the client; the store stays open for other clients"""
+
+
+class LocalQueueBackend:
+    """Queues held in a local store"""
+
+    def __init__(self, store: LocalQueueStore) -> None:
+        """Initialize the LocalQueueBackend class
+
+        Args:
+            store (LocalQueueStore): Where messages are stored
+        """
+        self.store: LocalQueueStore = store
+
+    def build_client(self, connection_string: str, queue_name: str) -> Any:
+        """Build a client for a local queue
+
+        Args:
+            connection_string (str): Ignored; local queues have no account
+            queue_name (str): The name of the queue
+
+        Returns:
+            Any: A LocalQueueClient
+        """
+        return LocalQueueClient(self.store, queue_name)
+
+    def build_async_client(self, connection_string: str, queue_name: str) -> Any:
+        """Build an asyncio client for a local queue
+
+        Args:
+            connection_string (str): Ignored; local queues have no account
+            queue_name (str): The name of the queue
+
+        Returns:
+            Any: An AsyncLocalQueueClient
+        """
+        return AsyncLocalQueueClient(self.store, queue_name)
+
+
+def build_queue_backend(settings: Settings) -> QueueBackend:
+    """Build the queue backend selected by QUEUE_BACKEND
+
+    Args:
+        settings (Settings): The settings
+
+    Returns:
+        QueueBackend: The backend
+
+    Raises:
+        ValueError: If QUEUE_BACKEND is not a known backend
+    """
+    if settings.queue_backend == "azure":
+        return AzureQueueBackend()
+    if settings.queue_backend == "memory":
+        return LocalQueueBackend(MemoryQueueStore())
+    if settings.queue_backend == "sqlite":
+        return LocalQueueBackend(SQLiteQueueStore(settings.queue_sqlite_path))
+    raise ValueError(f"Unknown QUEUE_BACKEND: '{settings.queue_backend}'")
+
+
+_queue_backend: QueueBackend | None = None
+_queue_backend_lock: threading.Lock = threading.Lock()
+
+
+def get_queue_backend() -> QueueBackend:
+    """Get the process-wide queue backend, built on first use from QUEUE_BACKEND
+
+    Returns:
+        QueueBackend: The backend
+    """
+    global _queue_backend
+    if _queue_backend is None:
+        with _queue_backend_lock:
+            if _queue_backend is None:
+                _queue_backend = build_queue_backend(get_settings())
+    return _queue_backend
@@ -0,0 +1,359 @@
+"""Process-wide registries of pooled queue clients"""
+
+import asyncio
+import logging
+import threading
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+from alma_item_checks_webhook_service.utils.log_limiter import log_limited
+
+if TYPE_CHECKING:
+    from azure.storage.queue import QueueClient
+    from azure.storage.queue.aio import QueueClient as AsyncQueueClient
+
+QueueClientFactory = Callable[[str, str], Any]
+
+
+def queue_send_errors() -> tuple[type[Exception], ...]:
+    """Get the exceptions a failed queue send may raise
+
+    For use in except clauses, which only evaluate this when an exception is raised, so the
+    Azure SDK is not imported until something has actually gone wrong.
+
+    Returns:
+        tuple[type[Exception], ...]: The exception types
+    """
+    import sqlite3
+
+    from azure.core.exceptions import (
+        HttpResponseError,
+        ServiceRequestError,
+        ServiceResponseError,
+    )
+
+    return (
+        ValueError,
+        TypeError,
+        TimeoutError,
+        sqlite3.Error,
+        ServiceRequestError,
+        ServiceResponseError,
+        HttpResponseError,
+    )
+
+
+def is_transient_send_error(error: BaseException) -> bool:
+    """Whether a failed queue send points at an unhealthy queue service rather than at the request
+
+    Timeouts, connection failures, cancellation, throttling and server errors count; a bad
+    request, an authorization failure or a message that could not be encoded does not.
+
+    Args:
+        error (BaseException): The exception raised by the send
+
+    Returns:
+        bool: True if the error should count towards opening the circuit breaker
+    """
+    import asyncio
+    import sqlite3
+
+    if isinstance(
+        error,
+        (
+            TimeoutError,
+            ConnectionError,
+            asyncio.CancelledError,
+            sqlite3.OperationalError,
+        ),
+    ):
+        return True
+
+    from azure.core.exceptions import (
+        HttpResponseError,
+        ServiceRequestError,
+        ServiceResponseError,
+    )
+
+    if isinstance(error, (ServiceRequestError, ServiceResponseError)):
+        return True
+    if isinstance(error, HttpResponseError):
+        status: int | None = error.status_code
+        return status is not None and (status >= 500 or status in (408, 429))
+    return False
+
+
+def _connection_errors() -> tuple[type[Exception], ...]:
+    """Get the exceptions that mean a pooled client's connection is broken"""
+    from azure.core.exceptions import ServiceRequestError
+
+    return (ServiceRequestError,)
+
+
+def build_queue_client(connection_string: str, queue_name: str) -> "QueueClient":
+    """Build a queue client for a queue
+
+    Args:
+        connection_string (str): The storage account connection string
+        queue_name (str): The name of the queue
+
+    Returns:
+        QueueClient: A queue client using base64 message encoding (the Functions queue trigger default)
+    """
+    from azure.storage.queue import (
+        QueueClient,
+        TextBase64DecodePolicy,
+        TextBase64EncodePolicy,
+    )
+
+    return QueueClient.from_connection_string(
+        conn_str=connection_string,
+        queue_name=queue_name,
+        message_encode_policy=TextBase64EncodePolicy(),
+        message_decode_policy=TextBase64DecodePolicy(),
+    )
+
+
+def build_async_queue_client(
+    connection_string: str, queue_name: str
+) -> "AsyncQueueClient":
+    """Build an asyncio queue client for a queue
+
+    Args:
+        connection_string (str): The storage account connection string
+        queue_name (str): The name of the queue
+
+    Returns:
+        AsyncQueueClient: An aio queue client using the same encoding as build_queue_client
+    """
+    from azure.storage.queue import TextBase64DecodePolicy, TextBase64EncodePolicy
+    from azure.storage.queue.aio import QueueClient as AsyncQueueClient
+
+    return AsyncQueueClient.from_connection_string(
+        conn_str=connection_string,
+        queue_name=queue_name,
+        message_encode_policy=TextBase64EncodePolicy(),
+        message_decode_policy=TextBase64DecodePolicy(),
+    )
+
+
+def build_backend_client(connection_string: str, queue_name: str) -> Any:
+    """Build a client for a queue with the backend selected by QUEUE_BACKEND
+
+    Args:
+        connection_string (str): The storage account connection string
+        queue_name (str): The name of the queue
+
+    Returns:
+        Any: The queue client
+    """
+    from alma_item_checks_webhook_service.services.queue_backends import (
+        get_queue_backend,
+    )
+
+    return get_queue_backend().build_client(connection_string, queue_name)
+
+
+def build_async_backend_client(connection_string: str, queue_name: str) -> Any:
+    """Build an asyncio client for a queue with the backend selected by QUEUE_BACKEND
+
+    Args:
+        connection_string (str): The storage account connection string
+        queue_name (str): The name of the queue
+
+    Returns:
+        Any: The aio queue client
+    """
+    from alma_item_checks_webhook_service.services.queue_backends import (
+        get_queue_backend,
+    )
+
+    return get_queue_backend().build_async_client(connection_string, queue_name)
+
+
+class QueueClientRegistry:
+    """Lazily builds one queue client per (connection string, queue name) and keeps it warm
+
+    Clients hold their own HTTP connection pool, so reusing them across invocations avoids
+    re-parsing the connection string and re-establishing TLS on every webhook.
+    """
+
+    def __init__(self, factory: QueueClientFactory = build_backend_client) -> None:
+        """Initialize the QueueClientRegistry class
+
+        Args:
+            factory (QueueClientFactory): Callable that builds a client from a connection string and queue name
+        """
+        self._factory: QueueClientFactory = factory
+        self._clients: dict[tuple[str, str], Any] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def get(self, connection_string: str, queue_name: str) -> Any:
+        """Get the pooled client for a queue, building it on first use
+
+        Args:
+            connection_string (str): The storage account connection string
+            queue_name (str): The name of the queue
+
+        Returns:
+            Any: The queue client
+        """
+        key = (connection_string, queue_name)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._factory(connection_string, queue_name)
+                    self._clients[key] = client
+        return client
+
+    def invalidate(self, connection_string: str, queue_name: str) -> None:
+        """Drop the pooled client for a queue so the next call builds a fresh one
+
+        Args:
+            connection_string (str): The storage account connection string
+            queue_name (str): The name of the queue
+        """
+        with self._lock:
+            client = self._clients.pop((connection_string, queue_name), None)
+        _close_quietly(client)
+
+    def clear(self) -> None:
+        """Drop and close all pooled clients"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            _close_quietly(client)
+
+    def send_message(
+        self, connection_string: str, queue_name: str, content: str, **kwargs: Any
+    ) -> Any:
+        """Send a message using the pooled client, discarding the client if its connection is broken
+
+        Args:
+            connection_string (str): The storage account connection string
+            queue_name (str): The name of the queue
+            content (str): The message content
+            **kwargs: Passed through to QueueClient.send_message
+
+        Returns:
+            Any: The result of QueueClient.send_message
+        """
+        client = self.get(connection_string, queue_name)
+        try:
+            return client.send_message(content, **kwargs)
+        except _connection_errors():
+            log_limited(
+                logging.WARNING,
+                "QueueClientRegistry.send_message: Connection error on queue %s, rebuilding client.",
+                queue_name,
+            )
+            self.invalidate(connection_string, queue_name)
+            raise
+
+
+class AsyncQueueClientRegistry:
+    """Lazily builds one aio queue client per (connection string, queue name) and keeps it warm
+
+    aio clients are bound to the event loop they were first used on, so a client is rebuilt if the
+    running loop changes. For the same reason they are not resolved at startup: each client is
+    built by the first send to its queue on the running loop. Lookups never await, so no lock is
+    needed within a loop.
+    """
+
+    def __init__(
+        self, factory: QueueClientFactory = build_async_backend_client
+    ) -> None:
+        """Initialize the AsyncQueueClientRegistry class
+
+        Args:
+            factory (QueueClientFactory): Callable that builds an aio client from a connection string and queue name
+        """
+        self._factory: QueueClientFactory = factory
+        self._clients: dict[tuple[str, str], tuple[asyncio.AbstractEventLoop, Any]] = {}
+
+    def get(self, connection_string: str, queue_name: str) -> Any:
+        """Get the pooled aio client for a queue, building it on first use in the running loop
+
+        Args:
+            connection_string (str): The storage account connection string
+            queue_name (str): The name of the queue
+
+        Returns:
+            Any: The aio queue client
+        """
+        loop = asyncio.get_running_loop()
+        key = (connection_string, queue_name)
+        entry = self._clients.get(key)
+        if entry is None or entry[0] is not loop:
+            entry = (loop, self._factory(connection_string, queue_name))
+            self._clients[key] = entry
+        return entry[1]
+
+    async def invalidate(self, connection_string: str, queue_name: str) -> None:
+        """Drop the pooled aio client for a queue so the next call builds a fresh one
+
+        Args:
+            connection_string (str): The storage account connection string
+            queue_name (str): The name of the queue
+        """
+        entry = self._clients.pop((connection_string, queue_name), None)
+        if entry is not None:
+            await _aclose_quietly(entry[1])
+
+    async def clear(self) -> None:
+        """Drop and close all pooled aio clients"""
+        entries = list(self._clients.values())
+        self._clients.clear()
+        for _, client in entries:
+            await _aclose_quietly(client)
+
+    async def send_message(
+        self, connection_string: str, queue_name: str, content: str, **kwargs: Any
+    ) -> Any:
+        """Send a message using the pooled aio client, discarding the client if its connection is broken
+
+        Args:
+            connection_string (str): The storage account connection string
+            queue_name (str): The name of the queue
+            content (str): The message content
+            **kwargs: Passed through to the aio QueueClient.send_message
+
+        Returns:
+            Any: The result of the aio QueueClient.send_message
+        """
+        client = self.get(connection_string, queue_name)
+        try:
+            return await client.send_message(content, **kwargs)
+        except _connection_errors():
+            log_limited(
+                logging.WARNING,
+                "AsyncQueueClientRegistry.send_message: Connection error on queue %s, rebuilding client.",
+                queue_name,
+            )
+            await self.invalidate(connection_string, queue_name)
+            raise
+
+
+def _close_quietly(client: Any) -> None:
+    """Close a client, ignoring errors from an already broken connection"""
+    if client is None:
+        return
+    try:
+        client.close()
+    except Exception:  # nosec B110
+        pass
+
+
+async def _aclose_quietly(client: Any) -> None:
+    """Close an aio client, ignoring errors from an already broken connection"""
+    try:
+        await client.close()
+    except Exception:  # nosec B110
+        pass
+
+
+queue_client_registry: QueueClientRegistry = QueueClientRegistry()
+async_queue_client_registry: AsyncQueueClientRegistry = AsyncQueueClientRegistry()
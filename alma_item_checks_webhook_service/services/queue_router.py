@@ -0,0 +1,68 @@
+"""Routing of fetch item messages across partitioned or per-institution queues"""
+
+import zlib
+
+
+class QueueRouter:
+    """Chooses the fetch item queue for a message
+
+    Institutions listed in the routing table go to their own queue. Every other message goes to
+    one of `partitions` queues named `<queue_name>-0` to `<queue_name>-<partitions - 1>`, chosen
+    by a CRC-32 hash of the barcode. The hash is stable across processes, so every message for a
+    barcode lands in the same queue. With one partition and no routes, everything goes to
+    queue_name as before.
+
+    Ordering: Azure Storage queues do not guarantee FIFO delivery, and partitioning does not
+    change that. It only keeps all messages for a barcode (or, with a route, for an institution)
+    in a single queue. Messages in different queues are consumed independently, in no relative
+    order.
+    """
+
+    def __init__(
+        self,
+        queue_name: str,
+        partitions: int = 1,
+        routes: dict[str, str] | None = None,
+    ) -> None:
+        """Initialize the QueueRouter class
+
+        Args:
+            queue_name (str): The base fetch item queue name
+            partitions (int): Number of hash partitions for unrouted messages
+            routes (dict[str, str] | None): Queue name by institution code
+
+        Raises:
+            ValueError: If partitions is less than 1
+        """
+        if partitions < 1:
+            raise ValueError("Queue partitions must be at least 1")
+        self.routes: dict[str, str] = dict(routes or {})
+        self._partitions: list[str] = (
+            [queue_name]
+            if partitions == 1
+            else [f"{queue_name}-{i}" for i in range(partitions)]
+        )
+
+    @property
+    def queue_names(self) -> list[str]:
+        """Every queue a message can be routed to"""
+        return list(dict.fromkeys([*self._partitions, *self.routes.values()]))
+
+    def route(self, institution: str, barcode: str) -> str:
+        """Get the queue for a message
+
+        Args:
+            institution (str): The institution code
+            barcode (str): The item barcode
+
+        Returns:
+            str: The queue name
+        """
+        queue_name: str | None = self.routes.get(institution)
+        if queue_name is not None:
+            return queue_name
+        if len(self._partitions) == 1:
+            return self._partitions[0]
+        return self._partitions[
+            zlib.crc32(barcode.encode("utf-8")) % len(self._partitions)
+        ]
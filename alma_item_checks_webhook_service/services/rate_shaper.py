@@ -0,0 +1,129 @@
+"""Per-institution token-bucket smoothing of fetch item messages
+
+Events beyond an institution's rate are not dropped. Each one is enqueued with a longer
+visibility_timeout than the last, so downstream sees the institution's messages at no more
+than its configured rate. Once an event would have to wait longer than the maximum delay, it
+is refused with ShapingLimitExceeded, so the webhook gets 503 with Retry-After and Alma sends
+it again later. Capping the delay instead would give every such event the same delay and
+release them downstream as one burst. The buckets are per process, so with several function
+instances each instance allows the full rate.
+"""
+
+import math
+import threading
+import time
+from collections.abc import Callable
+
+from alma_item_checks_webhook_service.config import Settings, get_settings
+
+
+class ShapingLimitExceeded(Exception):
+    """Raised instead of delaying an event beyond the maximum delay"""
+
+    def __init__(self, institution: str, retry_after: float) -> None:
+        """Initialize the ShapingLimitExceeded class
+
+        Args:
+            institution (str): The institution code
+            retry_after (float): Seconds until an event from the institution can be delayed within the maximum
+        """
+        super().__init__(f"Institution '{institution}' is over its shaping limit")
+        self.retry_after: float = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """The Retry-After header value, in whole seconds and at least 1"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class RateShaper:
+    """Token buckets that turn over-rate events into delivery delays
+
+    Each institution has a bucket of `burst` tokens refilled at its rate per second. An event
+    takes a token. When none are left the bucket goes into debt, and the event is delayed
+    until its token would have been refilled. Delays therefore grow by 1 / rate seconds per
+    over-rate event. An event that would need more than max_delay does not take a token and
+    is refused.
+    """
+
+    def __init__(
+        self,
+        rates: dict[str, float],
+        default_rate: float = 0.0,
+        burst: float = 50,
+        max_delay: float = 3600,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the RateShaper class
+
+        Args:
+            rates (dict[str, float]): Events per second allowed for each institution code
+            default_rate (float): Events per second for institutions not in rates; 0 leaves them unshaped
+            burst (float): Events an idle institution may send without delay
+            max_delay (float): Maximum delay in seconds
+            clock (Callable[[], float]): Monotonic clock, replaceable in tests
+        """
+        self.rates: dict[str, float] = rates
+        self.default_rate: float = default_rate
+        self.burst: float = burst
+        self.max_delay: float = max_delay
+        self._clock: Callable[[], float] = clock
+        # institution -> (tokens, time of last update); tokens below zero are debt
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def delay(self, institution: str) -> int:
+        """Take a token for an event and get the delay needed to keep the institution within its rate
+
+        Args:
+            institution (str): The institution code
+
+        Returns:
+            int: Seconds to hide the message for, rounded up; 0 if the event is within the rate
+
+        Raises:
+            ShapingLimitExceeded: If the event would have to be delayed longer than max_delay
+        """
+        rate: float = self.rates.get(institution, self.default_rate)
+        if rate <= 0:
+            return 0
+        with self._lock:
+            now: float = self._clock()
+            tokens, updated = self._buckets.get(institution, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * rate)
+            if tokens - 1 < -self.max_delay * rate:
+                self._buckets[institution] = (tokens, now)
+                raise ShapingLimitExceeded(
+                    institution, (1 - tokens) / rate - self.max_delay
+                )
+            tokens -= 1
+            self._buckets[institution] = (tokens, now)
+        if tokens >= 0:
+            return 0
+        return math.ceil(round(-tokens / rate, 6))
+
+
+_rate_shaper: RateShaper | None = None
+_rate_shaper_lock: threading.Lock = threading.Lock()
+
+
+def get_rate_shaper() -> RateShaper | None:
+    """Get the process-wide rate shaper, or None if no rates are configured
+
+    Returns:
+        RateShaper | None: The shaper for SHAPING_RATES and SHAPING_DEFAULT_RATE
+    """
+    global _rate_shaper
+    settings: Settings = get_settings()
+    if not settings.shaping_rates and settings.shaping_default_rate <= 0:
+        return None
+    if _rate_shaper is None:
+        with _rate_shaper_lock:
+            if _rate_shaper is None:
+                _rate_shaper = RateShaper(
+                    settings.shaping_rates,
+                    default_rate=settings.shaping_default_rate,
+                    burst=settings.shaping_burst,
+                    max_delay=settings.shaping_max_delay_seconds,
+                )
+    return _rate_shaper
@@ -0,0 +1,63 @@
+"""Helpers shared by the stores that keep per-item state in Azure Storage tables"""
+
+import logging
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from alma_item_checks_webhook_service.utils.log_limiter import log_limited
+
+# Characters Azure Table Storage does not allow in PartitionKey or RowKey values
+_TABLE_KEY_DISALLOWED = str.maketrans({c: "_" for c in "/\\#?"})
+
+
+def table_key(value: str) -> str:
+    """Make a value safe for use as a table PartitionKey or RowKey"""
+    return value.translate(_TABLE_KEY_DISALLOWED)
+
+
+def item_keys(institution: str, barcode: str) -> dict[str, str]:
+    """Get the keys of an item's entity, PartitionKey=institution and RowKey=barcode
+
+    Args:
+        institution (str): The institution code
+        barcode (str): The item barcode
+
+    Returns:
+        dict[str, str]: The PartitionKey and RowKey of the entity
+    """
+    return {"PartitionKey": table_key(institution), "RowKey": table_key(barcode)}
+
+
+def open_table(connection_string: str, table_name: str) -> Any:
+    """Get a client for a table, creating the table if it does not exist
+
+    Args:
+        connection_string (str): The storage account connection string
+        table_name (str): The name of the table
+
+    Returns:
+        Any: An azure.data.tables TableClient
+    """
+    from azure.data.tables import TableServiceClient  # type: ignore
+
+    service = TableServiceClient.from_connection_string(connection_string)
+    return service.create_table_if_not_exists(table_name)
+
+
+@contextmanager
+def store_errors_logged(message: str) -> Iterator[None]:
+    """Log and suppress storage errors, so an unavailable store does not fail the webhook
+
+    Args:
+        message (str): The warning logged, formatted with the error
+
+    Yields:
+        None: Control to the block using the store; the rest of it is skipped on an error
+    """
+    from azure.core.exceptions import AzureError
+
+    try:
+        yield
+    except AzureError as e:
+        log_limited(logging.WARNING, message, e)
@@ -1,159 +1,960 @@
 """Service class for handling Webhook events"""
 
+import atexit
+import base64
+import binascii
+import functools
 import json
 import logging
 import os
-from typing import Any
+import threading
+from concurrent.futures import Future
+from contextlib import AbstractContextManager, nullcontext
+from typing import Any, cast
 
-import azure.core.exceptions
-import azure.functions as func
-from wrlc_azure_storage_service import StorageService  # type: ignore
-
-from alma_item_checks_webhook_service.config import (
-    WEBHOOK_SECRET,
-    FETCH_ITEM_QUEUE,
-    STORAGE_CONNECTION_STRING,
+from alma_item_checks_webhook_service.config import Settings, get_settings
+from alma_item_checks_webhook_service.services.barcode_debouncer import (
+    BarcodeDebouncer,
+    get_barcode_debouncer,
+)
+from alma_item_checks_webhook_service.services.claim_check import (
+    ClaimCheck,
+    get_claim_check,
+)
+from alma_item_checks_webhook_service.services.change_detector import (
+    ChangeDetector,
+    get_change_detector,
+)
+from alma_item_checks_webhook_service.services.delivery_idempotency import (
+    IN_PROGRESS,
+    IdempotencyStore,
+    get_idempotency_store,
+)
+from alma_item_checks_webhook_service.services.enqueue_batcher import (
+    EnqueueBatcher,
+    pack_batch,
+)
+from alma_item_checks_webhook_service.services.event_filter import (
+    EVENT_TYPE_RULE,
+    EventFilter,
+    get_event_filter,
+)
+from alma_item_checks_webhook_service.services.outbox import (
+    RETRY_AFTER_SECONDS,
+    Outbox,
+    OutboxFull,
+    SQLiteSpill,
+)
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    is_transient_send_error,
+    queue_client_registry,
+    queue_send_errors,
 )
-from alma_item_checks_webhook_service.utils.security import validate_webhook_signature
+from alma_item_checks_webhook_service.services.queue_router import QueueRouter
+from alma_item_checks_webhook_service.services.rate_shaper import (
+    RateShaper,
+    ShapingLimitExceeded,
+    get_rate_shaper,
+)
+from alma_item_checks_webhook_service.utils.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+)
+from alma_item_checks_webhook_service.utils.http import WebhookRequest, WebhookResponse
+from alma_item_checks_webhook_service.utils.log_limiter import log_limited
+from alma_item_checks_webhook_service.utils.message_codec import (
+    decode_messages,
+    encode_messages,
+)
+from alma_item_checks_webhook_service.utils.payload import (
+    ITEM_EVENT_TYPES,
+    ItemEvent,
+    extract_item_event,
+)
+from alma_item_checks_webhook_service.utils.security import SignatureVerifier
+from alma_item_checks_webhook_service.utils.telemetry import (
+    NOOP_SPAN,
+    NoOpSpan,
+    Span,
+    get_tracer,
+)
+
+# Seconds a batched caller waits, beyond the batch window, for its batch to be sent
+BATCH_SEND_TIMEOUT: float = 30
+
+# Media types accepted by the single-event route; a request without a Content-Type is accepted
+JSON_CONTENT_TYPES: frozenset[str] = frozenset({"application/json", "text/json"})
+
+_fetch_item_batchers: dict[str, EnqueueBatcher] = {}
+_fetch_item_batcher_lock: threading.Lock = threading.Lock()
+_fetch_item_router: QueueRouter | None = None
+_outbox: Outbox | None = None
+_queue_circuit_breaker: CircuitBreaker | None = None
+_queue_circuit_breaker_lock: threading.Lock = threading.Lock()
+_outbox_lock: threading.Lock = threading.Lock()
+_fetch_item_router_lock: threading.Lock = threading.Lock()
+
+
+def send_fetch_item_message(
+    content: str, queue_name: str, visibility_timeout: int = 0
+) -> None:
+    """Send message content to a fetch item queue with the pooled queue client, through the circuit breaker
+
+    Args:
+        content (str): The queue message content
+        queue_name (str): The fetch item queue chosen by the router
+        visibility_timeout (int): Seconds the message stays hidden from consumers
+
+    Raises:
+        CircuitOpenError: If the circuit breaker is open and the send was not attempted
+    """
+    with queue_breaker_guard():
+        queue_client_registry.send_message(
+            get_settings().storage_connection_string,
+            queue_name,
+            content,
+            **queue_send_options(visibility_timeout),
+        )
+
+
+def queue_breaker_guard() -> AbstractContextManager[None]:
+    """Get a context manager running a queue send through the circuit breaker
+
+    Returns:
+        AbstractContextManager[None]: The breaker's guard(), or a no-op if the breaker is disabled
+
+    Raises:
+        CircuitOpenError: On entry, if the circuit breaker is open
+    """
+    breaker: CircuitBreaker | None = get_queue_circuit_breaker()
+    return breaker.guard() if breaker is not None else nullcontext()
+
+
+def queue_send_options(visibility_timeout: int = 0) -> dict[str, Any]:
+    """Per-call options bounding how long a single queue send may take, including SDK retries
+
+    Args:
+        visibility_timeout (int): Seconds the message stays hidden from consumers
+
+    Returns:
+        dict[str, Any]: Keyword arguments for QueueClient.send_message
+    """
+    settings: Settings = get_settings()
+    timeout: float = settings.queue_send_timeout_seconds
+    options: dict[str, Any] = {
+        "timeout": max(1, int(timeout)),
+        "connection_timeout": timeout,
+        "read_timeout": timeout,
+        "retry_total": settings.queue_send_retries,
+    }
+    if visibility_timeout > 0:
+        options["visibility_timeout"] = visibility_timeout
+    return options
+
+
+def get_queue_circuit_breaker() -> CircuitBreaker | None:
+    """Get the process-wide circuit breaker for queue sends, or None if it is disabled
+
+    Returns:
+        CircuitBreaker | None: The breaker, shared by every fetch item queue in the storage account
+    """
+    global _queue_circuit_breaker
+    settings: Settings = get_settings()
+    if settings.queue_breaker_failures <= 0:
+        return None
+    if _queue_circuit_breaker is None:
+        with _queue_circuit_breaker_lock:
+            if _queue_circuit_breaker is None:
+                _queue_circuit_breaker = CircuitBreaker(
+                    "fetch-item-queue",
+                    failure_threshold=settings.queue_breaker_failures,
+                    reset_timeout=settings.queue_breaker_reset_seconds,
+                    is_failure=is_transient_send_error,
+                )
+    return _queue_circuit_breaker
+
+
+def get_fetch_item_router() -> QueueRouter:
+    """Get the process-wide fetch item queue router, built by warm_up or on first use
+
+    Returns:
+        QueueRouter: The router for FETCH_ITEM_QUEUE, FETCH_ITEM_PARTITIONS and FETCH_ITEM_ROUTES
+    """
+    global _fetch_item_router
+    if _fetch_item_router is None:
+        with _fetch_item_router_lock:
+            if _fetch_item_router is None:
+                settings: Settings = get_settings()
+                _fetch_item_router = QueueRouter(
+                    settings.fetch_item_queue,
+                    settings.fetch_item_partitions,
+                    settings.fetch_item_routes,
+                )
+    return _fetch_item_router
+
+
+def warm_up() -> None:
+    """Build the fetch item router and resolve the pooled sync client of every destination queue
+
+    Called when a worker starts, from the ASGI lifespan startup or the Functions warm-up trigger,
+    so the first webhook builds neither. The sync clients serve the sync handler and the batch
+    route. aio clients are bound to the event loop that first uses them, so they are resolved by
+    the first send on each loop instead.
+    """
+    settings: Settings = get_settings()
+    for queue_name in get_fetch_item_router().queue_names:
+        queue_client_registry.get(settings.storage_connection_string, queue_name)
+
+
+@functools.cache
+def get_signature_verifier() -> SignatureVerifier:
+    """Get the process-wide signature verifier, built once from the configured secrets
+
+    Returns:
+        SignatureVerifier: Verifier accepting WEBHOOK_SECRET and any WEBHOOK_PREVIOUS_SECRETS
+    """
+    settings: Settings = get_settings()
+    return SignatureVerifier(
+        [settings.webhook_secret, *settings.webhook_previous_secrets]
+    )
+
+
+def batch_result_timeout() -> float:
+    """Seconds a batched caller waits for its batch to be sent before failing the webhook"""
+    return get_settings().fetch_item_batch_window_ms / 1000 + BATCH_SEND_TIMEOUT
+
+
+def uses_remote_stores() -> bool:
+    """Whether preparing or releasing a queue message calls the synchronous Azure table or blob clients
+
+    Returns:
+        bool: True if the debounce, change detection or claim-check store is in Azure Storage
+    """
+    settings: Settings = get_settings()
+    return bool(
+        (settings.debounce_ttl_seconds > 0 and settings.debounce_table_name)
+        or (settings.change_detection_paths and settings.change_detection_table_name)
+        or (settings.claim_check_container and not settings.claim_check_local_path)
+    )
+
+
+def get_outbox() -> Outbox | None:
+    """Get the process-wide outbox, or None unless ack-first mode is enabled
+
+    Returns:
+        Outbox | None: The outbox, recovering any messages left in OUTBOX_SPILL_PATH and flushed at interpreter exit
+    """
+    global _outbox
+    settings: Settings = get_settings()
+    if not settings.outbox_enabled:
+        return None
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = Outbox(
+                    send_fetch_item_message,
+                    max_size=settings.outbox_max_size,
+                    max_attempts=settings.outbox_max_attempts,
+                    workers=settings.outbox_workers,
+                    batch_size=settings.fetch_item_batch_size,
+                    pack=(
+                        pack_outbox_contents
+                        if settings.fetch_item_batch_size > 1
+                        else None
+                    ),
+                    spill=(
+                        SQLiteSpill(settings.outbox_spill_path)
+                        if settings.outbox_spill_path
+                        else None
+                    ),
+                )
+                atexit.register(_outbox.close, BATCH_SEND_TIMEOUT)
+    return _outbox
+
+
+def compact_message_format() -> bool:
+    """Whether MESSAGE_FORMAT selects compact queue messages
+
+    Returns:
+        bool: True for compact, False for json
+
+    Raises:
+        ValueError: If MESSAGE_FORMAT is not a known format
+    """
+    message_format: str = get_settings().message_format
+    if message_format not in ("json", "compact"):
+        raise ValueError(f"Unknown MESSAGE_FORMAT: '{message_format}'")
+    return message_format == "compact"
+
+
+def pack_fetch_item_batch(messages: list[dict[str, Any]]) -> str:
+    """Encode a batch of fetch item messages as one queue message in the MESSAGE_FORMAT encoding
+
+    Args:
+        messages (list[dict[str, Any]]): The messages
+
+    Returns:
+        str: The queue message content
+    """
+    if compact_message_format():
+        return encode_messages(messages, get_settings().message_compress_threshold)
+    return pack_batch(messages)
+
+
+def pack_outbox_contents(contents: list[str]) -> str:
+    """Pack fetch item messages waiting in the outbox into one batch queue message
+
+    Args:
+        contents (list[str]): The serialized messages, in any format the service sends
+
+    Returns:
+        str: The queue message content
+    """
+    return pack_fetch_item_batch(
+        [message for content in contents for message in decode_messages(content)]
+    )
+
+
+def get_fetch_item_batcher(queue_name: str) -> EnqueueBatcher | None:
+    """Get the process-wide batcher for a fetch item queue, or None if batching is disabled
+
+    Args:
+        queue_name (str): The fetch item queue chosen by the router
+
+    Returns:
+        EnqueueBatcher | None: The batcher, started on first use and flushed at interpreter exit
+    """
+    settings: Settings = get_settings()
+    if settings.fetch_item_batch_size <= 1:
+        return None
+    batcher: EnqueueBatcher | None = _fetch_item_batchers.get(queue_name)
+    if batcher is None:
+        with _fetch_item_batcher_lock:
+            batcher = _fetch_item_batchers.get(queue_name)
+            if batcher is None:
+                batcher = EnqueueBatcher(
+                    functools.partial(send_fetch_item_message, queue_name=queue_name),
+                    max_size=settings.fetch_item_batch_size,
+                    window=settings.fetch_item_batch_window_ms / 1000,
+                    pack=pack_fetch_item_batch,
+                )
+                atexit.register(batcher.close)
+                _fetch_item_batchers[queue_name] = batcher
+    return batcher
 
 
 class WebhookService:
     """Service class for handling Webhook events"""
 
-    def __init__(self, req: func.HttpRequest) -> None:
+    def __init__(self, req: WebhookRequest) -> None:
         """Initialize the WebhookService class
 
         Args:
-            req (func.HttpRequest): The request object
+            req (WebhookRequest): The request object
         """
-        self.req: func.HttpRequest = req
+        self.req: WebhookRequest = req
+        # Decoded signature digest of a delivery claimed and not yet completed or released
+        self.delivery_key: bytes | None = None
+        # Debounce delays of the built messages by (institution, barcode); only a message standing
+        # in for repeat events is held, until its debounce window closes
+        self.debounce_delays: dict[tuple[str, str], int] = {}
+        # Root span of the request, annotated with institution, event and outcome
+        self.span: Span | NoOpSpan = NOOP_SPAN
 
-    def parse_webhook(self) -> func.HttpResponse:
-        """Parse the webhook and return request data for re-retrieval to verify active status
+    def parse_webhook(self) -> WebhookResponse:
+        """Parse the webhook and queue request data for re-retrieval to verify active status
 
         Returns:
-            func.HttpResponse | dict[str, Any]: A response object if unsuccessful, otherwise request data dictionary
+            WebhookResponse: The response to return to Alma
+        """
+        try:
+            with get_tracer().span("webhook") as self.span:
+                message: WebhookResponse | dict[str, Any] = self.prepare_queue_message()
+                if isinstance(message, WebhookResponse):
+                    return self.finish_delivery(message)
+
+                with get_tracer().span("webhook.enqueue") as enqueue_span:
+                    response: WebhookResponse = self.enqueue(message)
+                    self.record_circuit_state(enqueue_span)
+                return self.finish_delivery(response)
+        finally:
+            self.release_delivery()
+
+    def prepare_queue_message(self) -> WebhookResponse | dict[str, Any]:
+        """Validate the webhook and build the fetch item queue message
+
+        Returns:
+            WebhookResponse | dict[str, Any]: A response object if there is nothing to queue, otherwise the message
         """
         # First, check for a challenge request and handle it immediately.
         activation_response = self.activate_webhook()
         if activation_response:
+            self.span.set_attribute("outcome", "challenge")
             return activation_response
 
-        request_data: func.HttpResponse | dict[str, Any] = (
-            self.get_request_data_from_webhook()
+        item_event: WebhookResponse | ItemEvent = self.get_request_data_from_webhook()
+        if isinstance(item_event, WebhookResponse):
+            return item_event
+
+        message: dict[str, Any] | str = self.build_queue_message(item_event)
+        if isinstance(message, str):
+            self.span.set_attribute("outcome", message)
+            if message == "invalid_payload":
+                return WebhookResponse(
+                    "Invalid payload: Barcode is missing.", status_code=400
+                )
+            return WebhookResponse("Webhook received", status_code=200)
+        return message
+
+    def build_queue_message(self, item_event: ItemEvent) -> dict[str, Any] | str:
+        """Apply the event filter, change detection and debouncing to an item event and build its queue message
+
+        Args:
+            item_event (ItemEvent): The item event, with its institution already validated
+
+        Returns:
+            dict[str, Any] | str: The message, or the outcome if there is nothing to queue
+        """
+        barcode: str | None = item_event.barcode
+        if not barcode:
+            log_limited(
+                logging.ERROR,
+                "WebhookService.item_webhook: Barcode not found in webhook payload.",
+            )
+            return "invalid_payload"
+
+        institution: str = cast(str, item_event.institution)
+        event_filter: EventFilter | None = get_event_filter()
+        # Events without an item object (bare barcodes) have no fields to filter on
+        rule: str | None = (
+            event_filter.match(institution, item_event.item)
+            if event_filter and item_event.item is not None
+            else None
         )
+        if rule is not None:
+            self.span.set_attribute("filter_rule", rule)
+            logging.info(
+                "WebhookService.build_queue_message: Dropped by event filter rule '%s'. Skipping.",
+                rule,
+            )
+            return "filtered"
 
-        if not isinstance(request_data, dict):
-            return request_data or func.HttpResponse(
-                "Internal Server Error: Invalid request data", status_code=500
+        change_detector: ChangeDetector | None = self.change_detector()
+        if change_detector and not change_detector.has_changed(
+            institution, barcode, item_event.item
+        ):
+            logging.info(
+                "WebhookService.build_queue_message: Relevant item fields unchanged. Skipping."
             )
+            return "unchanged"
 
-        if isinstance(request_data, dict):
-            if (
-                request_data.get("request", {}).get("event", {}).get("value")
-                != "ITEM_UPDATED"
-            ):
+        debouncer: BarcodeDebouncer | None = self.barcode_debouncer()
+        if debouncer:
+            debounce_delay: int | None = debouncer.hold(institution, barcode)
+            if debounce_delay is None:
+                # The change was not queued, so a later event with the same fields must not be skipped
+                if change_detector:
+                    change_detector.forget(institution, barcode)
                 logging.info(
-                    "WebhookService.parse_webhook(): Not an item update event. Skipping."
-                )
-                return func.HttpResponse("Webhook received", status_code=200)
-            barcode: str = (
-                request_data.get("request", {})
-                .get("item", {})
-                .get("item_data", {})
-                .get("barcode")
-            )
-            if not barcode:
-                logging.error(
-                    "WebhookService.item_webhook: Barcode not found in webhook payload."
+                    "WebhookService.build_queue_message: Barcode enqueued recently. Skipping."
                 )
-                return func.HttpResponse(
-                    "Invalid payload: Barcode is missing.", status_code=400
+                return "debounced"
+            self.debounce_delays[(institution, barcode)] = debounce_delay
+
+        message: dict[str, Any] = {
+            "institution": institution,
+            "barcode": barcode,
+        }
+        claim_check: ClaimCheck | None = get_claim_check()
+        if claim_check and item_event.item is not None:
+            with get_tracer().span("webhook.snapshot"):
+                snapshot: dict[str, Any] | None = claim_check.store_snapshot(
+                    institution, barcode, item_event.item, item_event.event_time
                 )
+            if snapshot is not None:
+                message["snapshot"] = snapshot
+        return message
 
-            message: dict[str, Any] = {
-                "institution": request_data.get("institution"),
-                "barcode": barcode,
-            }
+    @staticmethod
+    def record_circuit_state(span: Span | NoOpSpan) -> None:
+        """Record the queue circuit breaker state on a span
 
-            try:
-                storage_service = StorageService(
-                    storage_connection_string=STORAGE_CONNECTION_STRING
-                )
-                storage_service.send_queue_message(
-                    queue_name=FETCH_ITEM_QUEUE,
-                    message_content=message,
-                )
-            except (
-                ValueError,
-                TypeError,
-                azure.core.exceptions.ServiceRequestError,
-            ) as e:
-                logging.error(f"Failed to send message to queue: {e}")
-                return func.HttpResponse(
-                    "Error sending message to queue", status_code=500
+        Args:
+            span (Span | NoOpSpan): The enqueue span
+        """
+        breaker: CircuitBreaker | None = get_queue_circuit_breaker()
+        if breaker is not None and isinstance(span, Span):
+            span.set_attribute("circuit_state", breaker.state)
+
+    def enqueue(self, message: dict[str, Any]) -> WebhookResponse:
+        """Send the message to the fetch item queue
+
+        Args:
+            message (dict[str, Any]): The fetch item queue message
+
+        Returns:
+            WebhookResponse: The response to return to Alma
+        """
+        queue_name: str = self.route_message(message)
+        try:
+            delay: int = self.delivery_delay(message)
+        except ShapingLimitExceeded as e:
+            return self.rate_limited(message, e)
+        outbox: Outbox | None = get_outbox()
+        if outbox is not None and not delay:
+            return self.put_in_outbox(outbox, message, queue_name)
+        try:
+            batched: Future[None] | None = (
+                None if delay else self.submit_to_batcher(message, queue_name)
+            )
+            if batched is not None:
+                batched.result(timeout=batch_result_timeout())
+            else:
+                send_fetch_item_message(
+                    self.serialize_message(message), queue_name, delay
                 )
+        except CircuitOpenError as e:
+            return self.circuit_open(message, e)
+        except queue_send_errors() as e:
+            return self.enqueue_failed(message, e)
+
+        self.span.set_attribute("outcome", "queued")
+        return WebhookResponse("Webhook received", status_code=200)
 
-        return func.HttpResponse("Webhook received", status_code=200)
+    def put_in_outbox(
+        self, outbox: Outbox, message: dict[str, Any], queue_name: str
+    ) -> WebhookResponse:
+        """Hand the message to the outbox and acknowledge the webhook without waiting for the send
 
-    def get_request_data_from_webhook(self) -> func.HttpResponse | dict[str, Any]:
-        """Parse the webhook and return request data for re-retrieval to verify active status
+        Args:
+            outbox (Outbox): The process-wide outbox
+            message (dict[str, Any]): The fetch item queue message
+            queue_name (str): The fetch item queue chosen by the router
 
         Returns:
-            func.HttpResponse | dict[str, Any]: A response object if unsuccessful, otherwise request data dictionary
+            WebhookResponse: 200 once the message is held, or 503 if the outbox is full
         """
-        if not self.validate_signature():
-            logging.error(
-                "WebhookService.parse_webhook: Invalid webhook signature received."
+        try:
+            outbox.put(self.serialize_message(message), queue_name)
+        except OutboxFull as e:
+            self.span.set_attribute("outcome", "outbox_full")
+            log_limited(logging.WARNING, "WebhookService.put_in_outbox: %s", e)
+            self.release_claims(message)
+            return WebhookResponse(
+                "Service busy, retry later",
+                status_code=503,
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
             )
-            return func.HttpResponse(
+
+        self.span.set_attribute("outcome", "outboxed")
+        return WebhookResponse("Webhook received", status_code=200)
+
+    def delivery_delay(self, message: dict[str, Any]) -> int:
+        """Get the visibility timeout of a message: its debounce window or rate shaping delay, whichever is longer
+
+        Args:
+            message (dict[str, Any]): The fetch item queue message
+
+        Returns:
+            int: Seconds to hide the message for, 0 if it can be delivered at once
+
+        Raises:
+            ShapingLimitExceeded: If the message would have to be delayed longer than SHAPING_MAX_DELAY_SECONDS
+        """
+        return max(
+            self.debounce_delays.get((message["institution"], message["barcode"]), 0),
+            self.shaping_delay(message),
+        )
+
+    def shaping_delay(self, message: dict[str, Any]) -> int:
+        """Get the delivery delay that keeps the message's institution within its configured rate
+
+        Delayed messages are sent directly with a visibility timeout, bypassing the batcher and
+        the outbox, which cannot hold per-message delays.
+
+        Args:
+            message (dict[str, Any]): The fetch item queue message
+
+        Returns:
+            int: Seconds to hide the message for, 0 if it can be delivered at once
+
+        Raises:
+            ShapingLimitExceeded: If the message would have to be delayed longer than SHAPING_MAX_DELAY_SECONDS
+        """
+        shaper: RateShaper | None = get_rate_shaper()
+        if shaper is None:
+            return 0
+        delay: int = shaper.delay(message["institution"])
+        if delay:
+            self.span.set_attribute("shaping_delay", delay)
+        return delay
+
+    @staticmethod
+    def route_message(message: dict[str, Any]) -> str:
+        """Choose the fetch item queue for a message
+
+        Args:
+            message (dict[str, Any]): The fetch item queue message
+
+        Returns:
+            str: The queue name
+        """
+        return get_fetch_item_router().route(message["institution"], message["barcode"])
+
+    @staticmethod
+    def submit_to_batcher(
+        message: dict[str, Any], queue_name: str
+    ) -> Future[None] | None:
+        """Hand the message to its queue's batcher when batching is enabled
+
+        Args:
+            message (dict[str, Any]): The fetch item queue message
+            queue_name (str): The fetch item queue chosen by the router
+
+        Returns:
+            Future[None] | None: The caller's batch result, or None if the message should be sent directly
+        """
+        batcher: EnqueueBatcher | None = get_fetch_item_batcher(queue_name)
+        if batcher is None:
+            return None
+        return batcher.submit(message)
+
+    @staticmethod
+    def serialize_message(message: dict[str, Any]) -> str:
+        """Serialize a queue message
+
+        Args:
+            message (dict[str, Any]): The fetch item queue message
+
+        Returns:
+            str: The message content to send
+        """
+        if compact_message_format():
+            return encode_messages([message], get_settings().message_compress_threshold)
+        return json.dumps(message)
+
+    def enqueue_failed(
+        self, message: dict[str, Any], error: Exception
+    ) -> WebhookResponse:
+        """Log a failed queue send, release its claims and build the error response
+
+        Args:
+            message (dict[str, Any]): The fetch item queue message that was not sent
+            error (Exception): The exception raised by the send
+
+        Returns:
+            WebhookResponse: The error response
+        """
+        self.span.set_attribute("outcome", "enqueue_failed")
+        log_limited(logging.ERROR, "Failed to send message to queue: %s", error)
+        self.release_claims(message)
+        return WebhookResponse("Error sending message to queue", status_code=500)
+
+    def circuit_open(
+        self, message: dict[str, Any], error: CircuitOpenError
+    ) -> WebhookResponse:
+        """Fail fast while the queue circuit breaker is open, asking Alma to back off
+
+        Args:
+            message (dict[str, Any]): The fetch item queue message that was not sent
+            error (CircuitOpenError): The error raised by the breaker
+
+        Returns:
+            WebhookResponse: 503 with a Retry-After header
+        """
+        self.span.set_attribute("outcome", "circuit_open")
+        log_limited(
+            logging.WARNING,
+            "WebhookService.circuit_open: %s, not sending to queue",
+            error,
+        )
+        self.release_claims(message)
+        return WebhookResponse(
+            "Queue unavailable, retry later",
+            status_code=503,
+            headers={"Retry-After": error.retry_after_header},
+        )
+
+    def rate_limited(
+        self, message: dict[str, Any], error: ShapingLimitExceeded
+    ) -> WebhookResponse:
+        """Refuse a message its institution's rate could only deliver after the maximum delay, asking Alma to retry
+
+        Args:
+            message (dict[str, Any]): The fetch item queue message that was not sent
+            error (ShapingLimitExceeded): The error raised by the rate shaper
+
+        Returns:
+            WebhookResponse: 503 with a Retry-After header
+        """
+        self.span.set_attribute("outcome", "rate_limited")
+        log_limited(
+            logging.WARNING,
+            "WebhookService.rate_limited: %s, not sending to queue",
+            error,
+        )
+        self.release_claims(message)
+        return WebhookResponse(
+            "Rate limit exceeded, retry later",
+            status_code=503,
+            headers={"Retry-After": error.retry_after_header},
+        )
+
+    def barcode_debouncer(self) -> BarcodeDebouncer | None:
+        """Get the debouncer applied to this service's messages
+
+        Returns:
+            BarcodeDebouncer | None: The process-wide debouncer, or None if debouncing is disabled
+        """
+        return get_barcode_debouncer()
+
+    def change_detector(self) -> ChangeDetector | None:
+        """Get the change detector applied to this service's messages
+
+        Returns:
+            ChangeDetector | None: The process-wide change detector, or None if no relevant paths are configured
+        """
+        return get_change_detector()
+
+    def release_claims(self, message: dict[str, Any]) -> None:
+        """Release the debounce claim and fingerprint of a message that was not queued, so Alma's retry is not skipped
+
+        Args:
+            message (dict[str, Any]): The fetch item queue message
+        """
+        debouncer: BarcodeDebouncer | None = self.barcode_debouncer()
+        if debouncer:
+            debouncer.release(
+                message["institution"],
+                message["barcode"],
+                self.debounce_delays.get(
+                    (message["institution"], message["barcode"]), 0
+                ),
+            )
+        change_detector: ChangeDetector | None = self.change_detector()
+        if change_detector:
+            change_detector.forget(message["institution"], message["barcode"])
+
+    def get_request_data_from_webhook(self) -> WebhookResponse | ItemEvent:
+        """Validate the webhook and extract the item event from the request body
+
+        Returns:
+            WebhookResponse | ItemEvent: A response object if there is nothing to queue, otherwise the item event
+        """
+        rejected: WebhookResponse | None = self.check_request(
+            get_settings().max_body_bytes
+        )
+        if rejected is not None:
+            return rejected
+        if not self.validate_signature():
+            self.span.set_attribute("outcome", "invalid_signature")
+            return WebhookResponse(
                 "Internal Server Error: Invalid webhook signature", status_code=500
             )
+        earlier: str | None = self.claim_delivery()
+        if earlier is not None:
+            return self.repeated_delivery(earlier, "Webhook received")
+        event_filter: EventFilter | None = get_event_filter()
         try:
-            request_body = self.req.get_json()
+            with get_tracer().span("webhook.parse"):
+                item_event: ItemEvent | None = extract_item_event(
+                    self.req.get_body(),
+                    event_filter.event_types if event_filter else ITEM_EVENT_TYPES,
+                )
         except ValueError:
-            logging.error(
-                "WebhookService.get_request_data_from_webhook: Invalid JSON in request body."
+            self.span.set_attribute("outcome", "invalid_payload")
+            log_limited(
+                logging.ERROR,
+                "WebhookService.get_request_data_from_webhook: Invalid JSON in request body.",
             )
-            return func.HttpResponse("Invalid JSON in request body", status_code=400)
+            return WebhookResponse("Invalid JSON in request body", status_code=400)
 
-        institution_code: str | None = request_body.get("institution", {}).get("value")
-        if not institution_code:
-            logging.error(
-                "WebhookService.get_request_data_from_webhook: Missing institution.value in request body"
+        if item_event is None:
+            self.span.set_attribute("outcome", "ignored")
+            if event_filter:
+                event_filter.record_drop(EVENT_TYPE_RULE)
+            logging.info(
+                "WebhookService.parse_webhook(): Not an item update event. Skipping."
             )
-            return func.HttpResponse(
+            return WebhookResponse("Webhook received", status_code=200)
+
+        self.span.set_attribute("event", item_event.event)
+        self.span.set_attribute("institution", item_event.institution)
+        if not item_event.institution:
+            self.span.set_attribute("outcome", "invalid_payload")
+            log_limited(
+                logging.ERROR,
+                "WebhookService.get_request_data_from_webhook: Missing institution.value in request body",
+            )
+            return WebhookResponse(
                 "Missing institution.value in request body", status_code=400
             )
 
-        return {
-            "institution": institution_code,
-            "request": request_body,
-            "job": "bp_webhook_barcode_re_retrieve",
-        }
+        return item_event
+
+    def check_request(
+        self, max_bytes: int, content_types: frozenset[str] = JSON_CONTENT_TYPES
+    ) -> WebhookResponse | None:
+        """Reject requests that are not JSON, unsigned or too large before any hashing or parsing
+
+        The headers are checked before the body is read, and the body only by its length, so a
+        rejection costs the same whatever the size of the body.
+
+        Args:
+            max_bytes (int): The largest body accepted
+            content_types (frozenset[str]): The media types accepted
+
+        Returns:
+            WebhookResponse | None: The error response, or None if the request may be processed
+        """
+        media_type: str = (
+            self.req.headers.get("Content-Type", "").partition(";")[0].strip().lower()
+        )
+        if media_type and media_type not in content_types:
+            self.span.set_attribute("outcome", "unsupported_media_type")
+            log_limited(
+                logging.ERROR,
+                "WebhookService.check_request: Unsupported Content-Type %s",
+                media_type,
+            )
+            return WebhookResponse("Unsupported Media Type", status_code=415)
+        declared_length: str | None = self.req.headers.get("Content-Length")
+        if declared_length and declared_length.isdigit():
+            if int(declared_length) > max_bytes:
+                return self.too_large(int(declared_length), max_bytes)
+        if not self.signature_skipped() and not self.req.headers.get("X-Exl-Signature"):
+            self.span.set_attribute("outcome", "invalid_signature")
+            log_limited(
+                logging.ERROR, "WebhookService.check_request: Missing X-Exl-Signature"
+            )
+            return WebhookResponse("Missing X-Exl-Signature header", status_code=401)
+        body_length: int = len(self.req.get_body())
+        if body_length > max_bytes:
+            return self.too_large(body_length, max_bytes)
+        return None
+
+    def too_large(self, length: int, max_bytes: int) -> WebhookResponse:
+        """Build the response to a request whose body is over the size limit
 
-    def activate_webhook(self) -> func.HttpResponse | None:
+        Args:
+            length (int): The declared or actual body length
+            max_bytes (int): The largest body accepted
+
+        Returns:
+            WebhookResponse: 413
+        """
+        self.span.set_attribute("outcome", "too_large")
+        log_limited(
+            logging.ERROR,
+            "WebhookService.check_request: Body of %d bytes is over the %d byte limit",
+            length,
+            max_bytes,
+        )
+        return WebhookResponse("Request body too large", status_code=413)
+
+    def claim_delivery(self) -> str | None:
+        """Claim this delivery by its validated signature digest, marking it in progress
+
+        Returns:
+            str | None: None if the delivery should be processed, otherwise the state of an
+            earlier delivery with the same signature: IN_PROGRESS or COMPLETED
+        """
+        store: IdempotencyStore | None = get_idempotency_store()
+        signature: str | None = self.req.headers.get("X-Exl-Signature")
+        if store is None or not signature or self.signature_skipped():
+            return None
+        try:
+            digest: bytes = base64.b64decode(signature, validate=True)
+        except (binascii.Error, ValueError):
+            return None
+        earlier: str | None = store.claim(digest)
+        if earlier is None:
+            self.delivery_key = digest
+        return earlier
+
+    def repeated_delivery(self, earlier: str, received: str) -> WebhookResponse:
+        """Build the response to a retry of a delivery claimed earlier
+
+        Args:
+            earlier (str): The state of the earlier delivery, IN_PROGRESS or COMPLETED
+            received (str): The body acknowledging a completed delivery
+
+        Returns:
+            WebhookResponse: 200 if the earlier delivery completed, or 503 while it is in progress
+        """
+        if earlier == IN_PROGRESS:
+            self.span.set_attribute("outcome", "in_progress")
+            logging.info(
+                "WebhookService.repeated_delivery: Delivery still in progress. Asking for a retry."
+            )
+            return WebhookResponse(
+                "Delivery in progress, retry later",
+                status_code=503,
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+            )
+        self.span.set_attribute("outcome", "duplicate")
+        logging.info("WebhookService.repeated_delivery: Duplicate delivery. Skipping.")
+        return WebhookResponse(received, status_code=200)
+
+    def finish_delivery(self, response: WebhookResponse) -> WebhookResponse:
+        """Complete the delivery claim, or release it if processing failed so Alma's retry is processed
+
+        Args:
+            response (WebhookResponse): The response about to be returned
+
+        Returns:
+            WebhookResponse: The same response
+        """
+        if self.delivery_key is None:
+            return response
+        if response.status_code >= 400:
+            self.release_delivery()
+            return response
+        store: IdempotencyStore | None = get_idempotency_store()
+        if store is not None:
+            store.complete(self.delivery_key)
+        self.delivery_key = None
+        return response
+
+    def release_delivery(self) -> None:
+        """Release a delivery claim that was not completed, e.g. because processing raised"""
+        if self.delivery_key is None:
+            return
+        store: IdempotencyStore | None = get_idempotency_store()
+        if store is not None:
+            store.release(self.delivery_key)
+        self.delivery_key = None
+
+    def activate_webhook(self) -> WebhookResponse | None:
         """Activate the webhook by responding to a challenge request."""
         if self.req.method == "GET" and self.req.params.get("challenge"):
             challenge_value = self.req.params.get("challenge")
             challenge_response = {"challenge": challenge_value}
-            return func.HttpResponse(
+            return WebhookResponse(
                 json.dumps(challenge_response),
                 mimetype="application/json",
                 status_code=200,
             )
         return None
 
+    @staticmethod
+    def signature_skipped() -> bool:
+        """Whether signature validation is skipped in the local development environment"""
+        return os.environ.get("AZURE_FUNCTIONS_ENVIRONMENT") == "Development"
+
     def validate_signature(self) -> bool:
         """Validate the signature"""
-        if os.environ.get("AZURE_FUNCTIONS_ENVIRONMENT") == "Development":
+        if self.signature_skipped():
             return True
 
-        if not validate_webhook_signature(
-            self.req.get_body(), WEBHOOK_SECRET, self.req.headers.get("X-Exl-Signature")
-        ):
-            logging.error(
-                "WebhookService.validate_signature: Invalid webhook signature received."
+        with get_tracer().span("webhook.signature"):
+            valid: bool = get_signature_verifier().verify(
+                self.req.get_body(), self.req.headers.get("X-Exl-Signature")
+            )
+        if not valid:
+            log_limited(
+                logging.ERROR,
+                "WebhookService.validate_signature: Invalid webhook signature received.",
             )
             return False
 
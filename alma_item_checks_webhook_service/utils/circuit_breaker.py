@@ -0,0 +1,177 @@
+"""Circuit breaker that fails calls fast while a dependency is unhealthy"""
+
+import logging
+import math
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+CLOSED: str = "closed"
+OPEN: str = "open"
+HALF_OPEN: str = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the dependency while the circuit is open"""
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        """Initialize the CircuitOpenError class
+
+        Args:
+            name (str): The breaker name
+            retry_after (float): Seconds until the breaker lets a probe call through
+        """
+        super().__init__(f"Circuit '{name}' is open")
+        self.retry_after: float = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """The Retry-After header value, in whole seconds and at least 1"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def _any_error(error: BaseException) -> bool:
+    """Count every exception as a failure"""
+    return True
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets one probe call through after a cool-down
+
+    closed:    calls go through; failure_threshold consecutive failures open the circuit.
+    open:      calls raise CircuitOpenError until reset_timeout seconds have passed.
+    half_open: a single probe call goes through while others are rejected. If it succeeds
+               the circuit closes, and if it fails the circuit opens again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        is_failure: Callable[[BaseException], bool] = _any_error,
+    ) -> None:
+        """Initialize the CircuitBreaker class
+
+        Args:
+            name (str): Name used in logs and errors
+            failure_threshold (int): Consecutive failures that open the circuit
+            reset_timeout (float): Seconds the circuit stays open before a probe
+            clock (Callable[[], float]): Monotonic clock, replaceable in tests
+            is_failure (Callable[[BaseException], bool]): Whether an exception raised in guard()
+                means the dependency is unhealthy; other exceptions leave the failure count as is
+        """
+        self.name: str = name
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.failures: int = 0
+        self.times_opened: int = 0
+        self.rejected: int = 0
+        self._clock: Callable[[], float] = clock
+        self._is_failure: Callable[[BaseException], bool] = is_failure
+        self._state: str = CLOSED
+        self._opened_at: float = 0.0
+        self._probe_in_flight: bool = False
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """The current state: closed, open or half_open"""
+        with self._lock:
+            return self._current_state()
+
+    def before_call(self) -> None:
+        """Check that a call may go through, claiming the probe when half open
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half open with a probe already in flight
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError(
+                self.name,
+                max(self._opened_at + self.reset_timeout - self._clock(), 0.0),
+            )
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Run the enclosed call through the breaker
+
+        Only a block that completes counts as a success. An exception counts as a failure when
+        is_failure says so; any other exception, such as one caused by the caller, is neutral.
+        Either way a half-open probe is released.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half open with a probe already in flight
+        """
+        self.before_call()
+        try:
+            yield
+        except BaseException as error:
+            if self._is_failure(error):
+                self.record_failure()
+            else:
+                self.release_probe()
+            raise
+        self.record_success()
+
+    def record_success(self) -> None:
+        """Record a successful call, closing the circuit after a successful probe"""
+        with self._lock:
+            if self._state != CLOSED:
+                logging.warning("CircuitBreaker: Circuit '%s' closed", self.name)
+            self._state = CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Record a call that says nothing about the dependency, letting another probe through"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit at the threshold or after a failed probe"""
+        with self._lock:
+            self.failures += 1
+            if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.times_opened += 1
+                    logging.warning(
+                        "CircuitBreaker: Circuit '%s' opened after %d consecutive failures",
+                        self.name,
+                        self.failures,
+                    )
+                self._state = OPEN
+                self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+    def stats(self) -> dict[str, str | int]:
+        """Get the breaker state and counters
+
+        Returns:
+            dict[str, str | int]: State, consecutive failures, times opened and rejected calls
+        """
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "failures": self.failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+    def _current_state(self) -> str:
+        """The state, moving from open to half open once the cool-down has passed (lock held)"""
+        if (
+            self._state == OPEN
+            and self._clock() - self._opened_at >= self.reset_timeout
+        ):
+            self._state = HALF_OPEN
+        return self._state
@@ -0,0 +1,46 @@
+"""JSON encoding and decoding with the fastest available backend
+
+orjson is used when it is installed; otherwise the standard library json module is used.
+Both raise a ValueError subclass on malformed input.
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None  # type: ignore[assignment]
+
+JSON_BACKEND: str = "orjson" if orjson is not None else "json"
+
+
+def loads(data: bytes | str) -> Any:
+    """Deserialize JSON from bytes or str
+
+    Args:
+        data (bytes | str): The JSON document
+
+    Returns:
+        Any: The decoded value
+
+    Raises:
+        ValueError: If the document is not valid JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> str:
+    """Serialize a value to compact JSON
+
+    Args:
+        value (Any): The value, made of dicts with str keys, lists, strings, numbers, booleans and None
+
+    Returns:
+        str: The JSON document, without whitespace between tokens
+    """
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
@@ -0,0 +1,132 @@
+"""Framework-neutral HTTP request and response types for the webhook services
+
+The services only read a request's method, headers, query parameters and body, and return a
+status, body and headers. azure.functions.HttpRequest already has that shape, so the Functions
+blueprints pass their requests straight through and convert a WebhookResponse to a
+func.HttpResponse at the edge. The ASGI app and the replay CLI build a BufferedRequest instead.
+"""
+
+from collections.abc import Iterable, Iterator, Mapping
+from typing import Protocol
+
+
+class WebhookRequest(Protocol):
+    """The parts of an HTTP request the webhook services read"""
+
+    @property
+    def method(self) -> str:
+        """The upper-case request method"""
+        ...
+
+    @property
+    def headers(self) -> Mapping[str, str]:
+        """The request headers, looked up case-insensitively"""
+        ...
+
+    @property
+    def params(self) -> Mapping[str, str]:
+        """The query string parameters"""
+        ...
+
+    def get_body(self) -> bytes:
+        """The request body"""
+        ...
+
+
+class Headers(Mapping[str, str]):
+    """Read-only headers with case-insensitive names; repeated headers keep the last value"""
+
+    def __init__(
+        self, headers: Mapping[str, str] | Iterable[tuple[str, str]] = ()
+    ) -> None:
+        """Initialize the Headers class
+
+        Args:
+            headers (Mapping[str, str] | Iterable[tuple[str, str]]): Header names and values
+        """
+        items: Iterable[tuple[str, str]] = (
+            headers.items() if isinstance(headers, Mapping) else headers
+        )
+        self._headers: dict[str, str] = {name.lower(): value for name, value in items}
+
+    def __getitem__(self, name: str) -> str:
+        return self._headers[name.lower()]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._headers)
+
+    def __len__(self) -> int:
+        return len(self._headers)
+
+
+class BufferedRequest:
+    """A WebhookRequest whose body has already been read"""
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        body: bytes = b"",
+        headers: Mapping[str, str] | Iterable[tuple[str, str]] = (),
+        params: Mapping[str, str] | None = None,
+    ) -> None:
+        """Initialize the BufferedRequest class
+
+        Args:
+            method (str): The request method
+            url (str): The request path
+            body (bytes): The request body
+            headers (Mapping[str, str] | Iterable[tuple[str, str]]): The request headers
+            params (Mapping[str, str] | None): The query string parameters
+        """
+        self.method: str = method.upper()
+        self.url: str = url
+        self.headers: Headers = Headers(headers)
+        self.params: dict[str, str] = dict(params or {})
+        self._body: bytes = body
+
+    def get_body(self) -> bytes:
+        """Get the request body
+
+        Returns:
+            bytes: The body
+        """
+        return self._body
+
+
+class WebhookResponse:
+    """The status, body and headers returned by the webhook services
+
+    The constructor takes the same arguments as func.HttpResponse.
+    """
+
+    def __init__(
+        self,
+        body: str | bytes = b"",
+        status_code: int = 200,
+        headers: Mapping[str, str] | None = None,
+        mimetype: str = "text/plain",
+        charset: str = "utf-8",
+    ) -> None:
+        """Initialize the WebhookResponse class
+
+        Args:
+            body (str | bytes): The response body, encoded with charset if a string
+            status_code (int): The HTTP status code
+            headers (Mapping[str, str] | None): Extra response headers
+            mimetype (str): The media type of the body
+            charset (str): The character set of the body
+        """
+        self.status_code: int = status_code
+        self.headers: dict[str, str] = dict(headers or {})
+        self.mimetype: str = mimetype
+        self.charset: str = charset
+        self._body: bytes = body.encode(charset) if isinstance(body, str) else body
+
+    def get_body(self) -> bytes:
+        """Get the response body
+
+        Returns:
+            bytes: The body
+        """
+        return self._body
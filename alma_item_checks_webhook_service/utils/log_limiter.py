@@ -0,0 +1,182 @@
+"""Rate-limited logging for failure paths
+
+During a signature-failure or queue-outage storm, every request fails the same way. Logging
+each failure sends thousands of identical lines to Application Insights, and that log I/O
+becomes the bottleneck. Messages logged through log_limited are counted per key, which is
+the message format string unless a key is given. At most LOG_RATE_LIMIT of them are logged
+per key in each LOG_RATE_INTERVAL_SECONDS window. The rest are counted, and a single
+"suppressed" summary is logged for the window once it has passed.
+
+Arguments are formatted by logging only when a record is actually emitted, and nothing at
+all is done for levels the root logger would discard.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from alma_item_checks_webhook_service.config import Settings, get_settings
+
+
+class _Window:
+    """Messages logged and suppressed for one key in the current window"""
+
+    __slots__ = ("start", "level", "logged", "suppressed")
+
+    def __init__(self, start: float, level: int) -> None:
+        self.start: float = start
+        self.level: int = level
+        self.logged: int = 0
+        self.suppressed: int = 0
+
+
+class LogLimiter:
+    """Logs at most limit messages per key in each interval and summarizes the rest"""
+
+    def __init__(
+        self,
+        limit: int,
+        interval: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the LogLimiter class
+
+        Args:
+            limit (int): Messages logged per key in each interval; 0 logs every message
+            interval (float): Length of a window in seconds
+            clock (Callable[[], float]): Monotonic clock, replaceable in tests
+        """
+        self.limit: int = limit
+        self.interval: float = interval
+        self._clock: Callable[[], float] = clock
+        self._windows: dict[str, _Window] = {}
+        self._next_sweep: float = clock() + interval
+        self._lock: threading.Lock = threading.Lock()
+
+    def log(
+        self,
+        level: int,
+        msg: str,
+        *args: Any,
+        key: str | None = None,
+        stacklevel: int = 2,
+        **kwargs: Any,
+    ) -> None:
+        """Log a message unless its key is over the limit for the current window
+
+        Args:
+            level (int): The logging level
+            msg (str): The message format string, formatted lazily with args
+            *args: The message arguments
+            key (str | None): The key messages are counted under, defaulting to msg
+            stacklevel (int): Passed to logging so records point at the caller
+            **kwargs: Passed to logging, e.g. exc_info
+        """
+        logger: logging.Logger = logging.getLogger()
+        if not logger.isEnabledFor(level):
+            return
+        if self.limit <= 0:
+            logger.log(level, msg, *args, stacklevel=stacklevel, **kwargs)
+            return
+
+        key = key or msg
+        now: float = self._clock()
+        ended: list[tuple[str, _Window]] = []
+        with self._lock:
+            if now >= self._next_sweep:
+                ended = self._end_windows(now)
+            window: _Window | None = self._windows.get(key)
+            if window is None or now - window.start >= self.interval:
+                if window is not None and window.suppressed:
+                    ended.append((key, window))
+                window = self._windows[key] = _Window(now, level)
+            allowed: bool = window.logged < self.limit
+            if allowed:
+                window.logged += 1
+            else:
+                window.suppressed += 1
+
+        self._summarize(ended)
+        if allowed:
+            logger.log(level, msg, *args, stacklevel=stacklevel, **kwargs)
+
+    def flush(self) -> None:
+        """Log the summaries of every window with suppressed messages, ending the windows"""
+        with self._lock:
+            ended: list[tuple[str, _Window]] = [
+                (key, window)
+                for key, window in self._windows.items()
+                if window.suppressed
+            ]
+            self._windows.clear()
+        self._summarize(ended)
+
+    def _end_windows(self, now: float) -> list[tuple[str, _Window]]:
+        """Drop the windows that have passed, returning those with suppressed messages"""
+        self._next_sweep = now + self.interval
+        ended: list[tuple[str, _Window]] = [
+            (key, window)
+            for key, window in self._windows.items()
+            if now - window.start >= self.interval
+        ]
+        for key, _ in ended:
+            del self._windows[key]
+        return [(key, window) for key, window in ended if window.suppressed]
+
+    def _summarize(self, ended: list[tuple[str, _Window]]) -> None:
+        """Log a summary for each ended window"""
+        for key, window in ended:
+            logging.log(
+                window.level,
+                "LogLimiter: Suppressed %d similar messages in %.0f seconds: %s",
+                window.suppressed,
+                self.interval,
+                key,
+            )
+
+
+_log_limiter: LogLimiter | None = None
+_log_limiter_lock: threading.Lock = threading.Lock()
+
+
+def get_log_limiter() -> LogLimiter:
+    """Get the process-wide log limiter, built on first use and flushed at interpreter exit
+
+    Returns:
+        LogLimiter: The limiter for LOG_RATE_LIMIT and LOG_RATE_INTERVAL_SECONDS
+    """
+    global _log_limiter
+    if _log_limiter is None:
+        with _log_limiter_lock:
+            if _log_limiter is None:
+                settings: Settings = get_settings()
+                limiter: LogLimiter = LogLimiter(
+                    settings.log_rate_limit, settings.log_rate_interval_seconds
+                )
+                atexit.register(limiter.flush)
+                _log_limiter = limiter
+    return _log_limiter
+
+
+def log_limited(level: int, msg: str, *args: Any, **kwargs: Any) -> None:
+    """Log a failure-path message through the process-wide log limiter
+
+    Callers such as the signature check must not fail because an unrelated setting is invalid,
+    so the message is logged without a limit while the settings cannot be loaded.
+
+    Args:
+        level (int): The logging level
+        msg (str): The message format string, formatted lazily with args
+        *args: The message arguments
+        **kwargs: key, or options passed to logging such as exc_info
+    """
+    try:
+        limiter: LogLimiter = get_log_limiter()
+    except ValueError:
+        kwargs.pop("key", None)
+        logging.log(level, msg, *args, stacklevel=2, **kwargs)
+        return
+    limiter.log(level, msg, *args, stacklevel=3, **kwargs)
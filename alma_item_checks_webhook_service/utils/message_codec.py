@@ -0,0 +1,134 @@
+"""Versioned encoding of fetch item queue messages, with a decoder for downstream consumers
+
+A compact message is a JSON object holding a schema version and a list of messages with short
+field names:
+
+    {"v":2,"m":[{"i":"01WRLC_GWA","b":"32882019475853"}]}
+
+    institution  i        snapshot  s  (a claim-check reference, with its own short names)
+    barcode      b        container c, name n, event_time t
+
+Fields without a short name are kept as they are, so metadata can be added without a new
+schema version. An encoded document over the compression threshold is zlib-compressed and
+sent as "z:" followed by its base64 text, if that is shorter.
+
+decode_messages reads compact messages and the earlier formats: a single {"institution",
+"barcode"} object and the {"version": 1, "messages": [...]} batch. It always returns the list
+of messages with their full field names, so consumers can switch before the webhook service
+sends compact messages.
+"""
+
+import base64
+import binascii
+import zlib
+from collections.abc import Iterable
+from typing import Any
+
+from alma_item_checks_webhook_service.utils import fast_json
+
+MESSAGE_SCHEMA_VERSION: int = 2
+
+# Version of the {"version", "messages"} batch payload of the "json" message format
+BATCH_SCHEMA_VERSION: int = 1
+
+COMPRESSED_PREFIX: str = "z:"
+
+_SHORT_NAMES: dict[str, str] = {
+    "institution": "i",
+    "barcode": "b",
+    "snapshot": "s",
+}
+_SNAPSHOT_SHORT_NAMES: dict[str, str] = {
+    "container": "c",
+    "name": "n",
+    "event_time": "t",
+}
+_LONG_NAMES: dict[str, str] = {short: long for long, short in _SHORT_NAMES.items()}
+_SNAPSHOT_LONG_NAMES: dict[str, str] = {
+    short: long for long, short in _SNAPSHOT_SHORT_NAMES.items()
+}
+
+
+def _rename(fields: dict[str, Any], names: dict[str, str]) -> dict[str, Any]:
+    """Rename the keys of an object that have a replacement in names"""
+    return {names.get(key, key): value for key, value in fields.items()}
+
+
+def encode_messages(
+    messages: Iterable[dict[str, Any]], compress_threshold: int = 1024
+) -> str:
+    """Encode messages as one compact queue message
+
+    Args:
+        messages (Iterable[dict[str, Any]]): The messages, with full field names
+        compress_threshold (int): Encoded length above which compression is tried; 0 never compresses
+
+    Returns:
+        str: The queue message content
+    """
+    compact: list[dict[str, Any]] = []
+    for message in messages:
+        short: dict[str, Any] = _rename(message, _SHORT_NAMES)
+        if isinstance(short.get("s"), dict):
+            short["s"] = _rename(short["s"], _SNAPSHOT_SHORT_NAMES)
+        compact.append(short)
+    content: str = fast_json.dumps({"v": MESSAGE_SCHEMA_VERSION, "m": compact})
+    if compress_threshold <= 0 or len(content) <= compress_threshold:
+        return content
+    compressed: str = COMPRESSED_PREFIX + base64.b64encode(
+        zlib.compress(content.encode())
+    ).decode("ascii")
+    return compressed if len(compressed) < len(content) else content
+
+
+def decode_messages(content: str | bytes) -> list[dict[str, Any]]:
+    """Decode a fetch item queue message in any format the webhook service has sent
+
+    Args:
+        content (str | bytes): The queue message content, after the queue's base64 decoding
+
+    Returns:
+        list[dict[str, Any]]: The messages, with full field names
+
+    Raises:
+        ValueError: If the content is malformed or has an unsupported schema version
+    """
+    if isinstance(content, bytes):
+        content = content.decode()
+    if content.startswith(COMPRESSED_PREFIX):
+        try:
+            content = zlib.decompress(
+                base64.b64decode(content[len(COMPRESSED_PREFIX) :], validate=True)
+            ).decode()
+        except (binascii.Error, zlib.error) as e:
+            raise ValueError(f"Malformed compressed queue message: {e}") from None
+    document: Any = fast_json.loads(content)
+    if not isinstance(document, dict):
+        raise ValueError("Queue message is not a JSON object")
+
+    if "v" in document:
+        if document["v"] != MESSAGE_SCHEMA_VERSION or not isinstance(
+            document.get("m"), list
+        ):
+            raise ValueError(
+                f"Unsupported queue message schema version: {document['v']!r}"
+            )
+        messages: list[dict[str, Any]] = []
+        for short in document["m"]:
+            if not isinstance(short, dict):
+                raise ValueError("Queue message entry is not a JSON object")
+            message: dict[str, Any] = _rename(short, _LONG_NAMES)
+            if isinstance(message.get("snapshot"), dict):
+                message["snapshot"] = _rename(message["snapshot"], _SNAPSHOT_LONG_NAMES)
+            messages.append(message)
+        return messages
+
+    if "version" in document:
+        if document["version"] != BATCH_SCHEMA_VERSION or not isinstance(
+            document.get("messages"), list
+        ):
+            raise ValueError(
+                f"Unsupported queue message schema version: {document['version']!r}"
+            )
+        return list(document["messages"])
+    return [document]
@@ -0,0 +1,93 @@
+"""Single-pass extraction of the fields we need from an Alma webhook body"""
+
+import functools
+from dataclasses import dataclass, field
+from typing import Any
+
+from alma_item_checks_webhook_service.utils import fast_json
+
+ITEM_UPDATED: str = "ITEM_UPDATED"
+# The event types queued when EVENT_FILTER does not list any
+ITEM_EVENT_TYPES: frozenset[str] = frozenset({ITEM_UPDATED})
+
+
+@dataclass(frozen=True, slots=True)
+class ItemEvent:
+    """The fields of an item webhook needed to queue a fetch"""
+
+    event: str
+    institution: str | None
+    barcode: str | None
+    # The decoded "item" object (bib, holding and item data), for change detection
+    item: dict[str, Any] | None = field(default=None, repr=False, compare=False)
+    # The webhook "time", for item snapshots
+    event_time: str | None = field(default=None, compare=False)
+
+
+@functools.cache
+def _event_tokens(event_types: frozenset[str]) -> tuple[bytes, ...]:
+    """The quoted event types searched for in raw bodies"""
+    return tuple(f'"{event_type}"'.encode() for event_type in sorted(event_types))
+
+
+def extract_item_event(
+    body: bytes, event_types: frozenset[str] = ITEM_EVENT_TYPES
+) -> ItemEvent | None:
+    """Extract an ItemEvent from a webhook body
+
+    Bodies that cannot contain one of the event types are rejected with a byte search before
+    any JSON is decoded, so other events cost no parse at all.
+
+    Args:
+        body (bytes): The raw request body
+        event_types (frozenset[str]): The event types to extract
+
+    Returns:
+        ItemEvent | None: The event, or None if the webhook is not one of the event types
+
+    Raises:
+        ValueError: If the body could be one of the event types but is not valid JSON
+    """
+    if not any(token in body for token in _event_tokens(event_types)):
+        return None
+
+    payload: Any = fast_json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError("Webhook body is not a JSON object")
+    return item_event_from_payload(payload, event_types)
+
+
+def item_event_from_payload(
+    payload: dict[str, Any], event_types: frozenset[str] = ITEM_EVENT_TYPES
+) -> ItemEvent | None:
+    """Extract an ItemEvent from a decoded webhook body
+
+    Args:
+        payload (dict[str, Any]): The decoded webhook body
+        event_types (frozenset[str]): The event types to extract
+
+    Returns:
+        ItemEvent | None: The event, or None if the webhook is not one of the event types
+    """
+    event: Any = _value(payload.get("event"))
+    if event not in event_types:
+        return None
+
+    item = payload.get("item")
+    item_data = item.get("item_data") if isinstance(item, dict) else None
+    barcode = item_data.get("barcode") if isinstance(item_data, dict) else None
+
+    return ItemEvent(
+        event=event,
+        institution=_value(payload.get("institution")),
+        barcode=barcode or None,
+        item=item if isinstance(item, dict) else None,
+        event_time=event_time
+        if isinstance(event_time := payload.get("time"), str)
+        else None,
+    )
+
+
+def _value(field: Any) -> Any:
+    """Get the value of an Alma {"value": ..., "desc": ...} field"""
+    return field.get("value") if isinstance(field, dict) else None
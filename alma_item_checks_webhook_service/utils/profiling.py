@@ -0,0 +1,162 @@
+"""On-demand sampling profiler for the item_webhook function
+
+With PROFILE_SAMPLE_RATE set to N, one in every N invocations runs under cProfile, and only one
+at a time, so production traffic pays for profiling on a small fraction of requests. Samples are
+aggregated, and every PROFILE_FLUSH_SAMPLES samples (and at interpreter exit) the aggregate is
+written to the sink: a .pstats file in the PROFILE_OUTPUT directory, for snakeviz or
+python -m pstats, or, without PROFILE_OUTPUT, the top functions by cumulative time in the log.
+
+cProfile profiles a thread, not a request, so a sampled asyncio invocation also records the
+other coroutines that run on the event loop while it awaits.
+"""
+
+import atexit
+import io
+import itertools
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from typing import TYPE_CHECKING
+
+from alma_item_checks_webhook_service.config import Settings, get_settings
+
+if TYPE_CHECKING:
+    import cProfile
+    import pstats
+
+# Functions listed when profiles are written to the log
+LOGGED_FUNCTIONS: int = 30
+
+
+class SamplingProfiler:
+    """Profiles one in every sample_rate invocations and writes the aggregated stats"""
+
+    def __init__(
+        self, sample_rate: int, flush_samples: int = 100, output: str | None = None
+    ) -> None:
+        """Initialize the SamplingProfiler class
+
+        Args:
+            sample_rate (int): Profile one in this many invocations
+            flush_samples (int): Samples aggregated before the stats are written
+            output (str | None): Directory for .pstats files, or None to log the stats
+        """
+        self.sample_rate: int = max(sample_rate, 1)
+        self.flush_samples: int = max(flush_samples, 1)
+        self.output: str | None = output
+        self._invocations: itertools.count[int] = itertools.count()
+        self._active: threading.Lock = threading.Lock()
+        self._stats_lock: threading.Lock = threading.Lock()
+        self._stats: "pstats.Stats | None" = None
+        self._samples: int = 0
+
+    @contextmanager
+    def sample(self) -> Iterator[None]:
+        """Profile the enclosed block if this invocation is sampled and no other is profiled"""
+        if next(self._invocations) % self.sample_rate or not self._active.acquire(
+            blocking=False
+        ):
+            yield
+            return
+
+        import cProfile
+
+        profile: cProfile.Profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+        finally:
+            self._active.release()
+        self._add(profile)
+
+    def _add(self, profile: "cProfile.Profile") -> None:
+        """Add a sample to the aggregate, writing it once flush_samples have been taken"""
+        import pstats
+
+        with self._stats_lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self._samples += 1
+            if self._samples < self.flush_samples:
+                return
+        self.flush()
+
+    def flush(self) -> None:
+        """Write the aggregated stats to the sink and start a new aggregate"""
+        with self._stats_lock:
+            stats: "pstats.Stats | None" = self._stats
+            samples: int = self._samples
+            self._stats = None
+            self._samples = 0
+        if stats is None:
+            return
+
+        if self.output:
+            os.makedirs(self.output, exist_ok=True)
+            path: str = os.path.join(
+                self.output, f"webhook-{os.getpid()}-{int(time.time())}.pstats"
+            )
+            stats.dump_stats(path)
+            logging.info(
+                "SamplingProfiler.flush: Wrote %d profiled invocations to %s",
+                samples,
+                path,
+            )
+            return
+
+        import pstats
+
+        text: io.StringIO = io.StringIO()
+        pstats.Stats(stream=text).add(stats).sort_stats("cumulative").print_stats(
+            LOGGED_FUNCTIONS
+        )
+        logging.info(
+            "SamplingProfiler.flush: Profile of %d invocations\n%s",
+            samples,
+            text.getvalue(),
+        )
+
+
+_profiler: SamplingProfiler | None = None
+_profiler_lock: threading.Lock = threading.Lock()
+
+
+def get_profiler() -> SamplingProfiler | None:
+    """Get the process-wide sampling profiler, built on first use and flushed at interpreter exit
+
+    Returns:
+        SamplingProfiler | None: The profiler, or None if PROFILE_SAMPLE_RATE is 0
+    """
+    global _profiler
+    settings: Settings = get_settings()
+    if settings.profile_sample_rate <= 0:
+        return None
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                profiler: SamplingProfiler = SamplingProfiler(
+                    settings.profile_sample_rate,
+                    settings.profile_flush_samples,
+                    settings.profile_output,
+                )
+                atexit.register(profiler.flush)
+                _profiler = profiler
+    return _profiler
+
+
+def profiled() -> AbstractContextManager[None]:
+    """Get a context manager that profiles the enclosed block when it is sampled
+
+    Returns:
+        AbstractContextManager[None]: The profiler's sample(), or a no-op if profiling is off
+    """
+    profiler: SamplingProfiler | None = get_profiler()
+    return profiler.sample() if profiler is not None else nullcontext()
@@ -3,7 +3,11 @@
 import hmac
 import hashlib
 import base64
+import binascii
 import logging
+from collections.abc import Iterable
+
+from alma_item_checks_webhook_service.utils.log_limiter import log_limited
 
 
 def validate_webhook_signature(
@@ -21,11 +25,11 @@ def validate_webhook_signature(
         True if the signature is valid, False otherwise.
     """
     if not secret:
-        logging.error("Webhook secret is not provided for validation.")
+        log_limited(logging.ERROR, "Webhook secret is not provided for validation.")
         return False
 
     if not received_signature:
-        logging.warning("X-Exl-Signature header is missing.")
+        log_limited(logging.WARNING, "X-Exl-Signature header is missing.")
         return False
 
     try:
@@ -39,12 +43,67 @@ def validate_webhook_signature(
         result = hmac.compare_digest(expected_signature_base64, received_signature)
 
         if not result:
-            logging.error("Webhook signature validation failed.")
-            logging.warning(f"Expected signature: {expected_signature_base64}")
-            logging.warning(f"Received signature: {received_signature}")
+            log_limited(logging.ERROR, "Webhook signature validation failed.")
 
         return result
 
     except Exception as e:
-        logging.error(f"Error during signature validation: {e}", exc_info=True)
+        log_limited(
+            logging.ERROR, "Error during signature validation: %s", e, exc_info=True
+        )
+        return False
+
+
+class SignatureVerifier:
+    """Verifies X-Exl-Signature headers against prepared HMAC keys
+
+    The keyed HMAC state for each secret is built once and copied per request, the received
+    header is decoded once, and raw digest bytes are compared. Several secrets may be active at
+    once so the shared secret can be rotated without downtime.
+    """
+
+    def __init__(self, secrets: Iterable[str]) -> None:
+        """Initialize the SignatureVerifier class
+
+        Args:
+            secrets (Iterable[str]): The active shared secret keys, current first; empty ones are
+                skipped, and without any every signature fails verification
+        """
+        self._prepared: list["hmac.HMAC"] = [
+            hmac.new(secret.encode(), digestmod=hashlib.sha256)
+            for secret in secrets
+            if secret
+        ]
+
+    def verify(self, body_bytes: bytes, received_signature: str | None) -> bool:
+        """Verify the signature received for a body
+
+        Args:
+            body_bytes: The raw bytes of the request body.
+            received_signature: The signature received in the X-Exl-Signature header.
+
+        Returns:
+            True if the signature matches any active secret, False otherwise.
+        """
+        if not self._prepared:
+            log_limited(logging.ERROR, "Webhook secret is not provided for validation.")
+            return False
+
+        if not received_signature:
+            log_limited(logging.WARNING, "X-Exl-Signature header is missing.")
+            return False
+
+        try:
+            received_digest = base64.b64decode(received_signature, validate=True)
+        except (binascii.Error, ValueError):
+            log_limited(logging.ERROR, "Webhook signature is not valid base64.")
+            return False
+
+        for prepared in self._prepared:
+            mac = prepared.copy()
+            mac.update(body_bytes)
+            if hmac.compare_digest(mac.digest(), received_digest):
+                return True
+
+        log_limited(logging.ERROR, "Webhook signature validation failed.")
         return False
@@ -0,0 +1,307 @@
+"""Lightweight timed spans for the webhook stages, with pluggable exporters
+
+Spans nest through a context variable, so they work on worker threads and asyncio tasks
+alike. A finished root span is handed to the exporter together with its children. With the
+default "none" exporter, Tracer.span returns a shared no-op span and nothing is recorded.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import sys
+import threading
+import time
+from types import TracebackType
+from typing import Any, Protocol, TextIO
+
+from alma_item_checks_webhook_service.config import get_settings
+
+SERVICE_NAME: str = "alma-item-checks-webhook-service"
+
+AttributeValue = str | int | float | bool
+
+_current_span: contextvars.ContextVar["Span | None"] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class SpanExporter(Protocol):
+    """Destination for finished root spans"""
+
+    def export(self, span: "Span") -> None:
+        """Export a finished root span and its children"""
+        ...
+
+
+class Span:
+    """A timed operation with attributes and child spans"""
+
+    __slots__ = (
+        "name",
+        "attributes",
+        "children",
+        "start_ns",
+        "duration_ns",
+        "_exporter",
+        "_start_counter",
+        "_token",
+    )
+
+    def __init__(
+        self, name: str, exporter: SpanExporter, attributes: dict[str, Any]
+    ) -> None:
+        """Initialize the Span class
+
+        Args:
+            name (str): The span name
+            exporter (SpanExporter): Where the span is exported if it finishes as a root span
+            attributes (dict[str, Any]): Initial attributes
+        """
+        self.name: str = name
+        self.attributes: dict[str, AttributeValue] = {}
+        self.children: list[Span] = []
+        self.start_ns: int = 0
+        self.duration_ns: int = 0
+        self._exporter: SpanExporter = exporter
+        self._start_counter: int = 0
+        self._token: contextvars.Token | None = None
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    @property
+    def end_ns(self) -> int:
+        """Wall clock end time in nanoseconds since the epoch"""
+        return self.start_ns + self.duration_ns
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Set an attribute, ignoring None values
+
+        Args:
+            key (str): The attribute name
+            value (Any): A str, int, float or bool value
+        """
+        if value is not None:
+            self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        parent: Span | None = _current_span.get()
+        if parent is not None:
+            parent.children.append(self)
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        self._start_counter = time.perf_counter_ns()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self.duration_ns = time.perf_counter_ns() - self._start_counter
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        if _current_span.get() is None:
+            try:
+                self._exporter.export(self)
+            except Exception as e:  # telemetry must never fail a webhook
+                logging.warning("Span.__exit__: Failed to export span: %s", e)
+
+
+class NoOpSpan:
+    """Span returned when telemetry is disabled"""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> "NoOpSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+NOOP_SPAN: NoOpSpan = NoOpSpan()
+
+
+class Tracer:
+    """Creates spans that are exported when their root span finishes"""
+
+    def __init__(self, exporter: SpanExporter | None) -> None:
+        """Initialize the Tracer class
+
+        Args:
+            exporter (SpanExporter | None): Where finished spans go, or None to disable spans
+        """
+        self.exporter: SpanExporter | None = exporter
+
+    def span(self, name: str, **attributes: Any) -> Span | NoOpSpan:
+        """Start a span, to be used as a context manager
+
+        Args:
+            name (str): The span name
+            **attributes (Any): Initial attributes
+
+        Returns:
+            Span | NoOpSpan: The span, or the shared no-op span when disabled
+        """
+        if self.exporter is None:
+            return NOOP_SPAN
+        return Span(name, self.exporter, attributes)
+
+
+class InMemoryExporter:
+    """Keeps finished spans in memory, for tests and benchmarks"""
+
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+        self._lock: threading.Lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        """Store a finished root span"""
+        with self._lock:
+            self.spans.append(span)
+
+    def finished_spans(self) -> list[Span]:
+        """All finished spans, each root followed by its descendants
+
+        Returns:
+            list[Span]: The spans
+        """
+        with self._lock:
+            roots = list(self.spans)
+        spans: list[Span] = []
+        stack = list(reversed(roots))
+        while stack:
+            span = stack.pop()
+            spans.append(span)
+            stack.extend(reversed(span.children))
+        return spans
+
+    def clear(self) -> None:
+        """Forget all finished spans"""
+        with self._lock:
+            self.spans.clear()
+
+
+class ConsoleExporter:
+    """Writes each finished span tree as one JSON line"""
+
+    def __init__(self, stream: TextIO | None = None) -> None:
+        """Initialize the ConsoleExporter class
+
+        Args:
+            stream (TextIO | None): Where to write, defaulting to stderr
+        """
+        self.stream: TextIO | None = stream
+
+    def export(self, span: Span) -> None:
+        """Write a finished root span"""
+        stream: TextIO = self.stream or sys.stderr
+        stream.write(json.dumps(self._to_dict(span)) + "\n")
+
+    def _to_dict(self, span: Span) -> dict[str, Any]:
+        """Convert a span tree to plain data"""
+        data: dict[str, Any] = {
+            "name": span.name,
+            "duration_ms": round(span.duration_ns / 1e6, 3),
+            "attributes": span.attributes,
+        }
+        if span.children:
+            data["children"] = [self._to_dict(child) for child in span.children]
+        return data
+
+
+class OTLPExporter:
+    """Re-creates finished spans with the OpenTelemetry SDK and exports them over OTLP/HTTP
+
+    The collector endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* environment
+    variables. Requires the `telemetry` extra.
+    """
+
+    def __init__(self, tracer_provider: Any = None) -> None:
+        """Initialize the OTLPExporter class
+
+        Args:
+            tracer_provider (Any): An OpenTelemetry TracerProvider, built with an OTLP span processor if None
+        """
+        if tracer_provider is None:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+                OTLPSpanExporter,
+            )
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+            tracer_provider = TracerProvider(
+                resource=Resource.create({"service.name": SERVICE_NAME})
+            )
+            tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            atexit.register(tracer_provider.shutdown)
+        self._tracer: Any = tracer_provider.get_tracer(__name__)
+
+    def export(self, span: Span) -> None:
+        """Export a finished root span and its children"""
+        self._export(span, None)
+
+    def _export(self, span: Span, context: Any) -> None:
+        """Export a span as a child of context"""
+        from opentelemetry import trace
+
+        otel_span = self._tracer.start_span(
+            span.name,
+            context=context,
+            attributes=span.attributes,
+            start_time=span.start_ns,
+        )
+        child_context = trace.set_span_in_context(otel_span)
+        for child in span.children:
+            self._export(child, child_context)
+        otel_span.end(end_time=span.end_ns)
+
+
+def build_exporter(name: str) -> SpanExporter | None:
+    """Build the exporter selected by TELEMETRY_EXPORTER
+
+    Args:
+        name (str): One of none, memory, console or otlp
+
+    Returns:
+        SpanExporter | None: The exporter, or None for none
+
+    Raises:
+        ValueError: If the name is not a known exporter
+    """
+    if name == "none":
+        return None
+    if name == "memory":
+        return InMemoryExporter()
+    if name == "console":
+        return ConsoleExporter()
+    if name == "otlp":
+        return OTLPExporter()
+    raise ValueError(f"Unknown TELEMETRY_EXPORTER: '{name}'")
+
+
+_tracer: Tracer | None = None
+_tracer_lock: threading.Lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer, built on first use from TELEMETRY_EXPORTER
+
+    Returns:
+        Tracer: The tracer
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer(build_exporter(get_settings().telemetry_exporter))
+    return _tracer
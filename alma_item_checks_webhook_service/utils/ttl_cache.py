@@ -0,0 +1,115 @@
+"""Bounded, thread-safe LRU cache with per-entry expiry"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries expire after a time-to-live
+
+    The cache holds at most max_entries entries; adding beyond that evicts the least recently
+    used entry. Expired entries are treated as absent and dropped when they are next touched.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the TTLCache class
+
+        Args:
+            max_entries (int): Maximum number of entries held
+            ttl (float): Default seconds an entry stays valid
+            clock (Callable[[], float]): Monotonic clock, replaceable in tests
+        """
+        self.max_entries: int = max_entries
+        self.ttl: float = ttl
+        self._clock: Callable[[], float] = clock
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get an unexpired value, marking it as recently used
+
+        Args:
+            key (Hashable): The cache key
+            default (Any): Returned when the key is absent or expired
+
+        Returns:
+            Any: The cached value or default
+        """
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Store a value, replacing any existing entry
+
+        Args:
+            key (Hashable): The cache key
+            value (Any): The value to store
+            ttl (float | None): Seconds the entry stays valid, defaulting to the cache ttl
+        """
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key: Hashable, value: Any = True, ttl: float | None = None) -> bool:
+        """Store a value only if the key is absent or expired
+
+        Args:
+            key (Hashable): The cache key
+            value (Any): The value to store
+            ttl (float | None): Seconds the entry stays valid, defaulting to the cache ttl
+
+        Returns:
+            bool: True if the value was stored, False if an unexpired entry already existed
+        """
+        with self._lock:
+            if self._live_entry(key) is not None:
+                self._entries.move_to_end(key)
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def discard(self, key: Hashable) -> None:
+        """Remove an entry if present
+
+        Args:
+            key (Hashable): The cache key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def _live_entry(self, key: Hashable) -> tuple[float, Any] | None:
+        """Return the entry for key if unexpired, dropping it if expired (lock held)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self._clock():
+            del self._entries[key]
+            return None
+        return entry
+
+    def _store(self, key: Hashable, value: Any, ttl: float | None) -> None:
+        """Store an entry and evict the least recently used beyond capacity (lock held)"""
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,94 @@
+"""Compare concurrent throughput of the sync and async webhook paths
+
+The sync path is driven through a thread pool the size of the Functions worker pool
+(PYTHON_THREADPOOL_THREAD_COUNT); the async path runs every request on one event loop.
+Both send to fake queues that wait for the same simulated storage latency.
+
+Usage:
+    python -m benchmarks.bench_async_vs_sync --requests 2000 --latency 0.02 --threads 16
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import (
+    FakeAsyncQueueClient,
+    FakeQueueClient,
+    item_updated_body,
+    make_request,
+)
+
+from alma_item_checks_webhook_service.services import (
+    async_webhook_service,
+    webhook_service,
+)
+from alma_item_checks_webhook_service.services.async_webhook_service import (
+    AsyncWebhookService,
+)
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    AsyncQueueClientRegistry,
+    QueueClientRegistry,
+)
+from alma_item_checks_webhook_service.services.webhook_service import (
+    WebhookService,
+)
+
+
+def run_sync(requests: list, latency: float, threads: int) -> float:
+    """Run the sync path and return requests per second"""
+    webhook_service.queue_client_registry = QueueClientRegistry(
+        factory=lambda *_: FakeQueueClient(latency)
+    )
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        responses = list(
+            pool.map(lambda req: WebhookService(req).parse_webhook(), requests)
+        )
+    elapsed = time.perf_counter() - start
+    assert all(response.status_code == 200 for response in responses)
+    return len(requests) / elapsed
+
+
+def run_async(requests: list, latency: float) -> float:
+    """Run the async path and return requests per second"""
+    async_webhook_service.async_queue_client_registry = AsyncQueueClientRegistry(
+        factory=lambda *_: FakeAsyncQueueClient(latency)
+    )
+
+    async def run_all() -> list:
+        return await asyncio.gather(
+            *(AsyncWebhookService(req).parse_webhook() for req in requests)
+        )
+
+    start = time.perf_counter()
+    responses = asyncio.run(run_all())
+    elapsed = time.perf_counter() - start
+    assert all(response.status_code == 200 for response in responses)
+    return len(requests) / elapsed
+
+
+def main() -> None:
+    """Run the comparison and print throughput for both paths"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated queue send seconds")
+    parser.add_argument("--threads", type=int, default=16, help="sync worker thread count")
+    args = parser.parse_args()
+
+    requests = [
+        make_request(item_updated_body(barcode=f"3999900{i:07d}"))
+        for i in range(args.requests)
+    ]
+
+    sync_rps = run_sync(requests, args.latency, args.threads)
+    async_rps = run_async(requests, args.latency)
+
+    print(f"requests={args.requests} latency={args.latency}s threads={args.threads}")
+    print(f"sync : {sync_rps:10.1f} req/s")
+    print(f"async: {async_rps:10.1f} req/s ({async_rps / sync_rps:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
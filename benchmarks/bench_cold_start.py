@@ -0,0 +1,121 @@
+"""Cold-start cost: import time of the function app and latency of its first requests
+
+Each measurement runs in a fresh interpreter, as on a Consumption-plan cold start. Import
+times come from `python -X importtime`; first-request times call the registered webhook
+function through function_app.app, with queue sends going to an in-memory fake.
+
+Usage:
+    python -m benchmarks.bench_cold_start --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess  # nosec B404
+import sys
+from pathlib import Path
+
+ROOT: Path = Path(__file__).resolve().parent.parent
+
+FIRST_REQUEST_SCRIPT: str = """
+import asyncio, inspect, json, time
+start = time.perf_counter()
+import function_app
+imported = time.perf_counter()
+
+from benchmarks.common import FakeAsyncQueueClient, FakeQueueClient, item_updated_body, make_request
+from alma_item_checks_webhook_service.services import async_webhook_service, webhook_service
+from alma_item_checks_webhook_service.services.queue_client_registry import AsyncQueueClientRegistry, QueueClientRegistry
+import azure.functions as func
+
+webhook_service.queue_client_registry = QueueClientRegistry(factory=lambda *_: FakeQueueClient())
+async_webhook_service.async_queue_client_registry = AsyncQueueClientRegistry(factory=lambda *_: FakeAsyncQueueClient())
+handler = function_app.app.get_functions()[0].get_user_function()
+
+def call(req):
+    result = handler(req)
+    return asyncio.run(result) if inspect.isawaitable(result) else result
+
+timings = {"import_ms": (imported - start) * 1000}
+t = time.perf_counter()
+call(func.HttpRequest(method="GET", url="/api/webhook", params={"challenge": "x"}, body=b""))
+timings["first_challenge_ms"] = (time.perf_counter() - t) * 1000
+t = time.perf_counter()
+assert call(make_request(item_updated_body())).status_code == 200
+timings["first_item_updated_ms"] = (time.perf_counter() - t) * 1000
+print(json.dumps(timings))
+"""
+
+
+def benchmark_env() -> dict[str, str]:
+    """Environment for the child interpreters"""
+    env = dict(os.environ)
+    env.setdefault("AzureWebJobsStorage", "UseDevelopmentStorage=true")
+    env.setdefault("WEBHOOK_SECRET", "benchmark_webhook_secret")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    return env
+
+
+def import_times(module: str = "function_app") -> dict[str, int]:
+    """Cumulative import time in microseconds of each module imported by a fresh interpreter
+
+    Args:
+        module (str): The module to import
+
+    Returns:
+        dict[str, int]: Cumulative microseconds by module name
+    """
+    result = subprocess.run(  # nosec B603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=benchmark_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def first_request_times() -> dict[str, float]:
+    """Import and first-request latency in milliseconds from a fresh interpreter"""
+    result = subprocess.run(  # nosec B603
+        [sys.executable, "-c", FIRST_REQUEST_SCRIPT],
+        cwd=ROOT,
+        env=benchmark_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    """Report import and first-request cold-start timings"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    times = import_times()
+    print("import time (cumulative ms):")
+    for name in (
+        "function_app",
+        "azure.functions",
+        "alma_item_checks_webhook_service.blueprints.bp_webhook",
+    ):
+        print(f"  {name:<56} {times.get(name, 0) / 1000:8.2f}")
+
+    runs = [first_request_times() for _ in range(args.runs)]
+    print(f"first request (median of {args.runs} cold interpreters, ms):")
+    for key in runs[0]:
+        print(f"  {key:<56} {statistics.median(run[key] for run in runs):8.2f}")
+
+
+if __name__ == "__main__":
+    main()
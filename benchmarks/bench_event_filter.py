@@ -0,0 +1,75 @@
+"""Cost per event of evaluating the event filter
+
+Compares the compiled EventFilter with interpreting the same filter document for every event,
+for a realistic item record and growing numbers of rules. Every event passes all rules, the
+most expensive case, since each condition is evaluated.
+
+Usage:
+    python -m benchmarks.bench_event_filter --number 20000
+"""
+
+import argparse
+import json
+import timeit
+from typing import Any
+
+from benchmarks.common import alma_item_payload
+
+from alma_item_checks_webhook_service.services.event_filter import EventFilter
+
+INSTITUTION: str = "01WRLC_GWA"
+
+
+def filter_document(rules: int) -> dict[str, Any]:
+    """Build a filter with the given number of rules, half of them for one institution"""
+    return {
+        "events": ["ITEM_UPDATED"],
+        "rules": [
+            {
+                "name": f"rule-{i}",
+                **({"institutions": [INSTITUTION]} if i % 2 else {}),
+                "include": {"item_data.library": ["GELMAN", "EASTMAN", f"LIB{i}"]},
+                "exclude": {"item_data.physical_material_type": ["ELEC", f"MAT{i}"]},
+            }
+            for i in range(rules)
+        ],
+    }
+
+
+def interpret(document: dict[str, Any], institution: str, item: dict[str, Any]) -> str | None:
+    """Evaluate the filter document directly, without compiling it"""
+    for rule in document["rules"]:
+        if "institutions" in rule and institution not in rule["institutions"]:
+            continue
+        for key, include in (("include", True), ("exclude", False)):
+            for path, values in rule.get(key, {}).items():
+                value: Any = item
+                for part in path.split("."):
+                    value = value.get(part) if isinstance(value, dict) else None
+                if isinstance(value, dict):
+                    value = value.get("value")
+                if (value in values) is not include:
+                    return rule["name"]
+    return None
+
+
+def main() -> None:
+    """Time compiled and interpreted evaluation for each rule count"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="events per measurement")
+    args = parser.parse_args()
+
+    item: dict[str, Any] = json.loads(alma_item_payload(institution=INSTITUTION))["item"]
+    print(f"{'rules':>6} {'interpreted':>12} {'compiled':>10}  (ns/event)")
+    for rules in (1, 4, 16, 64):
+        document = filter_document(rules)
+        compiled = EventFilter(document)
+        assert compiled.match(INSTITUTION, item) is None
+        assert interpret(document, INSTITUTION, item) is None
+        interpreted_time = timeit.timeit(lambda: interpret(document, INSTITUTION, item), number=args.number)
+        compiled_time = timeit.timeit(lambda: compiled.match(INSTITUTION, item), number=args.number)
+        print(f"{rules:>6} {interpreted_time / args.number * 1e9:>12.0f} {compiled_time / args.number * 1e9:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Per-stage cost of WebhookService.parse_webhook on the synchronous hot path
+
+Drives parse_webhook with signed synthetic Alma payloads (small, typical and very large item
+records) and with the invalid-signature, non-item-event and challenge paths. Queue sends go
+to an in-memory fake client. Idempotency and debouncing are disabled so the same request can
+be replayed.
+
+Each scenario is run twice on one thread: once plain, for requests per second per core (from
+process CPU time), and once with the stages wrapped in timers:
+
+    signature  SignatureVerifier.verify
+    parse      JSON decoding of the body
+    filter     the rest of extract_item_event: event, institution and barcode checks
+    enqueue    WebhookService.enqueue, including message serialization and the fake send
+    other      everything else in parse_webhook (responses, challenge, logging)
+
+Usage:
+    python -m benchmarks.bench_hot_path --requests 2000 --output hot_path.json
+    python -m benchmarks.bench_hot_path --compare hot_path.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+os.environ.setdefault("IDEMPOTENCY_ENABLED", "false")
+os.environ.setdefault("DEBOUNCE_TTL_SECONDS", "0")
+
+import azure.functions as func  # noqa: E402
+from benchmarks.common import (  # noqa: E402
+    FakeQueueClient,
+    alma_item_payload,
+    git_commit,
+    item_updated_body,
+    make_request,
+    sign,
+)
+
+from alma_item_checks_webhook_service.services import webhook_service  # noqa: E402
+from alma_item_checks_webhook_service.services.queue_client_registry import (  # noqa: E402
+    QueueClientRegistry,
+)
+from alma_item_checks_webhook_service.services.webhook_service import (  # noqa: E402
+    WebhookService,
+)
+from alma_item_checks_webhook_service.utils import fast_json  # noqa: E402
+from alma_item_checks_webhook_service.utils.security import (  # noqa: E402
+    SignatureVerifier,
+)
+
+STAGES: tuple[str, ...] = ("signature", "parse", "filter", "enqueue", "other")
+
+
+def scenarios() -> dict[str, tuple[func.HttpRequest, int]]:
+    """Requests to benchmark, with the status code each must return"""
+    typical = alma_item_payload()
+    invalid = func.HttpRequest(
+        method="POST",
+        url="/api/webhook",
+        headers={"X-Exl-Signature": sign(typical, "not_the_webhook_secret")},
+        body=typical,
+    )
+    challenge = func.HttpRequest(
+        method="GET", url="/api/webhook", params={"challenge": "benchmark"}, body=b""
+    )
+    return {
+        "small_item": (make_request(item_updated_body()), 200),
+        "typical_item": (make_request(typical), 200),
+        "large_item": (make_request(alma_item_payload(notes=2000)), 200),
+        "invalid_signature": (invalid, 500),
+        "non_item_event": (make_request(alma_item_payload(event="LOAN_CREATED")), 200),
+        "challenge": (challenge, 200),
+    }
+
+
+class StageTimer:
+    """Accumulates wall time spent in wrapped functions, by stage"""
+
+    def __init__(self) -> None:
+        self.totals: defaultdict[str, float] = defaultdict(float)
+
+    def wrap(self, stage: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Wrap fn so the time spent in it is added to stage"""
+
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.totals[stage] += time.perf_counter() - start
+
+        return timed
+
+
+@contextmanager
+def instrumented(timer: StageTimer) -> Iterator[None]:
+    """Temporarily wrap each hot-path stage in a timer"""
+    patches = [
+        (SignatureVerifier, "verify", timer.wrap("signature", SignatureVerifier.verify)),
+        (fast_json, "loads", timer.wrap("parse", fast_json.loads)),
+        (
+            webhook_service,
+            "extract_item_event",
+            timer.wrap("extract", webhook_service.extract_item_event),
+        ),
+        (WebhookService, "enqueue", timer.wrap("enqueue", WebhookService.enqueue)),
+    ]
+    originals = [(owner, name, getattr(owner, name)) for owner, name, _ in patches]
+    for owner, name, wrapped in patches:
+        setattr(owner, name, wrapped)
+    try:
+        yield
+    finally:
+        for owner, name, original in originals:
+            setattr(owner, name, original)
+
+
+def run_scenario(req: func.HttpRequest, status: int, requests: int) -> dict[str, Any]:
+    """Benchmark one request, returning its throughput and per-stage cost
+
+    Args:
+        req (func.HttpRequest): The request to replay
+        status (int): The status code the request must return
+        requests (int): Number of calls per pass
+
+    Returns:
+        dict[str, Any]: Results for the scenario
+    """
+    for _ in range(min(requests, 100)):
+        assert WebhookService(req).parse_webhook().status_code == status
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(requests):
+        WebhookService(req).parse_webhook()
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+    timer = StageTimer()
+    with instrumented(timer):
+        start = time.perf_counter()
+        for _ in range(requests):
+            WebhookService(req).parse_webhook()
+        instrumented_total = time.perf_counter() - start
+
+    totals = timer.totals
+    stages = {
+        "signature": totals["signature"],
+        "parse": totals["parse"],
+        "filter": totals["extract"] - totals["parse"],
+        "enqueue": totals["enqueue"],
+    }
+    stages["other"] = instrumented_total - sum(stages.values())
+    return {
+        "status": status,
+        "bytes": len(req.get_body()),
+        "requests": requests,
+        "us_per_request": wall / requests * 1e6,
+        "rps_per_core": requests / cpu if cpu else None,
+        "stages_us": {name: max(stages[name], 0) / requests * 1e6 for name in STAGES},
+    }
+
+
+def print_results(results: dict[str, Any], baseline: dict[str, Any] | None) -> None:
+    """Print a results table, with the change from a baseline run if given"""
+    header = f"{'scenario':<18} {'bytes':>8} {'us/req':>9} {'req/s/core':>11}"
+    header += "".join(f" {stage:>9}" for stage in STAGES)
+    if baseline:
+        header += f" {'vs base':>8}"
+    print(header + "  (stage columns in us/req)")
+    for name, result in results["scenarios"].items():
+        line = (
+            f"{name:<18} {result['bytes']:>8} {result['us_per_request']:>9.2f} "
+            f"{result['rps_per_core'] or 0:>11.0f}"
+        )
+        line += "".join(f" {result['stages_us'][stage]:>9.2f}" for stage in STAGES)
+        base = (baseline or {}).get("scenarios", {}).get(name)
+        if base:
+            change = result["us_per_request"] / base["us_per_request"] - 1
+            line += f" {change:>+8.1%}"
+        print(line)
+
+
+def main() -> None:
+    """Run every scenario, print the results and optionally write them as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="calls per pass")
+    parser.add_argument("--output", help="write machine-readable results to this file")
+    parser.add_argument("--compare", help="results file from a previous run to compare with")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    webhook_service.queue_client_registry = QueueClientRegistry(
+        factory=lambda *_: FakeQueueClient()
+    )
+
+    results = {
+        "benchmark": "hot_path",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "json_backend": fast_json.JSON_BACKEND,
+        "scenarios": {
+            name: run_scenario(req, status, args.requests)
+            for name, (req, status) in scenarios().items()
+        },
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"baseline: commit {baseline.get('commit')}")
+    print(f"commit {results['commit']} python {results['python']} json {results['json_backend']}")
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
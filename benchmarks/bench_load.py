@@ -0,0 +1,389 @@
+"""End-to-end load test of /webhook across a sweep of concurrency levels
+
+Replays a weighted mix of Alma deliveries: signed ITEM_UPDATED webhooks, signed webhooks of
+other event types, webhooks with a bad signature and challenge GETs. At each concurrency
+level, that many clients send requests back to back until the level's requests are used up,
+so the level measures how the app behaves with that many deliveries in flight.
+
+Targets:
+
+    in-process  the item_webhook function registered on function_app.app, with queue sends
+                going to in-memory fake clients that wait --queue-latency seconds to simulate
+                a slow queue. --sync selects the sync handler (WEBHOOK_ASYNC=false), run on a
+                pool of --threads workers as the Functions host does.
+    --url       a running server, e.g. the ASGI app started with QUEUE_BACKEND=memory, or
+                `func start`. The server must use the same WEBHOOK_SECRET as this tool.
+
+Each level reports throughput, p50/p95/p99/max latency, status counts and the error rate:
+the share of requests that raised or returned a status other than the one expected for their
+kind (500 for a bad signature, 200 for everything else).
+
+Usage:
+    python -m benchmarks.bench_load --concurrency 1,10,100,500 --requests 2000 --queue-latency 0.02
+    python -m benchmarks.bench_load --url http://127.0.0.1:8000 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+from benchmarks.common import (
+    FakeAsyncQueueClient,
+    FakeQueueClient,
+    alma_item_payload,
+    git_commit,
+    sign,
+)
+
+WEBHOOK_PATH: str = "/api/webhook"
+
+# Share of each kind of request in the default mix
+DEFAULT_MIX: dict[str, float] = {
+    "item_updated": 0.80,
+    "other_event": 0.10,
+    "bad_signature": 0.05,
+    "challenge": 0.05,
+}
+
+OTHER_EVENTS: tuple[str, ...] = ("LOAN_CREATED", "LOAN_RETURNED", "REQUEST_CREATED")
+INSTITUTIONS: tuple[str, ...] = ("01WRLC_GWA", "01WRLC_GU", "01WRLC_AMU", "01WRLC_CUA")
+
+
+@dataclass
+class LoadRequest:
+    """One request of the mix, with the status the app should return"""
+
+    kind: str
+    method: str
+    headers: dict[str, str] = field(default_factory=dict)
+    params: dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+    expected_status: int = 200
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    """Parse a kind=weight,... mix, e.g. item_updated=90,challenge=10"""
+    mix: dict[str, float] = {}
+    for pair in filter(None, (part.strip() for part in text.split(","))):
+        kind, _, weight = pair.partition("=")
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown request kind '{kind}'")
+        mix[kind] = float(weight)
+    return mix
+
+
+def build_requests(count: int, mix: dict[str, float], seed: int) -> list[LoadRequest]:
+    """Build a reproducible mix of requests with a distinct barcode for every webhook
+
+    Args:
+        count (int): The number of requests
+        mix (dict[str, float]): The weight of each kind of request
+        seed (int): Seed for the kinds, institutions and event types; also keeps barcodes of different levels apart
+
+    Returns:
+        list[LoadRequest]: The requests, in sending order
+    """
+    rng: random.Random = random.Random(seed)
+    kinds: list[str] = rng.choices(list(mix), weights=list(mix.values()), k=count)
+    requests: list[LoadRequest] = []
+    for i, kind in enumerate(kinds):
+        if kind == "challenge":
+            requests.append(
+                LoadRequest(kind, "GET", params={"challenge": f"load-{seed}-{i}"})
+            )
+            continue
+        body: bytes = alma_item_payload(
+            barcode=f"39{seed:06d}{i:07d}",
+            institution=rng.choice(INSTITUTIONS),
+            event="ITEM_UPDATED" if kind != "other_event" else rng.choice(OTHER_EVENTS),
+        )
+        bad: bool = kind == "bad_signature"
+        requests.append(
+            LoadRequest(
+                kind,
+                "POST",
+                headers={
+                    "Content-Type": "application/json",
+                    "X-Exl-Signature": sign(body, "not_the_webhook_secret")
+                    if bad
+                    else sign(body),
+                },
+                body=body,
+                expected_status=500 if bad else 200,
+            )
+        )
+    return requests
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    """The nearest-rank percentile of sorted values"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+async def run_level(
+    send: Callable[[LoadRequest], Awaitable[int]],
+    requests: list[LoadRequest],
+    concurrency: int,
+) -> dict[str, Any]:
+    """Send requests from concurrency clients and summarize the results
+
+    Args:
+        send (Callable[[LoadRequest], Awaitable[int]]): Sends a request and returns its status
+        requests (list[LoadRequest]): The requests of the level
+        concurrency (int): The number of clients sending at once
+
+    Returns:
+        dict[str, Any]: Throughput, latency percentiles in milliseconds, status counts and error rate
+    """
+    pending: Iterator[LoadRequest] = iter(requests)
+    latencies: list[float] = []
+    statuses: Counter[str] = Counter()
+    errors: Counter[str] = Counter()
+
+    async def client() -> None:
+        for request in pending:
+            start: float = time.perf_counter()
+            try:
+                status: int | None = await send(request)
+            except Exception as e:  # a failed request is counted, not fatal
+                status = None
+                errors[f"{request.kind}: {type(e).__name__}"] += 1
+            latencies.append(time.perf_counter() - start)
+            statuses[str(status) if status is not None else "exception"] += 1
+            if status is not None and status != request.expected_status:
+                errors[f"{request.kind}: {status}"] += 1
+
+    start: float = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed: float = time.perf_counter() - start
+
+    ordered: list[float] = sorted(latency * 1000 for latency in latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": len(requests),
+        "seconds": elapsed,
+        "throughput_rps": len(requests) / elapsed if elapsed else None,
+        "latency_ms": {
+            "p50": percentile(ordered, 50),
+            "p95": percentile(ordered, 95),
+            "p99": percentile(ordered, 99),
+            "max": ordered[-1] if ordered else 0.0,
+        },
+        "statuses": dict(sorted(statuses.items())),
+        "errors": dict(errors),
+        "error_rate": sum(errors.values()) / len(requests) if requests else 0.0,
+    }
+
+
+class InProcessTarget:
+    """Calls the item_webhook function registered on function_app.app"""
+
+    def __init__(self, sync: bool, threads: int, queue_latency: float) -> None:
+        """Initialize the InProcessTarget class, importing the function app
+
+        Args:
+            sync (bool): Register and call the sync handler instead of the async one
+            threads (int): Worker threads for the sync handler
+            queue_latency (float): Seconds each fake queue send waits
+        """
+        os.environ["WEBHOOK_ASYNC"] = "false" if sync else "true"
+        import azure.functions as func
+        import function_app
+
+        from alma_item_checks_webhook_service.services import (
+            async_webhook_service,
+            webhook_service,
+        )
+        from alma_item_checks_webhook_service.services.queue_client_registry import (
+            AsyncQueueClientRegistry,
+            QueueClientRegistry,
+        )
+
+        self._func = func
+        self.clients: list[FakeQueueClient] = []
+
+        def factory(client_class: type[FakeQueueClient]) -> Callable[..., Any]:
+            def build(*_: Any) -> FakeQueueClient:
+                client: FakeQueueClient = client_class(queue_latency)
+                self.clients.append(client)
+                return client
+
+            return build
+
+        webhook_service.queue_client_registry = QueueClientRegistry(
+            factory=factory(FakeQueueClient)
+        )
+        async_webhook_service.async_queue_client_registry = AsyncQueueClientRegistry(
+            factory=factory(FakeAsyncQueueClient)
+        )
+        handler = next(
+            function.get_user_function()
+            for function in function_app.app.get_functions()
+            if function.get_function_name() == "item_webhook"
+        )
+        self._handler: Callable[..., Any] = handler
+        self._is_async: bool = asyncio.iscoroutinefunction(handler)
+        self._pool: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=threads)
+
+    async def send(self, request: LoadRequest) -> int:
+        """Call the function with a request and return the response status"""
+        req = self._func.HttpRequest(
+            method=request.method,
+            url=WEBHOOK_PATH,
+            headers=request.headers,
+            params=request.params,
+            body=request.body,
+        )
+        if self._is_async:
+            response = await self._handler(req)
+        else:
+            response = await asyncio.get_running_loop().run_in_executor(
+                self._pool, self._handler, req
+            )
+        return int(response.status_code)
+
+    def queued(self) -> int:
+        """The number of messages sent to the fake queues so far"""
+        return sum(client.sent for client in self.clients)
+
+    async def close(self) -> None:
+        """Stop the worker threads"""
+        self._pool.shutdown()
+
+
+class URLTarget:
+    """Sends requests to a running server over HTTP"""
+
+    def __init__(self, url: str, concurrency: int) -> None:
+        """Initialize the URLTarget class
+
+        Args:
+            url (str): The server's base URL, e.g. http://127.0.0.1:8000
+            concurrency (int): The most connections to open at once
+        """
+        import aiohttp
+
+        self._url: str = url.rstrip("/") + WEBHOOK_PATH
+        self._session: aiohttp.ClientSession = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=concurrency)
+        )
+
+    async def send(self, request: LoadRequest) -> int:
+        """Send a request and return the response status"""
+        async with self._session.request(
+            request.method,
+            self._url,
+            headers=request.headers,
+            params=request.params,
+            data=request.body or None,
+        ) as response:
+            await response.read()
+            return response.status
+
+    def queued(self) -> int | None:
+        """Messages queued by the server are not visible to this tool"""
+        return None
+
+    async def close(self) -> None:
+        """Close the HTTP session"""
+        await self._session.close()
+
+
+async def sweep(args: argparse.Namespace) -> list[dict[str, Any]]:
+    """Run every concurrency level against the target, with fresh requests per level"""
+    target: InProcessTarget | URLTarget = (
+        URLTarget(args.url, max(args.concurrency))
+        if args.url
+        else InProcessTarget(args.sync, args.threads, args.queue_latency)
+    )
+    levels: list[dict[str, Any]] = []
+    try:
+        if args.warmup:
+            await run_level(
+                target.send, build_requests(args.warmup, args.mix, 0), args.concurrency[0]
+            )
+        for index, concurrency in enumerate(args.concurrency, start=1):
+            requests: list[LoadRequest] = build_requests(
+                args.requests, args.mix, args.seed + index
+            )
+            queued_before: int | None = target.queued()
+            level: dict[str, Any] = await run_level(target.send, requests, concurrency)
+            queued_after: int | None = target.queued()
+            if queued_before is not None and queued_after is not None:
+                level["queued"] = queued_after - queued_before
+            levels.append(level)
+            print_level(level)
+    finally:
+        await target.close()
+    return levels
+
+
+def print_level(level: dict[str, Any]) -> None:
+    """Print one row of the results table"""
+    latency: dict[str, float] = level["latency_ms"]
+    print(
+        f"{level['concurrency']:>11} {level['throughput_rps'] or 0:>10.1f} "
+        f"{latency['p50']:>9.2f} {latency['p95']:>9.2f} {latency['p99']:>9.2f} "
+        f"{latency['max']:>9.2f} {level['error_rate']:>8.2%}"
+    )
+
+
+def main() -> None:
+    """Run the sweep, print a table and optionally write the results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--concurrency",
+        type=lambda text: [int(level) for level in text.split(",")],
+        default=[1, 10, 50, 100, 500],
+        help="comma-separated concurrency levels",
+    )
+    parser.add_argument("--requests", type=int, default=2000, help="requests per level")
+    parser.add_argument("--warmup", type=int, default=200, help="requests sent before the first level")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=DEFAULT_MIX,
+        help="weights of item_updated, other_event, bad_signature and challenge",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="base URL of a running server instead of the in-process app")
+    parser.add_argument("--sync", action="store_true", help="use the sync handler in-process")
+    parser.add_argument("--threads", type=int, default=16, help="worker threads for --sync")
+    parser.add_argument("--queue-latency", type=float, default=0.0, help="seconds per fake queue send")
+    parser.add_argument("--logging", action="store_true", help="keep application logging enabled")
+    parser.add_argument("--output", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    if not args.logging:
+        logging.disable(logging.CRITICAL)
+    print(f"{'concurrency':>11} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>8}")
+    levels: list[dict[str, Any]] = asyncio.run(sweep(args))
+
+    results: dict[str, Any] = {
+        "benchmark": "load",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "target": args.url or ("in-process sync" if args.sync else "in-process async"),
+        "queue_latency": None if args.url else args.queue_latency,
+        "mix": args.mix,
+        "levels": levels,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Size and speed of the fetch item queue message encodings
+
+Compares the json message format (json.dumps of a plain object, or a version 1 batch) with
+the compact codec, uncompressed and with compression above a threshold, for a single message,
+a message with a claim-check snapshot reference and a batch of 32 messages. Every encoding is
+decoded with decode_messages and checked against the original messages.
+
+Sizes are queue bytes: the UTF-8 content after the queue's base64 encoding.
+
+Usage:
+    python -m benchmarks.bench_message_codec --number 20000
+"""
+
+import argparse
+import base64
+import json
+import timeit
+from collections.abc import Callable
+from typing import Any
+
+from alma_item_checks_webhook_service.services.enqueue_batcher import pack_batch
+from alma_item_checks_webhook_service.utils import fast_json
+from alma_item_checks_webhook_service.utils.message_codec import (
+    decode_messages,
+    encode_messages,
+)
+
+
+def scenarios() -> dict[str, list[dict[str, Any]]]:
+    """Messages to encode in each scenario"""
+    snapshot = {
+        "container": "item-snapshots",
+        "name": "01WRLC_GWA/32882019475853/2026-10-17T12%3A00%3A00.000Z.json.gz",
+        "event_time": "2026-10-17T12:00:00.000Z",
+    }
+    return {
+        "single": [{"institution": "01WRLC_GWA", "barcode": "32882019475853"}],
+        "snapshot": [{"institution": "01WRLC_GWA", "barcode": "32882019475853", "snapshot": snapshot}],
+        "batch_32": [
+            {"institution": "01WRLC_GWA", "barcode": f"3288201947{i:04d}"} for i in range(32)
+        ],
+    }
+
+
+def json_format(messages: list[dict[str, Any]]) -> str:
+    """Encode as the json MESSAGE_FORMAT does"""
+    return json.dumps(messages[0]) if len(messages) == 1 else pack_batch(messages)
+
+
+ENCODINGS: dict[str, Callable[[list[dict[str, Any]]], str]] = {
+    "json": json_format,
+    "compact": lambda messages: encode_messages(messages, compress_threshold=0),
+    "compact+zlib": lambda messages: encode_messages(messages, compress_threshold=256),
+}
+
+
+def main() -> None:
+    """Print queue bytes and encode and decode times for each scenario and encoding"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="calls per measurement")
+    args = parser.parse_args()
+
+    print(f"json backend {fast_json.JSON_BACKEND}")
+    print(f"{'scenario':<10} {'encoding':<13} {'bytes':>7} {'encode us':>10} {'decode us':>10}")
+    for name, messages in scenarios().items():
+        for encoding, encode in ENCODINGS.items():
+            content = encode(messages)
+            assert decode_messages(content) == messages
+            queue_bytes = len(base64.b64encode(content.encode()))
+            encode_time = timeit.timeit(lambda: encode(messages), number=args.number)
+            decode_time = timeit.timeit(lambda: decode_messages(content), number=args.number)
+            print(
+                f"{name:<10} {encoding:<13} {queue_bytes:>7} "
+                f"{encode_time / args.number * 1e6:>10.2f} {decode_time / args.number * 1e6:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Cost of extracting the queued fields from realistic Alma item webhook bodies
+
+Compares the previous approach (decode the whole body with json and walk the dict) with
+extract_item_event on both JSON backends, for typical and very large item records and for
+non-item events, which extract_item_event rejects before decoding.
+
+Usage:
+    python -m benchmarks.bench_payload --number 2000
+"""
+
+import argparse
+import json
+import timeit
+from typing import Any
+
+from benchmarks.common import alma_item_payload
+
+from alma_item_checks_webhook_service.utils import fast_json
+from alma_item_checks_webhook_service.utils.payload import extract_item_event
+
+
+def dict_walk(body: bytes) -> Any:
+    """The previous extraction: full stdlib decode and nested lookups"""
+    request_body = json.loads(body)
+    institution = request_body.get("institution", {}).get("value")
+    if request_body.get("event", {}).get("value") != "ITEM_UPDATED":
+        return None
+    return institution, request_body.get("item", {}).get("item_data", {}).get("barcode")
+
+
+def main() -> None:
+    """Time each extraction for each payload"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="calls per measurement")
+    args = parser.parse_args()
+
+    payloads = {
+        "typical item": alma_item_payload(),
+        "large item": alma_item_payload(notes=2000),
+        "loan event": alma_item_payload(event="LOAN_CREATED"),
+    }
+    orjson = fast_json.orjson
+    print(f"{'payload':<14} {'bytes':>8} {'dict walk':>11} {'extract/json':>13} {'extract/orjson':>15}  (us/call)")
+    for name, body in payloads.items():
+        number = max(args.number * 4096 // len(body), 50)
+        results = [timeit.timeit(lambda: dict_walk(body), number=number)]
+        fast_json.orjson = None
+        results.append(timeit.timeit(lambda: extract_item_event(body), number=number))
+        fast_json.orjson = orjson
+        if orjson is not None:
+            results.append(timeit.timeit(lambda: extract_item_event(body), number=number))
+        columns = [f"{r / number * 1e6:>11.2f}" for r in results]
+        print(f"{name:<14} {len(body):>8} {columns[0]} {columns[1]:>13} {columns[2] if orjson else 'n/a':>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Per-request cost of webhook signature verification across payload sizes
+
+Compares validate_webhook_signature (re-keys the HMAC and compares base64 strings on every
+call) with SignatureVerifier (copies a prepared keyed state and compares raw digests).
+
+Usage:
+    python -m benchmarks.bench_signature --number 2000
+"""
+
+import argparse
+import os
+import timeit
+
+from benchmarks.common import WEBHOOK_SECRET, sign
+
+from alma_item_checks_webhook_service.utils.security import (
+    SignatureVerifier,
+    validate_webhook_signature,
+)
+
+PAYLOAD_SIZES: list[int] = [1024, 10 * 1024, 100 * 1024, 1024 * 1024]
+
+
+def main() -> None:
+    """Time both verification paths for each payload size"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="calls per measurement")
+    args = parser.parse_args()
+
+    verifier = SignatureVerifier([WEBHOOK_SECRET])
+    print(f"{'size':>8} {'before (us)':>12} {'after (us)':>12} {'speedup':>8}")
+    for size in PAYLOAD_SIZES:
+        body = os.urandom(size)
+        signature = sign(body)
+        number = max(args.number * 1024 // size, 20)
+
+        before = timeit.timeit(
+            lambda: validate_webhook_signature(body, WEBHOOK_SECRET, signature),
+            number=number,
+        )
+        after = timeit.timeit(lambda: verifier.verify(body, signature), number=number)
+
+        before_us = before / number * 1e6
+        after_us = after / number * 1e6
+        print(f"{size:>8} {before_us:>12.2f} {after_us:>12.2f} {before_us / after_us:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Shared helpers for the local webhook benchmarks
+
+Benchmarks run offline: requests are signed with a throwaway secret and queue sends go to
+in-memory fake clients that can optionally simulate storage round-trip latency.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import subprocess  # nosec B404
+import time
+from typing import Any
+
+os.environ.setdefault("AzureWebJobsStorage", "UseDevelopmentStorage=true")
+os.environ.setdefault("WEBHOOK_SECRET", "benchmark_webhook_secret")
+
+import azure.functions as func  # noqa: E402
+
+WEBHOOK_SECRET: str = os.environ["WEBHOOK_SECRET"]
+
+
+def sign(body: bytes, secret: str = WEBHOOK_SECRET) -> str:
+    """Compute the X-Exl-Signature header value for a body"""
+    return base64.b64encode(
+        hmac.new(secret.encode(), body, hashlib.sha256).digest()
+    ).decode()
+
+
+def item_updated_body(barcode: str = "39999000000001", institution: str = "TU") -> bytes:
+    """Build a minimal signed-ready ITEM_UPDATED webhook body"""
+    return json.dumps(
+        {
+            "id": "1234567890",
+            "action": "ITEM_UPDATED",
+            "institution": {"value": institution},
+            "event": {"value": "ITEM_UPDATED"},
+            "item": {"item_data": {"barcode": barcode}},
+        }
+    ).encode()
+
+
+def alma_item_payload(
+    barcode: str = "39999000000001",
+    institution: str = "01WRLC_GWA",
+    event: str = "ITEM_UPDATED",
+    notes: int = 0,
+) -> bytes:
+    """Build a realistic Alma item webhook body with full bib, holding and item records
+
+    Args:
+        barcode (str): The item barcode
+        institution (str): The institution code
+        event (str): The webhook event type
+        notes (int): Number of extra note/statistics fields, to grow the payload
+
+    Returns:
+        bytes: The JSON body
+    """
+
+    def code(value: str, desc: str = "") -> dict[str, str]:
+        return {"value": value, "desc": desc or value}
+
+    bib_data = {
+        "mms_id": "991234567890104106",
+        "title": "The collected works of an exceptionally verbose author : a critical edition",
+        "author": "Author, Example, 1850-1920.",
+        "issn": None,
+        "isbn": "9780000000000",
+        "complete_edition": "2nd ed.",
+        "network_number": [f"(OCoLC){100000000 + i}" for i in range(8)],
+        "place_of_publication": "Washington, D.C. :",
+        "publisher_const": "Example University Press",
+        "link": "https://api-na.hosted.exlibrisgroup.com/almaws/v1/bibs/991234567890104106",
+    }
+    holding_data = {
+        "holding_id": "22123456780004106",
+        "call_number_type": code("0", "Library of Congress classification"),
+        "call_number": "PS3545.X3 A6 2001",
+        "accession_number": "",
+        "copy_id": "1",
+        "in_temp_location": False,
+        "temp_library": code("", ""),
+        "temp_location": code("", ""),
+        "link": "https://api-na.hosted.exlibrisgroup.com/almaws/v1/bibs/991234567890104106/holdings/22123456780004106",
+    }
+    item_data = {
+        "pid": "23123456780004106",
+        "barcode": barcode,
+        "creation_date": "2019-06-01Z",
+        "modification_date": "2026-10-17Z",
+        "base_status": code("1", "Item in place"),
+        "awaiting_reshelving": False,
+        "physical_material_type": code("BOOK", "Book"),
+        "policy": code("01", "Regular loan"),
+        "provenance": code("", ""),
+        "po_line": "",
+        "is_magnetic": False,
+        "arrival_date": "2019-05-28Z",
+        "year_of_issue": "",
+        "enumeration_a": "",
+        "chronology_i": "",
+        "description": "",
+        "receiving_operator": "import",
+        "process_type": code("", ""),
+        "inventory_number": "",
+        "inventory_price": "",
+        "library": code("GELMAN", "Gelman Library"),
+        "location": code("STACKS", "Stacks"),
+        "alternative_call_number": "",
+        "storage_location_id": "",
+        "pages": "",
+        "pieces": "1",
+        "public_note": "",
+        "fulfillment_note": "",
+        "internal_note_1": "",
+        "internal_note_2": "",
+        "internal_note_3": "",
+        "statistics_note_1": "",
+        "statistics_note_2": "",
+        "statistics_note_3": "",
+        "requested": False,
+        "edition": "",
+        "committed_to_retain": code("false", "No"),
+        "retention_reason": code("", ""),
+    }
+    for i in range(notes):
+        item_data[f"note_{i}"] = f"Condition report {i}: spine repaired, pages foxed, bookplate present."
+
+    return json.dumps(
+        {
+            "id": "1234567890123456789",
+            "action": "ITEM_UPDATED" if event == "ITEM_UPDATED" else "OTHER",
+            "institution": code(institution, "George Washington University"),
+            "time": "2026-10-17T12:00:00.000Z",
+            "event": code(event, "Item updated" if event == "ITEM_UPDATED" else event),
+            "item": {
+                "link": f"{holding_data['link']}/items/{item_data['pid']}",
+                "bib_data": bib_data,
+                "holding_data": holding_data,
+                "item_data": item_data,
+            },
+        }
+    ).encode()
+
+
+def git_commit() -> str | None:
+    """The current commit, if the benchmark is run from a git checkout"""
+    try:
+        return subprocess.run(  # nosec B603 B607
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_request(body: bytes, secret: str = WEBHOOK_SECRET) -> func.HttpRequest:
+    """Build a signed webhook POST request"""
+    return func.HttpRequest(
+        method="POST",
+        url="/api/webhook",
+        headers={"X-Exl-Signature": sign(body, secret)},
+        body=body,
+    )
+
+
+class FakeQueueClient:
+    """In-memory queue client that sleeps to simulate the storage round trip"""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.sent = 0
+
+    def send_message(self, content: str, **kwargs: Any) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        self.sent += 1
+
+    def close(self) -> None:
+        pass
+
+
+class FakeAsyncQueueClient(FakeQueueClient):
+    """In-memory aio queue client that awaits to simulate the storage round trip"""
+
+    async def send_message(self, content: str, **kwargs: Any) -> None:  # type: ignore[override]
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent += 1
+
+    async def close(self) -> None:  # type: ignore[override]
+        pass
@@ -1,9 +1,18 @@
 """Test suite for item_webhook function"""
-from unittest.mock import Mock
+import asyncio
+from unittest.mock import AsyncMock, Mock
 
 import azure.functions as func
+from azure.functions.warmup import WarmUpContext
 
-from alma_item_checks_webhook_service.blueprints.bp_webhook import item_webhook
+from alma_item_checks_webhook_service.blueprints.bp_webhook import (
+    item_webhook,
+    item_webhook_async,
+    item_webhook_batch,
+    to_http_response,
+    warmup,
+)
+from alma_item_checks_webhook_service.utils.http import WebhookResponse
 
 
 def test_item_webhook(mocker):
@@ -14,7 +23,7 @@ def test_item_webhook(mocker):
         url='/api/scfwebhook',
         body=b'{"test": "body"}'
     )
-    mock_response = func.HttpResponse("mock response", status_code=200)
+    mock_response = WebhookResponse("mock response", status_code=200)
 
     mock_webhook_service = Mock()
     mock_webhook_service.parse_webhook.return_value = mock_response
@@ -30,4 +39,79 @@ def test_item_webhook(mocker):
     # then
     mock_webhook_service_class.assert_called_once_with(mock_request)
     mock_webhook_service.parse_webhook.assert_called_once()
-    assert response == mock_response
+    assert isinstance(response, func.HttpResponse)
+    assert response.status_code == 200
+    assert response.get_body() == b"mock response"
+
+
+def test_item_webhook_async(mocker):
+    """Test item_webhook_async function"""
+    # given
+    mock_request = func.HttpRequest(
+        method='POST',
+        url='/api/scfwebhook',
+        body=b'{"test": "body"}'
+    )
+    mock_response = WebhookResponse("mock response", status_code=200)
+
+    mock_webhook_service = Mock()
+    mock_webhook_service.parse_webhook = AsyncMock(return_value=mock_response)
+
+    mock_webhook_service_class = mocker.patch(
+        'alma_item_checks_webhook_service.blueprints.bp_webhook.AsyncWebhookService',
+        return_value=mock_webhook_service
+    )
+
+    # when
+    response = asyncio.run(item_webhook_async(mock_request))
+
+    # then
+    mock_webhook_service_class.assert_called_once_with(mock_request)
+    mock_webhook_service.parse_webhook.assert_awaited_once()
+    assert isinstance(response, func.HttpResponse)
+    assert response.status_code == 200
+    assert response.get_body() == b"mock response"
+
+
+def test_item_webhook_batch(mocker):
+    """Test item_webhook_batch function"""
+    mock_request = func.HttpRequest(method="POST", url="/api/webhook/batch", body=b'["TU", "1"]')
+    mock_response = WebhookResponse("mock response", status_code=200)
+    mock_batch_service_class = mocker.patch(
+        "alma_item_checks_webhook_service.blueprints.bp_webhook.BatchWebhookService"
+    )
+    mock_batch_service_class.return_value.parse_batch.return_value = mock_response
+
+    response = item_webhook_batch(mock_request)
+
+    mock_batch_service_class.assert_called_once_with(mock_request)
+    assert isinstance(response, func.HttpResponse)
+    assert response.status_code == 200
+    assert response.get_body() == b"mock response"
+
+
+def test_to_http_response_keeps_headers_and_mimetype():
+    """Test that a service response converts to an equivalent Functions response"""
+    response = to_http_response(
+        WebhookResponse(
+            '{"challenge": "x"}',
+            status_code=503,
+            headers={"Retry-After": "5"},
+            mimetype="application/json",
+        )
+    )
+
+    assert isinstance(response, func.HttpResponse)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert response.mimetype == "application/json"
+    assert response.get_body() == b'{"challenge": "x"}'
+
+
+def test_warmup(mocker):
+    """Test that the warm-up trigger builds the router and queue clients"""
+    mock_warm_up = mocker.patch('alma_item_checks_webhook_service.blueprints.bp_webhook.warm_up')
+
+    warmup(WarmUpContext())
+
+    mock_warm_up.assert_called_once_with()
@@ -1,5 +1,12 @@
 """Test configurations"""
+import dataclasses
+import json
 import os
+from unittest.mock import Mock
+
+import azure.functions as func
+import pytest
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
 
 os.environ["AzureWebJobsStorage"] = (
     "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;AccountKey"
@@ -8,3 +15,257 @@ os.environ["AzureWebJobsStorage"] = (
 )
 os.environ["SQLALCHEMY_CONNECTION_STRING"] = "sqlite:///:memory:"
 os.environ["WEBHOOK_SECRET"] = "test_webhook_secret"
+
+
+class FakeQueueClient:
+    """In-memory stand-in for azure.storage.queue.QueueClient"""
+
+    def __init__(self, queue_name):
+        self.queue_name = queue_name
+        self.messages = []
+        self.send_kwargs = []
+        self.fail_with = None
+        self.closed = False
+
+    def send_message(self, content, **kwargs):
+        if self.fail_with is not None:
+            raise self.fail_with
+        self.messages.append(content)
+        self.send_kwargs.append(kwargs)
+        return {"content": content}
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncQueueClient(FakeQueueClient):
+    """In-memory stand-in for azure.storage.queue.aio.QueueClient"""
+
+    async def send_message(self, content, **kwargs):
+        return FakeQueueClient.send_message(self, content, **kwargs)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeQueueFactory:
+    """Queue client factory that records every client it builds"""
+
+    def __init__(self, client_class=FakeQueueClient):
+        self.client_class = client_class
+        self.builds = []
+        self.clients = {}
+
+    def __call__(self, connection_string, queue_name):
+        client = self.client_class(queue_name)
+        self.builds.append((connection_string, queue_name))
+        self.clients[queue_name] = client
+        return client
+
+
+@pytest.fixture
+def fake_queue_factory():
+    """Factory building in-memory fake queue clients."""
+    return FakeQueueFactory()
+
+
+@pytest.fixture
+def fake_async_queue_factory():
+    """Factory building in-memory fake aio queue clients."""
+    return FakeQueueFactory(FakeAsyncQueueClient)
+
+
+@pytest.fixture
+def mock_request_factory():
+    """Factory to create mock HttpRequest objects."""
+
+    def _create_mock_request(
+        method="POST",
+        params=None,
+        headers=None,
+        body=b'{"event": {"value": "ITEM_UPDATED"}, "item": {"item_data": {"barcode": "12345"}}, "institution": {"value": "TU"}}',
+    ):
+        default_headers = {"X-Exl-Signature": "n9h4nbtY6kgo0ns104I3W2khZH0lM9oiVLqLlmyeb+U="}
+        req = func.HttpRequest(
+            method=method,
+            url="/api/scfwebhook",
+            params=params or {},
+            headers=headers or default_headers,
+            body=body,
+        )
+        # Add get_json method to the mock request
+        req.get_json = Mock(side_effect=lambda: json.loads(body.decode()) if body else {})
+        return req
+
+    return _create_mock_request
+
+
+class InMemoryTableClient:
+    """Local stand-in for azure.data.tables.TableClient"""
+
+    def __init__(self):
+        self.entities = {}
+
+    def create_entity(self, entity):
+        key = (entity["PartitionKey"], entity["RowKey"])
+        if key in self.entities:
+            raise ResourceExistsError("The specified entity already exists.")
+        self.entities[key] = dict(entity)
+
+    def upsert_entity(self, entity, **kwargs):
+        self.entities[(entity["PartitionKey"], entity["RowKey"])] = dict(entity)
+
+    def get_entity(self, partition_key, row_key):
+        try:
+            return dict(self.entities[(partition_key, row_key)])
+        except KeyError:
+            raise ResourceNotFoundError("The specified resource does not exist.")
+
+    def delete_entity(self, partition_key, row_key):
+        self.entities.pop((partition_key, row_key), None)
+
+
+@pytest.fixture
+def in_memory_table_client():
+    """Local stand-in for an Azure Storage table."""
+    return InMemoryTableClient()
+
+
+class FakeClock:
+    """Manually advanced clock."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_clock():
+    """Manually advanced clock for time-dependent tests."""
+    return FakeClock()
+
+
+@pytest.fixture(autouse=True)
+def fresh_idempotency_store(mocker):
+    """Start every test with an empty delivery idempotency store."""
+    mocker.patch(
+        "alma_item_checks_webhook_service.services.delivery_idempotency._idempotency_store",
+        None,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_settings(mocker):
+    """Read settings from the environment afresh in every test."""
+    mocker.patch("alma_item_checks_webhook_service.config._settings", None)
+
+
+@pytest.fixture
+def override_settings(mocker):
+    """Replace selected settings for the duration of a test."""
+    from alma_item_checks_webhook_service import config
+
+    def _override(**changes):
+        mocker.patch.object(config, "_settings", dataclasses.replace(config.get_settings(), **changes))
+
+    return _override
+
+
+@pytest.fixture(autouse=True)
+def fresh_tracer(mocker):
+    """Build the tracer from the current settings in every test."""
+    mocker.patch("alma_item_checks_webhook_service.utils.telemetry._tracer", None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_queue_router(mocker):
+    """Build the fetch item queue router from the current settings in every test."""
+    mocker.patch(
+        "alma_item_checks_webhook_service.services.webhook_service._fetch_item_router",
+        None,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_outbox(mocker):
+    """Build the outbox from the current settings in every test."""
+    mocker.patch("alma_item_checks_webhook_service.services.webhook_service._outbox", None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_queue_circuit_breaker(mocker):
+    """Start every test with a closed queue circuit breaker."""
+    mocker.patch(
+        "alma_item_checks_webhook_service.services.webhook_service._queue_circuit_breaker",
+        None,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_fetch_item_batchers(mocker):
+    """Build the fetch item enqueue batchers from the current settings in every test."""
+    from alma_item_checks_webhook_service.services import webhook_service
+
+    mocker.patch.dict(webhook_service._fetch_item_batchers, clear=True)
+
+
+@pytest.fixture(autouse=True)
+def fresh_barcode_debouncer(mocker):
+    """Start every test with no debounced barcodes."""
+    mocker.patch(
+        "alma_item_checks_webhook_service.services.barcode_debouncer._barcode_debouncer",
+        None,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_change_detector(mocker):
+    """Start every test with no remembered item fingerprints."""
+    mocker.patch(
+        "alma_item_checks_webhook_service.services.change_detector._change_detector",
+        None,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_claim_check(mocker):
+    """Build the claim check from the current settings in every test."""
+    mocker.patch(
+        "alma_item_checks_webhook_service.services.claim_check._claim_check",
+        None,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_shaper(mocker):
+    """Start every test with full rate shaping buckets."""
+    mocker.patch(
+        "alma_item_checks_webhook_service.services.rate_shaper._rate_shaper",
+        None,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_queue_backend(mocker):
+    """Build the queue backend from the current settings in every test."""
+    mocker.patch(
+        "alma_item_checks_webhook_service.services.queue_backends._queue_backend",
+        None,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_log_limiter(mocker):
+    """Start every test with no rate-limited log messages counted."""
+    mocker.patch("alma_item_checks_webhook_service.utils.log_limiter._log_limiter", None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_profiler(mocker):
+    """Build the sampling profiler from the current settings in every test."""
+    mocker.patch("alma_item_checks_webhook_service.utils.profiling._profiler", None)
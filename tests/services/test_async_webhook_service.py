@@ -0,0 +1,198 @@
+"""Tests for the AsyncWebhookService class"""
+import asyncio
+import json
+import threading
+import zlib
+
+import pytest
+from azure.core.exceptions import ServiceRequestError
+
+from alma_item_checks_webhook_service.config import (
+    FETCH_ITEM_QUEUE,
+    STORAGE_CONNECTION_STRING,
+)
+from alma_item_checks_webhook_service.services.async_webhook_service import (
+    AsyncWebhookService,
+)
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    AsyncQueueClientRegistry,
+)
+
+
+@pytest.fixture
+def async_registry(mocker, fake_async_queue_factory):
+    """Patch the aio queue client registry with one building fake clients."""
+    mocker.patch(
+        "alma_item_checks_webhook_service.services.webhook_service.get_signature_verifier"
+    ).return_value.verify.return_value = True
+    mocker.patch.dict("os.environ", {"AZURE_FUNCTIONS_ENVIRONMENT": "Production"})
+    return mocker.patch(
+        "alma_item_checks_webhook_service.services.async_webhook_service.async_queue_client_registry",
+        AsyncQueueClientRegistry(factory=fake_async_queue_factory),
+    )
+
+
+def test_parse_webhook_success(mock_request_factory, async_registry, fake_async_queue_factory):
+    """Test the happy path awaits the aio queue send."""
+    service = AsyncWebhookService(mock_request_factory())
+
+    response = asyncio.run(service.parse_webhook())
+
+    assert response.status_code == 200
+    assert response.get_body() == b"Webhook received"
+    assert fake_async_queue_factory.builds == [(STORAGE_CONNECTION_STRING, FETCH_ITEM_QUEUE)]
+    assert [json.loads(m) for m in fake_async_queue_factory.clients[FETCH_ITEM_QUEUE].messages] == [
+        {"institution": "TU", "barcode": "12345"}
+    ]
+
+
+def test_parse_webhook_challenge_request(mock_request_factory, async_registry, fake_async_queue_factory):
+    """Test that a challenge is answered without touching the queue."""
+    req = mock_request_factory(method="GET", params={"challenge": "test_challenge"}, body=b'')
+
+    response = asyncio.run(AsyncWebhookService(req).parse_webhook())
+
+    assert json.loads(response.get_body()) == {"challenge": "test_challenge"}
+    assert fake_async_queue_factory.builds == []
+
+
+def test_parse_webhook_queue_error(mock_request_factory, async_registry, caplog):
+    """Test that an aio queue connection error returns a 500 error."""
+
+    async def scenario():
+        async_registry.get(STORAGE_CONNECTION_STRING, FETCH_ITEM_QUEUE).fail_with = (
+            ServiceRequestError("connection reset")
+        )
+        return await AsyncWebhookService(mock_request_factory()).parse_webhook()
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 500
+    assert b"Error sending message to queue" in response.get_body()
+    assert "Failed to send message to queue: connection reset" in caplog.text
+
+
+def test_parse_webhook_routes_to_partition(mock_request_factory, async_registry, fake_async_queue_factory, override_settings):
+    """Test that the aio path sends to the partition chosen by the router."""
+    override_settings(fetch_item_partitions=4)
+
+    response = asyncio.run(AsyncWebhookService(mock_request_factory()).parse_webhook())
+
+    assert response.status_code == 200
+    (queue_name,) = fake_async_queue_factory.clients
+    assert queue_name == f"{FETCH_ITEM_QUEUE}-{zlib.crc32(b'12345') % 4}"
+    assert len(fake_async_queue_factory.clients[queue_name].messages) == 1
+
+
+def test_parse_webhook_open_circuit_returns_503(mock_request_factory, async_registry, override_settings):
+    """Test that the aio path counts failed sends and fails fast once the circuit opens."""
+    override_settings(queue_breaker_failures=1, queue_breaker_reset_seconds=30)
+
+    async def scenario():
+        queue = async_registry.get(STORAGE_CONNECTION_STRING, FETCH_ITEM_QUEUE)
+        queue.fail_with = TimeoutError("Storage timed out")
+        first = await AsyncWebhookService(mock_request_factory(headers={"X-Exl-Signature": "a"})).parse_webhook()
+        queue.fail_with = None
+        second = await AsyncWebhookService(mock_request_factory(headers={"X-Exl-Signature": "b"})).parse_webhook()
+        return first, second, queue
+
+    first, second, queue = asyncio.run(scenario())
+
+    assert first.status_code == 500
+    assert second.status_code == 503
+    assert second.headers["Retry-After"] == "30"
+    assert queue.messages == []
+
+
+def test_cancelled_probe_releases_half_open_circuit(mock_request_factory, async_registry, override_settings):
+    """Test that a probe cancelled by the host counts as a failure instead of leaving the circuit half open."""
+    override_settings(queue_breaker_failures=1, queue_breaker_reset_seconds=0)
+
+    async def hang(content, **kwargs):
+        await asyncio.Event().wait()
+
+    async def scenario():
+        queue = async_registry.get(STORAGE_CONNECTION_STRING, FETCH_ITEM_QUEUE)
+        queue.fail_with = TimeoutError("Storage timed out")
+        await AsyncWebhookService(mock_request_factory(headers={"X-Exl-Signature": "a"})).parse_webhook()
+        queue.fail_with = None
+
+        healthy_send = queue.send_message
+        queue.send_message = hang
+        probe = asyncio.create_task(
+            AsyncWebhookService(mock_request_factory(headers={"X-Exl-Signature": "b"})).parse_webhook()
+        )
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        queue.send_message = healthy_send
+
+        return [
+            await AsyncWebhookService(mock_request_factory(headers={"X-Exl-Signature": signature})).parse_webhook()
+            for signature in ("c", "d", "e")
+        ]
+
+    responses = asyncio.run(scenario())
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+
+
+def test_parse_webhook_delays_over_rate_events(mocker, mock_request_factory, async_registry, override_settings, fake_clock):
+    """Test that the aio path sends over-rate events with a visibility timeout."""
+    from alma_item_checks_webhook_service.services import rate_shaper
+
+    override_settings(shaping_rates={"TU": 1.0}, shaping_burst=1)
+    mocker.patch.object(rate_shaper, "_rate_shaper", rate_shaper.RateShaper({"TU": 1.0}, burst=1, clock=fake_clock))
+
+    async def scenario():
+        for signature in ("a", "b"):
+            await AsyncWebhookService(mock_request_factory(headers={"X-Exl-Signature": signature})).parse_webhook()
+        return async_registry.get(STORAGE_CONNECTION_STRING, FETCH_ITEM_QUEUE)
+
+    queue = asyncio.run(scenario())
+
+    assert [k.get("visibility_timeout", 0) for k in queue.send_kwargs] == [0, 1]
+
+
+@pytest.mark.parametrize("remote", [False, True])
+def test_remote_store_calls_run_off_the_event_loop(mocker, mock_request_factory, async_registry, override_settings, remote):
+    """Test that the synchronous table clients are only called in a worker thread."""
+    override_settings(
+        change_detection_paths=("item_data.location",),
+        change_detection_table_name="fingerprints" if remote else None,
+    )
+    threads = []
+    detector = mocker.patch(
+        "alma_item_checks_webhook_service.services.webhook_service.get_change_detector"
+    ).return_value
+    detector.has_changed.side_effect = lambda *args: threads.append(threading.current_thread()) or True
+
+    response = asyncio.run(AsyncWebhookService(mock_request_factory()).parse_webhook())
+
+    assert response.status_code == 200
+    assert (threads[0] is threading.main_thread()) is not remote
+
+
+def test_release_after_failed_send_runs_off_the_event_loop(mocker, mock_request_factory, async_registry, override_settings):
+    """Test that releasing the stores' claims after a failed send does not block the event loop."""
+    override_settings(
+        change_detection_paths=("item_data.location",),
+        change_detection_table_name="fingerprints",
+    )
+    threads = []
+    detector = mocker.patch(
+        "alma_item_checks_webhook_service.services.webhook_service.get_change_detector"
+    ).return_value
+    detector.forget.side_effect = lambda *args: threads.append(threading.current_thread())
+
+    async def scenario():
+        async_registry.get(STORAGE_CONNECTION_STRING, FETCH_ITEM_QUEUE).fail_with = (
+            ServiceRequestError("connection reset")
+        )
+        return await AsyncWebhookService(mock_request_factory()).parse_webhook()
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 500
+    assert threads and threads[0] is not threading.main_thread()
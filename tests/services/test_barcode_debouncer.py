@@ -0,0 +1,117 @@
+"""Tests for the barcode debouncer"""
+import pytest
+from azure.core.exceptions import ServiceRequestError
+
+from alma_item_checks_webhook_service.services.barcode_debouncer import (
+    BarcodeDebouncer,
+    MemoryDebounceStore,
+    TableDebounceStore,
+    get_barcode_debouncer,
+)
+from alma_item_checks_webhook_service.utils.log_limiter import get_log_limiter
+
+
+@pytest.fixture(params=["memory", "table"])
+def store(request, fake_clock, in_memory_table_client):
+    """Each debounce store implementation, driven by the same fake clock."""
+    if request.param == "memory":
+        return MemoryDebounceStore(max_entries=100, clock=fake_clock)
+    return TableDebounceStore(in_memory_table_client, clock=fake_clock)
+
+
+def test_repeats_within_window_are_coalesced(store, fake_clock):
+    """Test that the first event is not held, the first repeat is held for the window and later repeats are dropped."""
+    debouncer = BarcodeDebouncer(store, ttl=9.5)
+
+    assert debouncer.hold("TU", "12345") == 0
+    fake_clock.advance(5)
+    assert debouncer.hold("TU", "12345") == 10
+    assert debouncer.hold("TU", "12345") is None
+    assert debouncer.stats() == {"hits": 1, "misses": 2}
+
+
+def test_repeat_after_window_is_enqueued(store, fake_clock):
+    """Test that an event after the ttl has passed is enqueued again without a delay."""
+    debouncer = BarcodeDebouncer(store, ttl=10)
+
+    debouncer.hold("TU", "12345")
+    fake_clock.advance(10)
+
+    assert debouncer.hold("TU", "12345") == 0
+
+
+def test_keys_are_per_institution(store):
+    """Test that the same barcode at another institution is not coalesced."""
+    debouncer = BarcodeDebouncer(store, ttl=10)
+
+    assert debouncer.hold("TU", "12345") == 0
+    assert debouncer.hold("GU", "12345") == 0
+
+
+def test_release_allows_next_event(store):
+    """Test that releasing a key lets the next event through."""
+    debouncer = BarcodeDebouncer(store, ttl=10)
+    debouncer.hold("TU", "12345")
+
+    debouncer.release("TU", "12345")
+
+    assert debouncer.hold("TU", "12345") == 0
+
+
+def test_release_of_trailing_message_keeps_window(store):
+    """Test that releasing a held repeat frees the trailing slot but keeps the window open."""
+    debouncer = BarcodeDebouncer(store, ttl=10)
+    debouncer.hold("TU", "12345")
+    delay = debouncer.hold("TU", "12345")
+
+    debouncer.release("TU", "12345", delay)
+
+    assert debouncer.hold("TU", "12345") == 10
+
+
+def test_table_store_sanitizes_keys(in_memory_table_client, fake_clock):
+    """Test that characters disallowed in table keys are replaced."""
+    store = TableDebounceStore(in_memory_table_client, clock=fake_clock)
+
+    store.claim("TU", "12/34#5", ttl=10)
+
+    assert ("TU", "12_34_5") in in_memory_table_client.entities
+
+
+def test_memory_store_is_bounded(fake_clock):
+    """Test that the in-memory store evicts the least recently used key."""
+    store = MemoryDebounceStore(max_entries=2, clock=fake_clock)
+    for barcode in ("1", "2", "3"):
+        store.claim("TU", barcode, ttl=10)
+
+    assert store.claim("TU", "1", ttl=10) is True
+
+
+def test_store_error_fails_open(mocker):
+    """Test that an unavailable shared store does not block enqueueing."""
+    store = mocker.Mock()
+    store.claim.side_effect = ServiceRequestError("table unavailable")
+    debouncer = BarcodeDebouncer(store, ttl=10)
+
+    assert debouncer.hold("TU", "12345") == 0
+
+
+def test_store_error_warnings_are_rate_limited(mocker, override_settings, caplog):
+    """Test that an outage of the shared store does not log a warning per webhook."""
+    override_settings(log_rate_limit=2)
+    store = mocker.Mock()
+    store.claim.side_effect = ServiceRequestError("table unavailable")
+    debouncer = BarcodeDebouncer(store, ttl=10)
+
+    for barcode in range(5):
+        debouncer.hold("TU", str(barcode))
+
+    assert caplog.text.count("Debounce store unavailable") == 2
+    get_log_limiter().flush()
+
+
+def test_debouncing_is_off_in_claim_check_mode(override_settings, tmp_path):
+    """Test that no debouncer is built when each message references its own snapshot."""
+    override_settings(debounce_ttl_seconds=10, claim_check_local_path=str(tmp_path))
+
+    assert get_barcode_debouncer() is None
@@ -0,0 +1,228 @@
+"""Tests for the BatchWebhookService class"""
+import json
+
+import azure.functions as func
+import pytest
+
+from alma_item_checks_webhook_service.config import (
+    FETCH_ITEM_QUEUE,
+    STORAGE_CONNECTION_STRING,
+)
+from alma_item_checks_webhook_service.services import webhook_service
+from alma_item_checks_webhook_service.services.batch_webhook_service import (
+    BatchWebhookService,
+    iter_batch_records,
+)
+from alma_item_checks_webhook_service.services.event_filter import EventFilter
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    QueueClientRegistry,
+)
+
+
+@pytest.fixture
+def registry(mocker, fake_queue_factory):
+    """Patch the queue client registry and accept every signature."""
+    mocker.patch.dict("os.environ", {"AZURE_FUNCTIONS_ENVIRONMENT": "Production"})
+    mocker.patch.object(webhook_service, "get_signature_verifier").return_value.verify.return_value = True
+    return mocker.patch.object(
+        webhook_service, "queue_client_registry", QueueClientRegistry(factory=fake_queue_factory)
+    )
+
+
+def queue(registry):
+    return registry.get(STORAGE_CONNECTION_STRING, FETCH_ITEM_QUEUE)
+
+
+def item_event(barcode, event="ITEM_UPDATED", material="BOOK"):
+    return {
+        "event": {"value": event},
+        "institution": {"value": "TU"},
+        "item": {"item_data": {"barcode": barcode, "physical_material_type": {"value": material}}},
+    }
+
+
+def post(body, content_type="application/x-ndjson"):
+    headers = {"X-Exl-Signature": "sig", "Content-Type": content_type}
+    req = func.HttpRequest(method="POST", url="/api/webhook/batch", headers=headers, body=body)
+    response = BatchWebhookService(req).parse_batch()
+    return response, json.loads(response.get_body()) if response.mimetype == "application/json" else None
+
+
+def ndjson(*records):
+    return b"\n".join(json.dumps(record).encode() for record in records)
+
+
+def test_ndjson_batch(registry):
+    """Test that each kind of record is queued or reported, in body order."""
+    body = ndjson(
+        item_event("1"),
+        {"institution": "GU", "barcode": "2"},
+        ["GWA", "3"],
+        item_event("4", event="LOAN_CREATED"),
+        {"institution": "GU"},
+        ["GU", ""],
+    ) + b"\n\n{not json\n"
+
+    response, summary = post(body)
+
+    assert response.status_code == 200
+    assert [record["outcome"] for record in summary["records"]] == [
+        "queued", "queued", "queued", "ignored", "invalid_payload", "invalid_payload", "invalid_payload",
+    ]
+    assert summary["received"] == 7
+    assert summary["counts"] == {"queued": 3, "ignored": 1, "invalid_payload": 3}
+    assert summary["records"][6]["error"].startswith("Invalid JSON")
+    assert [json.loads(m) for m in queue(registry).messages] == [
+        {"institution": "TU", "barcode": "1"},
+        {"institution": "GU", "barcode": "2"},
+        {"institution": "GWA", "barcode": "3"},
+    ]
+
+
+def test_json_array_batch(registry):
+    """Test that a JSON array body is accepted."""
+    response, summary = post(json.dumps([["TU", "1"], item_event("2")], indent=2).encode(), "application/json; charset=utf-8")
+
+    assert response.status_code == 200
+    assert summary["counts"] == {"queued": 2}
+
+
+def test_invalid_signature(registry):
+    """Test that the signature is validated once for the whole batch."""
+    webhook_service.get_signature_verifier.return_value.verify.return_value = False
+
+    response, _ = post(ndjson(["TU", "1"]))
+
+    assert response.status_code == 500
+    assert queue(registry).messages == []
+    webhook_service.get_signature_verifier.return_value.verify.assert_called_once()
+
+
+def test_batch_body_limit(registry, override_settings):
+    """Test that the batch route has its own body limit."""
+    override_settings(max_body_bytes=10, max_batch_body_bytes=100)
+
+    assert post(ndjson(["TU", "1"]))[0].status_code == 200
+    assert post(ndjson(*(["TU", str(i)] for i in range(20))))[0].status_code == 413
+    assert post(b"TU,1", content_type="text/csv")[0].status_code == 415
+
+
+def test_event_filter_applies_to_item_events(registry, override_settings):
+    """Test that filter rules drop item events but not bare barcodes, which have no item fields."""
+    override_settings(event_filter=EventFilter({"rules": [{"name": "books-only", "include": {"item_data.physical_material_type": ["BOOK"]}}]}))
+
+    _, summary = post(ndjson(item_event("1", material="ELEC"), item_event("2"), ["TU", "3"]))
+
+    assert [record["outcome"] for record in summary["records"]] == ["filtered", "queued", "queued"]
+
+
+def test_failed_sends_return_500(registry):
+    """Test that records that could not be enqueued are reported and fail the request."""
+    queue(registry).fail_with = ValueError("Storage error")
+
+    response, summary = post(ndjson(["TU", "1"], ["TU", "2"]))
+
+    assert response.status_code == 500
+    assert summary["counts"] == {"enqueue_failed": 2}
+
+
+class TestPacking:
+    """Tests for packing batch records into batch queue messages."""
+
+    def test_records_are_sent_alone_by_default(self, registry):
+        """Test that records are sent as plain messages while batch messages are disabled."""
+        _, summary = post(ndjson(*(["TU", str(i)] for i in range(5))))
+
+        assert summary["counts"] == {"queued": 5}
+        assert [json.loads(m) for m in queue(registry).messages] == [
+            {"institution": "TU", "barcode": str(i)} for i in range(5)
+        ]
+
+    def test_records_share_queue_messages(self, registry, override_settings):
+        """Test that a batch body is sent as a few batch messages rather than one per record."""
+        override_settings(fetch_item_batch_size=32)
+        response, summary = post(ndjson(*(["TU", str(i)] for i in range(100))))
+
+        assert response.status_code == 200
+        assert summary["counts"] == {"queued": 100}
+        messages = [json.loads(m) for m in queue(registry).messages]
+        assert [len(message["messages"]) for message in messages] == [32] * 3 + [4]
+        assert [m["barcode"] for message in messages for m in message["messages"]] == [str(i) for i in range(100)]
+
+    def test_per_webhook_batchers_are_not_used(self, mocker, registry, override_settings):
+        """Test that records are packed by the route rather than waiting on the fetch item batchers."""
+        override_settings(fetch_item_batch_size=4)
+        batchers = mocker.patch.dict(webhook_service._fetch_item_batchers, clear=True)
+
+        _, summary = post(ndjson(*(["TU", str(i)] for i in range(10))))
+
+        assert summary["counts"] == {"queued": 10}
+        assert [len(json.loads(m)["messages"]) for m in queue(registry).messages] == [4, 4, 2]
+        assert batchers == {}
+
+    def test_single_record_is_sent_unpacked(self, registry, override_settings):
+        """Test that a one-record pack is sent as a plain message."""
+        override_settings(fetch_item_batch_size=4)
+        post(ndjson(["TU", "1"]))
+
+        assert [json.loads(m) for m in queue(registry).messages] == [{"institution": "TU", "barcode": "1"}]
+
+    def test_delayed_records_are_sent_alone(self, registry, override_settings):
+        """Test that records delayed by rate shaping keep their own visibility timeout."""
+        override_settings(shaping_default_rate=1.0, shaping_burst=1)
+
+        _, summary = post(ndjson(["TU", "1"], ["TU", "2"], ["TU", "3"]))
+
+        assert summary["counts"] == {"queued": 3}
+        sent = {
+            json.loads(m)["barcode"]: kwargs.get("visibility_timeout", 0)
+            for m, kwargs in zip(queue(registry).messages, queue(registry).send_kwargs)
+        }
+        assert sent == {"1": 0, "2": 1, "3": 2}
+
+    def test_records_past_max_delay_are_rate_limited(self, registry, override_settings):
+        """Test that records the rate could only deliver after the maximum delay fail the batch."""
+        override_settings(shaping_default_rate=1.0, shaping_burst=1, shaping_max_delay_seconds=1)
+
+        response, summary = post(ndjson(["TU", "1"], ["TU", "2"], ["TU", "3"]))
+
+        assert response.status_code == 500
+        assert [record["outcome"] for record in summary["records"]] == ["queued", "queued", "rate_limited"]
+
+    def test_failed_batch_send(self, registry):
+        """Test that a failed batch send is reported for each of its records."""
+        queue(registry).fail_with = ValueError("Storage error")
+
+        response, summary = post(ndjson(["TU", "1"], ["TU", "2"]))
+
+        assert response.status_code == 500
+        assert summary["counts"] == {"enqueue_failed": 2}
+
+
+@pytest.mark.parametrize(
+    "body, expected",
+    [
+        (b"", []),
+        (b"  []  ", []),
+        (b' [ {"a": 1} ,\n [2, 3] ] ', [({"a": 1}, None), ([2, 3], None)]),
+        (b'{"a": 1}\r\n\r\n[2]', [({"a": 1}, None), ([2], None)]),
+    ],
+)
+def test_iter_batch_records(body, expected):
+    """Test that NDJSON and array bodies are decoded record by record."""
+    assert list(iter_batch_records(body)) == expected
+
+
+def test_iter_batch_records_declared_format():
+    """Test that a declared format overrides the guess from the first character."""
+    assert list(iter_batch_records(b'["TU", "1"]\n["TU", "2"]', array=False)) == [(["TU", "1"], None), (["TU", "2"], None)]
+    assert list(iter_batch_records(b'{"a": 1}', array=True))[0][1].startswith("Invalid JSON array")
+
+
+@pytest.mark.parametrize("body", [b'[{"a": 1}, {"a": ', b'[{"a": 1} {"a": 2}]', b'[{"a": 1},]'])
+def test_iter_batch_records_malformed_array(body):
+    """Test that a malformed array yields its valid leading records, then an error."""
+    records = list(iter_batch_records(body))
+
+    assert records[0] == ({"a": 1}, None)
+    assert records[-1][0] is None and records[-1][1].startswith("Invalid JSON array")
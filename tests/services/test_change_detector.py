@@ -0,0 +1,106 @@
+"""Tests for content-based change detection"""
+import copy
+
+import pytest
+from azure.core.exceptions import ServiceRequestError
+
+from alma_item_checks_webhook_service.services.change_detector import (
+    ChangeDetector,
+    MemoryFingerprintStore,
+    TableFingerprintStore,
+    item_fingerprint,
+)
+
+PATHS = ["item_data.location", "item_data.base_status", "item_data.process_type", "holding_data"]
+
+ITEM = {
+    "bib_data": {"title": "A book"},
+    "holding_data": {"holding_id": "22123", "call_number": "PS3545 .X3"},
+    "item_data": {
+        "barcode": "12345",
+        "location": {"value": "STACKS", "desc": "Stacks"},
+        "base_status": {"value": "1", "desc": "Item in place"},
+        "process_type": {"value": "", "desc": ""},
+        "internal_note_1": "",
+    },
+}
+
+
+def changed(item, path, value):
+    item = copy.deepcopy(item)
+    *parents, key = path.split(".")
+    target = item
+    for parent in parents:
+        target = target[parent]
+    target[key] = value
+    return item
+
+
+def test_fingerprint_ignores_irrelevant_fields():
+    """Test that only the configured paths affect the fingerprint."""
+    base = item_fingerprint(ITEM, PATHS)
+
+    assert len(base) == 32
+    assert item_fingerprint(changed(ITEM, "item_data.internal_note_1", "Rebound"), PATHS) == base
+    assert item_fingerprint(changed(ITEM, "bib_data.title", "Another"), PATHS) == base
+    assert item_fingerprint(changed(ITEM, "item_data.location", {"value": "ANNEX"}), PATHS) != base
+    assert item_fingerprint(changed(ITEM, "holding_data.call_number", "PS3545 .X4"), PATHS) != base
+
+
+def test_fingerprint_distinguishes_missing_paths():
+    """Test that a missing path does not collide with a present value."""
+    assert item_fingerprint({}, ["item_data.location"]) == item_fingerprint({"item_data": "x"}, ["item_data.location"])
+    assert item_fingerprint({}, ["item_data.location"]) != item_fingerprint(
+        {"item_data": {"location": "STACKS"}}, ["item_data.location"]
+    )
+
+
+@pytest.fixture(params=["memory", "table"])
+def store(request, fake_clock, in_memory_table_client):
+    if request.param == "memory":
+        return MemoryFingerprintStore(max_entries=100, ttl=60, clock=fake_clock)
+    return TableFingerprintStore(in_memory_table_client, ttl=60, clock=fake_clock)
+
+
+def test_unchanged_items_are_skipped_until_ttl(store, fake_clock):
+    """Test that a repeated fingerprint is skipped and a changed or expired one is enqueued."""
+    detector = ChangeDetector(store, PATHS)
+
+    assert detector.has_changed("TU", "12345", ITEM) is True
+    assert detector.has_changed("TU", "12345", changed(ITEM, "item_data.internal_note_1", "x")) is False
+    assert detector.has_changed("OTHER", "12345", ITEM) is True
+
+    moved = changed(ITEM, "item_data.location", {"value": "ANNEX"})
+    assert detector.has_changed("TU", "12345", moved) is True
+    assert detector.has_changed("TU", "12345", moved) is False
+
+    fake_clock.advance(60)
+    assert detector.has_changed("TU", "12345", moved) is True
+    assert detector.stats() == {"unchanged": 2, "changed": 4}
+
+
+def test_forget_lets_the_next_event_through(store):
+    """Test that a forgotten fingerprint does not skip the retry of a failed enqueue."""
+    detector = ChangeDetector(store, PATHS)
+    detector.has_changed("TU", "12345", ITEM)
+
+    detector.forget("TU", "12345")
+
+    assert detector.has_changed("TU", "12345", ITEM) is True
+
+
+def test_items_without_data_are_enqueued(store):
+    """Test that an event without an item object is never skipped."""
+    detector = ChangeDetector(store, PATHS)
+
+    assert detector.has_changed("TU", "12345", None) is True
+    assert detector.has_changed("TU", "12345", None) is True
+
+
+def test_store_errors_fail_open(mocker, caplog):
+    """Test that an unavailable fingerprint store lets the event through."""
+    store = mocker.Mock()
+    store.get.side_effect = ServiceRequestError("table unavailable")
+
+    assert ChangeDetector(store, PATHS).has_changed("TU", "12345", ITEM) is True
+    assert "Fingerprint store unavailable" in caplog.text
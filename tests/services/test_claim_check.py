@@ -0,0 +1,102 @@
+"""Tests for claim-check item snapshots"""
+import gzip
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from alma_item_checks_webhook_service.services.claim_check import (
+    BlobSnapshotStore,
+    ClaimCheck,
+    LocalSnapshotStore,
+    compact,
+    snapshot_name,
+)
+
+ITEM = {
+    "bib_data": {"title": "A book", "issn": None, "network_number": ["(OCoLC)1", ""]},
+    "holding_data": {"temp_location": {"value": "", "desc": ""}, "call_number": "PS3545"},
+    "item_data": {"barcode": "12345", "public_note": "", "requested": False, "pieces": "1"},
+}
+
+
+def test_compact_drops_empty_values():
+    """Test that empty strings, nulls and empty containers are removed but false and zero are kept."""
+    assert compact(ITEM) == {
+        "bib_data": {"title": "A book", "network_number": ["(OCoLC)1"]},
+        "holding_data": {"call_number": "PS3545"},
+        "item_data": {"barcode": "12345", "requested": False, "pieces": "1"},
+    }
+    assert compact({"count": 0}) == {"count": 0}
+
+
+def test_snapshot_name_is_keyed_and_encoded():
+    """Test that snapshot names are keyed by institution, barcode and event time and safe as paths."""
+    assert snapshot_name("01WRLC_GWA", "3288/2019", "2026-10-17T12:00:00.000Z") == (
+        "01WRLC_GWA/3288%2F2019/2026-10-17T12%3A00%3A00.000Z.json.gz"
+    )
+
+
+def test_snapshot_name_escapes_dot_segments(tmp_path):
+    """Test that "." and ".." parts cannot leave the institution and barcode directories."""
+    name = snapshot_name("..", ".", "2026-10-17T12:00:00.000Z")
+
+    assert name == "%2E%2E/%2E/2026-10-17T12%3A00%3A00.000Z.json.gz"
+    LocalSnapshotStore(tmp_path / "snapshots").put(name, b"snapshot")
+    assert [path.relative_to(tmp_path) for path in tmp_path.rglob("*") if path.is_file()] == [
+        Path("snapshots", "%2E%2E", "%2E", "2026-10-17T12%3A00%3A00.000Z.json.gz")
+    ]
+
+
+def test_local_store_concurrent_writes(tmp_path):
+    """Test that concurrent writes of the same snapshot each replace the file whole."""
+    store = LocalSnapshotStore(tmp_path)
+    payloads = [bytes([index]) * 100_000 for index in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda data: store.put("TU/1/snapshot.json.gz", data), payloads))
+
+    assert (tmp_path / "TU" / "1" / "snapshot.json.gz").read_bytes() in payloads
+    assert [path.name for path in (tmp_path / "TU" / "1").iterdir()] == ["snapshot.json.gz"]
+
+
+def test_local_store_snapshot_round_trip(tmp_path):
+    """Test that a stored snapshot can be read back from the local stand-in."""
+    claim_check = ClaimCheck(LocalSnapshotStore(tmp_path / "snapshots"))
+
+    reference = claim_check.store_snapshot("TU", "12345", ITEM, "2026-10-17T12:00:00Z")
+
+    assert reference == {
+        "container": str(tmp_path / "snapshots"),
+        "name": "TU/12345/2026-10-17T12%3A00%3A00Z.json.gz",
+        "event_time": "2026-10-17T12:00:00Z",
+    }
+    document = json.loads(gzip.decompress((tmp_path / "snapshots" / reference["name"]).read_bytes()))
+    assert document == {
+        "version": 1,
+        "institution": "TU",
+        "barcode": "12345",
+        "event_time": "2026-10-17T12:00:00Z",
+        "item": compact(ITEM),
+    }
+
+
+def test_blob_store_uploads_gzipped_json(mocker):
+    """Test that the blob store overwrites a block blob with gzip content settings."""
+    container = mocker.Mock(container_name="item-snapshots")
+
+    reference = BlobSnapshotStore(container).put("TU/12345/t.json.gz", b"data")
+
+    assert reference == {"container": "item-snapshots", "name": "TU/12345/t.json.gz"}
+    args, kwargs = container.upload_blob.call_args
+    assert args == ("TU/12345/t.json.gz", b"data")
+    assert kwargs["overwrite"] is True
+    assert kwargs["content_settings"].content_encoding == "gzip"
+
+
+def test_store_failure_returns_no_reference(mocker, caplog):
+    """Test that a failed upload leaves the message without a snapshot rather than failing it."""
+    store = mocker.Mock()
+    store.put.side_effect = OSError("disk full")
+
+    assert ClaimCheck(store).store_snapshot("TU", "12345", ITEM, None) is None
+    assert "Failed to store item snapshot: disk full" in caplog.text
@@ -0,0 +1,56 @@
+"""Tests for the delivery idempotency store"""
+from alma_item_checks_webhook_service.services.delivery_idempotency import (
+    COMPLETED,
+    IN_PROGRESS,
+    MemoryIdempotencyStore,
+)
+
+
+def test_claim_is_exact(fake_clock):
+    """Test that only the same key is treated as already claimed."""
+    store = MemoryIdempotencyStore(max_entries=10, ttl=60, clock=fake_clock)
+
+    assert store.claim(b"digest-1") is None
+    assert store.claim(b"digest-1") == IN_PROGRESS
+    assert store.claim(b"digest-2") is None
+
+
+def test_complete(fake_clock):
+    """Test that a completed delivery is reported as completed rather than in progress."""
+    store = MemoryIdempotencyStore(max_entries=10, ttl=60, clock=fake_clock)
+    store.claim(b"key")
+
+    store.complete(b"key")
+
+    assert store.claim(b"key") == COMPLETED
+
+
+def test_claim_expires(fake_clock):
+    """Test that a key can be claimed again after its ttl."""
+    store = MemoryIdempotencyStore(max_entries=10, ttl=60, clock=fake_clock)
+    store.claim(b"key")
+    store.complete(b"key")
+
+    fake_clock.advance(60)
+
+    assert store.claim(b"key") is None
+
+
+def test_release(fake_clock):
+    """Test that a released key can be claimed again."""
+    store = MemoryIdempotencyStore(max_entries=10, ttl=60, clock=fake_clock)
+    store.claim(b"key")
+
+    store.release(b"key")
+
+    assert store.claim(b"key") is None
+
+
+def test_bounded(fake_clock):
+    """Test that the store forgets the least recently used key beyond capacity."""
+    store = MemoryIdempotencyStore(max_entries=2, ttl=60, clock=fake_clock)
+    for key in (b"a", b"b", b"c"):
+        store.claim(key)
+
+    assert store.claim(b"a") is None
+
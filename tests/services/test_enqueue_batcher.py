@@ -0,0 +1,108 @@
+"""Tests for the EnqueueBatcher class"""
+import json
+import threading
+
+import pytest
+
+from alma_item_checks_webhook_service.services.enqueue_batcher import (
+    BATCH_SCHEMA_VERSION,
+    EnqueueBatcher,
+    pack_batch,
+)
+
+
+class RecordingSender:
+    """Records sent batch payloads, optionally failing."""
+
+    def __init__(self, fail_with=None):
+        self.fail_with = fail_with
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def __call__(self, content):
+        if self.fail_with is not None:
+            raise self.fail_with
+        with self.lock:
+            self.sent.append(json.loads(content))
+
+
+def message(i):
+    return {"institution": "TU", "barcode": f"barcode-{i}"}
+
+
+def test_pack_batch_is_versioned():
+    """Test that packed batches carry the schema version and messages in order."""
+    assert json.loads(pack_batch([message(1), message(2)])) == {
+        "version": BATCH_SCHEMA_VERSION,
+        "messages": [message(1), message(2)],
+    }
+
+
+def test_flushes_when_batch_is_full():
+    """Test that a full batch is sent as one queue message without waiting for the window."""
+    sender = RecordingSender()
+    batcher = EnqueueBatcher(sender, max_size=3, window=60)
+
+    futures = [batcher.submit(message(i)) for i in range(3)]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert sender.sent == [{"version": BATCH_SCHEMA_VERSION, "messages": [message(i) for i in range(3)]}]
+    batcher.close()
+
+
+def test_flushes_when_window_expires():
+    """Test that a partial batch is sent once the window has passed."""
+    sender = RecordingSender()
+    batcher = EnqueueBatcher(sender, max_size=100, window=0.01)
+
+    batcher.submit(message(1)).result(timeout=5)
+
+    assert sender.sent[0]["messages"] == [message(1)]
+    batcher.close()
+
+
+def test_close_flushes_pending_messages():
+    """Test that closing the batcher sends everything still pending."""
+    sender = RecordingSender()
+    batcher = EnqueueBatcher(sender, max_size=100, window=60)
+    futures = [batcher.submit(message(i)) for i in range(5)]
+
+    batcher.close(timeout=5)
+
+    assert all(future.done() for future in futures)
+    assert [m for batch in sender.sent for m in batch["messages"]] == [message(i) for i in range(5)]
+
+
+def test_send_failure_is_reported_to_every_caller():
+    """Test that a failed batch send fails each caller's future."""
+    batcher = EnqueueBatcher(RecordingSender(fail_with=ValueError("Storage error")), max_size=2, window=60)
+
+    futures = [batcher.submit(message(i)) for i in range(2)]
+
+    for future in futures:
+        with pytest.raises(ValueError, match="Storage error"):
+            future.result(timeout=5)
+    batcher.close()
+
+
+def test_submit_after_close_raises():
+    """Test that a closed batcher rejects new messages."""
+    batcher = EnqueueBatcher(RecordingSender())
+    batcher.close()
+
+    with pytest.raises(RuntimeError):
+        batcher.submit(message(1))
+
+
+def test_custom_pack_encodes_each_batch():
+    """Test that batches are encoded with the pack callable."""
+    sender = RecordingSender()
+    batcher = EnqueueBatcher(sender, max_size=2, window=60, pack=lambda messages: json.dumps({"n": len(messages)}))
+
+    futures = [batcher.submit(message(i)) for i in range(2)]
+    for future in futures:
+        future.result(timeout=5)
+    batcher.close()
+
+    assert sender.sent == [{"n": 2}]
@@ -0,0 +1,112 @@
+"""Tests for the declarative event filter"""
+import pytest
+
+from alma_item_checks_webhook_service.services.event_filter import (
+    EVENT_TYPE_RULE,
+    EventFilter,
+    get_event_filter,
+)
+
+CONFIG = {
+    "events": ["ITEM_UPDATED", "ITEM_CREATED"],
+    "rules": [
+        {"name": "electronic", "exclude": {"item_data.physical_material_type": ["ELEC", "OTHER"]}},
+        {"name": "gwa-libraries", "institutions": ["GWA"], "include": {"item_data.library": ["GELMAN", "EASTMAN"]}},
+        {"name": "work-orders", "institutions": ["GU"], "exclude": {"item_data.process_type": ["WORK_ORDER_DEPARTMENT"]}},
+    ],
+}
+
+
+def item(library="GELMAN", material="BOOK", process_type=""):
+    return {
+        "item_data": {
+            "library": {"value": library, "desc": library},
+            "physical_material_type": {"value": material},
+            "process_type": {"value": process_type},
+        }
+    }
+
+
+def test_event_types():
+    """Test that the configured event types are exposed, defaulting to item updates."""
+    assert EventFilter(CONFIG).event_types == {"ITEM_UPDATED", "ITEM_CREATED"}
+    assert EventFilter({"rules": []}).event_types == {"ITEM_UPDATED"}
+
+
+def test_rules_for_every_institution():
+    """Test that a rule without institutions applies to all of them."""
+    compiled = EventFilter(CONFIG)
+
+    assert compiled.match("GWA", item(material="ELEC")) == "electronic"
+    assert compiled.match("TU", item(material="OTHER")) == "electronic"
+    assert compiled.match("TU", item(material="BOOK")) is None
+
+
+def test_include_rule():
+    """Test that an include rule drops events whose value is not listed."""
+    compiled = EventFilter(CONFIG)
+
+    assert compiled.match("GWA", item(library="EASTMAN")) is None
+    assert compiled.match("GWA", item(library="LAW")) == "gwa-libraries"
+    assert compiled.match("GWA", {"item_data": {}}) == "gwa-libraries"
+    assert compiled.match("GU", item(library="LAW")) is None
+
+
+def test_exclude_rule_for_one_institution():
+    """Test that an institution's rules do not apply to other institutions."""
+    compiled = EventFilter(CONFIG)
+
+    assert compiled.match("GU", item(process_type="WORK_ORDER_DEPARTMENT")) == "work-orders"
+    assert compiled.match("GWA", item(process_type="WORK_ORDER_DEPARTMENT")) is None
+
+
+def test_conditions_of_one_rule():
+    """Test that any condition of a rule drops the event, and non-scalar values never match."""
+    compiled = EventFilter({"rules": [{"include": {"item_data.library": ["GELMAN"]}, "exclude": {"bib_data.title": [None]}}]})
+
+    assert compiled.match("GWA", {**item(), "bib_data": {"title": "A book"}}) is None
+    assert compiled.match("GWA", item()) == "rule-0"
+    assert compiled.match("GWA", {"item_data": {"library": [1, 2]}, "bib_data": {"title": "A book"}}) == "rule-0"
+    assert compiled.match("GWA", None) == "rule-0"
+
+
+def test_drops_are_counted_per_rule():
+    """Test that each drop is counted against the first rule that matched."""
+    compiled = EventFilter(CONFIG)
+    compiled.match("GWA", item(library="LAW", material="ELEC"))
+    compiled.match("GWA", item(library="LAW"))
+    compiled.match("GU", item())
+    compiled.record_drop(EVENT_TYPE_RULE)
+
+    assert compiled.stats() == {EVENT_TYPE_RULE: 1, "electronic": 1, "gwa-libraries": 1, "work-orders": 0}
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        [],
+        {"rules": {}},
+        {"events": "ITEM_UPDATED"},
+        {"rules": [], "other": 1},
+        {"rules": [{"name": "empty"}]},
+        {"rules": [{"exclude": {"item_data.library": "GELMAN"}}]},
+        {"rules": [{"exclude": {"item_data.library": [{"value": "GELMAN"}]}}]},
+        {"rules": [{"institutions": "GWA", "exclude": {"item_data.library": ["GELMAN"]}}]},
+        {"rules": [{"exclude": {"a": [1]}, "unknown": True}]},
+        {"rules": [{"name": "a", "exclude": {"a": [1]}}, {"name": "a", "exclude": {"b": [1]}}]},
+    ],
+)
+def test_malformed_config(config):
+    """Test that malformed filter documents are rejected when compiled."""
+    with pytest.raises(ValueError):
+        EventFilter(config)
+
+
+def test_get_event_filter(override_settings):
+    """Test that the process-wide filter is the one compiled with the settings."""
+    assert get_event_filter() is None
+
+    compiled = EventFilter(CONFIG)
+    override_settings(event_filter=compiled)
+
+    assert get_event_filter() is compiled
@@ -0,0 +1,234 @@
+"""Tests for the Outbox class"""
+import threading
+
+import pytest
+
+from alma_item_checks_webhook_service.services.outbox import (
+    Outbox,
+    OutboxFull,
+    SQLiteSpill,
+)
+from alma_item_checks_webhook_service.utils.circuit_breaker import CircuitOpenError
+
+
+class RecordingSender:
+    """Send callable that records messages and fails a set number of times first"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.attempts = 0
+        self.sent = []
+        self.release = threading.Event()
+        self.release.set()
+        self.delivered = threading.Event()
+
+    def __call__(self, content, queue_name):
+        self.release.wait(5)
+        self.attempts += 1
+        if self.failures:
+            self.failures -= 1
+            raise ValueError("storage unavailable")
+        self.sent.append((queue_name, content))
+        self.delivered.set()
+
+
+def test_messages_are_drained_in_order():
+    """Test that the drainer sends every message in the order it was added."""
+    sender = RecordingSender()
+    outbox = Outbox(sender)
+
+    for i in range(20):
+        outbox.put(f"message-{i}", f"queue-{i % 2}")
+    outbox.close(timeout=5)
+
+    assert sender.sent == [(f"queue-{i % 2}", f"message-{i}") for i in range(20)]
+    assert len(outbox) == 0
+
+
+def test_queues_are_drained_in_parallel():
+    """Test that workers send to different queues at once, one send in flight per queue and in order."""
+    barrier = threading.Barrier(4, timeout=5)
+    in_flight = {}
+    most_in_flight = {}
+    sent = []
+    lock = threading.Lock()
+
+    def send(content, queue_name):
+        with lock:
+            in_flight[queue_name] = in_flight.get(queue_name, 0) + 1
+            most_in_flight[queue_name] = max(most_in_flight.get(queue_name, 0), in_flight[queue_name])
+        if content.endswith("-0"):
+            # Every queue's first send waits for the others, which only a parallel drain passes
+            barrier.wait()
+        with lock:
+            in_flight[queue_name] -= 1
+            sent.append((queue_name, content))
+
+    outbox = Outbox(send, workers=4)
+    for i in range(5):
+        for queue in range(4):
+            outbox.put(f"queue-{queue}-{i}", f"queue-{queue}")
+    outbox.close(timeout=5)
+
+    assert len(sent) == 20
+    assert most_in_flight == {f"queue-{queue}": 1 for queue in range(4)}
+    for queue in range(4):
+        assert [content for name, content in sent if name == f"queue-{queue}"] == [
+            f"queue-{queue}-{i}" for i in range(5)
+        ]
+
+
+def test_waiting_messages_are_packed_per_queue():
+    """Test that messages waiting behind a send are packed into batches of up to batch_size."""
+    sender = RecordingSender()
+    sender.release.clear()
+    entered = threading.Event()
+
+    def send(content, queue_name):
+        entered.set()
+        sender(content, queue_name)
+
+    outbox = Outbox(send, batch_size=3, pack="+".join)
+    outbox.put("one", "queue")
+    assert entered.wait(5)
+    for content in ("two", "three", "four", "five"):
+        outbox.put(content, "queue")
+    sender.release.set()
+    outbox.close(timeout=5)
+
+    assert sender.sent == [("queue", "one"), ("queue", "two+three+four"), ("queue", "five")]
+    assert len(outbox) == 0
+
+
+def test_failed_sends_are_retried(caplog):
+    """Test that a failing send is retried until it succeeds."""
+    sender = RecordingSender(failures=3)
+    outbox = Outbox(sender, base_delay=0.001, jitter=lambda: 1.0)
+
+    outbox.put("message", "queue")
+    assert sender.delivered.wait(5)
+    outbox.close(timeout=5)
+
+    assert sender.attempts == 4
+    assert sender.sent == [("queue", "message")]
+    assert "retrying in" in caplog.text
+
+
+def test_backoff_is_exponential_capped_and_jittered():
+    """Test the retry delay grows by doubling up to max_delay, scaled by the jitter factor."""
+    outbox = Outbox(RecordingSender(), base_delay=0.1, max_delay=1.0, jitter=lambda: 0.5)
+
+    assert [outbox._backoff(attempt) for attempt in range(1, 7)] == pytest.approx(
+        [0.05, 0.1, 0.2, 0.4, 0.5, 0.5]
+    )
+
+
+def test_full_outbox_rejects_messages():
+    """Test that puts beyond max_size raise OutboxFull."""
+    sender = RecordingSender()
+    sender.release.clear()
+    outbox = Outbox(sender, max_size=2)
+
+    outbox.put("one", "queue")
+    outbox.put("two", "queue")
+    with pytest.raises(OutboxFull):
+        outbox.put("three", "queue")
+
+    sender.release.set()
+    outbox.close(timeout=5)
+    assert [content for _, content in sender.sent] == ["one", "two"]
+
+
+def test_closed_outbox_rejects_messages():
+    """Test that a closed outbox accepts no more messages."""
+    outbox = Outbox(RecordingSender())
+    outbox.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        outbox.put("message", "queue")
+
+
+def test_spilled_messages_survive_restart(tmp_path, caplog):
+    """Test that undelivered messages stay in the spill file and are sent by the next outbox."""
+    path = str(tmp_path / "outbox.sqlite")
+    failing = RecordingSender(failures=1000)
+    first = Outbox(failing, spill=SQLiteSpill(path), base_delay=0.001, jitter=lambda: 1.0)
+    first.put("one", "queue-a")
+    first.put("two", "queue-b")
+    first.close(timeout=5)
+    assert "2 messages were not delivered and remain in" in caplog.text
+
+    sender = RecordingSender()
+    spill = SQLiteSpill(path)
+    second = Outbox(sender, spill=spill)
+    second.close(timeout=5)
+
+    assert sender.sent == [("queue-a", "one"), ("queue-b", "two")]
+    assert spill.pending() == []
+
+
+def test_undeliverable_message_is_dead_lettered(tmp_path, caplog):
+    """Test that a message failing max_attempts times is set aside and later messages are sent."""
+    path = str(tmp_path / "outbox.sqlite")
+    spill = SQLiteSpill(path)
+
+    class PoisonSender(RecordingSender):
+        def __call__(self, content, queue_name):
+            if content == "poison":
+                self.attempts += 1
+                raise ValueError("queue not found")
+            super().__call__(content, queue_name)
+
+    sender = PoisonSender()
+    outbox = Outbox(sender, spill=spill, base_delay=0.001, jitter=lambda: 1.0, max_attempts=3)
+    outbox.put("poison", "missing-queue")
+    outbox.put("next", "queue")
+    assert sender.delivered.wait(5)
+    outbox.close(timeout=5)
+
+    assert sender.attempts == 4
+    assert sender.sent == [("queue", "next")]
+    assert outbox.dead_lettered == 1
+    assert [(content, queue, error) for _, content, queue, error in spill.dead_letters()] == [
+        ("poison", "missing-queue", "queue not found")
+    ]
+    assert spill.pending() == []
+    assert "Gave up on message" in caplog.text
+
+
+def test_open_circuit_does_not_use_up_attempts():
+    """Test that rejections by the open circuit breaker are not counted as failed attempts."""
+    rejections = [CircuitOpenError("queue", 0.0)] * 5
+    sent = []
+    delivered = threading.Event()
+
+    def send(content, queue_name):
+        if rejections:
+            raise rejections.pop()
+        sent.append(content)
+        delivered.set()
+
+    outbox = Outbox(send, base_delay=0.001, max_attempts=2)
+    outbox.put("message", "queue")
+    assert delivered.wait(5)
+    outbox.close(timeout=5)
+
+    assert sent == ["message"]
+    assert outbox.dead_lettered == 0
+
+
+def test_spill_rows_of_running_processes_are_not_taken_over(tmp_path):
+    """Test that processes sharing a spill file only recover rows of processes no longer running."""
+    path = str(tmp_path / "outbox.sqlite")
+    running = {101, 102}
+    first = SQLiteSpill(path, owner=101, is_alive=running.__contains__)
+    second = SQLiteSpill(path, owner=102, is_alive=running.__contains__)
+    first.add("from-first", "queue")
+    second.add("from-second", "queue")
+
+    assert [content for _, content, _ in second.pending()] == ["from-second"]
+
+    running.discard(101)
+    running.add(103)
+    third = SQLiteSpill(path, owner=103, is_alive=running.__contains__)
+    assert [content for _, content, _ in third.pending()] == ["from-first"]
+    assert [content for _, content, _ in first.pending()] == []
@@ -0,0 +1,126 @@
+"""Tests for the queue backends"""
+import asyncio
+
+import pytest
+
+from alma_item_checks_webhook_service.services import queue_backends
+from alma_item_checks_webhook_service.services.queue_backends import (
+    AsyncLocalQueueClient,
+    AzureQueueBackend,
+    LocalQueueBackend,
+    LocalQueueClient,
+    MemoryQueueStore,
+    SQLiteQueueStore,
+    build_queue_backend,
+    get_queue_backend,
+)
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    AsyncQueueClientRegistry,
+    QueueClientRegistry,
+)
+
+CONNECTION_STRING = "UseDevelopmentStorage=true"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, fake_clock):
+    """Each local queue store, with a manually advanced clock."""
+    if request.param == "memory":
+        yield MemoryQueueStore(clock=fake_clock)
+    else:
+        sqlite_store = SQLiteQueueStore(str(tmp_path / "queues.sqlite3"), clock=fake_clock)
+        yield sqlite_store
+        sqlite_store.close()
+
+
+def test_store_receives_in_order_per_queue(store):
+    """Test that messages are received oldest first, only from their own queue."""
+    for i in range(3):
+        store.put("queue-a", f"a-{i}")
+    store.put("queue-b", "b-0")
+
+    assert store.receive("queue-a", max_messages=2) == ["a-0", "a-1"]
+    assert store.receive("queue-a") == ["a-2"]
+    assert store.receive("queue-a") == []
+    assert store.count("queue-b") == 1
+
+
+def test_store_hides_message_for_visibility_timeout(store, fake_clock):
+    """Test that a delayed message is only received once its visibility timeout has passed."""
+    store.put("queue-a", "later", visibility_timeout=30)
+    store.put("queue-a", "now")
+
+    assert store.receive("queue-a") == ["now"]
+    assert store.count("queue-a") == 1
+    fake_clock.advance(30)
+    assert store.receive("queue-a") == ["later"]
+
+
+def test_sqlite_store_is_shared_by_path(tmp_path):
+    """Test that messages sent through one connection are received through another."""
+    path = str(tmp_path / "queues.sqlite3")
+    sender, receiver = SQLiteQueueStore(path), SQLiteQueueStore(path)
+
+    LocalQueueClient(sender, "fetch-item-queue").send_message("message")
+
+    assert receiver.receive("fetch-item-queue") == ["message"]
+    assert sender.count("fetch-item-queue") == 0
+
+
+def test_local_client_uses_only_visibility_timeout(fake_clock):
+    """Test that Azure-only send options are accepted and ignored."""
+    store = MemoryQueueStore(clock=fake_clock)
+    client = LocalQueueClient(store, "fetch-item-queue")
+
+    result = client.send_message("message", timeout=5, retry_total=1, visibility_timeout=10)
+
+    assert result == {"id": 1, "content": "message"}
+    assert store.receive("fetch-item-queue") == []
+    fake_clock.advance(10)
+    assert store.receive("fetch-item-queue") == ["message"]
+
+
+def test_async_client_sends_to_sqlite_off_the_loop(tmp_path):
+    """Test that the asyncio client stores messages through a blocking store."""
+    store = SQLiteQueueStore(str(tmp_path / "queues.sqlite3"))
+    client = AsyncLocalQueueClient(store, "fetch-item-queue")
+
+    async def send():
+        await client.send_message("message", visibility_timeout=0)
+        await client.close()
+
+    asyncio.run(send())
+
+    assert store.receive("fetch-item-queue") == ["message"]
+
+
+@pytest.mark.parametrize(
+    "name, backend_class",
+    [("azure", AzureQueueBackend), ("memory", LocalQueueBackend), ("sqlite", LocalQueueBackend)],
+)
+def test_build_queue_backend(override_settings, tmp_path, name, backend_class):
+    """Test that QUEUE_BACKEND selects the backend."""
+    override_settings(queue_backend=name, queue_sqlite_path=str(tmp_path / "queues.sqlite3"))
+
+    from alma_item_checks_webhook_service.config import get_settings
+
+    assert isinstance(build_queue_backend(get_settings()), backend_class)
+
+
+def test_unknown_queue_backend_is_rejected(override_settings):
+    """Test that an unknown QUEUE_BACKEND fails loudly."""
+    override_settings(queue_backend="rabbitmq")
+
+    with pytest.raises(ValueError, match="Unknown QUEUE_BACKEND"):
+        get_queue_backend()
+
+
+def test_registries_build_clients_from_configured_backend(override_settings):
+    """Test that the default registry factories send through the configured backend."""
+    override_settings(queue_backend="memory")
+    registry, async_registry = QueueClientRegistry(), AsyncQueueClientRegistry()
+
+    registry.send_message(CONNECTION_STRING, "fetch-item-queue", "sync")
+    asyncio.run(async_registry.send_message(CONNECTION_STRING, "fetch-item-queue", "async"))
+
+    assert queue_backends.get_queue_backend().store.receive("fetch-item-queue") == ["sync", "async"]
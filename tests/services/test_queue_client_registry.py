@@ -0,0 +1,173 @@
+"""Tests for the queue client registries"""
+import asyncio
+import threading
+
+import pytest
+from azure.core.exceptions import (
+    ClientAuthenticationError,
+    HttpResponseError,
+    ServiceRequestError,
+    ServiceResponseError,
+)
+
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    AsyncQueueClientRegistry,
+    QueueClientRegistry,
+    is_transient_send_error,
+)
+
+CONNECTION_STRING = "UseDevelopmentStorage=true"
+
+
+def test_client_is_built_once(fake_queue_factory):
+    """Test that repeated sends reuse a single client."""
+    registry = QueueClientRegistry(factory=fake_queue_factory)
+
+    for i in range(5):
+        registry.send_message(CONNECTION_STRING, "fetch-item-queue", f"message-{i}")
+
+    assert fake_queue_factory.builds == [(CONNECTION_STRING, "fetch-item-queue")]
+    assert len(fake_queue_factory.clients["fetch-item-queue"].messages) == 5
+
+
+def test_one_client_per_queue(fake_queue_factory):
+    """Test that each queue gets its own client."""
+    registry = QueueClientRegistry(factory=fake_queue_factory)
+
+    first = registry.get(CONNECTION_STRING, "queue-a")
+    second = registry.get(CONNECTION_STRING, "queue-b")
+
+    assert first is not second
+    assert registry.get(CONNECTION_STRING, "queue-a") is first
+    assert len(fake_queue_factory.builds) == 2
+
+
+def test_concurrent_get_builds_once(fake_queue_factory):
+    """Test that concurrent first use still builds a single client."""
+    registry = QueueClientRegistry(factory=fake_queue_factory)
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        registry.get(CONNECTION_STRING, "fetch-item-queue")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(fake_queue_factory.builds) == 1
+
+
+def test_broken_connection_rebuilds_client(fake_queue_factory):
+    """Test that a connection error discards the client and the next send rebuilds it."""
+    registry = QueueClientRegistry(factory=fake_queue_factory)
+    broken = registry.get(CONNECTION_STRING, "fetch-item-queue")
+    broken.fail_with = ServiceRequestError("connection reset")
+
+    with pytest.raises(ServiceRequestError):
+        registry.send_message(CONNECTION_STRING, "fetch-item-queue", "message")
+
+    assert broken.closed
+    registry.send_message(CONNECTION_STRING, "fetch-item-queue", "message")
+    assert len(fake_queue_factory.builds) == 2
+    assert fake_queue_factory.clients["fetch-item-queue"].messages == ["message"]
+
+
+def test_other_errors_keep_client(fake_queue_factory):
+    """Test that non-connection errors do not discard the pooled client."""
+    registry = QueueClientRegistry(factory=fake_queue_factory)
+    client = registry.get(CONNECTION_STRING, "fetch-item-queue")
+    client.fail_with = ValueError("bad message")
+
+    with pytest.raises(ValueError):
+        registry.send_message(CONNECTION_STRING, "fetch-item-queue", "message")
+
+    assert registry.get(CONNECTION_STRING, "fetch-item-queue") is client
+
+
+def http_error(status):
+    """Build an HttpResponseError with a status code."""
+    error = HttpResponseError(message=f"status {status}")
+    error.status_code = status
+    return error
+
+
+@pytest.mark.parametrize(
+    "error, transient",
+    [
+        (ServiceRequestError("connection refused"), True),
+        (ServiceResponseError("connection reset"), True),
+        (TimeoutError(), True),
+        (asyncio.CancelledError(), True),
+        (http_error(500), True),
+        (http_error(503), True),
+        (http_error(408), True),
+        (http_error(429), True),
+        (http_error(400), False),
+        (ClientAuthenticationError("bad key"), False),
+        (http_error(404), False),
+        (ValueError("bad message"), False),
+        (TypeError("not a string"), False),
+    ],
+)
+def test_transient_send_errors(error, transient):
+    """Test that only errors pointing at an unhealthy queue service are transient."""
+    assert is_transient_send_error(error) is transient
+
+
+def test_clear_closes_clients(fake_queue_factory):
+    """Test that clear closes and forgets all clients."""
+    registry = QueueClientRegistry(factory=fake_queue_factory)
+    client = registry.get(CONNECTION_STRING, "fetch-item-queue")
+
+    registry.clear()
+
+    assert client.closed
+    assert registry.get(CONNECTION_STRING, "fetch-item-queue") is not client
+
+
+def test_async_client_is_built_once(fake_async_queue_factory):
+    """Test that repeated async sends in one loop reuse a single client."""
+    registry = AsyncQueueClientRegistry(factory=fake_async_queue_factory)
+
+    async def send_all():
+        await asyncio.gather(
+            *(
+                registry.send_message(CONNECTION_STRING, "fetch-item-queue", f"message-{i}")
+                for i in range(5)
+            )
+        )
+
+    asyncio.run(send_all())
+
+    assert len(fake_async_queue_factory.builds) == 1
+    assert len(fake_async_queue_factory.clients["fetch-item-queue"].messages) == 5
+
+
+def test_async_client_rebuilt_for_new_loop(fake_async_queue_factory):
+    """Test that a client bound to a finished event loop is not reused."""
+    registry = AsyncQueueClientRegistry(factory=fake_async_queue_factory)
+
+    asyncio.run(registry.send_message(CONNECTION_STRING, "fetch-item-queue", "first"))
+    asyncio.run(registry.send_message(CONNECTION_STRING, "fetch-item-queue", "second"))
+
+    assert len(fake_async_queue_factory.builds) == 2
+
+
+def test_async_broken_connection_rebuilds_client(fake_async_queue_factory):
+    """Test that an async connection error discards the client."""
+    registry = AsyncQueueClientRegistry(factory=fake_async_queue_factory)
+
+    async def scenario():
+        broken = registry.get(CONNECTION_STRING, "fetch-item-queue")
+        broken.fail_with = ServiceRequestError("connection reset")
+        with pytest.raises(ServiceRequestError):
+            await registry.send_message(CONNECTION_STRING, "fetch-item-queue", "message")
+        assert broken.closed
+        await registry.send_message(CONNECTION_STRING, "fetch-item-queue", "message")
+
+    asyncio.run(scenario())
+
+    assert len(fake_async_queue_factory.builds) == 2
@@ -0,0 +1,46 @@
+"""Tests for the QueueRouter class"""
+import zlib
+
+import pytest
+
+from alma_item_checks_webhook_service.services.queue_router import QueueRouter
+
+
+def test_single_partition_routes_everything_to_base_queue():
+    """Test that the default router keeps the single fetch item queue."""
+    router = QueueRouter("fetch-item-queue")
+
+    assert router.queue_names == ["fetch-item-queue"]
+    assert router.route("TU", "12345") == "fetch-item-queue"
+
+
+def test_partitions_are_chosen_by_stable_barcode_hash():
+    """Test that barcodes are spread across partitions by CRC-32 and always land in the same one."""
+    router = QueueRouter("fetch-item-queue", partitions=4)
+    barcodes = [f"3999900{i:07d}" for i in range(200)]
+
+    assert router.queue_names == [f"fetch-item-queue-{i}" for i in range(4)]
+    for barcode in barcodes:
+        expected = f"fetch-item-queue-{zlib.crc32(barcode.encode()) % 4}"
+        assert router.route("TU", barcode) == expected
+        assert router.route("OTHER", barcode) == expected
+    assert {router.route("TU", barcode) for barcode in barcodes} == set(router.queue_names)
+
+
+def test_routing_table_overrides_partitions():
+    """Test that routed institutions get their own queue and others are partitioned."""
+    router = QueueRouter(
+        "fetch-item-queue", partitions=2, routes={"01WRLC_GWA": "fetch-item-gwa"}
+    )
+
+    assert router.route("01WRLC_GWA", "12345") == "fetch-item-gwa"
+    assert router.route("01WRLC_GUNIV", "12345").startswith("fetch-item-queue-")
+    assert router.queue_names == [
+        "fetch-item-queue-0", "fetch-item-queue-1", "fetch-item-gwa"
+    ]
+
+
+def test_invalid_partition_count():
+    """Test that fewer than one partition is rejected."""
+    with pytest.raises(ValueError, match="at least 1"):
+        QueueRouter("fetch-item-queue", partitions=0)
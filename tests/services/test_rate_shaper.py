@@ -0,0 +1,89 @@
+"""Tests for per-institution token-bucket smoothing"""
+import pytest
+
+from alma_item_checks_webhook_service.services import rate_shaper
+from alma_item_checks_webhook_service.services.rate_shaper import (
+    RateShaper,
+    ShapingLimitExceeded,
+    get_rate_shaper,
+)
+
+
+def test_events_within_burst_are_not_delayed(fake_clock):
+    """Test that an idle institution may send a full burst without delay."""
+    shaper = RateShaper({"TU": 2.0}, burst=3, clock=fake_clock)
+
+    assert [shaper.delay("TU") for _ in range(3)] == [0, 0, 0]
+
+
+def test_over_rate_events_get_increasing_delays(fake_clock):
+    """Test that each event past the burst is delayed by another 1 / rate seconds."""
+    shaper = RateShaper({"TU": 2.0}, burst=2, clock=fake_clock)
+
+    assert [shaper.delay("TU") for _ in range(8)] == [0, 0, 1, 1, 2, 2, 3, 3]
+
+
+def test_refill_reduces_delays(fake_clock):
+    """Test that elapsed time refills the bucket and pays off debt."""
+    shaper = RateShaper({"TU": 1.0}, burst=1, clock=fake_clock)
+    assert [shaper.delay("TU") for _ in range(4)] == [0, 1, 2, 3]
+
+    fake_clock.advance(2)
+    assert shaper.delay("TU") == 2
+
+    fake_clock.advance(60)
+    assert shaper.delay("TU") == 0
+
+
+def test_institutions_have_independent_buckets(fake_clock):
+    """Test that one institution's burst does not delay another's events."""
+    shaper = RateShaper({"TU": 1.0, "GU": 1.0}, burst=1, clock=fake_clock)
+    shaper.delay("TU")
+
+    assert shaper.delay("TU") == 1
+    assert shaper.delay("GU") == 0
+
+
+def test_events_past_max_delay_are_refused(fake_clock):
+    """Test that an event needing more than max_delay is refused rather than given max_delay."""
+    shaper = RateShaper({"TU": 1.0}, burst=1, max_delay=3, clock=fake_clock)
+    assert [shaper.delay("TU") for _ in range(4)] == [0, 1, 2, 3]
+
+    with pytest.raises(ShapingLimitExceeded) as refused:
+        shaper.delay("TU")
+
+    assert refused.value.retry_after == pytest.approx(1)
+    assert refused.value.retry_after_header == "1"
+
+
+def test_refused_events_take_no_token(fake_clock):
+    """Test that refused events do not add debt, so a retry after Retry-After is accepted."""
+    shaper = RateShaper({"TU": 2.0}, burst=1, max_delay=1, clock=fake_clock)
+    assert [shaper.delay("TU") for _ in range(3)] == [0, 1, 1]
+    for _ in range(5):
+        with pytest.raises(ShapingLimitExceeded):
+            shaper.delay("TU")
+
+    fake_clock.advance(0.5)
+    assert shaper.delay("TU") == 1
+
+
+def test_default_rate_applies_to_unlisted_institutions(fake_clock):
+    """Test that unlisted institutions use the default rate, and are unshaped without one."""
+    shaped = RateShaper({}, default_rate=1.0, burst=1, clock=fake_clock)
+    unshaped = RateShaper({"TU": 1.0}, burst=1, clock=fake_clock)
+
+    assert [shaped.delay("GU") for _ in range(3)] == [0, 1, 2]
+    assert [unshaped.delay("GU") for _ in range(3)] == [0, 0, 0]
+
+
+def test_get_rate_shaper(override_settings):
+    """Test that the process-wide shaper exists only when a rate is configured."""
+    assert get_rate_shaper() is None
+
+    override_settings(shaping_rates={"TU": 5.0}, shaping_burst=10, shaping_max_delay_seconds=60)
+    shaper = get_rate_shaper()
+
+    assert shaper is rate_shaper._rate_shaper
+    assert (shaper.rates, shaper.burst, shaper.max_delay) == ({"TU": 5.0}, 10, 60)
+    assert get_rate_shaper() is shaper
@@ -0,0 +1,53 @@
+"""Tests for the helpers shared by the table-backed stores"""
+import logging
+
+import pytest
+from azure.core.exceptions import ServiceRequestError
+
+from alma_item_checks_webhook_service.services.table_storage import (
+    item_keys,
+    open_table,
+    store_errors_logged,
+    table_key,
+)
+
+
+def test_table_key_replaces_disallowed_characters():
+    """Test that characters Table Storage rejects in keys are replaced."""
+    assert table_key("a/b\\c#d?e") == "a_b_c_d_e"
+
+
+def test_item_keys():
+    """Test that an item's entity is keyed by institution and barcode."""
+    assert item_keys("TU", "12/34") == {"PartitionKey": "TU", "RowKey": "12_34"}
+
+
+def test_open_table_creates_table(mocker):
+    """Test that the table is created if it does not exist."""
+    pytest.importorskip("azure.data.tables")
+    service = mocker.patch("azure.data.tables.TableServiceClient.from_connection_string")
+
+    table = open_table("UseDevelopmentStorage=true", "debounce")
+
+    service.assert_called_once_with("UseDevelopmentStorage=true")
+    service.return_value.create_table_if_not_exists.assert_called_once_with("debounce")
+    assert table is service.return_value.create_table_if_not_exists.return_value
+
+
+def test_store_errors_are_logged_and_suppressed(caplog):
+    """Test that a storage error skips the rest of the block and is logged."""
+    reached = False
+    with caplog.at_level(logging.WARNING):
+        with store_errors_logged("Store unavailable: %s"):
+            raise ServiceRequestError("down")
+            reached = True
+
+    assert not reached
+    assert "Store unavailable: down" in caplog.text
+
+
+def test_other_errors_propagate():
+    """Test that errors other than storage errors are not suppressed."""
+    with pytest.raises(KeyError):
+        with store_errors_logged("Store unavailable: %s"):
+            raise KeyError("barcode")
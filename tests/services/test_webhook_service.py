@@ -1,71 +1,74 @@
 """Tests for the WebhookService class"""
+import base64
+import hashlib
+import hmac
 import json
+import time
 from unittest.mock import Mock
 
 import pytest
-import azure.functions as func
-
+from azure.core.exceptions import HttpResponseError
+
+from alma_item_checks_webhook_service.config import (
+    FETCH_ITEM_QUEUE,
+    STORAGE_CONNECTION_STRING,
+)
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    QueueClientRegistry,
+    is_transient_send_error,
+)
+from alma_item_checks_webhook_service.services import webhook_service
+from alma_item_checks_webhook_service.services.barcode_debouncer import (
+    BarcodeDebouncer,
+    MemoryDebounceStore,
+)
+from alma_item_checks_webhook_service.services.event_filter import EventFilter
 from alma_item_checks_webhook_service.services.webhook_service import WebhookService
+from alma_item_checks_webhook_service.utils.message_codec import decode_messages
 
 
 @pytest.fixture
-def mock_request_factory():
-    """Factory to create mock HttpRequest objects."""
-
-    def _create_mock_request(
-        method="POST",
-        params=None,
-        headers=None,
-        body=b'{"event": {"value": "ITEM_UPDATED"}, "item": {"item_data": {"barcode": "12345"}}, "institution": {"value": "TU"}}',
-    ):
-        default_headers = {"X-Exl-Signature": "valid_signature"}
-        req = func.HttpRequest(
-            method=method,
-            url="/api/scfwebhook",
-            params=params or {},
-            headers=headers or default_headers,
-            body=body,
-        )
-        # Add get_json method to the mock request
-        req.get_json = Mock(return_value=json.loads(body.decode()) if body else {})
-        return req
-
-    return _create_mock_request
-
-
-@pytest.fixture
-def mock_dependencies(mocker):
+def mock_dependencies(mocker, fake_queue_factory):
     """Mock all external dependencies for the WebhookService."""
-    mock_storage_service = mocker.patch(
-        "alma_item_checks_webhook_service.services.webhook_service.StorageService",
-        autospec=True,
+    queue_registry = mocker.patch(
+        "alma_item_checks_webhook_service.services.webhook_service.queue_client_registry",
+        QueueClientRegistry(factory=fake_queue_factory),
     )
 
     mocks = {
-        "StorageService": mock_storage_service,
-        "validate_webhook_signature": mocker.patch(
-            "alma_item_checks_webhook_service.services.webhook_service.validate_webhook_signature"
-        ),
-        "os_environ": mocker.patch("os.environ.get", return_value="Production"),
+        "queue_factory": fake_queue_factory,
+        "queue_registry": queue_registry,
+        "verify_signature": mocker.patch(
+            "alma_item_checks_webhook_service.services.webhook_service.get_signature_verifier"
+        ).return_value.verify,
+        "os_environ": mocker.patch.dict("os.environ", {"AZURE_FUNCTIONS_ENVIRONMENT": "Production"}),
     }
-    mocks["mock_storage_service"] = mocks["StorageService"].return_value
     return mocks
 
 
+def fetch_item_queue(mock_dependencies):
+    """Return the fake fetch item queue client from the patched registry."""
+    return mock_dependencies["queue_registry"].get(
+        STORAGE_CONNECTION_STRING, FETCH_ITEM_QUEUE
+    )
+
+
 class TestParseWebhook:
     """Tests for the main parse_webhook method."""
 
     def test_parse_webhook_success(self, mock_request_factory, mock_dependencies):
         """Test the happy path for a valid webhook POST request."""
         req = mock_request_factory()
-        mock_dependencies["validate_webhook_signature"].return_value = True
+        mock_dependencies["verify_signature"].return_value = True
 
         service = WebhookService(req)
         response = service.parse_webhook()
 
         assert response.status_code == 200
         assert response.get_body() == b"Webhook received"
-        mock_dependencies["mock_storage_service"].send_queue_message.assert_called_once()
+        assert [json.loads(m) for m in fetch_item_queue(mock_dependencies).messages] == [
+            {"institution": "TU", "barcode": "12345"}
+        ]
 
     def test_parse_webhook_challenge_request(self, mock_request_factory):
         """Test that a GET request with a challenge is handled correctly."""
@@ -79,7 +82,7 @@ class TestParseWebhook:
     def test_parse_webhook_missing_barcode(self, mock_request_factory, mock_dependencies, caplog):
         """Test that a webhook with a missing barcode returns a 400 error."""
         req = mock_request_factory(body=b'{"event": {"value": "ITEM_UPDATED"}, "item": {"item_data": {}}, "institution": {"value": "TU"}}')  # No barcode
-        mock_dependencies["validate_webhook_signature"].return_value = True
+        mock_dependencies["verify_signature"].return_value = True
 
         service = WebhookService(req)
         response = service.parse_webhook()
@@ -91,7 +94,7 @@ class TestParseWebhook:
     def test_parse_webhook_non_item_updated_event(self, mock_request_factory, mock_dependencies):
         """Test that a webhook with a non-ITEM_UPDATED event returns 200 but doesn't process."""
         req = mock_request_factory(body=b'{"event": {"value": "ITEM_CREATED"}, "item": {"item_data": {"barcode": "12345"}}, "institution": {"value": "TU"}}')
-        mock_dependencies["validate_webhook_signature"].return_value = True
+        mock_dependencies["verify_signature"].return_value = True
 
         service = WebhookService(req)
         response = service.parse_webhook()
@@ -99,12 +102,12 @@ class TestParseWebhook:
         assert response.status_code == 200
         assert response.get_body() == b"Webhook received"
         # Should not call send_queue_message for non-ITEM_UPDATED events
-        mock_dependencies["mock_storage_service"].send_queue_message.assert_not_called()
+        assert mock_dependencies["queue_factory"].builds == []
 
     def test_parse_webhook_invalid_signature(self, mock_request_factory, mock_dependencies, caplog):
         """Test that an invalid signature returns a 500 error."""
         req = mock_request_factory()
-        mock_dependencies["validate_webhook_signature"].return_value = False
+        mock_dependencies["verify_signature"].return_value = False
 
         service = WebhookService(req)
         response = service.parse_webhook()
@@ -119,13 +122,13 @@ class TestValidateSignature:
 
     def test_validate_signature_prod_valid(self, mock_request_factory, mock_dependencies):
         req = mock_request_factory()
-        mock_dependencies["validate_webhook_signature"].return_value = True
+        mock_dependencies["verify_signature"].return_value = True
         service = WebhookService(req)
         assert service.validate_signature() is True
 
     def test_validate_signature_prod_invalid(self, mock_request_factory, mock_dependencies, caplog):
         req = mock_request_factory()
-        mock_dependencies["validate_webhook_signature"].return_value = False
+        mock_dependencies["verify_signature"].return_value = False
         service = WebhookService(req)
         assert service.validate_signature() is False
         assert "Invalid webhook signature received" in caplog.text
@@ -133,18 +136,18 @@ class TestValidateSignature:
     def test_validate_signature_dev_env(self, mock_request_factory, mock_dependencies):
         """Test that signature validation is skipped in a development environment."""
         req = mock_request_factory()
-        mock_dependencies["os_environ"].return_value = "Development"
+        mock_dependencies["os_environ"]["AZURE_FUNCTIONS_ENVIRONMENT"] = "Development"
         service = WebhookService(req)
         assert service.validate_signature() is True
         # Ensure the actual validation function was not called
-        mock_dependencies["validate_webhook_signature"].assert_not_called()
+        mock_dependencies["verify_signature"].assert_not_called()
 
     def test_parse_webhook_storage_service_error(self, mock_request_factory, mock_dependencies, caplog):
         """Test that a storage service error returns a 500 error."""
         req = mock_request_factory()
-        mock_dependencies["validate_webhook_signature"].return_value = True
+        mock_dependencies["verify_signature"].return_value = True
         # Make the storage service throw an exception
-        mock_dependencies["mock_storage_service"].send_queue_message.side_effect = ValueError("Storage error")
+        fetch_item_queue(mock_dependencies).fail_with = ValueError("Storage error")
 
         service = WebhookService(req)
         response = service.parse_webhook()
@@ -156,7 +159,7 @@ class TestValidateSignature:
     def test_get_request_data_missing_institution(self, mock_request_factory, mock_dependencies, caplog):
         """Test that missing institution.value in request body returns a 400 error."""
         req = mock_request_factory(body=b'{"event": {"value": "ITEM_UPDATED"}, "item": {"item_data": {"barcode": "12345"}}}')  # No institution
-        mock_dependencies["validate_webhook_signature"].return_value = True
+        mock_dependencies["verify_signature"].return_value = True
 
         service = WebhookService(req)
         response = service.get_request_data_from_webhook()
@@ -167,10 +170,8 @@ class TestValidateSignature:
 
     def test_get_request_data_invalid_json(self, mock_request_factory, mock_dependencies, caplog):
         """Test that invalid JSON in request body returns a 400 error."""
-        req = mock_request_factory()
-        mock_dependencies["validate_webhook_signature"].return_value = True
-        # Make get_json throw a ValueError
-        req.get_json = Mock(side_effect=ValueError("Invalid JSON"))
+        req = mock_request_factory(body=b'{"event": {"value": "ITEM_UPDATED"}, "item": ')
+        mock_dependencies["verify_signature"].return_value = True
 
         service = WebhookService(req)
         response = service.get_request_data_from_webhook()
@@ -178,3 +179,709 @@ class TestValidateSignature:
         assert response.status_code == 400
         assert b"Invalid JSON in request body" in response.get_body()
         assert "Invalid JSON in request body" in caplog.text
+
+
+class TestBatching:
+    """Tests for enqueueing through the fetch item batcher."""
+
+    @pytest.fixture(autouse=True)
+    def batching_enabled(self, mocker, override_settings):
+        override_settings(fetch_item_batch_size=2, fetch_item_batch_window_ms=10)
+        batchers = mocker.patch.dict(webhook_service._fetch_item_batchers, clear=True)
+        yield
+        for batcher in batchers.values():
+            batcher.close(timeout=5)
+
+    def test_parse_webhook_sends_batch_message(self, mock_request_factory, mock_dependencies):
+        """Test that a batched webhook is sent as a versioned batch message."""
+        mock_dependencies["verify_signature"].return_value = True
+
+        response = WebhookService(mock_request_factory()).parse_webhook()
+
+        assert response.status_code == 200
+        assert [json.loads(m) for m in fetch_item_queue(mock_dependencies).messages] == [
+            {"version": 1, "messages": [{"institution": "TU", "barcode": "12345"}]}
+        ]
+
+    def test_compact_batch_message(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that batches use the compact encoding when MESSAGE_FORMAT is compact."""
+        override_settings(fetch_item_batch_size=2, fetch_item_batch_window_ms=10, message_format="compact")
+        mock_dependencies["verify_signature"].return_value = True
+
+        WebhookService(mock_request_factory()).parse_webhook()
+
+        [content] = fetch_item_queue(mock_dependencies).messages
+        assert json.loads(content) == {"v": 2, "m": [{"i": "TU", "b": "12345"}]}
+
+    def test_parse_webhook_batch_send_error(self, mock_request_factory, mock_dependencies, caplog):
+        """Test that a failed batch send returns a 500 error to the caller."""
+        mock_dependencies["verify_signature"].return_value = True
+        fetch_item_queue(mock_dependencies).fail_with = ValueError("Storage error")
+
+        response = WebhookService(mock_request_factory()).parse_webhook()
+
+        assert response.status_code == 500
+        assert "Failed to send message to queue: Storage error" in caplog.text
+
+
+class TestDebounce:
+    """Tests for debouncing repeat item updates."""
+
+    @pytest.fixture
+    def debouncer(self, mocker, fake_clock):
+        debouncer = BarcodeDebouncer(MemoryDebounceStore(100, clock=fake_clock), ttl=30)
+        mocker.patch(
+            "alma_item_checks_webhook_service.services.webhook_service.get_barcode_debouncer",
+            return_value=debouncer,
+        )
+        return debouncer
+
+    @staticmethod
+    def send(mock_request_factory, i):
+        return WebhookService(mock_request_factory(headers={"X-Exl-Signature": f"sig-{i}"})).parse_webhook()
+
+    def test_repeats_are_coalesced(self, mock_request_factory, mock_dependencies, debouncer):
+        """Test that repeat webhooks for the same barcode return 200 and are queued once between them."""
+        mock_dependencies["verify_signature"].return_value = True
+
+        responses = [self.send(mock_request_factory, i) for i in range(3)]
+
+        assert [response.status_code for response in responses] == [200, 200, 200]
+        assert len(fetch_item_queue(mock_dependencies).messages) == 2
+        assert debouncer.stats() == {"hits": 1, "misses": 2}
+
+    def test_only_the_first_repeat_is_held(self, mock_request_factory, mock_dependencies, debouncer):
+        """Test that the first event is sent at once and the repeat standing in for the burst is hidden for the window."""
+        mock_dependencies["verify_signature"].return_value = True
+
+        for i in range(3):
+            self.send(mock_request_factory, i)
+
+        kwargs = fetch_item_queue(mock_dependencies).send_kwargs
+        assert [k.get("visibility_timeout", 0) for k in kwargs] == [0, 30]
+
+    def test_debounce_window_outlasts_a_shorter_shaping_delay(self, mocker, mock_request_factory, mock_dependencies, debouncer, override_settings, fake_clock):
+        """Test that a held repeat gets the longer of its debounce window and rate shaping delay."""
+        from alma_item_checks_webhook_service.services import rate_shaper
+
+        override_settings(shaping_rates={"TU": 0.1}, shaping_burst=1)
+        mocker.patch.object(rate_shaper, "_rate_shaper", rate_shaper.RateShaper({"TU": 0.1}, burst=1, clock=fake_clock))
+        mock_dependencies["verify_signature"].return_value = True
+
+        for i in range(2):
+            self.send(mock_request_factory, i)
+
+        kwargs = fetch_item_queue(mock_dependencies).send_kwargs
+        assert [k.get("visibility_timeout", 0) for k in kwargs] == [0, 30]
+
+    def test_first_event_goes_through_the_outbox(self, mocker, mock_request_factory, mock_dependencies, debouncer, override_settings):
+        """Test that debouncing leaves ack-first mode in place for undelayed messages."""
+        override_settings(outbox_enabled=True)
+        outbox = mocker.patch.object(webhook_service, "get_outbox").return_value
+        mock_dependencies["verify_signature"].return_value = True
+
+        for i in range(2):
+            self.send(mock_request_factory, i)
+
+        outbox.put.assert_called_once()
+        assert fetch_item_queue(mock_dependencies).send_kwargs[0]["visibility_timeout"] == 30
+
+    def test_first_event_goes_through_the_batcher(self, mocker, mock_request_factory, mock_dependencies, debouncer, override_settings):
+        """Test that debouncing leaves batching in place for undelayed messages."""
+        override_settings(fetch_item_batch_size=2, fetch_item_batch_window_ms=10)
+        batchers = mocker.patch.dict(webhook_service._fetch_item_batchers, clear=True)
+        mock_dependencies["verify_signature"].return_value = True
+
+        try:
+            for i in range(2):
+                self.send(mock_request_factory, i)
+        finally:
+            for batcher in batchers.values():
+                batcher.close(timeout=5)
+
+        queue = fetch_item_queue(mock_dependencies)
+        assert [json.loads(m) for m in queue.messages] == [
+            {"version": 1, "messages": [{"institution": "TU", "barcode": "12345"}]},
+            {"institution": "TU", "barcode": "12345"},
+        ]
+        assert queue.send_kwargs[1]["visibility_timeout"] == 30
+
+    def test_failed_enqueue_releases_barcode(self, mock_request_factory, mock_dependencies, debouncer):
+        """Test that a failed send does not suppress Alma's retry."""
+        mock_dependencies["verify_signature"].return_value = True
+        queue = fetch_item_queue(mock_dependencies)
+        queue.fail_with = ValueError("Storage error")
+
+        assert WebhookService(mock_request_factory()).parse_webhook().status_code == 500
+
+        queue.fail_with = None
+        assert WebhookService(mock_request_factory()).parse_webhook().status_code == 200
+        assert len(queue.messages) == 1
+
+
+class TestDeliveryIdempotency:
+    """Tests for acknowledging retried deliveries without reprocessing them."""
+
+    def test_retry_is_acknowledged_without_parsing(self, mocker, mock_request_factory, mock_dependencies):
+        """Test that a byte-identical retry returns 200 without a second parse or enqueue."""
+        mock_dependencies["verify_signature"].return_value = True
+        extract = mocker.spy(webhook_service, "extract_item_event")
+        WebhookService(mock_request_factory()).parse_webhook()
+
+        response = WebhookService(mock_request_factory()).parse_webhook()
+
+        assert response.status_code == 200
+        assert extract.call_count == 1
+        assert len(fetch_item_queue(mock_dependencies).messages) == 1
+
+    def test_different_deliveries_are_processed(self, mock_request_factory, mock_dependencies):
+        """Test that deliveries with different signatures are both processed."""
+        mock_dependencies["verify_signature"].return_value = True
+
+        WebhookService(mock_request_factory(headers={"X-Exl-Signature": "first"})).parse_webhook()
+        WebhookService(mock_request_factory(headers={"X-Exl-Signature": "second"})).parse_webhook()
+
+        assert len(fetch_item_queue(mock_dependencies).messages) == 2
+
+    def test_failed_delivery_is_retried(self, mock_request_factory, mock_dependencies):
+        """Test that a retry of a delivery that failed is processed again."""
+        mock_dependencies["verify_signature"].return_value = True
+        queue = fetch_item_queue(mock_dependencies)
+        queue.fail_with = ValueError("Storage error")
+        assert WebhookService(mock_request_factory()).parse_webhook().status_code == 500
+
+        queue.fail_with = None
+        assert WebhookService(mock_request_factory()).parse_webhook().status_code == 200
+        assert len(queue.messages) == 1
+
+    def test_padding_variants_are_the_same_delivery(self, mock_request_factory, mock_dependencies):
+        """Test that a non-canonical base64 spelling of the same signature is a duplicate."""
+        mock_dependencies["verify_signature"].return_value = True
+        WebhookService(mock_request_factory(
+            headers={"X-Exl-Signature": "n9h4nbtY6kgo0ns104I3W2khZH0lM9oiVLqLlmyeb+U="}
+        )).parse_webhook()
+
+        response = WebhookService(mock_request_factory(
+            headers={"X-Exl-Signature": "n9h4nbtY6kgo0ns104I3W2khZH0lM9oiVLqLlmyeb+V="}
+        )).parse_webhook()
+
+        assert response.status_code == 200
+        assert len(fetch_item_queue(mock_dependencies).messages) == 1
+
+    def test_exception_releases_the_claim(self, mocker, mock_request_factory, mock_dependencies):
+        """Test that a delivery whose processing raises is processed again on retry."""
+        mock_dependencies["verify_signature"].return_value = True
+        get_event_filter = mocker.patch.object(
+            webhook_service, "get_event_filter", side_effect=ValueError("Malformed EVENT_FILTER")
+        )
+        with pytest.raises(ValueError):
+            WebhookService(mock_request_factory()).parse_webhook()
+
+        get_event_filter.side_effect = None
+        get_event_filter.return_value = None
+        assert WebhookService(mock_request_factory()).parse_webhook().status_code == 200
+        assert len(fetch_item_queue(mock_dependencies).messages) == 1
+
+    def test_retry_during_processing_is_asked_to_come_back(self, mocker, mock_request_factory, mock_dependencies):
+        """Test that a retry arriving while the first attempt is in flight gets 503, not 200."""
+        mock_dependencies["verify_signature"].return_value = True
+        responses = []
+
+        def send_during_retry(*args, **kwargs):
+            responses.append(WebhookService(mock_request_factory()).parse_webhook())
+            raise ValueError("Storage error")
+
+        mocker.patch.object(webhook_service, "send_fetch_item_message", side_effect=send_during_retry)
+
+        first = WebhookService(mock_request_factory()).parse_webhook()
+
+        assert first.status_code == 500
+        assert responses[0].status_code == 503
+        assert responses[0].headers["Retry-After"] == "5"
+
+    def test_disabled(self, override_settings, mock_request_factory, mock_dependencies):
+        """Test that retries are reprocessed when idempotency is disabled."""
+        override_settings(idempotency_enabled=False)
+        mock_dependencies["verify_signature"].return_value = True
+
+        WebhookService(mock_request_factory()).parse_webhook()
+        WebhookService(mock_request_factory()).parse_webhook()
+
+        assert len(fetch_item_queue(mock_dependencies).messages) == 2
+
+
+def test_signature_verifier_accepts_previous_secrets(override_settings):
+    """Test that the verifier is built from the current and previous secrets."""
+    override_settings(webhook_previous_secrets=["old_secret"])
+    webhook_service.get_signature_verifier.cache_clear()
+    body = b'{"key": "value"}'
+    old_signature = base64.b64encode(hmac.new(b"old_secret", body, hashlib.sha256).digest()).decode()
+
+    try:
+        assert webhook_service.get_signature_verifier().verify(body, old_signature)
+    finally:
+        webhook_service.get_signature_verifier.cache_clear()
+
+
+def test_empty_secret_rejects_webhooks(mock_request_factory, override_settings):
+    """Test that an empty WEBHOOK_SECRET fails signature validation instead of raising."""
+    override_settings(webhook_secret="", webhook_previous_secrets=[])
+    webhook_service.get_signature_verifier.cache_clear()
+
+    try:
+        response = WebhookService(mock_request_factory(headers={"X-Exl-Signature": "c2ln"})).parse_webhook()
+    finally:
+        webhook_service.get_signature_verifier.cache_clear()
+
+    assert response.status_code == 500
+    assert response.get_body() == b"Internal Server Error: Invalid webhook signature"
+
+
+def test_parse_webhook_emits_stage_spans(mock_request_factory, mock_dependencies, override_settings):
+    """Test that a queued webhook records its stages and outcome when telemetry is enabled."""
+    from alma_item_checks_webhook_service.utils.telemetry import get_tracer
+
+    override_settings(telemetry_exporter="memory")
+    mock_dependencies["verify_signature"].return_value = True
+
+    response = WebhookService(mock_request_factory()).parse_webhook()
+
+    assert response.status_code == 200
+    (root,) = get_tracer().exporter.spans
+    assert [child.name for child in root.children] == [
+        "webhook.signature", "webhook.parse", "webhook.enqueue"
+    ]
+    assert root.attributes == {
+        "event": "ITEM_UPDATED", "institution": "TU", "outcome": "queued"
+    }
+
+
+def test_parse_webhook_span_outcome_for_invalid_signature(mock_request_factory, mock_dependencies, override_settings):
+    """Test that a rejected webhook is labelled with its outcome."""
+    from alma_item_checks_webhook_service.utils.telemetry import get_tracer
+
+    override_settings(telemetry_exporter="memory")
+    mock_dependencies["verify_signature"].return_value = False
+
+    WebhookService(mock_request_factory()).parse_webhook()
+
+    (root,) = get_tracer().exporter.spans
+    assert root.attributes == {"outcome": "invalid_signature"}
+
+
+class TestPartitionedQueues:
+    """Tests for routing fetch item messages across partitioned queues."""
+
+    @staticmethod
+    def item_body(institution, barcode):
+        return json.dumps({
+            "event": {"value": "ITEM_UPDATED"},
+            "institution": {"value": institution},
+            "item": {"item_data": {"barcode": barcode}},
+        }).encode()
+
+    def test_messages_routed_by_barcode_and_institution(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that each message goes to its barcode's partition or its institution's queue."""
+        override_settings(
+            fetch_item_partitions=3,
+            fetch_item_routes={"HOT": "fetch-item-hot"},
+            webhook_async=False,
+        )
+        mock_dependencies["verify_signature"].return_value = True
+        webhook_service.warm_up()
+        router = webhook_service.get_fetch_item_router()
+        factory = mock_dependencies["queue_factory"]
+
+        # Every destination client is resolved once, before any message is routed
+        assert sorted(name for _, name in factory.builds) == [
+            "fetch-item-hot", "fetch-item-queue-0", "fetch-item-queue-1", "fetch-item-queue-2"
+        ]
+
+        messages = [("TU", f"3999900{i:07d}") for i in range(30)] + [("HOT", "12345")]
+        for i, (institution, barcode) in enumerate(messages):
+            req = mock_request_factory(
+                body=self.item_body(institution, barcode), headers={"X-Exl-Signature": f"sig-{i}"}
+            )
+            assert WebhookService(req).parse_webhook().status_code == 200
+
+        assert len(factory.builds) == 4
+        for institution, barcode in messages:
+            queue = factory.clients[router.route(institution, barcode)]
+            assert json.dumps({"institution": institution, "barcode": barcode}) in queue.messages
+        assert factory.clients["fetch-item-hot"].messages == [
+            json.dumps({"institution": "HOT", "barcode": "12345"})
+        ]
+        assert all(factory.clients[f"fetch-item-queue-{i}"].messages for i in range(3))
+
+
+class TestAckFirst:
+    """Tests for acknowledging webhooks once their message is in the outbox."""
+
+    def test_parse_webhook_acknowledges_before_send(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that the message is sent by the outbox drainer after the webhook is answered."""
+        override_settings(outbox_enabled=True)
+        mock_dependencies["verify_signature"].return_value = True
+
+        response = WebhookService(mock_request_factory()).parse_webhook()
+        webhook_service.get_outbox().close(timeout=5)
+
+        assert response.status_code == 200
+        assert [json.loads(m) for m in fetch_item_queue(mock_dependencies).messages] == [
+            {"institution": "TU", "barcode": "12345"}
+        ]
+
+    def test_parse_webhook_full_outbox_returns_503(self, mocker, mock_request_factory, mock_dependencies, override_settings):
+        """Test that a full outbox applies backpressure and forgets the change detection fingerprint."""
+        override_settings(outbox_enabled=True, outbox_max_size=0)
+        mock_dependencies["verify_signature"].return_value = True
+        change_detector = mocker.patch(
+            "alma_item_checks_webhook_service.services.webhook_service.get_change_detector"
+        ).return_value
+        change_detector.has_changed.return_value = True
+
+        response = WebhookService(mock_request_factory()).parse_webhook()
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
+        change_detector.forget.assert_called_once_with("TU", "12345")
+        assert fetch_item_queue(mock_dependencies).messages == []
+
+    @pytest.mark.parametrize("message_format", ["json", "compact"])
+    def test_outbox_packs_waiting_messages(self, override_settings, message_format):
+        """Test that outbox messages waiting for a queue are packed in the batch message format."""
+        override_settings(fetch_item_batch_size=4, message_format=message_format)
+        messages = [{"institution": "TU", "barcode": str(i)} for i in range(3)]
+
+        packed = webhook_service.pack_outbox_contents(
+            [WebhookService.serialize_message(message) for message in messages]
+        )
+
+        assert decode_messages(packed) == messages
+
+
+class TestQueueCircuitBreaker:
+    """Tests for failing fast while queue sends are failing."""
+
+    @staticmethod
+    def send(mock_request_factory, i):
+        req = mock_request_factory(headers={"X-Exl-Signature": f"sig-{i}"})
+        return WebhookService(req).parse_webhook()
+
+    def test_send_uses_bounded_options(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that each queue send carries the configured timeout and retry limit."""
+        override_settings(queue_send_timeout_seconds=2.5, queue_send_retries=0)
+        mock_dependencies["verify_signature"].return_value = True
+
+        self.send(mock_request_factory, 0)
+
+        assert fetch_item_queue(mock_dependencies).send_kwargs == [
+            {"timeout": 2, "connection_timeout": 2.5, "read_timeout": 2.5, "retry_total": 0}
+        ]
+
+    def test_open_circuit_fails_fast_with_503(self, mocker, mock_request_factory, mock_dependencies, override_settings, fake_clock):
+        """Test that the breaker opens after repeated failures, rejects without sending, then probes."""
+        from alma_item_checks_webhook_service.utils.circuit_breaker import CircuitBreaker
+
+        override_settings(queue_breaker_failures=2, queue_breaker_reset_seconds=30)
+        breaker = CircuitBreaker(
+            "fetch-item-queue", failure_threshold=2, reset_timeout=30, clock=fake_clock,
+            is_failure=is_transient_send_error,
+        )
+        mocker.patch.object(webhook_service, "_queue_circuit_breaker", breaker)
+        mock_dependencies["verify_signature"].return_value = True
+        queue = fetch_item_queue(mock_dependencies)
+        queue.fail_with = HttpResponseError(message="ServerBusy")
+        queue.fail_with.status_code = 503
+
+        assert [self.send(mock_request_factory, i).status_code for i in range(2)] == [500, 500]
+
+        fake_clock.advance(10)
+        queue.fail_with = None
+        response = self.send(mock_request_factory, 2)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "20"
+        assert queue.messages == []
+
+        fake_clock.advance(20)
+        assert self.send(mock_request_factory, 3).status_code == 200
+        assert breaker.stats()["state"] == "closed"
+        assert len(queue.messages) == 1
+
+    def test_caller_errors_do_not_open_circuit(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that rejected requests and unencodable messages fail alone rather than opening the circuit."""
+        override_settings(queue_breaker_failures=2)
+        mock_dependencies["verify_signature"].return_value = True
+        queue = fetch_item_queue(mock_dependencies)
+        bad_request = HttpResponseError(message="InvalidXmlDocument")
+        bad_request.status_code = 400
+
+        for i, error in enumerate([ValueError("bad message"), bad_request, TypeError("not a string")]):
+            queue.fail_with = error
+            assert self.send(mock_request_factory, i).status_code == 500
+
+        queue.fail_with = None
+        assert self.send(mock_request_factory, 3).status_code == 200
+        assert webhook_service.get_queue_circuit_breaker().stats()["failures"] == 0
+
+
+class TestRequestGuard:
+    """Tests for rejecting oversized, non-JSON and unsigned requests before the body is processed."""
+
+    @staticmethod
+    def untouched_request(mock_request_factory, headers, body=b"{}"):
+        req = mock_request_factory(headers=headers, body=body)
+        req.get_body = Mock(side_effect=AssertionError("body read"))
+        return req
+
+    def test_declared_length_over_limit(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that a Content-Length over the limit is rejected without reading the body."""
+        override_settings(max_body_bytes=1024)
+        req = self.untouched_request(mock_request_factory, {"X-Exl-Signature": "sig", "Content-Length": "10000000000"})
+
+        assert WebhookService(req).parse_webhook().status_code == 413
+        mock_dependencies["verify_signature"].assert_not_called()
+
+    def test_unsupported_content_type(self, mock_request_factory, mock_dependencies):
+        """Test that a non-JSON Content-Type is rejected without reading the body."""
+        req = self.untouched_request(mock_request_factory, {"X-Exl-Signature": "sig", "Content-Type": "text/plain"})
+
+        assert WebhookService(req).parse_webhook().status_code == 415
+
+    def test_missing_signature(self, mock_request_factory, mock_dependencies):
+        """Test that a request without X-Exl-Signature is rejected without reading the body."""
+        req = self.untouched_request(mock_request_factory, {"Content-Type": "application/json; charset=utf-8"})
+
+        assert WebhookService(req).parse_webhook().status_code == 401
+        mock_dependencies["verify_signature"].assert_not_called()
+
+    def test_missing_signature_in_development(self, mock_request_factory, mock_dependencies, mocker):
+        """Test that the signature header is not required when signatures are skipped."""
+        mocker.patch.dict("os.environ", {"AZURE_FUNCTIONS_ENVIRONMENT": "Development"})
+        req = mock_request_factory(headers={"Content-Type": "application/json"})
+
+        assert WebhookService(req).parse_webhook().status_code == 200
+
+    def test_oversized_bodies_rejected_in_constant_time(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that bodies over the limit are rejected by length, without hashing, however large they are."""
+        override_settings(max_body_bytes=1024)
+        elapsed = {}
+        for size in (1025, 64 * 1024 * 1024):
+            req = mock_request_factory(body=b"x" * size)
+            started = time.perf_counter()
+            response = WebhookService(req).parse_webhook()
+            elapsed[size] = time.perf_counter() - started
+            assert response.status_code == 413
+
+        mock_dependencies["verify_signature"].assert_not_called()
+        assert elapsed[64 * 1024 * 1024] < 0.005 + 10 * elapsed[1025]
+
+    def test_body_at_limit_is_processed(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that a body of exactly the limit is accepted."""
+        req = mock_request_factory()
+        override_settings(max_body_bytes=len(req.get_body()))
+        mock_dependencies["verify_signature"].return_value = True
+
+        assert WebhookService(req).parse_webhook().status_code == 200
+
+
+class TestRateShaping:
+    """Tests for delaying over-rate events with the queue visibility timeout."""
+
+    @staticmethod
+    def send(mock_request_factory, i):
+        body = json.dumps({
+            "event": {"value": "ITEM_UPDATED"},
+            "institution": {"value": "TU"},
+            "item": {"item_data": {"barcode": f"1234{i}"}},
+        }).encode()
+        req = mock_request_factory(body=body, headers={"X-Exl-Signature": f"sig-{i}"})
+        return WebhookService(req).parse_webhook()
+
+    def test_over_rate_events_are_accepted_with_increasing_delays(self, mocker, mock_request_factory, mock_dependencies, override_settings, fake_clock):
+        """Test that events past the burst are queued with a growing visibility timeout."""
+        from alma_item_checks_webhook_service.services import rate_shaper
+
+        override_settings(shaping_rates={"TU": 1.0}, shaping_burst=2)
+        mocker.patch.object(rate_shaper, "_rate_shaper", rate_shaper.RateShaper({"TU": 1.0}, burst=2, clock=fake_clock))
+        mock_dependencies["verify_signature"].return_value = True
+
+        assert {self.send(mock_request_factory, i).status_code for i in range(5)} == {200}
+
+        kwargs = fetch_item_queue(mock_dependencies).send_kwargs
+        assert [k.get("visibility_timeout", 0) for k in kwargs] == [0, 0, 1, 2, 3]
+
+    def test_events_past_max_delay_get_503(self, mocker, mock_request_factory, mock_dependencies, override_settings, fake_clock):
+        """Test that an event the rate could only deliver after the maximum delay is refused with Retry-After."""
+        from alma_item_checks_webhook_service.services import rate_shaper
+
+        override_settings(shaping_rates={"TU": 1.0}, shaping_burst=1, shaping_max_delay_seconds=1)
+        mocker.patch.object(rate_shaper, "_rate_shaper", rate_shaper.RateShaper({"TU": 1.0}, burst=1, max_delay=1, clock=fake_clock))
+        mock_dependencies["verify_signature"].return_value = True
+
+        responses = [self.send(mock_request_factory, i) for i in range(3)]
+
+        assert [response.status_code for response in responses] == [200, 200, 503]
+        assert responses[2].headers["Retry-After"] == "1"
+        assert len(fetch_item_queue(mock_dependencies).messages) == 2
+
+    def test_delayed_events_bypass_the_outbox(self, mocker, mock_request_factory, mock_dependencies, override_settings, fake_clock):
+        """Test that a delayed event is sent directly, since the outbox cannot hold per-message delays."""
+        from alma_item_checks_webhook_service.services import rate_shaper
+
+        override_settings(shaping_rates={"TU": 1.0}, shaping_burst=1, outbox_enabled=True, outbox_max_size=0)
+        mocker.patch.object(rate_shaper, "_rate_shaper", rate_shaper.RateShaper({"TU": 1.0}, burst=1, clock=fake_clock))
+        mocker.patch.object(webhook_service, "get_outbox").return_value.put.side_effect = webhook_service.OutboxFull("full")
+        mock_dependencies["verify_signature"].return_value = True
+
+        assert self.send(mock_request_factory, 0).status_code == 503
+        assert self.send(mock_request_factory, 1).status_code == 200
+        assert fetch_item_queue(mock_dependencies).send_kwargs[0]["visibility_timeout"] == 1
+
+
+class TestMessageFormat:
+    """Tests for the queue message encoding."""
+
+    def test_compact_message(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that a single message is sent compact and decodes to the json format message."""
+        override_settings(message_format="compact")
+        mock_dependencies["verify_signature"].return_value = True
+
+        WebhookService(mock_request_factory()).parse_webhook()
+
+        [content] = fetch_item_queue(mock_dependencies).messages
+        assert content == '{"v":2,"m":[{"i":"TU","b":"12345"}]}'
+        assert decode_messages(content) == [{"institution": "TU", "barcode": "12345"}]
+
+    def test_unknown_message_format_is_rejected(self, override_settings):
+        """Test that an unknown MESSAGE_FORMAT fails loudly instead of sending an unreadable message."""
+        override_settings(message_format="msgpack")
+
+        with pytest.raises(ValueError, match="Unknown MESSAGE_FORMAT"):
+            WebhookService.serialize_message({"institution": "TU", "barcode": "12345"})
+
+
+class TestEventFilter:
+    """Tests for dropping events with the configured event filter."""
+
+    FILTER = {
+        "events": ["ITEM_UPDATED"],
+        "rules": [{"name": "electronic", "exclude": {"item_data.physical_material_type": ["ELEC"]}}],
+    }
+
+    @staticmethod
+    def send(mock_request_factory, event, material):
+        body = json.dumps({
+            "event": {"value": event},
+            "institution": {"value": "TU"},
+            "item": {"item_data": {"barcode": "12345", "physical_material_type": {"value": material}}},
+        }).encode()
+        return WebhookService(mock_request_factory(body=body, headers={"X-Exl-Signature": f"{event}-{material}"})).parse_webhook()
+
+    def test_filtered_events_are_acknowledged_without_enqueue(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that dropped events get 200 without a queue message and are counted per rule."""
+        from alma_item_checks_webhook_service.services.event_filter import get_event_filter
+
+        override_settings(event_filter=EventFilter(self.FILTER))
+        mock_dependencies["verify_signature"].return_value = True
+
+        assert self.send(mock_request_factory, "ITEM_UPDATED", "ELEC").status_code == 200
+        assert self.send(mock_request_factory, "ITEM_DELETED", "BOOK").status_code == 200
+        assert fetch_item_queue(mock_dependencies).messages == []
+
+        assert self.send(mock_request_factory, "ITEM_UPDATED", "BOOK").status_code == 200
+        assert len(fetch_item_queue(mock_dependencies).messages) == 1
+        assert get_event_filter().stats() == {"event_type": 1, "electronic": 1}
+
+    def test_configured_event_types_are_queued(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that event types listed in the filter are queued like item updates."""
+        override_settings(event_filter=EventFilter({"events": ["ITEM_UPDATED", "ITEM_CREATED"], "rules": []}))
+        mock_dependencies["verify_signature"].return_value = True
+
+        assert self.send(mock_request_factory, "ITEM_CREATED", "BOOK").status_code == 200
+        assert len(fetch_item_queue(mock_dependencies).messages) == 1
+
+
+class TestChangeDetection:
+    """Tests for skipping item updates whose relevant fields did not change."""
+
+    @staticmethod
+    def item_body(location, note):
+        return json.dumps({
+            "event": {"value": "ITEM_UPDATED"},
+            "institution": {"value": "TU"},
+            "item": {"item_data": {"barcode": "12345", "location": {"value": location}, "internal_note_1": note}},
+        }).encode()
+
+    def send(self, mock_request_factory, i, location, note=""):
+        req = mock_request_factory(body=self.item_body(location, note), headers={"X-Exl-Signature": f"sig-{i}"})
+        return WebhookService(req).parse_webhook()
+
+    def test_parse_webhook_skips_unchanged_items(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that only updates changing a relevant field are queued."""
+        override_settings(change_detection_paths=["item_data.location"])
+        mock_dependencies["verify_signature"].return_value = True
+
+        responses = [
+            self.send(mock_request_factory, 0, "STACKS"),
+            self.send(mock_request_factory, 1, "STACKS", note="Rebound"),
+            self.send(mock_request_factory, 2, "ANNEX"),
+        ]
+
+        assert [r.status_code for r in responses] == [200, 200, 200]
+        assert len(fetch_item_queue(mock_dependencies).messages) == 2
+
+    def test_failed_enqueue_forgets_fingerprint(self, mock_request_factory, mock_dependencies, override_settings):
+        """Test that Alma's retry after a failed send is not skipped as unchanged."""
+        override_settings(change_detection_paths=["item_data.location"])
+        mock_dependencies["verify_signature"].return_value = True
+        queue = fetch_item_queue(mock_dependencies)
+        queue.fail_with = ValueError("Storage error")
+
+        assert self.send(mock_request_factory, 0, "STACKS").status_code == 500
+        queue.fail_with = None
+        assert self.send(mock_request_factory, 1, "STACKS").status_code == 200
+        assert len(queue.messages) == 1
+
+    def test_debounced_change_is_not_recorded(self, mocker, fake_clock, mock_request_factory, mock_dependencies, override_settings):
+        """Test that a change suppressed by the debouncer is queued by a later event with the same fields."""
+        override_settings(change_detection_paths=["item_data.location"])
+        mocker.patch(
+            "alma_item_checks_webhook_service.services.webhook_service.get_barcode_debouncer",
+            return_value=BarcodeDebouncer(MemoryDebounceStore(100, clock=fake_clock), ttl=30),
+        )
+        mock_dependencies["verify_signature"].return_value = True
+
+        self.send(mock_request_factory, 0, "STACKS")
+        self.send(mock_request_factory, 1, "ANNEX")
+        self.send(mock_request_factory, 2, "MAIN")
+        fake_clock.advance(30)
+        self.send(mock_request_factory, 3, "MAIN")
+
+        assert len(fetch_item_queue(mock_dependencies).messages) == 3
+
+
+def test_parse_webhook_adds_snapshot_reference(tmp_path, mock_request_factory, mock_dependencies, override_settings):
+    """Test that claim-check mode stores the item and queues only a reference to it."""
+    override_settings(claim_check_local_path=str(tmp_path))
+    mock_dependencies["verify_signature"].return_value = True
+    body = json.dumps({
+        "time": "2026-10-17T12:00:00Z",
+        "event": {"value": "ITEM_UPDATED"},
+        "institution": {"value": "TU"},
+        "item": {"item_data": {"barcode": "12345", "location": {"value": "STACKS"}}},
+    }).encode()
+
+    response = WebhookService(mock_request_factory(body=body)).parse_webhook()
+
+    assert response.status_code == 200
+    (message,) = [json.loads(m) for m in fetch_item_queue(mock_dependencies).messages]
+    assert message == {
+        "institution": "TU",
+        "barcode": "12345",
+        "snapshot": {
+            "container": str(tmp_path),
+            "name": "TU/12345/2026-10-17T12%3A00%3A00Z.json.gz",
+            "event_time": "2026-10-17T12:00:00Z",
+        },
+    }
+    assert (tmp_path / message["snapshot"]["name"]).exists()
@@ -0,0 +1,179 @@
+"""Tests for the ASGI entry point"""
+import asyncio
+import json
+
+import pytest
+
+from alma_item_checks_webhook_service import asgi
+from alma_item_checks_webhook_service.services import async_webhook_service, webhook_service
+from alma_item_checks_webhook_service.services.queue_backends import get_queue_backend
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    AsyncQueueClientRegistry,
+    QueueClientRegistry,
+)
+
+WEBHOOK = {
+    "event": {"value": "ITEM_UPDATED"},
+    "institution": {"value": "TU"},
+    "item": {"item_data": {"barcode": "12345"}},
+}
+
+
+@pytest.fixture
+def memory_queues(mocker, override_settings):
+    """Send to in-memory queues through fresh registries and accept every signature."""
+    override_settings(queue_backend="memory")
+    mocker.patch.dict("os.environ", {"AZURE_FUNCTIONS_ENVIRONMENT": "Production"})
+    mocker.patch.object(webhook_service, "get_signature_verifier").return_value.verify.return_value = True
+    mocker.patch.object(webhook_service, "queue_client_registry", QueueClientRegistry())
+    mocker.patch.object(async_webhook_service, "async_queue_client_registry", AsyncQueueClientRegistry())
+    return get_queue_backend().store
+
+
+def call(method, path, chunks=(b"",), headers=None, query_string=b""):
+    """Run one HTTP request through the app, returning the status, headers and body."""
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query_string,
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    incoming = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    received = []
+    sent = []
+
+    async def receive():
+        received.append(incoming[len(received)])
+        return received[-1]
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    start, body = sent
+    return start["status"], dict(start["headers"]), body["body"], len(received)
+
+
+def test_challenge(memory_queues):
+    """Test that the Alma challenge is answered on GET."""
+    status, headers, body, _ = call("GET", "/api/webhook", query_string=b"challenge=abc")
+
+    assert status == 200
+    assert headers[b"content-type"] == b"application/json; charset=utf-8"
+    assert json.loads(body) == {"challenge": "abc"}
+
+
+@pytest.mark.parametrize("webhook_async", [True, False])
+def test_webhook_is_queued(memory_queues, override_settings, webhook_async):
+    """Test that a signed webhook is queued by the sync and async services."""
+    override_settings(queue_backend="memory", webhook_async=webhook_async)
+    body = json.dumps(WEBHOOK).encode()
+
+    status, _, response_body, _ = call(
+        "POST", "/api/webhook", [body[:20], body[20:]], {"X-Exl-Signature": "sig", "Content-Type": "application/json"}
+    )
+
+    assert (status, response_body) == (200, b"Webhook received")
+    assert [json.loads(message) for message in memory_queues.receive("fetch-item-queue")] == [
+        {"institution": "TU", "barcode": "12345"}
+    ]
+
+
+def test_batch_is_queued(memory_queues):
+    """Test that the batch route queues every record."""
+    status, _, body, _ = call(
+        "POST",
+        "/api/webhook/batch",
+        [b'["TU", "1"]\n["TU", "2"]\n'],
+        {"X-Exl-Signature": "sig", "Content-Type": "application/x-ndjson"},
+    )
+
+    assert status == 200
+    assert json.loads(body)["counts"] == {"queued": 2}
+    assert len(memory_queues.receive("fetch-item-queue")) == 2
+
+
+def test_streamed_body_over_limit_is_rejected_early(memory_queues, override_settings):
+    """Test that reading stops at the first chunk that takes the body over the limit."""
+    override_settings(queue_backend="memory", max_body_bytes=10)
+
+    status, _, body, chunks_read = call(
+        "POST", "/api/webhook", [b"x" * 6, b"x" * 6, b"x" * 6], {"X-Exl-Signature": "sig"}
+    )
+
+    assert (status, body) == (413, b"Request body too large")
+    assert chunks_read == 2
+    assert memory_queues.count("fetch-item-queue") == 0
+
+
+def test_unknown_route_and_method(memory_queues):
+    """Test that unknown paths get 404 and unsupported methods get 405 with Allow."""
+    assert call("POST", "/api/other")[0] == 404
+    status, headers, _, _ = call("GET", "/api/webhook/batch")
+    assert status == 405
+    assert headers[b"allow"] == b"POST"
+
+
+def test_unhandled_error_is_500(memory_queues, mocker):
+    """Test that an unexpected service error becomes a 500 response."""
+    mocker.patch.object(asgi, "handle", side_effect=RuntimeError("boom"))
+
+    assert call("POST", "/api/webhook", [b"{}"], {"X-Exl-Signature": "sig"})[0] == 500
+
+
+def test_lifespan_closes_pooled_clients(mocker, memory_queues):
+    """Test that startup validates settings and shutdown closes the pooled clients."""
+    sync_clear = mocker.patch.object(asgi.queue_client_registry, "clear")
+    async_clear = mocker.patch.object(asgi.async_queue_client_registry, "clear")
+    messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+    sent = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(asgi.app({"type": "lifespan"}, receive, send))
+
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    sync_clear.assert_called_once()
+    async_clear.assert_awaited_once()
+
+
+def test_lifespan_startup_fails_on_bad_settings(mocker):
+    """Test that startup fails when the settings are invalid."""
+    mocker.patch.object(webhook_service, "get_settings", side_effect=ValueError("Missing required environment variable"))
+    sent = []
+
+    async def receive():
+        return {"type": "lifespan.startup"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app({"type": "lifespan"}, receive, send))
+
+    assert sent == [{"type": "lifespan.startup.failed", "message": "Missing required environment variable"}]
+
+
+def test_lifespan_startup_resolves_sync_clients(mocker, fake_queue_factory, override_settings):
+    """Test that the router and every destination's sync client are built before the first request."""
+    override_settings(fetch_item_partitions=2)
+    mocker.patch.object(webhook_service, "queue_client_registry", QueueClientRegistry(factory=fake_queue_factory))
+    messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        pass
+
+    asyncio.run(asgi.app({"type": "lifespan"}, receive, send))
+
+    assert webhook_service._fetch_item_router is not None
+    assert sorted(name for _, name in fake_queue_factory.builds) == ["fetch-item-queue-0", "fetch-item-queue-1"]
@@ -33,6 +33,20 @@ def test_get_required_env_variable_missing(mocker):
     "env_var, set_value, expected_value, default_value",
     [
         ("FETCH_ITEM_QUEUE", "custom-queue", "custom-queue", "fetch-item-queue"),
+        ("WEBHOOK_ASYNC", "True", True, False),
+        ("MAX_BODY_BYTES", "65536", 65536, 1048576),
+        ("MAX_BATCH_BODY_BYTES", "1048576", 1048576, 33554432),
+        ("QUEUE_BACKEND", "SQLite", "sqlite", "azure"),
+        ("MESSAGE_FORMAT", "Compact", "compact", "json"),
+        ("MESSAGE_COMPRESS_THRESHOLD", "0", 0, 1024),
+        ("QUEUE_SQLITE_PATH", "/tmp/queues.db", "/tmp/queues.db", "queues.sqlite3"),
+        ("OUTBOX_MAX_ATTEMPTS", "0", 0, 10),
+        ("OUTBOX_WORKERS", "8", 8, 4),
+        ("LOG_RATE_LIMIT", "0", 0, 10),
+        ("LOG_RATE_INTERVAL_SECONDS", "5", 5.0, 60.0),
+        ("PROFILE_SAMPLE_RATE", "50", 50, 0),
+        ("PROFILE_FLUSH_SAMPLES", "10", 10, 100),
+        ("PROFILE_OUTPUT", "/tmp/profiles", "/tmp/profiles", None),
     ]
 )
 def test_optional_env_variables(mocker, base_env, env_var, set_value, expected_value, default_value):
@@ -57,3 +71,75 @@ def test_required_env_variables_loaded(mocker, base_env):
 
     assert config.STORAGE_CONNECTION_STRING == base_env["AzureWebJobsStorage"]
     assert config.WEBHOOK_SECRET == base_env["WEBHOOK_SECRET"]
+
+
+def test_import_does_not_require_env(mocker):
+    """Test that the module loads without settings and only get_settings validates them."""
+    mocker.patch.dict('os.environ', {}, clear=True)
+    importlib.reload(config)
+    with pytest.raises(ValueError, match="AzureWebJobsStorage"):
+        config.get_settings()
+
+
+def test_get_settings_is_cached(mocker, base_env):
+    """Test that settings are read once and reused."""
+    mocker.patch.dict('os.environ', base_env, clear=True)
+    settings = config.get_settings()
+    mocker.patch.dict('os.environ', {"FETCH_ITEM_QUEUE": "changed"})
+    assert config.get_settings() is settings
+    assert config.FETCH_ITEM_QUEUE == "fetch-item-queue"
+
+
+def test_unknown_attribute_raises(mocker, base_env):
+    """Test that names which are not settings still raise AttributeError."""
+    mocker.patch.dict('os.environ', base_env, clear=True)
+    with pytest.raises(AttributeError):
+        _ = config.NOT_A_SETTING
+
+
+def test_fetch_item_routes_parsed(mocker, base_env):
+    """Test that FETCH_ITEM_ROUTES is read as institution=queue pairs."""
+    mocker.patch.dict('os.environ', {**base_env, "FETCH_ITEM_ROUTES": "01WRLC_GWA=fetch-gwa, 01WRLC_GU = fetch-gu"}, clear=True)
+    assert config.get_settings().fetch_item_routes == {"01WRLC_GWA": "fetch-gwa", "01WRLC_GU": "fetch-gu"}
+
+
+def test_fetch_item_routes_malformed(mocker, base_env):
+    """Test that a route without a queue name is rejected."""
+    mocker.patch.dict('os.environ', {**base_env, "FETCH_ITEM_ROUTES": "01WRLC_GWA"}, clear=True)
+    with pytest.raises(ValueError, match="Malformed entry"):
+        config.get_settings()
+
+
+def test_shaping_rates_parsed(mocker, base_env):
+    """Test that SHAPING_RATES is read as institution=events per second pairs."""
+    mocker.patch.dict('os.environ', {**base_env, "SHAPING_RATES": "01WRLC_GWA=2.5,01WRLC_GU=10"}, clear=True)
+    assert config.get_settings().shaping_rates == {"01WRLC_GWA": 2.5, "01WRLC_GU": 10.0}
+
+
+def test_event_filter_compiled(mocker, base_env):
+    """Test that EVENT_FILTER is compiled when the settings are loaded."""
+    mocker.patch.dict('os.environ', {**base_env, "EVENT_FILTER": '{"events": ["ITEM_UPDATED"], "rules": []}'}, clear=True)
+    assert config.get_settings().event_filter.event_types == frozenset({"ITEM_UPDATED"})
+
+
+def test_event_filter_invalid(mocker, base_env):
+    """Test that an EVENT_FILTER with an invalid rule is rejected when the settings are loaded."""
+    mocker.patch.dict('os.environ', {**base_env, "EVENT_FILTER": '{"rules": [{"name": "empty"}]}'}, clear=True)
+    with pytest.raises(ValueError, match="Invalid event filter in environment variable 'EVENT_FILTER'"):
+        config.get_settings()
+
+
+def test_event_filter_malformed(mocker, base_env):
+    """Test that an EVENT_FILTER that is not JSON is rejected."""
+    mocker.patch.dict('os.environ', {**base_env, "EVENT_FILTER": "{rules: []}"}, clear=True)
+    with pytest.raises(ValueError, match="Malformed JSON"):
+        config.get_settings()
+
+
+def test_debounce_with_claim_check_rejected(mocker, base_env):
+    """Test that debouncing is rejected in claim-check mode rather than silently turned off."""
+    mocker.patch.dict(
+        'os.environ', {**base_env, "DEBOUNCE_TTL_SECONDS": "30", "CLAIM_CHECK_CONTAINER": "snapshots"}, clear=True
+    )
+    with pytest.raises(ValueError, match="DEBOUNCE_TTL_SECONDS cannot be used"):
+        config.get_settings()
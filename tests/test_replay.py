@@ -0,0 +1,232 @@
+"""Tests for the webhook replay CLI"""
+import base64
+import hashlib
+import hmac
+import io
+import json
+
+import pytest
+
+from alma_item_checks_webhook_service import replay
+from alma_item_checks_webhook_service.config import (
+    FETCH_ITEM_QUEUE,
+    STORAGE_CONNECTION_STRING,
+    WEBHOOK_SECRET,
+)
+from alma_item_checks_webhook_service.services.barcode_debouncer import (
+    get_barcode_debouncer,
+)
+from alma_item_checks_webhook_service.services.change_detector import (
+    get_change_detector,
+)
+from alma_item_checks_webhook_service.services.delivery_idempotency import (
+    get_idempotency_store,
+)
+from alma_item_checks_webhook_service.services.queue_client_registry import (
+    QueueClientRegistry,
+)
+
+
+@pytest.fixture
+def registry(mocker, fake_queue_factory):
+    """Patch the queue client registry with one building fake clients."""
+    return mocker.patch(
+        "alma_item_checks_webhook_service.services.webhook_service.queue_client_registry",
+        QueueClientRegistry(factory=fake_queue_factory),
+    )
+
+
+def queue(registry):
+    return registry.get(STORAGE_CONNECTION_STRING, FETCH_ITEM_QUEUE)
+
+
+def body(barcode, event="ITEM_UPDATED"):
+    return json.dumps({
+        "event": {"value": event},
+        "institution": {"value": "TU"},
+        "item": {"item_data": {"barcode": barcode}},
+    }).encode()
+
+
+def envelope(raw, secret=None):
+    signature = base64.b64encode(hmac.new((secret or WEBHOOK_SECRET).encode(), raw, hashlib.sha256).digest()).decode()
+    return json.dumps({"body": raw.decode(), "signature": signature}).encode()
+
+
+def write_ndjson(path, records):
+    path.write_bytes(b"".join(record + b"\n" for record in records))
+    return path
+
+
+def queued_barcodes(registry):
+    return [json.loads(message)["barcode"] for message in queue(registry).messages]
+
+
+def test_replays_ndjson(tmp_path, registry):
+    """Test that records are validated, filtered, deduplicated by item and queued."""
+    source = write_ndjson(tmp_path / "captured.ndjson", [
+        body("1"), body("2"), b"", body("1"), body("3", event="LOAN_CREATED"), b'{"event": {"value": "ITEM_UPDATED"', body("4"),
+    ])
+
+    assert replay.main([str(source), "--workers", "2"]) == 0
+
+    assert sorted(queued_barcodes(registry)) == ["1", "2", "4"]
+
+
+def test_counts(tmp_path, registry):
+    """Test that each record is counted once under its result."""
+    replayer = replay.Replayer(workers=2)
+    counts = replayer.run(replay.read_ndjson(write_ndjson(tmp_path / "captured.ndjson", [
+        body("1"), body("1"), body("2", event="LOAN_CREATED"), b'{"event": "ITEM_UPDATED", ',
+    ])))
+
+    assert counts == {"read": 4, "queued": 1, "duplicate": 1, "skipped": 1, "invalid": 1, "failed": 0}
+    assert replayer.position == (tmp_path / "captured.ndjson").stat().st_size
+
+
+def test_verifies_envelope_signatures(tmp_path, registry):
+    """Test that envelope signatures are validated when requested."""
+    source = write_ndjson(tmp_path / "captured.ndjson", [
+        envelope(body("1")), envelope(body("2"), secret="wrong"), body("3"),
+    ])
+    replayer = replay.Replayer(envelope=True, verify_signatures=True)
+
+    counts = replayer.run(replay.read_ndjson(source))
+
+    assert queued_barcodes(registry) == ["1"]
+    assert counts["invalid"] == 2
+
+
+def test_live_delivery_stages_are_bypassed(tmp_path, registry, override_settings):
+    """Test that records already seen live are queued despite idempotency, debouncing and change detection."""
+    override_settings(debounce_ttl_seconds=60, change_detection_paths=("item_data.barcode",))
+    raw = body("1")
+    get_idempotency_store().claim(hmac.new(WEBHOOK_SECRET.encode(), raw, hashlib.sha256).digest())
+    get_barcode_debouncer().hold("TU", "1")
+    get_change_detector().has_changed("TU", "1", {"item_data": {"barcode": "1"}})
+
+    counts = replay.Replayer(envelope=True, verify_signatures=True).run(
+        replay.read_ndjson(write_ndjson(tmp_path / "captured.ndjson", [envelope(raw)]))
+    )
+
+    assert counts["queued"] == 1
+    assert queued_barcodes(registry) == ["1"]
+    assert "visibility_timeout" not in queue(registry).send_kwargs[0]
+
+
+def test_replays_directory(tmp_path, registry):
+    """Test that a directory is read one webhook per file, in name order."""
+    for i in range(3):
+        (tmp_path / f"{i:03}.json").write_bytes(body(str(i)))
+
+    replayer = replay.Replayer(workers=1)
+    replayer.run(replay.read_directory(tmp_path))
+
+    assert queued_barcodes(registry) == ["0", "1", "2"]
+    assert replayer.position == 3
+
+
+def test_checkpoint_resumes(tmp_path, registry):
+    """Test that a run with the same checkpoint only replays records added since."""
+    source = write_ndjson(tmp_path / "captured.ndjson", [body("1"), body("2")])
+    checkpoint = tmp_path / "replay.checkpoint"
+    assert replay.main([str(source), "--checkpoint", str(checkpoint)]) == 0
+
+    with source.open("ab") as file:
+        file.write(body("3") + b"\n")
+    assert replay.main([str(source), "--checkpoint", str(checkpoint)]) == 0
+
+    assert sorted(queued_barcodes(registry)) == ["1", "2", "3"]
+    saved = json.loads(checkpoint.read_text())
+    assert saved["position"] == source.stat().st_size
+    assert saved["counts"]["read"] == 3
+
+
+def test_checkpoint_resume_skips_items_queued(tmp_path, registry):
+    """Test that a resumed run does not queue items the checkpointed run already queued."""
+    source = write_ndjson(tmp_path / "captured.ndjson", [body("1"), body("2")])
+    checkpoint = tmp_path / "replay.checkpoint"
+    assert replay.main([str(source), "--checkpoint", str(checkpoint)]) == 0
+
+    with source.open("ab") as file:
+        file.write(body("1") + b"\n" + body("3") + b"\n")
+    assert replay.main([str(source), "--checkpoint", str(checkpoint)]) == 0
+
+    assert sorted(queued_barcodes(registry)) == ["1", "2", "3"]
+    saved = json.loads(checkpoint.read_text())
+    assert saved["counts"]["duplicate"] == 1
+    assert sorted(map(tuple, saved["seen"])) == [("TU", "1"), ("TU", "2"), ("TU", "3")]
+
+
+def test_unfinished_items_are_not_checkpointed(tmp_path):
+    """Test that items of records past the checkpoint position are left out of the checkpoint."""
+    from concurrent.futures import Future
+
+    replayer = replay.Replayer(workers=1)
+    replayer.checkpoint = replay.Checkpoint(tmp_path / "replay.checkpoint", tmp_path / "source")
+    replayer.seen.update({("TU", "1"), ("TU", "2")})
+    replayer._unconfirmed.update({("TU", "1"), ("TU", "2")})
+    first, second = Future(), Future()
+    second.set_result(None)
+    replayer.track(first, 10, ("TU", "1"))
+    replayer.track(second, 20, ("TU", "2"))
+
+    replayer.report(0, 0)
+    assert replayer.checkpoint.load()[2] == set()
+
+    first.set_result(None)
+    replayer.report(0, 0)
+    assert replayer.checkpoint.load()[2] == {("TU", "1"), ("TU", "2")}
+
+
+def test_checkpoint_of_other_source(tmp_path, registry):
+    """Test that a checkpoint is not reused for a different source."""
+    checkpoint = tmp_path / "replay.checkpoint"
+    replay.Checkpoint(checkpoint, tmp_path / "other.ndjson").save(10, {})
+
+    with pytest.raises(SystemExit):
+        replay.main([str(write_ndjson(tmp_path / "captured.ndjson", [])), "--checkpoint", str(checkpoint)])
+
+
+def test_failed_records_are_retried_then_written_out(tmp_path, registry):
+    """Test that an enqueue is retried, and a record that still fails is written to the failed file."""
+    queue(registry).fail_with = ValueError("Storage error")
+    sleeps = []
+    failed = io.BytesIO()
+    replayer = replay.Replayer(workers=1, retries=2, failed_output=failed, sleep=sleeps.append)
+
+    counts = replayer.run(replay.read_ndjson(write_ndjson(tmp_path / "captured.ndjson", [body("1")])))
+
+    assert counts["failed"] == 1
+    assert sleeps == [1, 2]
+    assert failed.getvalue() == body("1") + b"\n"
+
+
+def test_position_waits_for_unfinished_enqueues():
+    """Test that the checkpoint position never passes a record still being enqueued."""
+    from concurrent.futures import Future
+
+    replayer = replay.Replayer()
+    first, second = Future(), Future()
+    replayer.track(first, 10)
+    replayer.track(None, 20)
+    replayer.track(second, 30)
+    replayer.track(None, 40)
+    assert replayer.position == 0
+
+    second.set_result(None)
+    replayer.advance()
+    assert replayer.position == 0
+
+    first.set_result(None)
+    replayer.advance()
+    assert replayer.position == 40
+
+
+def test_progress_is_reported(tmp_path, registry):
+    """Test that progress lines report the counters and throughput."""
+    progress = io.StringIO()
+    replay.Replayer(progress_output=progress).run(replay.read_ndjson(write_ndjson(tmp_path / "captured.ndjson", [body("1")])))
+
+    assert "read 1, queued 1" in progress.getvalue()
+    assert "records/s" in progress.getvalue()
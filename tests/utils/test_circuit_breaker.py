@@ -0,0 +1,131 @@
+"""Tests for the CircuitBreaker class"""
+import pytest
+
+from alma_item_checks_webhook_service.utils.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+
+
+def test_opens_after_consecutive_failures(fake_clock):
+    """Test that the circuit opens at the failure threshold and rejects calls."""
+    breaker = CircuitBreaker("queue", failure_threshold=3, reset_timeout=10, clock=fake_clock)
+
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    fake_clock.advance(4)
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after == pytest.approx(6)
+    assert excinfo.value.retry_after_header == "6"
+    assert breaker.stats() == {"state": OPEN, "failures": 3, "times_opened": 1, "rejected": 1}
+
+
+def test_success_resets_failure_count(fake_clock):
+    """Test that only consecutive failures count towards the threshold."""
+    breaker = CircuitBreaker("queue", failure_threshold=2, clock=fake_clock)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_allows_a_single_probe(fake_clock):
+    """Test that after the cool-down one probe goes through and its success closes the circuit."""
+    breaker = CircuitBreaker("queue", failure_threshold=1, reset_timeout=10, clock=fake_clock)
+    breaker.record_failure()
+
+    fake_clock.advance(10)
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after_header == "1"
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_circuit(fake_clock):
+    """Test that a failed probe opens the circuit for another cool-down."""
+    breaker = CircuitBreaker("queue", failure_threshold=5, reset_timeout=10, clock=fake_clock)
+    for _ in range(5):
+        breaker.record_failure()
+
+    fake_clock.advance(10)
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    fake_clock.advance(9)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    fake_clock.advance(1)
+    breaker.before_call()
+
+
+def test_guard_records_the_outcome_of_the_call(fake_clock):
+    """Test that guard counts a completed block as a success and any exception as a failure."""
+    breaker = CircuitBreaker("queue", failure_threshold=2, reset_timeout=10, clock=fake_clock)
+
+    with pytest.raises(KeyError):
+        with breaker.guard():
+            raise KeyError("not a queue error")
+    assert breaker.failures == 1
+
+    with breaker.guard():
+        pass
+    assert breaker.failures == 0
+
+
+def test_guard_releases_a_probe_that_raises(fake_clock):
+    """Test that a half-open probe raising an unexpected exception reopens the circuit."""
+    breaker = CircuitBreaker("queue", failure_threshold=1, reset_timeout=10, clock=fake_clock)
+    breaker.record_failure()
+    fake_clock.advance(10)
+
+    with pytest.raises(RuntimeError):
+        with breaker.guard():
+            raise RuntimeError("unexpected SDK error")
+
+    assert breaker.state == OPEN
+    fake_clock.advance(10)
+    with breaker.guard():
+        pass
+    assert breaker.state == CLOSED
+
+
+def test_guard_ignores_errors_that_are_not_failures(fake_clock):
+    """Test that exceptions is_failure rejects neither count nor keep a half-open probe claimed."""
+    breaker = CircuitBreaker(
+        "queue", failure_threshold=1, reset_timeout=10, clock=fake_clock,
+        is_failure=lambda error: not isinstance(error, ValueError),
+    )
+
+    with pytest.raises(ValueError):
+        with breaker.guard():
+            raise ValueError("bad message")
+    assert (breaker.state, breaker.failures) == (CLOSED, 0)
+
+    breaker.record_failure()
+    fake_clock.advance(10)
+    with pytest.raises(ValueError):
+        with breaker.guard():
+            raise ValueError("bad message")
+    assert breaker.state == HALF_OPEN
+    with breaker.guard():
+        pass
+    assert breaker.state == CLOSED
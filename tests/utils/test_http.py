@@ -0,0 +1,38 @@
+"""Tests for the framework-neutral request and response types"""
+from alma_item_checks_webhook_service.utils.http import (
+    BufferedRequest,
+    Headers,
+    WebhookResponse,
+)
+
+
+def test_headers_are_case_insensitive():
+    """Test that header lookups ignore case and repeated headers keep the last value."""
+    headers = Headers([("Content-Type", "text/plain"), ("x-exl-signature", "a"), ("X-Exl-Signature", "b")])
+
+    assert headers["content-type"] == "text/plain"
+    assert headers.get("X-EXL-SIGNATURE") == "b"
+    assert headers.get("Content-Length") is None
+    assert len(headers) == 2
+
+
+def test_buffered_request_exposes_request_parts():
+    """Test that a buffered request has the parts the webhook services read."""
+    req = BufferedRequest(
+        "get", "/api/webhook", b"body", headers={"X-Exl-Signature": "sig"}, params={"challenge": "x"}
+    )
+
+    assert req.method == "GET"
+    assert req.headers["x-exl-signature"] == "sig"
+    assert req.params["challenge"] == "x"
+    assert req.get_body() == b"body"
+
+
+def test_response_encodes_string_body():
+    """Test that a string body is encoded with the response charset."""
+    response = WebhookResponse("café", status_code=202, headers={"Retry-After": "5"})
+
+    assert response.status_code == 202
+    assert response.get_body() == "café".encode()
+    assert response.headers == {"Retry-After": "5"}
+    assert response.mimetype == "text/plain"
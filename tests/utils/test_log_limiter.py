@@ -0,0 +1,128 @@
+"""Tests for the rate-limited failure-path logging"""
+import logging
+from unittest.mock import MagicMock
+
+from alma_item_checks_webhook_service.utils.log_limiter import (
+    LogLimiter,
+    get_log_limiter,
+    log_limited,
+)
+
+
+def messages(caplog):
+    return [record.getMessage() for record in caplog.records]
+
+
+def test_messages_over_the_limit_are_suppressed(fake_clock, caplog):
+    """Test that only limit messages per key are logged in a window."""
+    limiter = LogLimiter(2, 60, clock=fake_clock)
+    with caplog.at_level(logging.INFO):
+        for attempt in range(5):
+            limiter.log(logging.ERROR, "Send failed: %s", attempt)
+
+    assert messages(caplog) == ["Send failed: 0", "Send failed: 1"]
+
+
+def test_keys_are_limited_separately(fake_clock, caplog):
+    """Test that each message format string has its own limit."""
+    limiter = LogLimiter(1, 60, clock=fake_clock)
+    with caplog.at_level(logging.INFO):
+        limiter.log(logging.ERROR, "Send failed: %s", "a")
+        limiter.log(logging.ERROR, "Send failed: %s", "b")
+        limiter.log(logging.WARNING, "Signature missing")
+        limiter.log(logging.WARNING, "Signature missing", key="other")
+
+    assert messages(caplog) == [
+        "Send failed: a", "Signature missing", "Signature missing"
+    ]
+
+
+def test_summary_is_logged_when_the_window_ends(fake_clock, caplog):
+    """Test that suppressed messages are summarized once their window has passed."""
+    limiter = LogLimiter(1, 60, clock=fake_clock)
+    with caplog.at_level(logging.INFO):
+        for _ in range(4):
+            limiter.log(logging.ERROR, "Send failed")
+        fake_clock.advance(61)
+        limiter.log(logging.ERROR, "Send failed")
+
+    assert messages(caplog) == [
+        "Send failed",
+        "LogLimiter: Suppressed 3 similar messages in 60 seconds: Send failed",
+        "Send failed",
+    ]
+    assert caplog.records[1].levelno == logging.ERROR
+
+
+def test_other_keys_end_expired_windows(fake_clock, caplog):
+    """Test that a quiet key's summary is logged when any later message sweeps the windows."""
+    limiter = LogLimiter(1, 60, clock=fake_clock)
+    with caplog.at_level(logging.INFO):
+        limiter.log(logging.ERROR, "Send failed")
+        limiter.log(logging.ERROR, "Send failed")
+        fake_clock.advance(61)
+        limiter.log(logging.ERROR, "Signature missing")
+
+    assert "Suppressed 1 similar messages in 60 seconds: Send failed" in caplog.text
+
+
+def test_flush_summarizes_open_windows(fake_clock, caplog):
+    """Test that flush logs the summaries of windows that have not ended."""
+    limiter = LogLimiter(1, 60, clock=fake_clock)
+    with caplog.at_level(logging.INFO):
+        limiter.log(logging.ERROR, "Send failed")
+        limiter.log(logging.ERROR, "Send failed")
+        limiter.flush()
+        limiter.flush()
+
+    assert caplog.text.count("Suppressed 1 similar messages") == 1
+
+
+def test_zero_limit_logs_every_message(fake_clock, caplog):
+    """Test that a limit of 0 turns rate limiting off."""
+    limiter = LogLimiter(0, 60, clock=fake_clock)
+    with caplog.at_level(logging.INFO):
+        for _ in range(20):
+            limiter.log(logging.ERROR, "Send failed")
+
+    assert len(caplog.records) == 20
+
+
+def test_disabled_levels_are_not_formatted_or_counted(fake_clock, caplog):
+    """Test that messages below the logging level cost nothing and use none of the limit."""
+    argument = MagicMock()
+    limiter = LogLimiter(1, 60, clock=fake_clock)
+    with caplog.at_level(logging.ERROR):
+        limiter.log(logging.INFO, "Queued %s", argument)
+        limiter.log(logging.ERROR, "Queued %s", "barcode")
+
+    argument.__str__.assert_not_called()
+    assert messages(caplog) == ["Queued barcode"]
+
+
+def test_records_point_at_the_caller(caplog):
+    """Test that log_limited records the calling function, not the limiter."""
+    with caplog.at_level(logging.INFO):
+        log_limited(logging.ERROR, "Send failed")
+
+    assert caplog.records[0].funcName == "test_records_point_at_the_caller"
+
+
+def test_get_log_limiter_uses_settings(override_settings):
+    """Test that the process-wide limiter is built once from the settings."""
+    override_settings(log_rate_limit=3, log_rate_interval_seconds=5.0)
+
+    limiter = get_log_limiter()
+
+    assert (limiter.limit, limiter.interval) == (3, 5.0)
+    assert get_log_limiter() is limiter
+
+
+def test_invalid_settings_log_without_limit(mocker, caplog):
+    """Test that messages are still logged, by the caller, when the settings cannot be loaded."""
+    mocker.patch.dict("os.environ", {}, clear=True)
+
+    log_limited(logging.ERROR, "Signature check failed: %s", "no secret", key="signature")
+
+    assert messages(caplog) == ["Signature check failed: no secret"]
+    assert caplog.records[0].funcName == "test_invalid_settings_log_without_limit"
@@ -0,0 +1,110 @@
+"""Tests for the queue message codec"""
+import json
+
+import pytest
+
+from alma_item_checks_webhook_service.utils import fast_json
+from alma_item_checks_webhook_service.utils.message_codec import (
+    COMPRESSED_PREFIX,
+    decode_messages,
+    encode_messages,
+)
+
+SNAPSHOT_MESSAGE = {
+    "institution": "01WRLC_GWA",
+    "barcode": "32882019475853",
+    "snapshot": {
+        "container": "item-snapshots",
+        "name": "01WRLC_GWA/32882019475853/2026-10-17T12%3A00%3A00Z.json.gz",
+        "event_time": "2026-10-17T12:00:00Z",
+    },
+}
+
+
+def test_encodes_short_field_names_with_version():
+    """Test that messages are encoded with the schema version and short field names."""
+    content = encode_messages([SNAPSHOT_MESSAGE])
+
+    assert json.loads(content) == {
+        "v": 2,
+        "m": [
+            {
+                "i": "01WRLC_GWA",
+                "b": "32882019475853",
+                "s": {
+                    "c": "item-snapshots",
+                    "n": "01WRLC_GWA/32882019475853/2026-10-17T12%3A00%3A00Z.json.gz",
+                    "t": "2026-10-17T12:00:00Z",
+                },
+            }
+        ],
+    }
+    assert len(content) < len(json.dumps(SNAPSHOT_MESSAGE))
+
+
+@pytest.mark.parametrize(
+    "messages",
+    [
+        [{"institution": "TU", "barcode": "12345"}],
+        [SNAPSHOT_MESSAGE, {"institution": "TU", "barcode": "1", "priority": "high"}],
+        [{"institution": "TU", "barcode": "café"}],
+    ],
+)
+def test_round_trip(messages):
+    """Test that decoding returns the encoded messages, including fields without a short name."""
+    assert decode_messages(encode_messages(messages)) == messages
+
+
+def test_large_batch_is_compressed():
+    """Test that a batch over the threshold is compressed when that makes it shorter."""
+    messages = [{"institution": "01WRLC_GWA", "barcode": f"3288201947{i:04d}"} for i in range(32)]
+
+    content = encode_messages(messages, compress_threshold=256)
+
+    assert content.startswith(COMPRESSED_PREFIX)
+    assert len(content) < len(encode_messages(messages, compress_threshold=0))
+    assert decode_messages(content) == messages
+
+
+def test_small_message_is_not_compressed():
+    """Test that messages under the threshold are plain JSON."""
+    assert encode_messages([{"institution": "TU", "barcode": "1"}], compress_threshold=10).startswith("{")
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        ('{"institution": "TU", "barcode": "1"}', [{"institution": "TU", "barcode": "1"}]),
+        (
+            b'{"version": 1, "messages": [{"institution": "TU", "barcode": "1"}, {"institution": "TU", "barcode": "2"}]}',
+            [{"institution": "TU", "barcode": "1"}, {"institution": "TU", "barcode": "2"}],
+        ),
+    ],
+)
+def test_decodes_json_format_messages(content, expected):
+    """Test that single and batch messages of the json format are decoded."""
+    assert decode_messages(content) == expected
+
+
+@pytest.mark.parametrize(
+    "content, error",
+    [
+        ('{"v": 3, "m": []}', "Unsupported queue message schema version: 3"),
+        ('{"version": 2, "messages": []}', "Unsupported queue message schema version: 2"),
+        ('{"v": 2, "m": ["TU"]}', "not a JSON object"),
+        ('["TU", "1"]', "not a JSON object"),
+        ("z:not base64!", "Malformed compressed queue message"),
+        ("{", None),
+    ],
+)
+def test_rejects_malformed_messages(content, error):
+    """Test that malformed messages and unknown versions raise ValueError."""
+    with pytest.raises(ValueError, match=error):
+        decode_messages(content)
+
+
+def test_dumps_is_compact_without_orjson(mocker):
+    """Test that the standard library fallback writes the same compact JSON."""
+    mocker.patch.object(fast_json, "orjson", None)
+
+    assert fast_json.dumps({"i": "TU", "b": ["café", 1]}) == '{"i":"TU","b":["café",1]}'
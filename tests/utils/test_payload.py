@@ -0,0 +1,84 @@
+"""Tests for webhook payload extraction"""
+import json
+
+import pytest
+
+from alma_item_checks_webhook_service.utils import fast_json
+from alma_item_checks_webhook_service.utils.payload import ItemEvent, extract_item_event
+
+
+def body(**payload):
+    return json.dumps(payload).encode()
+
+
+def test_extracts_item_updated_fields():
+    """Test that institution and barcode are extracted from an item update."""
+    event = extract_item_event(
+        body(
+            event={"value": "ITEM_UPDATED", "desc": "Item updated"},
+            institution={"value": "01WRLC_GWA"},
+            item={"bib_data": {"title": "A book"}, "item_data": {"barcode": "32882019475853"}},
+        )
+    )
+
+    assert event == ItemEvent(event="ITEM_UPDATED", institution="01WRLC_GWA", barcode="32882019475853")
+
+
+def test_item_event_is_slotted():
+    """Test that the record has no per-instance dict."""
+    assert not hasattr(ItemEvent("ITEM_UPDATED", "TU", "1"), "__dict__")
+
+
+def test_other_events_are_not_parsed(mocker):
+    """Test that a body without an ITEM_UPDATED token is rejected before decoding."""
+    loads = mocker.spy(fast_json, "loads")
+
+    assert extract_item_event(body(event={"value": "LOAN_CREATED"}, institution={"value": "TU"})) is None
+    loads.assert_not_called()
+
+
+def test_other_event_mentioning_item_updated():
+    """Test that the event type, not just the token, decides."""
+    payload = body(event={"value": "ITEM_DELETED"}, item={"item_data": {"public_note": "ITEM_UPDATED"}})
+    assert extract_item_event(payload) is None
+
+
+def test_missing_fields_are_none():
+    """Test that missing institution and barcode are reported as None."""
+    event = extract_item_event(body(event={"value": "ITEM_UPDATED"}, item={"item_data": {"barcode": ""}}))
+
+    assert event.institution is None
+    assert event.barcode is None
+
+
+@pytest.mark.parametrize("payload", [b'{"event": {"value": "ITEM_UPDATED"', b'["ITEM_UPDATED"]'])
+def test_invalid_json_raises(payload):
+    """Test that malformed or non-object bodies raise ValueError."""
+    with pytest.raises(ValueError):
+        extract_item_event(payload)
+
+
+def test_stdlib_fallback(mocker):
+    """Test that decoding falls back to the json module when orjson is unavailable."""
+    mocker.patch.object(fast_json, "orjson", None)
+
+    assert fast_json.loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+    with pytest.raises(ValueError):
+        fast_json.loads(b"{")
+
+
+def test_item_object_is_kept_for_change_detection():
+    """Test that the decoded item object is carried on the event without affecting equality."""
+    item = {"item_data": {"barcode": "1", "location": {"value": "STACKS"}}}
+    event = extract_item_event(body(event={"value": "ITEM_UPDATED"}, institution={"value": "TU"}, item=item))
+
+    assert event.item == item
+    assert event == ItemEvent("ITEM_UPDATED", "TU", "1")
+
+
+def test_extracts_configured_event_types():
+    """Test that other item events are extracted only when their event type is requested."""
+    payload = body(event={"value": "ITEM_CREATED"}, institution={"value": "TU"}, item={"item_data": {"barcode": "1"}})
+
+    assert extract_item_event(payload) is None
+    assert extract_item_event(payload, frozenset({"ITEM_UPDATED", "ITEM_CREATED"})) == ItemEvent("ITEM_CREATED", "TU", "1")
@@ -0,0 +1,94 @@
+"""Tests for the sampling profiler"""
+import logging
+import pstats
+from contextlib import nullcontext
+
+from alma_item_checks_webhook_service.utils.profiling import (
+    SamplingProfiler,
+    get_profiler,
+    profiled,
+)
+
+
+def work():
+    return sum(range(100))
+
+
+def test_one_in_n_invocations_is_sampled(tmp_path):
+    """Test that the first of every sample_rate invocations is profiled."""
+    profiler = SamplingProfiler(3, flush_samples=100, output=str(tmp_path))
+
+    for _ in range(7):
+        with profiler.sample():
+            work()
+
+    assert profiler._samples == 3
+
+
+def test_concurrent_samples_are_skipped():
+    """Test that an invocation is not profiled while another one is."""
+    profiler = SamplingProfiler(1, flush_samples=100)
+
+    with profiler.sample():
+        with profiler.sample():
+            work()
+
+    assert profiler._samples == 1
+
+
+def test_stats_are_written_to_the_output_directory(tmp_path):
+    """Test that the aggregated stats are dumped once flush_samples have been taken."""
+    output = tmp_path / "profiles"
+    profiler = SamplingProfiler(1, flush_samples=2, output=str(output))
+
+    for _ in range(2):
+        with profiler.sample():
+            work()
+
+    [path] = output.glob("webhook-*.pstats")
+    stats = pstats.Stats(str(path))
+    assert any(function[2] == "work" for function in stats.stats)
+    assert profiler._samples == 0
+
+
+def test_stats_are_logged_without_an_output_directory(caplog):
+    """Test that the top functions are logged when PROFILE_OUTPUT is not set."""
+    profiler = SamplingProfiler(1, flush_samples=1)
+
+    with caplog.at_level(logging.INFO):
+        with profiler.sample():
+            work()
+
+    assert "Profile of 1 invocations" in caplog.text
+    assert "work" in caplog.text
+
+
+def test_flush_without_samples_writes_nothing(tmp_path, caplog):
+    """Test that flushing an empty aggregate does nothing."""
+    profiler = SamplingProfiler(1, output=str(tmp_path / "profiles"))
+
+    with caplog.at_level(logging.INFO):
+        profiler.flush()
+
+    assert not (tmp_path / "profiles").exists()
+    assert caplog.text == ""
+
+
+def test_profiling_is_off_by_default():
+    """Test that no profiler is built when PROFILE_SAMPLE_RATE is 0."""
+    assert get_profiler() is None
+    assert isinstance(profiled(), nullcontext)
+
+
+def test_get_profiler_uses_settings(override_settings, tmp_path):
+    """Test that the process-wide profiler is built once from the settings."""
+    override_settings(
+        profile_sample_rate=10, profile_flush_samples=5, profile_output=str(tmp_path)
+    )
+
+    profiler = get_profiler()
+
+    assert (profiler.sample_rate, profiler.flush_samples, profiler.output) == (
+        10, 5, str(tmp_path)
+    )
+    assert get_profiler() is profiler
@@ -1,5 +1,10 @@
+import base64
+
 import pytest
-from alma_item_checks_webhook_service.utils.security import validate_webhook_signature
+from alma_item_checks_webhook_service.utils.security import (
+    SignatureVerifier,
+    validate_webhook_signature,
+)
 
 
 @pytest.fixture
@@ -31,6 +36,18 @@ def test_validate_webhook_signature_invalid(sample_data):
     )
 
 
+def test_validate_webhook_signature_invalid_does_not_log_signatures(sample_data, caplog):
+    """Test that a failed validation logs neither the expected nor the received signature."""
+    assert not validate_webhook_signature(
+        body_bytes=sample_data["body"],
+        secret=sample_data["secret"],
+        received_signature="aW52YWxpZA==",
+    )
+    assert "Webhook signature validation failed" in caplog.text
+    assert sample_data["valid_signature"] not in caplog.text
+    assert "aW52YWxpZA==" not in caplog.text
+
+
 def test_validate_webhook_signature_missing_signature(sample_data, caplog):
     """Test that a missing signature returns False and logs a warning."""
     assert not validate_webhook_signature(
@@ -62,3 +79,59 @@ def test_validate_webhook_signature_exception_handling(sample_data, caplog, mock
         received_signature=sample_data["valid_signature"],
     )
     assert "Error during signature validation: Encoding error" in caplog.text
+
+
+class TestSignatureVerifier:
+    """Tests for the SignatureVerifier class"""
+
+    def test_valid_signature(self, sample_data):
+        """Test that a valid signature is accepted."""
+        verifier = SignatureVerifier([sample_data["secret"]])
+        assert verifier.verify(sample_data["body"], sample_data["valid_signature"])
+
+    def test_verifier_is_reusable(self, sample_data):
+        """Test that the prepared key state is not consumed by a verification."""
+        verifier = SignatureVerifier([sample_data["secret"]])
+        assert not verifier.verify(b'{"other": "body"}', sample_data["valid_signature"])
+        assert verifier.verify(sample_data["body"], sample_data["valid_signature"])
+        assert verifier.verify(sample_data["body"], sample_data["valid_signature"])
+
+    def test_invalid_signature(self, sample_data, caplog):
+        """Test that a well-formed but wrong signature is rejected without logging signatures."""
+        verifier = SignatureVerifier([sample_data["secret"]])
+        wrong = base64.b64encode(b"\0" * 32).decode()
+
+        assert not verifier.verify(sample_data["body"], wrong)
+        assert "Webhook signature validation failed" in caplog.text
+        assert sample_data["valid_signature"] not in caplog.text
+
+    def test_malformed_signature(self, sample_data, caplog):
+        """Test that a signature that is not base64 is rejected."""
+        verifier = SignatureVerifier([sample_data["secret"]])
+        assert not verifier.verify(sample_data["body"], "invalid_signature!")
+        assert "not valid base64" in caplog.text
+
+    def test_missing_signature(self, sample_data, caplog):
+        """Test that a missing signature is rejected and logs a warning."""
+        verifier = SignatureVerifier([sample_data["secret"]])
+        assert not verifier.verify(sample_data["body"], None)
+        assert "X-Exl-Signature header is missing" in caplog.text
+
+    def test_rotated_secrets(self, sample_data):
+        """Test that a signature made with any active secret is accepted."""
+        verifier = SignatureVerifier(["new_secret", sample_data["secret"]])
+        assert verifier.verify(sample_data["body"], sample_data["valid_signature"])
+
+    def test_invalid_settings_do_not_break_verification(self, mocker, sample_data, caplog):
+        """Test that a failed verification is reported even when the settings cannot be loaded."""
+        mocker.patch.dict("os.environ", {}, clear=True)
+        verifier = SignatureVerifier([sample_data["secret"]])
+
+        assert not verifier.verify(sample_data["body"], base64.b64encode(b"\0" * 32).decode())
+        assert "Webhook signature validation failed" in caplog.text
+
+    def test_missing_secret(self, sample_data, caplog):
+        """Test that without a secret every signature fails verification and an error is logged."""
+        verifier = SignatureVerifier(["", None])
+        assert not verifier.verify(sample_data["body"], sample_data["valid_signature"])
+        assert "Webhook secret is not provided for validation" in caplog.text
@@ -0,0 +1,111 @@
+"""Tests for the telemetry spans and exporters"""
+import io
+import json
+
+import pytest
+
+from alma_item_checks_webhook_service.utils import telemetry
+from alma_item_checks_webhook_service.utils.telemetry import (
+    NOOP_SPAN,
+    ConsoleExporter,
+    InMemoryExporter,
+    Tracer,
+)
+
+
+def test_disabled_tracer_returns_noop_span():
+    """Test that a tracer without an exporter records nothing."""
+    tracer = Tracer(None)
+    with tracer.span("webhook", institution="TU") as span:
+        span.set_attribute("outcome", "queued")
+    assert span is NOOP_SPAN
+
+
+def test_child_spans_are_exported_with_their_root():
+    """Test that nested spans are attached to the enclosing span and exported once."""
+    exporter = InMemoryExporter()
+    tracer = Tracer(exporter)
+
+    with tracer.span("webhook", institution="TU") as root:
+        with tracer.span("webhook.signature"):
+            pass
+        with tracer.span("webhook.parse"):
+            pass
+        root.set_attribute("outcome", "queued")
+        root.set_attribute("barcode", None)
+
+    assert exporter.spans == [root]
+    assert [span.name for span in exporter.finished_spans()] == [
+        "webhook", "webhook.signature", "webhook.parse"
+    ]
+    assert root.attributes == {"institution": "TU", "outcome": "queued"}
+    assert root.duration_ns >= sum(child.duration_ns for child in root.children)
+    assert root.end_ns >= root.start_ns
+
+
+def test_span_records_exception_type():
+    """Test that an exception leaving a span is recorded and propagated."""
+    exporter = InMemoryExporter()
+    with pytest.raises(ValueError):
+        with Tracer(exporter).span("webhook.parse"):
+            raise ValueError("bad json")
+    assert exporter.spans[0].attributes == {"error": "ValueError"}
+
+
+def test_export_failure_does_not_propagate(caplog):
+    """Test that a failing exporter is logged rather than failing the request."""
+
+    class BrokenExporter:
+        def export(self, span):
+            raise RuntimeError("collector down")
+
+    with Tracer(BrokenExporter()).span("webhook"):
+        pass
+    assert "Failed to export span: collector down" in caplog.text
+
+
+def test_console_exporter_writes_one_json_line_per_root():
+    """Test that the console exporter writes the span tree as JSON."""
+    stream = io.StringIO()
+    tracer = Tracer(ConsoleExporter(stream))
+    with tracer.span("webhook", outcome="queued"):
+        with tracer.span("webhook.enqueue"):
+            pass
+
+    line = json.loads(stream.getvalue())
+    assert line["name"] == "webhook"
+    assert line["attributes"] == {"outcome": "queued"}
+    assert [child["name"] for child in line["children"]] == ["webhook.enqueue"]
+
+
+def test_otlp_exporter_recreates_span_tree():
+    """Test that spans are re-created in OpenTelemetry with their parent links and timing."""
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    otel_exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(otel_exporter))
+    tracer = Tracer(telemetry.OTLPExporter(provider))
+
+    with tracer.span("webhook", institution="TU") as root:
+        with tracer.span("webhook.signature"):
+            pass
+
+    child, parent = otel_exporter.get_finished_spans()
+    assert (parent.name, child.name) == ("webhook", "webhook.signature")
+    assert child.parent.span_id == parent.context.span_id
+    assert parent.attributes["institution"] == "TU"
+    assert (parent.start_time, parent.end_time) == (root.start_ns, root.end_ns)
+
+
+def test_get_tracer_uses_configured_exporter(override_settings):
+    """Test that TELEMETRY_EXPORTER selects the exporter and unknown names are rejected."""
+    override_settings(telemetry_exporter="memory")
+    assert isinstance(telemetry.get_tracer().exporter, InMemoryExporter)
+    assert telemetry.get_tracer() is telemetry.get_tracer()
+
+    with pytest.raises(ValueError, match="Unknown TELEMETRY_EXPORTER"):
+        telemetry.build_exporter("zipkin")
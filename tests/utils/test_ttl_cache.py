@@ -0,0 +1,63 @@
+"""Tests for the TTLCache class"""
+from alma_item_checks_webhook_service.utils.ttl_cache import TTLCache
+
+
+def test_get_returns_value_until_expiry(fake_clock):
+    """Test that entries are returned until their ttl has passed."""
+    cache = TTLCache(max_entries=10, ttl=5, clock=fake_clock)
+    cache.set("key", "value")
+
+    fake_clock.advance(4.9)
+    assert cache.get("key") == "value"
+
+    fake_clock.advance(0.1)
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_add_only_stores_absent_or_expired_keys(fake_clock):
+    """Test that add refuses live keys and accepts expired ones."""
+    cache = TTLCache(max_entries=10, ttl=5, clock=fake_clock)
+
+    assert cache.add("key") is True
+    assert cache.add("key") is False
+
+    fake_clock.advance(5)
+    assert cache.add("key") is True
+
+
+def test_per_entry_ttl_overrides_default(fake_clock):
+    """Test that a ttl passed to set overrides the cache default."""
+    cache = TTLCache(max_entries=10, ttl=5, clock=fake_clock)
+    cache.set("key", "value", ttl=60)
+
+    fake_clock.advance(30)
+    assert cache.get("key") == "value"
+
+
+def test_least_recently_used_entry_is_evicted(fake_clock):
+    """Test that the cache stays bounded by evicting the least recently used entry."""
+    cache = TTLCache(max_entries=2, ttl=60, clock=fake_clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+
+    cache.set("c", 3)
+
+    assert len(cache) == 2
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_discard_and_clear(fake_clock):
+    """Test that entries can be removed individually or all at once."""
+    cache = TTLCache(max_entries=10, ttl=60, clock=fake_clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.discard("a")
+    assert cache.get("a") is None
+
+    cache.clear()
+    assert len(cache) == 0